@@ -2,31 +2,96 @@
 Admin API endpoints.
 """
 import uuid
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Dict, Any, Optional
 
 from app.core.database import get_db
-from app.repositories.device_repository import DeviceRepository
+from app.core.encoding import negotiated_response
+from app.core.pagination import NEXT_CURSOR_HEADER, TOTAL_ESTIMATE_HEADER, decode_cursor, encode_cursor, parse_sort
+from app.core import tracing
+from app.core.tracing import TracedRoute
+from app.repositories.device_repository import DeviceRepository, DEVICE_SORT_COLUMNS
 from app.repositories.admin_service_repository import AdminServiceRepository
+from app.services.circuit_breaker import device_breakers
 from app.services.device_service import DeviceService
+from app.services.inference_service import device_slots
+from app.services.service_registry import service_registry, SERVICE_SORT_FIELDS
+from app.services.analytics_service import fleet_analytics
 from app.schemas.devices import DeviceResponse, DeviceCreate, DeviceUpdate
-from app.schemas.admin import AdminServiceResponse, AdminServiceCreate, AdminServiceUpdate
+from app.schemas.admin import AdminServiceResponse, AdminServiceCreate, AdminServiceUpdate, AnalyticsResponse
 from app.schemas.auth import UserInDB
-from app.deps import require_auth
+from app.deps import require_admin, require_auth
 
-router = APIRouter(prefix="/admin", tags=["admin"])
+router = APIRouter(prefix="/admin", tags=["admin"], route_class=TracedRoute)
+
+
+def parse_listing(sort: str, allowed, cursor: Optional[str]) -> tuple:
+    """Validate a listing's sort and cursor; returns (field, descending, after key)."""
+    try:
+        field, descending = parse_sort(sort, allowed)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    after = None
+    if cursor:
+        try:
+            cursor_sort, *after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if cursor_sort != sort or len(after) != 2:
+            raise HTTPException(status_code=400, detail="Cursor is for a different sort order")
+    return field, descending, after
+
+
+def page_headers(next_key: Optional[list], total: Optional[int]) -> Dict[str, str]:
+    headers = {}
+    if next_key is not None:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(next_key)
+    if total is not None:
+        headers[TOTAL_ESTIMATE_HEADER] = str(total)
+    return headers
 
 
 @router.get("/devices", response_model=List[DeviceResponse])
 async def admin_get_devices(
+    request: Request,
+    status: Optional[List[str]] = Query(None),
+    type: Optional[List[str]] = Query(None),
+    owner: Optional[str] = Query(None, description="Owner user ID, or 'none' for unassigned devices"),
+    lastSeenFrom: Optional[datetime] = None,
+    lastSeenTo: Optional[datetime] = None,
+    sort: str = Query("-last_seen", description="name, last_seen or created_at; prefix with '-' for descending"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     current_user: UserInDB = Depends(require_auth),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get all devices (admin view)."""
+    """Get devices (admin view), filtered and sorted, one page at a time.
+    
+    Pass the ``X-Next-Cursor`` response header back as ``cursor`` for the next
+    page (absent on the last page). ``X-Total-Estimate`` is an approximate
+    count of matching devices for the grid. The body format and compression
+    are negotiated (see ``app.core.encoding``).
+    """
+    field, descending, after = parse_listing(sort, DEVICE_SORT_COLUMNS, cursor)
+    owner_id = None
+    if owner and owner != "none":
+        try:
+            owner_id = uuid.UUID(owner)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid owner ID format")
+    
     device_repo = DeviceRepository(db)
-    devices = await device_repo.get_all()
-    return [DeviceResponse.model_validate(device) for device in devices]
+    query = device_repo.filtered(status, type, owner_id, owner == "none", lastSeenFrom, lastSeenTo)
+    rows = await device_repo.list_page(query, field, descending, limit + 1, after)
+    devices = rows[:limit]
+    next_key = [sort, getattr(devices[-1], field), devices[-1].id] if len(rows) > limit else None
+    return negotiated_response(
+        request,
+        [DeviceResponse.model_validate(device) for device in devices],
+        page_headers(next_key, await device_repo.estimate(query))
+    )
 
 
 @router.post("/devices", response_model=DeviceResponse)
@@ -76,19 +141,35 @@ async def admin_delete_device(
     deleted = await device_repo.delete(device_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Device not found")
+    device_slots.forget(device_id)
+    device_breakers.forget(device_id)
     
     return {"message": "Device deleted successfully"}
 
 
 @router.get("/services", response_model=List[AdminServiceResponse])
 async def admin_get_services(
-    current_user: UserInDB = Depends(require_auth),
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    status: Optional[List[str]] = Query(None),
+    type: Optional[List[str]] = Query(None),
+    sort: str = Query("created_at", description="name, created_at, type or status; prefix with '-' for descending"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    current_user: UserInDB = Depends(require_auth)
 ):
-    """Get all admin services."""
-    service_repo = AdminServiceRepository(db)
-    services = await service_repo.get_all()
-    return [AdminServiceResponse.model_validate(service) for service in services]
+    """Get admin services (served from the in-memory registry), filtered and sorted, one page at a time.
+    
+    Paging works as for ``/admin/devices``; ``X-Total-Estimate`` is exact here.
+    """
+    field, descending, after = parse_listing(sort, SERVICE_SORT_FIELDS, cursor)
+    await service_registry.ensure_loaded()
+    try:
+        services, total = service_registry.page(status, type, field, descending, limit + 1, after)
+    except TypeError:
+        raise HTTPException(status_code=400, detail="Cursor is for a different sort order")
+    page = services[:limit]
+    next_key = [sort, getattr(page[-1], field), page[-1].id] if len(services) > limit else None
+    return negotiated_response(request, page, page_headers(next_key, total))
 
 
 @router.post("/services", response_model=AdminServiceResponse)
@@ -100,6 +181,7 @@ async def admin_create_service(
     """Create a new admin service."""
     service_repo = AdminServiceRepository(db)
     service = await service_repo.create(service_data)
+    await service_registry.upserted(service)
     return AdminServiceResponse.model_validate(service)
 
 
@@ -122,6 +204,7 @@ async def admin_update_service(
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
     
+    await service_registry.upserted(service)
     return AdminServiceResponse.model_validate(service)
 
 
@@ -143,4 +226,40 @@ async def admin_delete_service(
     if not deleted:
         raise HTTPException(status_code=404, detail="Service not found")
     
-    return {"message": "Service deleted successfully"}
\ No newline at end of file
+    await service_registry.deleted(service_uuid)
+    
+    return {"message": "Service deleted successfully"}
+
+
+@router.get("/traces")
+async def admin_get_traces(
+    limit: int = Query(50, ge=1, le=1000),
+    current_user: UserInDB = Depends(require_admin)
+) -> List[Dict[str, Any]]:
+    """Get the most recent request traces (newest first).
+    
+    Admin only: span names carry request paths, including image URLs.
+    """
+    if tracing.exporter is None:
+        return []
+    return tracing.exporter.recent(limit)
+
+
+@router.get("/analytics", response_model=AnalyticsResponse)
+async def admin_get_analytics(
+    groupBy: str = Query("device", pattern="^(device|user|hour)$"),
+    hours: int = Query(24, ge=1, le=24 * 90),
+    deviceId: Optional[str] = None,
+    userId: Optional[str] = None,
+    current_user: UserInDB = Depends(require_admin)
+):
+    """Fleet requests, error rate, tokens/sec and latency percentiles per device, user or hour (admins only)."""
+    user_uuid = None
+    if userId:
+        try:
+            user_uuid = uuid.UUID(userId)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid user ID format")
+    
+    rows = await fleet_analytics.summarize(groupBy, hours, deviceId, user_uuid)
+    return AnalyticsResponse(groupBy=groupBy, hours=hours, rows=rows)
@@ -6,6 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
 from app.core.database import get_db
+from app.core.tracing import TracedRoute
 from app.repositories.user_repository import UserRepository
 from app.schemas.auth import (
     LoginRequest, OIDCLoginRequest, LoginResponse, LogoutResponse,
@@ -13,7 +14,7 @@ from app.schemas.auth import (
 )
 from app.deps import create_session, destroy_session
 
-router = APIRouter(prefix="/auth", tags=["authentication"])
+router = APIRouter(prefix="/auth", tags=["authentication"], route_class=TracedRoute)
 
 
 @router.post("/login", response_model=LoginResponse)
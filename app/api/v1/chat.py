@@ -1,73 +1,255 @@
 """
 Chat API endpoints.
 """
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, Response
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
-import base64
+from typing import AsyncIterator, List, Optional
+from datetime import date, datetime, timedelta, timezone
+import asyncio
+import math
+import time
+import uuid
 
-from app.core.database import get_db
+from app.core.database import get_db, async_session_maker
+from app.core import tracing
+from app.core.tracing import TracedRoute
+from app.core.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from app.core.uploads import discard_form, media_store, media_url, read_streamed_form
+from app.core.cancellation import run_until_disconnected, ClientDisconnected, CLIENT_CLOSED_REQUEST
+from app.core.device_protocol import DeviceError, InvalidRequest, MessageTooLarge
+from app.core.encoding import cached_response, immutable_response, negotiated_response
 from app.repositories.chat_repository import ChatRepository
+from app.repositories.device_repository import DeviceRepository
+from app.repositories.usage_repository import UsageRepository
+from app.repositories.chat_job_repository import ChatJobRepository, TERMINAL_STATUSES
 from app.services.chat_service import ChatService
-from app.schemas.chat import ChatMessageResponse, ChatResponse
+from app.services.chat_job_service import chat_job_pool
+from app.services.circuit_breaker import DeviceUnavailable, device_breakers
+from app.services.device_service import DeviceService, NoDeviceAvailable
+from app.services.model_residency import ModelUnavailable, known_model
+from app.services.thumbnail_service import thumbnailer
+from app.domain.models import ChatJob
+from app.schemas.chat import (
+    ChatMessageRequest, ChatMessageResponse, ChatResponse, ChatJobResponse, UsageResponse, UsageTotals,
+    ConversationPage, ConversationResponse
+)
 from app.schemas.auth import UserInDB
-from app.deps import require_auth
+from app.deps import require_auth, rate_limit, rate_limit_device
 from app.core.config import get_settings
 
-router = APIRouter(prefix="/chat", tags=["chat"])
+router = APIRouter(prefix="/chat", tags=["chat"], route_class=TracedRoute)
+
+
+CHAT_FORM_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["message"],
+                    "properties": {
+                        "message": {"type": "string"},
+                        "deviceId": {"type": "string"},
+                        "debug": {"type": "string", "enum": ["true", "false"]},
+                        "hedge": {"type": "string", "enum": ["true", "false"]},
+                        "model": {"type": "string"},
+                        "images": {"type": "array", "items": {"type": "string", "format": "binary"}},
+                    },
+                }
+            }
+        },
+    }
+}
+
+
+async def chat_form(request: Request, response: Response) -> ChatMessageRequest:
+    """Stream the multipart chat form, storing images in the media store as they arrive.
+    
+    Runs after the route's ``rate_limit`` dependency; the device named in the
+    form is charged here. Images stored by a rejected request are removed.
+    """
+    with tracing.span("chat.read_form"):
+        form = await read_streamed_form(request)
+    try:
+        if not form.get("message"):
+            raise HTTPException(status_code=422, detail="Field required: message")
+        if form.get("model") and not known_model(form.get("model")):
+            raise HTTPException(status_code=422, detail=f"Unknown model: {form.get('model')[:100]}")
+        await rate_limit_device(request, response, form.get("deviceId"))
+    except HTTPException:
+        discard_form(form)
+        raise
+    return ChatMessageRequest(
+        message=form.get("message"),
+        deviceId=form.get("deviceId") or None,
+        debug=form.get("debug"),
+        hedge=form.get("hedge"),
+        model=form.get("model") or None,
+        images=[media_url(stored.sha256) for stored in form.files.get("images", [])]
+    )
 
 
 @router.get("/messages", response_model=List[ChatMessageResponse])
 async def get_messages(
+    request: Request,
     deviceId: Optional[str] = None,
+    conversationId: Optional[uuid.UUID] = None,
+    images: str = Query("thumbnail", pattern="^(thumbnail|full)$"),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
     current_user: UserInDB = Depends(require_auth),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get chat messages for user and optionally device."""
+    """Get chat messages for user and optionally device or conversation, oldest first.
+    
+    Images are referenced by thumbnail (full images in ``fullImages``) unless
+    ``images=full`` is requested. With ``limit`` the history comes one page at
+    a time: pass the ``X-Next-Cursor`` header back as ``cursor``. Full pages
+    older than ``history_immutable_after`` never change, so their encoded
+    forms are cached and they are served with an ETag. The body format and
+    compression are negotiated (see ``app.core.encoding``).
+    """
+    settings = get_settings()
+    after = None
+    if cursor:
+        if limit is None:
+            raise HTTPException(status_code=400, detail="cursor requires limit")
+        try:
+            created_at, message_id = decode_cursor(cursor)
+            if not isinstance(created_at, datetime) or not isinstance(message_id, uuid.UUID):
+                raise ValueError("Invalid cursor")
+            after = (created_at, message_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    cache_key = ("history", current_user.id, deviceId, conversationId, images, limit, cursor)
+    if limit is not None:
+        cached = cached_response(request, cache_key)
+        if cached is not None:
+            return cached
+    
     chat_repo = ChatRepository(db)
-    messages = await chat_repo.get_messages(current_user.id, deviceId)
+    rows = await chat_repo.get_messages(
+        current_user.id, deviceId, conversationId, limit + 1 if limit is not None else None, after
+    )
+    messages = rows[:limit] if limit is not None else rows
+    thumbnails = images == "thumbnail" and thumbnailer.available
     
-    return [
+    page = [
         ChatMessageResponse(
             id=msg.id,
             role=msg.role,
             content=msg.content,
-            images=msg.images,
+            images=thumbnailer.history_images(msg.images, settings.history_thumbnail_size) if thumbnails else msg.images,
+            fullImages=msg.images if thumbnails and msg.images else None,
             debug=msg.debug,
+            status=msg.status,
+            conversationId=msg.conversation_id,
             createdAt=msg.created_at
         )
         for msg in messages
     ]
+    if limit is None or len(rows) <= limit:
+        return negotiated_response(request, page)
+    
+    headers = {NEXT_CURSOR_HEADER: encode_cursor([messages[-1].created_at, messages[-1].id])}
+    settled = datetime.now(timezone.utc) - timedelta(seconds=settings.history_immutable_after)
+    if _aware(messages[-1].created_at) < settled:
+        return immutable_response(request, cache_key, page, headers)
+    return negotiated_response(request, page, headers)
+
+
+def _aware(moment: datetime) -> datetime:
+    """Timestamps read back from SQLite are naive UTC."""
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+@router.get("/conversations", response_model=ConversationPage)
+async def get_conversations(
+    request: Request,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: UserInDB = Depends(require_auth),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get the user's inbox: conversations by most recent message, one page at a time.
+    
+    Previews, timestamps and counts are stored on the conversation, so a page
+    is a single index range read regardless of history size or page depth.
+    """
+    after = None
+    if cursor:
+        try:
+            last_message_at, conversation_id = decode_cursor(cursor)
+            if not isinstance(last_message_at, datetime) or not isinstance(conversation_id, uuid.UUID):
+                raise ValueError("Invalid cursor")
+            after = (last_message_at, conversation_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    rows = await ChatRepository(db).list_conversations(current_user.id, limit + 1, after)
+    page = rows[:limit]
+    return negotiated_response(request, ConversationPage(
+        conversations=[
+            ConversationResponse(
+                id=row.id,
+                deviceId=row.device_id,
+                lastMessagePreview=row.last_message_preview,
+                lastMessageRole=row.last_message_role,
+                lastMessageAt=row.last_message_at,
+                messageCount=row.message_count
+            )
+            for row in page
+        ],
+        nextCursor=encode_cursor([page[-1].last_message_at, page[-1].id]) if len(rows) > limit else None
+    ))
+
+
+@router.get("/usage", response_model=UsageResponse)
+async def get_usage(
+    days: Optional[int] = Query(None, ge=1, le=3650),
+    current_user: UserInDB = Depends(require_auth),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get token usage for the current user, optionally limited to the last ``days`` days."""
+    since = date.today() - timedelta(days=days - 1) if days else None
+    totals = await UsageRepository(db).totals(current_user.id, since)
+    breakdown = [
+        UsageTotals(
+            deviceId=row["device_id"],
+            model=row["model"],
+            requests=row["requests"],
+            promptTokens=row["prompt_tokens"],
+            completionTokens=row["completion_tokens"]
+        )
+        for row in totals
+    ]
+    return UsageResponse(
+        since=since,
+        requests=sum(row.requests for row in breakdown),
+        promptTokens=sum(row.promptTokens for row in breakdown),
+        completionTokens=sum(row.completionTokens for row in breakdown),
+        breakdown=breakdown
+    )
 
 
-@router.post("/message", response_model=ChatResponse)
+@router.post(
+    "/message",
+    response_model=ChatResponse,
+    dependencies=[Depends(rate_limit("chat.message"))],
+    openapi_extra=CHAT_FORM_OPENAPI
+)
 async def send_message(
-    message: str = Form(...),
-    deviceId: Optional[str] = Form(None),
-    debug: Optional[str] = Form(None),
-    images: List[UploadFile] = File(default=[]),
+    request: Request,
+    form: ChatMessageRequest = Depends(chat_form),
     current_user: UserInDB = Depends(require_auth),
     db: AsyncSession = Depends(get_db)
 ):
     """Send a chat message with optional images."""
     settings = get_settings()
-    
-    # Validate and process images
-    image_data = []
-    for image in images:
-        # Check file size
-        content = await image.read()
-        if len(content) > settings.max_upload_size:
-            raise HTTPException(status_code=413, detail=f"Image too large: {image.filename}")
-        
-        # Check file type
-        if image.content_type not in settings.allowed_image_types:
-            raise HTTPException(status_code=400, detail=f"Invalid image type: {image.content_type}")
-        
-        # Convert to base64 data URL
-        image_b64 = base64.b64encode(content).decode()
-        data_url = f"data:{image.content_type};base64,{image_b64}"
-        image_data.append(data_url)
+    deviceId, debug, hedge, model = form.deviceId, form.debug, form.hedge, form.model
     
     # Initialize services
     chat_repo = ChatRepository(db)
@@ -76,10 +258,225 @@ async def send_message(
     # Send message and get response
     debug_mode = debug == "true" if debug else False
     
-    return await chat_service.send_message(
+    device_service = DeviceService(DeviceRepository(db))
+    
+    # Without an explicit device, prefer one that already has the model loaded
+    try:
+        deviceId = await device_service.resolve_device(current_user.id, deviceId, model)
+    except NoDeviceAvailable as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    
+    # A device whose circuit is open fails fast, before the turn is stored
+    try:
+        device_breakers.check(deviceId)
+    except DeviceUnavailable as exc:
+        raise device_unavailable(exc.device_id, exc.retry_after)
+    
+    # Hedging is opt-in per request and must be enabled server-side
+    hedge_devices = None
+    if hedge == "true" and settings.hedging_enabled:
+        hedge_devices = await device_service.hedge_candidates(current_user.id, deviceId, model)
+    
+    # Inference is cancelled (freeing the device) if the client disconnects
+    try:
+        response = await run_until_disconnected(
+            request,
+            chat_service.send_message(
+                user_id=current_user.id,
+                message=form.message,
+                device_id=deviceId,
+                images=form.images or None,
+                debug=debug_mode,
+                hedge_devices=hedge_devices,
+                model=model
+            ),
+            settings.disconnect_poll_interval
+        )
+    except ClientDisconnected:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    except DeviceUnavailable as exc:
+        raise device_unavailable(exc.device_id, exc.retry_after)
+    except ModelUnavailable as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    except DeviceError as exc:
+        raise HTTPException(status_code=504 if exc.code == "timeout" else 502, detail=f"Device error: {exc}")
+    except MessageTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    except InvalidRequest as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    
+    # Attach the per-request timing breakdown (returned only, not persisted)
+    if debug_mode and settings.tracing_debug_breakdown and response.aiMessage.debug is not None:
+        trace = tracing.breakdown()
+        if trace:
+            response.aiMessage.debug["trace"] = trace
+    
+    return response
+
+
+def device_unavailable(device_id: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=f"Device {device_id} is temporarily unavailable",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+def job_response(job: ChatJob) -> ChatJobResponse:
+    """Convert a job row to its API representation."""
+    return ChatJobResponse(
+        id=job.id,
+        status=job.status,
+        deviceId=job.device_id,
+        result=ChatResponse.model_validate(job.result) if job.result else None,
+        error=job.error,
+        createdAt=job.created_at,
+        finishedAt=job.finished_at
+    )
+
+
+def parse_job_id(job_id: str) -> uuid.UUID:
+    """Parse a job ID path parameter."""
+    try:
+        return uuid.UUID(job_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid job ID format")
+
+
+@router.post(
+    "/jobs",
+    response_model=ChatJobResponse,
+    status_code=202,
+    dependencies=[Depends(rate_limit("chat.jobs"))],
+    openapi_extra=CHAT_FORM_OPENAPI
+)
+async def submit_job(
+    form: ChatMessageRequest = Depends(chat_form),
+    idempotency_key: Optional[str] = Header(None),
+    current_user: UserInDB = Depends(require_auth),
+    db: AsyncSession = Depends(get_db)
+):
+    """Submit a chat turn for background processing and return its job ID immediately.
+    
+    Resubmitting with the same ``Idempotency-Key`` header returns the original
+    job instead of running inference again.
+    """
+    if idempotency_key:
+        existing = await ChatJobRepository(db).get_by_idempotency_key(current_user.id, idempotency_key)
+        if existing:
+            return job_response(existing)
+    
+    # A named device must exist now; jobs without one get a device when they run
+    if form.deviceId:
+        try:
+            await DeviceService(DeviceRepository(db)).resolve_device(current_user.id, form.deviceId, form.model)
+        except NoDeviceAvailable as exc:
+            raise HTTPException(status_code=409, detail=str(exc))
+    
+    job = await ChatJobRepository(db).create(
         user_id=current_user.id,
-        message=message,
-        device_id=deviceId,
-        images=image_data if image_data else None,
-        debug=debug_mode
-    )
\ No newline at end of file
+        device_id=form.deviceId,
+        request={
+            "message": form.message,
+            "images": form.images,
+            "debug": form.debug == "true",
+            "model": form.model,
+            "hedge": form.hedge == "true",
+        },
+        idempotency_key=idempotency_key
+    )
+    chat_job_pool.notify_submitted()
+    return job_response(job)
+
+
+@router.get("/jobs/{job_id}", response_model=ChatJobResponse)
+async def get_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, description="Seconds to long-poll for completion"),
+    current_user: UserInDB = Depends(require_auth),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a chat job, optionally long-polling until it finishes."""
+    settings = get_settings()
+    job_repo = ChatJobRepository(db)
+    job_uuid = parse_job_id(job_id)
+    
+    job = await job_repo.get_for_user(job_uuid, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    deadline = time.monotonic() + min(wait, settings.chat_job_max_wait)
+    while job.status not in TERMINAL_STATUSES and time.monotonic() < deadline:
+        # Release the connection while waiting; jobs may finish in another process
+        await db.commit()
+        remaining = deadline - time.monotonic()
+        await chat_job_pool.wait_for_update(job_uuid, min(remaining, settings.chat_job_poll_interval))
+        job = await job_repo.get_for_user(job_uuid, current_user.id)
+    
+    return job_response(job)
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job(
+    job_id: str,
+    current_user: UserInDB = Depends(require_auth),
+    db: AsyncSession = Depends(get_db)
+):
+    """Stream job status changes as server-sent events until the job finishes."""
+    settings = get_settings()
+    job_repo = ChatJobRepository(db)
+    job_uuid = parse_job_id(job_id)
+    
+    job = await job_repo.get_for_user(job_uuid, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events() -> AsyncIterator[str]:
+        # The request session may be closed once streaming starts; poll with short-lived sessions
+        current = job
+        last_status = None
+        while current is not None:
+            if current.status != last_status:
+                last_status = current.status
+                payload = job_response(current).model_dump_json()
+                yield f"event: {current.status}\ndata: {payload}\n\n"
+            if current.status in TERMINAL_STATUSES:
+                return
+            await chat_job_pool.wait_for_update(job_uuid, settings.chat_job_poll_interval)
+            async with async_session_maker() as session:
+                current = await ChatJobRepository(session).get_for_user(job_uuid, current_user.id)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/images/{sha256}")
+async def get_image(sha256: str):
+    """Serve a stored image by content hash.
+    
+    Image URLs are capabilities: the SHA-256 cannot be derived without the
+    image itself, so no session is required (``<img>`` tags cannot send one).
+    """
+    if not media_store.exists(sha256):
+        raise HTTPException(status_code=404, detail="Image not found")
+    content_type = await asyncio.to_thread(media_store.content_type, sha256)
+    return FileResponse(
+        media_store.path(sha256),
+        media_type=content_type,
+        headers={"Cache-Control": "private, max-age=31536000, immutable", "ETag": f'"{sha256}"'}
+    )
+
+
+@router.get("/images/{sha256}/thumbnails/{size}")
+async def get_thumbnail(sha256: str, size: int):
+    """Serve a cached thumbnail, rendering it first if needed (falls back to the full image)."""
+    if size not in thumbnailer.sizes:
+        raise HTTPException(status_code=404, detail="Unknown thumbnail size")
+    if not media_store.exists(sha256):
+        raise HTTPException(status_code=404, detail="Image not found")
+    if not await thumbnailer.ensure(sha256):
+        return RedirectResponse(media_url(sha256), status_code=307)
+    return FileResponse(
+        thumbnailer.path(sha256, size),
+        media_type="image/webp",
+        headers={"Cache-Control": "private, max-age=31536000, immutable", "ETag": f'"{sha256}-{size}"'}
+    )
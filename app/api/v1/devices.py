@@ -1,32 +1,70 @@
 """
 Device management API endpoints.
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Path, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import AsyncIterator, List
+import json
 
-from app.core.database import get_db
+from app.core.config import get_settings
+from app.core.database import get_db, async_session_maker
+from app.core.encoding import negotiated_response
+from app.core.tracing import TracedRoute
 from app.repositories.device_repository import DeviceRepository
 from app.services.device_service import DeviceService
-from app.schemas.devices import DeviceResponse, DeviceActionResponse, DeviceScanResponse
+from app.schemas.devices import DeviceResponse, DeviceActionResponse, DeviceScanResponse, FleetOperationRequest
 from app.schemas.auth import UserInDB
-from app.deps import require_auth
+from app.deps import require_auth, rate_limit
 
-router = APIRouter(prefix="/devices", tags=["devices"])
+router = APIRouter(prefix="/devices", tags=["devices"], route_class=TracedRoute)
 
 
 @router.get("", response_model=List[DeviceResponse])
 async def get_devices(
+    request: Request,
     current_user: UserInDB = Depends(require_auth),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get user's devices."""
+    """Get user's devices (JSON or MessagePack, optionally compressed, as negotiated)."""
     device_repo = DeviceRepository(db)
     devices = await device_repo.get_user_devices(current_user.id)
-    return [DeviceResponse.model_validate(device) for device in devices]
+    return negotiated_response(request, [DeviceResponse.model_validate(device) for device in devices])
 
 
-@router.post("/{device_id}/connect", response_model=DeviceActionResponse)
+# Registered before the per-device routes, which would otherwise match "fleet" as a device ID
+@router.post("/fleet/{action}", dependencies=[Depends(rate_limit("devices.fleet"))])
+async def fleet_operation(
+    request: FleetOperationRequest,
+    action: str = Path(pattern="^(connect|disconnect)$"),
+    current_user: UserInDB = Depends(require_auth)
+):
+    """Connect or disconnect many devices at once.
+    
+    Streams newline-delimited JSON: one ``{"deviceId", "status", "error"}``
+    line per device as it completes, then a ``{"done": true, ...}`` summary.
+    """
+    settings = get_settings()
+    if len(request.deviceIds) > settings.fleet_max_devices:
+        raise HTTPException(status_code=400, detail=f"At most {settings.fleet_max_devices} devices per operation")
+    
+    async def progress() -> AsyncIterator[str]:
+        # The request session may be closed once streaming starts
+        async with async_session_maker() as session:
+            device_service = DeviceService(DeviceRepository(session))
+            async for event in device_service.fleet_operation(
+                action, request.deviceIds, current_user.id, request.concurrency
+            ):
+                yield json.dumps(event) + "\n"
+    
+    return StreamingResponse(progress(), media_type="application/x-ndjson", headers={"Cache-Control": "no-cache"})
+
+
+@router.post(
+    "/{device_id}/connect",
+    response_model=DeviceActionResponse,
+    dependencies=[Depends(rate_limit("devices.connect"))]
+)
 async def connect_device(
     device_id: str,
     current_user: UserInDB = Depends(require_auth),
@@ -52,7 +90,7 @@ async def disconnect_device(
     return await device_service.disconnect_device(device_id)
 
 
-@router.post("/scan", response_model=DeviceScanResponse)
+@router.post("/scan", response_model=DeviceScanResponse, dependencies=[Depends(rate_limit("devices.scan"))])
 async def scan_devices(
     current_user: UserInDB = Depends(require_auth),
     db: AsyncSession = Depends(get_db)
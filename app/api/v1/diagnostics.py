@@ -0,0 +1,176 @@
+"""
+Admin-only diagnostics endpoints.
+"""
+import asyncio
+import json
+import sys
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse
+from typing import Optional
+
+from app.core import memory
+from app.core.config import get_settings
+from app.core.memory import memory_profiler
+from app.core.profiling import profiler
+from app.core.tracing import TracedRoute
+from app.deps import require_admin
+from app.services.circuit_breaker import device_breakers
+
+router = APIRouter(
+    prefix="/admin/diagnostics",
+    tags=["admin"],
+    route_class=TracedRoute,
+    dependencies=[Depends(require_admin)]
+)
+
+GROUP_BY_PATTERN = "^(" + "|".join(memory.GROUP_BY) + ")$"
+
+
+@router.get("/memory")
+async def get_memory():
+    """Process RSS, garbage collector state, tracemalloc status and sizes of in-process stores.
+    
+    Counting heap objects and walking the stores take a while on a large heap,
+    so both run in a worker thread rather than stalling other requests.
+    """
+    gc_state, stores = await asyncio.gather(
+        asyncio.to_thread(memory.gc_summary),
+        asyncio.to_thread(memory.store_sizes)
+    )
+    return {
+        "rssBytes": memory.rss_bytes(),
+        "modules": len(sys.modules),
+        "gc": gc_state,
+        "tracemalloc": memory_profiler.status(),
+        "stores": stores,
+    }
+
+
+@router.get("/circuits")
+async def get_circuits():
+    """Device circuit breakers that are open, half-open or have recent outcomes."""
+    return {"circuits": device_breakers.snapshot()}
+
+
+@router.post("/memory/tracing")
+async def start_tracing(frames: int = Query(1, ge=1, le=50)):
+    """Start tracing allocations, keeping ``frames`` stack frames per allocation."""
+    memory_profiler.start(frames)
+    return memory_profiler.status()
+
+
+@router.delete("/memory/tracing")
+async def stop_tracing():
+    """Stop tracing allocations (snapshots already taken are kept)."""
+    memory_profiler.stop()
+    return memory_profiler.status()
+
+
+@router.post("/memory/snapshots")
+async def take_snapshot(
+    label: Optional[str] = Query(None, max_length=100),
+    groupBy: str = Query("lineno", pattern=GROUP_BY_PATTERN),
+    limit: int = Query(20, ge=1, le=500)
+):
+    """Snapshot current allocations and return the top allocators."""
+    try:
+        stored = await asyncio.to_thread(memory_profiler.take, label)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    top = await asyncio.to_thread(memory_profiler.top, stored.id, groupBy, limit)
+    return {**stored.describe(), "top": top}
+
+
+@router.get("/memory/snapshots/{snapshot_id}")
+async def get_snapshot(
+    snapshot_id: int,
+    groupBy: str = Query("lineno", pattern=GROUP_BY_PATTERN),
+    limit: int = Query(20, ge=1, le=500)
+):
+    """Top allocators in a snapshot, grouped by line, file, traceback or package."""
+    stored = memory_profiler.get(snapshot_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    top = await asyncio.to_thread(memory_profiler.top, snapshot_id, groupBy, limit)
+    return {**stored.describe(), "top": top}
+
+
+@router.get("/memory/snapshots/{snapshot_id}/diff")
+async def diff_snapshots(
+    snapshot_id: int,
+    base: int = Query(..., description="Earlier snapshot to compare against"),
+    groupBy: str = Query("lineno", pattern=GROUP_BY_PATTERN),
+    limit: int = Query(20, ge=1, le=500)
+):
+    """Allocators that grew or shrank the most since snapshot ``base``."""
+    try:
+        changes = await asyncio.to_thread(memory_profiler.diff, snapshot_id, base, groupBy, limit)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    return {
+        "snapshot": memory_profiler.get(snapshot_id).describe(),
+        "base": memory_profiler.get(base).describe(),
+        "changes": changes,
+    }
+
+
+@router.delete("/memory/snapshots/{snapshot_id}")
+async def delete_snapshot(snapshot_id: int):
+    """Discard a snapshot."""
+    if not memory_profiler.delete(snapshot_id):
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    return {"message": "Snapshot deleted"}
+
+
+@router.get("/profiles")
+async def list_profiles():
+    """Stored request profiles, newest first, with how to trigger new ones."""
+    settings = get_settings()
+    return {
+        "enabled": settings.profiling_enabled,
+        "sampleRate": settings.profiling_sample_rate,
+        "armed": profiler.armed,
+        "profiles": profiler.store.list(),
+    }
+
+
+@router.post("/profiles/arm")
+async def arm_profiles(
+    path: str = Query(..., description="Path prefix, e.g. /api/v1/chat/message"),
+    count: int = Query(1, ge=1, le=100)
+):
+    """Profile the next ``count`` requests under ``path`` (requires ``profiling_enabled``)."""
+    if not get_settings().profiling_enabled:
+        raise HTTPException(status_code=409, detail="Profiling is not enabled")
+    return {"armed": profiler.arm(path, count)}
+
+
+@router.delete("/profiles/arm")
+async def disarm_profiles():
+    """Cancel pending armed profiles."""
+    profiler.disarm()
+    return {"armed": profiler.armed}
+
+
+@router.get("/profiles/{profile_id}")
+async def download_profile(
+    profile_id: str,
+    format: str = Query("json", pattern="^(json|collapsed)$")
+):
+    """Download a profile as JSON, or its stacks in collapsed (flame graph) format."""
+    path = profiler.store.path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "json":
+        return FileResponse(path, media_type="application/json", filename=f"profile-{profile_id}.json")
+    with open(path) as f:
+        stacks = json.load(f).get("stacks", {})
+    return PlainTextResponse("".join(f"{stack} {count}\n" for stack, count in stacks.items()))
+
+
+@router.delete("/profiles/{profile_id}")
+async def delete_profile(profile_id: str):
+    """Delete a stored profile."""
+    if not profiler.store.delete(profile_id):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return {"message": "Profile deleted"}
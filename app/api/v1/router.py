@@ -7,6 +7,7 @@ from app.api.v1.auth import router as auth_router
 from app.api.v1.devices import router as devices_router
 from app.api.v1.chat import router as chat_router
 from app.api.v1.admin import router as admin_router
+from app.api.v1.diagnostics import router as diagnostics_router
 
 # Create main API router
 api_router = APIRouter()
@@ -15,4 +16,5 @@ api_router = APIRouter()
 api_router.include_router(auth_router)
 api_router.include_router(devices_router)
 api_router.include_router(chat_router)
-api_router.include_router(admin_router)
\ No newline at end of file
+api_router.include_router(admin_router)
+api_router.include_router(diagnostics_router)
\ No newline at end of file
@@ -0,0 +1,36 @@
+"""
+Command line management tasks.
+
+Usage:
+    python -m app.cli migrate [revision]
+    python -m app.cli current
+"""
+import argparse
+import asyncio
+import sys
+
+from app.core import migrations
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Independent Research management tasks")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    
+    migrate_parser = subcommands.add_parser("migrate", help="Apply schema migrations")
+    migrate_parser.add_argument("revision", nargs="?", default="head")
+    subcommands.add_parser("current", help="Show the database schema revision")
+    
+    args = parser.parse_args(argv)
+    
+    if args.command == "migrate":
+        migrations.upgrade(args.revision)
+        print(f"Database migrated to {args.revision}")
+    elif args.command == "current":
+        current = asyncio.run(migrations.current_revision())
+        print(f"current: {current or 'none'}  head: {migrations.head_revision()}")
+        return 0 if current == migrations.head_revision() else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""
+Cancel request work when the client goes away.
+
+Neither uvicorn nor Starlette cancels a handler when its client disconnects,
+so long-running work (device inference) would keep holding a device slot and
+then persist a reply nobody reads. ``run_until_disconnected`` runs the work
+as a task and cancels it as soon as the client disconnects; cancellation
+propagates through the service into the device call.
+"""
+import asyncio
+from typing import Awaitable, TypeVar
+
+from fastapi import Request
+
+T = TypeVar("T")
+
+# Non-standard status (nginx convention) used for logging/metrics only; the client is gone
+CLIENT_CLOSED_REQUEST = 499
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client disconnected before the work finished."""
+
+
+async def run_until_disconnected(request: Request, work: Awaitable[T], poll_interval: float = 0.25) -> T:
+    """Await ``work``, cancelling it if the client disconnects first."""
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                raise ClientDisconnected()
+    except asyncio.CancelledError:
+        # Our own handler was cancelled (e.g. server shutdown): take the work down with it
+        task.cancel()
+        raise
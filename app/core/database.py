@@ -2,13 +2,17 @@
 Database configuration and session management.
 """
 import uuid
+import weakref
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import DateTime, func, text
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
+from sqlalchemy import DateTime, event, func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from datetime import datetime
 from typing import AsyncGenerator
 
 from app.core.config import get_settings
+from app.core.memory import register_store
 
 
 class Base(DeclarativeBase):
@@ -16,13 +20,103 @@ class Base(DeclarativeBase):
     pass
 
 
+def async_database_url() -> str:
+    """Database URL with the async driver selected."""
+    url = get_settings().database_url
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url.replace("postgresql://", "postgresql+psycopg://")
+
+
+def is_sqlite() -> bool:
+    return get_settings().database_url.startswith("sqlite")
+
+
+def pool_options() -> dict:
+    """Per-worker pool sizing derived from the global connection budget."""
+    settings = get_settings()
+    if is_sqlite():
+        if ":memory:" in settings.database_url or settings.database_url.rstrip("/").endswith(":"):
+            return {}  # One shared in-memory connection
+        # A few file connections; there is no server-side connection limit to share
+        return {"pool_size": settings.sqlite_pool_size, "max_overflow": 0, "pool_timeout": settings.db_pool_timeout}
+    workers = max(1, settings.web_concurrency)
+    pool_size = settings.db_pool_size or max(1, settings.db_connection_budget // workers)
+    return {
+        "pool_size": pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_pre_ping": True,
+    }
+
+
+_live_sessions: "weakref.WeakSet[Session]" = weakref.WeakSet()
+
+
+class TrackedSession(Session):
+    """Session that registers itself in ``_live_sessions`` for memory diagnostics."""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        _live_sessions.add(self)
+
+
 # Database engine and session
 settings = get_settings()
 engine = create_async_engine(
-    settings.database_url.replace("postgresql://", "postgresql+psycopg://"),
-    echo=True
+    async_database_url(),
+    echo=settings.database_echo,
+    **pool_options()
+)
+async_session_maker = async_sessionmaker(
+    engine, class_=AsyncSession, sync_session_class=TrackedSession, expire_on_commit=False
 )
-async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def _identity_map_objects() -> list:
+    """ORM objects held by all live sessions (long-lived sessions show up as growth here)."""
+    return [obj for session in list(_live_sessions) for obj in list(session.identity_map.values())]
+
+
+register_store("sqlalchemy_identity_maps", _identity_map_objects)
+
+
+def sqlite_pragmas() -> dict:
+    """Per-connection SQLite settings for a small, concurrent-read deployment."""
+    settings = get_settings()
+    return {
+        "journal_mode": "WAL",  # Readers do not block the writer (persists in the file)
+        "synchronous": settings.sqlite_synchronous,
+        "foreign_keys": "ON",
+        "busy_timeout": settings.sqlite_busy_timeout_ms,  # Wait for the write lock instead of failing
+        "cache_size": -settings.sqlite_cache_size_kb,  # Negative: size in KiB rather than pages
+        "mmap_size": settings.sqlite_mmap_size_mb * 1024 * 1024,
+        "temp_store": "MEMORY",
+    }
+
+
+def configure_sqlite(sync_engine) -> None:
+    """Apply ``sqlite_pragmas()`` to every new connection of an engine."""
+    pragmas = sqlite_pragmas()
+    
+    @event.listens_for(sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+if engine.dialect.name == "sqlite":
+    configure_sqlite(engine.sync_engine)
+
+
+def upsert(db: AsyncSession, model):
+    """``INSERT ... ON CONFLICT`` statement for the session's dialect."""
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite_insert(model)
+    # Settings only accept PostgreSQL and SQLite URLs
+    return postgresql_insert(model)
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
@@ -33,15 +127,3 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         finally:
             await session.close()
 
-
-async def create_db_and_tables():
-    """Create database tables."""
-    async with engine.begin() as conn:
-        # Enable uuid-ossp extension for UUID generation
-        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS \"uuid-ossp\""))
-        
-        # Import all models to ensure they're registered
-        from app.domain.models import User, Device, ChatMessage, AdminService  # noqa
-        
-        # Create all tables
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""
+Wire protocol spoken between the API and edge devices.
+
+A device listens on TCP (``Device.ip`` and ``specs["port"]``, default
+``device_port``). Each connection carries one request: the client writes a
+single JSON object terminated by a newline, and the device answers with
+newline-delimited JSON messages:
+
+* ``{"op": "load", "variant": "<name>"}`` loads model weights and answers
+  ``{"ok": true}``.
+* ``{"op": "generate", "prompt": "...", "images": [...]}`` streams
+  ``{"token": "..."}`` messages and ends with ``{"done": true, "tokens": n}``.
+  Each image is sent inline as ``{"contentType": "image/png", "data":
+  "<base64>"}`` (see ``image_message()``): devices have no route back to the
+  API, so they never receive URLs.
+* ``{"op": "status"}`` answers with the device's current telemetry.
+
+Any request may instead be answered with
+``{"error": "<message>", "code": "<code>"}``. A connection that closes before
+the final message means the device dropped the request.
+"""
+import asyncio
+import base64
+import binascii
+import json
+from typing import Optional, Tuple
+
+PROTOCOL_VERSION = 1
+
+# Longest message either side will read; a generate request carries its images
+# base64-encoded, which is a third larger than the files themselves
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+OPERATIONS = ("load", "generate", "status")
+
+
+class DeviceError(Exception):
+    """A device refused or failed a request."""
+
+    def __init__(self, message: str, code: str = "device_error"):
+        super().__init__(message)
+        self.code = code
+
+
+class InvalidRequest(ValueError):
+    """A request that cannot be sent to any device (a fault of the request, not the device)."""
+
+
+class MessageTooLarge(InvalidRequest):
+    """A request does not fit in ``MAX_MESSAGE_BYTES``."""
+
+
+def encode(message: dict) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+def image_message(content_type: str, data: bytes) -> dict:
+    """An image as it is sent in a ``generate`` request."""
+    return {"contentType": content_type, "data": base64.b64encode(data).decode("ascii")}
+
+
+def decode_image(image: object) -> Tuple[str, bytes]:
+    """Content type and bytes of an image from a ``generate`` request.
+
+    Raises ``DeviceError`` (code ``bad_request``) if it is malformed.
+    """
+    if not isinstance(image, dict) or not all(isinstance(image.get(key), str) for key in ("contentType", "data")):
+        raise DeviceError("Images must be {contentType, data} objects", "bad_request")
+    try:
+        return image["contentType"], base64.b64decode(image["data"], validate=True)
+    except (binascii.Error, ValueError):
+        raise DeviceError("Image data is not valid base64", "bad_request") from None
+
+
+async def read_message(reader: asyncio.StreamReader, timeout: Optional[float] = None) -> Optional[dict]:
+    """Read one message; None when the peer closed the connection.
+
+    Raises ``DeviceError`` on a timeout or a malformed message.
+    """
+    try:
+        line = await asyncio.wait_for(reader.readline(), timeout)
+    except asyncio.TimeoutError:
+        raise DeviceError("Device did not respond in time", "timeout") from None
+    except (ConnectionError, asyncio.LimitOverrunError, ValueError) as exc:
+        raise DeviceError(f"Connection to device failed: {exc}", "disconnected") from None
+    if not line:
+        return None
+    try:
+        message = json.loads(line)
+    except ValueError:
+        raise DeviceError("Malformed message from device", "protocol") from None
+    if not isinstance(message, dict):
+        raise DeviceError("Malformed message from device", "protocol")
+    return message
@@ -0,0 +1,239 @@
+"""
+Content negotiation for list endpoints.
+
+Clients choose the body format with ``Accept`` (JSON, or MessagePack with the
+optional ``msgpack`` package) and compression with ``Accept-Encoding`` (zstd
+with the optional ``zstandard`` package, or gzip). Compression depends on the
+payload size:
+
+* bodies under ``compression_min_bytes`` are sent as is, since compression
+  would save less than it costs;
+* bodies over ``compression_fast_above_bytes`` use a fast level, which bounds
+  the encode time of very large histories;
+* everything in between uses the default level.
+
+A page whose content can no longer change (e.g. a full page of old chat
+history) can be served with a cache key. Its encoded and compressed forms
+are kept in a bounded LRU cache, compressed at the best level once and then
+reused. Such pages also get an ETag and an immutable ``Cache-Control``, and
+a matching ``If-None-Match`` is answered with 304.
+"""
+import gzip
+import hashlib
+import json
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.memory import register_store
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+MEDIA_TYPE_ALIASES = {"application/json": JSON, "application/msgpack": MSGPACK, "application/x-msgpack": MSGPACK}
+
+# Compression levels per encoding: fast (large bodies), default, best (cached pages)
+LEVELS = {"zstd": (1, 3, 9), "gzip": (1, 6, 9)}
+FAST, DEFAULT, BEST = 0, 1, 2
+
+VARY = "Accept, Accept-Encoding"
+
+
+def _parse_quality(header: str) -> Dict[str, float]:
+    """Map each value in an Accept-style header to its quality."""
+    qualities = {}
+    for part in header.split(","):
+        value, *params = [piece.strip() for piece in part.split(";")]
+        if not value:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, number = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        qualities[value.lower()] = max(quality, qualities.get(value.lower(), 0.0))
+    return qualities
+
+
+def negotiate_media_type(accept: Optional[str]) -> str:
+    """MessagePack if the client prefers it (and it is installed), otherwise JSON."""
+    if not accept or msgpack is None:
+        return JSON
+    qualities = _parse_quality(accept)
+    msgpack_quality = max(
+        (quality for value, quality in qualities.items() if MEDIA_TYPE_ALIASES.get(value) == MSGPACK), default=0.0
+    )
+    json_quality = max(qualities.get(JSON, 0.0), qualities.get("application/*", 0.0), qualities.get("*/*", 0.0))
+    return MSGPACK if msgpack_quality > 0 and msgpack_quality >= json_quality else JSON
+
+
+def negotiate_encoding(accept_encoding: Optional[str], size: int) -> Optional[str]:
+    """Content-Encoding for a body of ``size`` bytes, or None to send it uncompressed."""
+    if not accept_encoding or size < get_settings().compression_min_bytes:
+        return None
+    qualities = _parse_quality(accept_encoding)
+    wildcard = qualities.get("*", 0.0)
+    candidates = [
+        (qualities.get(encoding, wildcard), preference, encoding)
+        for preference, encoding in enumerate(("gzip", "zstd"))
+        if encoding == "gzip" or zstandard is not None
+    ]
+    quality, _, encoding = max(candidates)
+    return encoding if quality > 0 else None
+
+
+def serialize(content: Any, media_type: str) -> bytes:
+    """Encode JSON-compatible content in the negotiated format."""
+    if media_type == MSGPACK:
+        return msgpack.packb(content, use_bin_type=True)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def compress(body: bytes, encoding: str, effort: int) -> bytes:
+    level = LEVELS[encoding][effort]
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def effort_for(size: int) -> int:
+    return FAST if size > get_settings().compression_fast_above_bytes else DEFAULT
+
+
+@dataclass
+class CachedPage:
+    """Encoded forms of one immutable page."""
+    etag: str
+    headers: Dict[str, str]
+    bodies: Dict[Tuple[str, Optional[str]], bytes] = field(default_factory=dict)
+
+    @property
+    def size(self) -> int:
+        return sum(len(body) for body in self.bodies.values())
+
+
+class PageCache:
+    """LRU cache of encoded immutable pages, bounded by total bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._pages: "OrderedDict[Hashable, CachedPage]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def pages(self) -> List[CachedPage]:
+        """The cached pages, least recently used first."""
+        return list(self._pages.values())
+
+    def get(self, key: Hashable) -> Optional[CachedPage]:
+        page = self._pages.get(key)
+        if page is not None:
+            self._pages.move_to_end(key)
+        return page
+
+    def put(self, key: Hashable, page: CachedPage) -> None:
+        previous = self._pages.pop(key, None)
+        if previous is not None:
+            self.bytes -= previous.size
+        self._pages[key] = page
+        self.bytes += page.size
+        while self.bytes > self.max_bytes and self._pages:
+            _, evicted = self._pages.popitem(last=False)
+            self.bytes -= evicted.size
+
+    def add_body(self, key: Hashable, page: CachedPage, variant: Tuple[str, Optional[str]], body: bytes) -> None:
+        page.bodies[variant] = body
+        self.put(key, page)
+
+
+page_cache = PageCache(get_settings().encoded_page_cache_bytes)
+register_store("encoded_page_cache", page_cache.pages)
+
+
+def _response(
+    body: bytes,
+    media_type: str,
+    encoding: Optional[str],
+    headers: Optional[Dict[str, str]] = None,
+    cached: bool = False
+) -> Response:
+    response = Response(content=body, media_type=media_type, headers=headers)
+    response.headers["Vary"] = VARY
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    metrics.encoded_responses.inc(format=media_type.split("/")[-1], encoding=encoding or "identity", cached=str(cached).lower())
+    metrics.encoded_response_bytes.observe(len(body), format=media_type.split("/")[-1], encoding=encoding or "identity")
+    return response
+
+
+def negotiated_response(request: Request, content: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Serialize ``content`` (models or JSON-compatible data) as the client asked."""
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    body = serialize(jsonable_encoder(content), media_type)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), len(body))
+    if encoding:
+        body = compress(body, encoding, effort_for(len(body)))
+    return _response(body, media_type, encoding, headers)
+
+
+def cached_response(request: Request, key: Hashable) -> Optional[Response]:
+    """The response for an immutable page already in the cache, or None."""
+    page = page_cache.get(key)
+    if page is None:
+        return None
+    if request.headers.get("if-none-match") == page.etag:
+        return Response(status_code=304, headers={"ETag": page.etag, "Vary": VARY, **_immutable_headers()})
+    return _cached_variant(request, key, page)
+
+
+def immutable_response(
+    request: Request,
+    key: Hashable,
+    content: Any,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """Serve a page that will never change, caching its encoded forms under ``key``."""
+    payload = jsonable_encoder(content)
+    canonical = serialize(payload, JSON)
+    page = CachedPage(etag=f'"{hashlib.sha256(canonical).hexdigest()[:32]}"', headers=dict(headers or {}))
+    page.bodies[(JSON, None)] = canonical
+    if msgpack is not None:
+        page.bodies[(MSGPACK, None)] = serialize(payload, MSGPACK)
+    page_cache.put(key, page)
+    return _cached_variant(request, key, page, cached=False)
+
+
+def _cached_variant(request: Request, key: Hashable, page: CachedPage, cached: bool = True) -> Response:
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    plain = page.bodies[(media_type, None)]
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), len(plain))
+    body = page.bodies.get((media_type, encoding))
+    if body is None:
+        # Compressed once for every later request, at the best level unless the page is huge
+        body = compress(plain, encoding, BEST if effort_for(len(plain)) != FAST else DEFAULT)
+        page_cache.add_body(key, page, (media_type, encoding), body)
+    headers = {**page.headers, "ETag": page.etag, **_immutable_headers()}
+    return _response(body, media_type, encoding, headers, cached=cached)
+
+
+def _immutable_headers() -> Dict[str, str]:
+    return {"Cache-Control": f"private, max-age={get_settings().immutable_page_max_age}, immutable"}
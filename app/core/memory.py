@@ -0,0 +1,269 @@
+"""
+Memory diagnostics for constrained deployments.
+
+Two views of where memory goes:
+
+* ``MemoryProfiler`` wraps ``tracemalloc``: tracing is switched on at runtime,
+  named snapshots are kept (a bounded number), and each can be reported as its
+  top allocators or diffed against another to find growth. Start the process
+  with ``PYTHONTRACEMALLOC=1`` to include allocations made while importing
+  modules (e.g. the cost of each router and its dependencies).
+* Stores: modules register their long-lived in-process caches and buffers
+  with ``register_store()``, and ``store_sizes()`` reports the entry count and
+  approximate deep size of each, so caps can be tuned from production data.
+"""
+import collections
+import gc
+import itertools
+import os
+import sys
+import sysconfig
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+
+CONTAINERS = (dict, list, tuple, set, frozenset, collections.deque)
+GROUP_BY = ("lineno", "filename", "traceback", "package")
+
+_stores: Dict[str, Tuple[Callable[[], Any], str]] = {}
+
+
+def register_store(name: str, get: Callable[[], Any], kind: str = "memory") -> None:
+    """Register a long-lived store for ``store_sizes()``.
+
+    ``get`` returns the object to measure. For ``kind="disk"`` it returns the
+    paths of files the store currently holds instead. It is called from a
+    worker thread, so it should return a copy rather than a live container.
+    """
+    _stores[name] = (get, kind)
+
+
+def deep_sizeof(obj: Any, max_objects: int = 200_000) -> Tuple[int, bool]:
+    """Approximate bytes reachable from ``obj``; also whether the walk was cut short.
+
+    Containers are followed, as are the attributes of objects defined in this
+    application. Other objects (ORM state, event loops, futures, library
+    internals) count only their own size, so one store does not claim the
+    whole heap through a back-reference.
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        if len(seen) >= max_objects:
+            return total, True
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current, 0)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, CONTAINERS):
+            stack.extend(current)
+        elif type(current).__module__.startswith("app."):
+            attributes = getattr(current, "__dict__", None)
+            if attributes is not None:
+                stack.append(attributes)
+            for slot in getattr(type(current), "__slots__", ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+    return total, False
+
+
+def store_sizes() -> List[dict]:
+    """Entry count and approximate size of every registered store, largest first."""
+    sizes = []
+    for name, (get, kind) in _stores.items():
+        try:
+            target = get()
+            if kind == "disk":
+                paths = list(target)
+                size, truncated = sum(os.path.getsize(path) for path in paths if os.path.exists(path)), False
+                entries: Optional[int] = len(paths)
+            else:
+                size, truncated = deep_sizeof(target)
+                entries = len(target) if hasattr(target, "__len__") else None
+        except Exception as exc:
+            sizes.append({"name": name, "kind": kind, "error": str(exc)})
+            continue
+        sizes.append({"name": name, "kind": kind, "entries": entries, "bytes": size, "truncated": truncated})
+    return sorted(sizes, key=lambda store: store.get("bytes", 0), reverse=True)
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size of this process (Linux), or None if unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def gc_summary() -> dict:
+    return {
+        "counts": gc.get_count(),
+        "objects": len(gc.get_objects()),
+        "uncollectable": len(gc.garbage),
+    }
+
+
+_LIBRARY_ROOTS = tuple(
+    os.path.join(path, "") for path in {sysconfig.get_paths()["purelib"], sysconfig.get_paths()["platlib"]}
+)
+_STDLIB_ROOT = os.path.join(sysconfig.get_paths()["stdlib"], "")
+_APP_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "")
+
+
+def package_of(filename: str) -> str:
+    """Group a source file by distribution (libraries) or subpackage (this app)."""
+    if filename.startswith(_APP_ROOT):
+        parts = os.path.relpath(filename, os.path.dirname(_APP_ROOT)).split(os.sep)
+        return "/".join(parts[:-1][:3]) or parts[0]
+    for root in _LIBRARY_ROOTS:
+        if filename.startswith(root):
+            return filename[len(root):].split(os.sep, 1)[0]
+    if filename.startswith(_STDLIB_ROOT):
+        return "stdlib"
+    return filename
+
+
+@dataclass
+class StoredSnapshot:
+    id: int
+    label: Optional[str]
+    taken_at: float
+    snapshot: tracemalloc.Snapshot
+    traced_bytes: int
+
+    def describe(self) -> dict:
+        return {"id": self.id, "label": self.label, "takenAt": self.taken_at, "tracedBytes": self.traced_bytes}
+
+
+class MemoryProfiler:
+    """Runtime control of tracemalloc and a bounded set of named snapshots."""
+
+    def __init__(self, limit: int = 5):
+        self.limit = limit
+        self._snapshots: "collections.OrderedDict[int, StoredSnapshot]" = collections.OrderedDict()
+        self._ids = itertools.count(1)
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1) -> None:
+        """Start tracing allocations (costs CPU and memory while on)."""
+        if tracemalloc.is_tracing() and tracemalloc.get_traceback_limit() != frames:
+            tracemalloc.stop()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop(self) -> None:
+        """Stop tracing; existing snapshots are kept."""
+        tracemalloc.stop()
+
+    def status(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory() if self.tracing else (0, 0)
+        return {
+            "tracing": self.tracing,
+            "frames": tracemalloc.get_traceback_limit() if self.tracing else None,
+            "tracedBytes": current,
+            "tracedPeakBytes": peak,
+            "overheadBytes": tracemalloc.get_tracemalloc_memory() if self.tracing else 0,
+            "snapshots": [stored.describe() for stored in self._snapshots.values()],
+        }
+
+    def take(self, label: Optional[str] = None) -> StoredSnapshot:
+        """Snapshot current allocations, evicting the oldest beyond ``limit``."""
+        if not self.tracing:
+            raise RuntimeError("Tracing is not enabled")
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        stored = StoredSnapshot(
+            id=next(self._ids),
+            label=label,
+            taken_at=time.time(),
+            snapshot=snapshot,
+            traced_bytes=sum(stat.size for stat in snapshot.statistics("filename")),
+        )
+        self._snapshots[stored.id] = stored
+        while len(self._snapshots) > self.limit:
+            self._snapshots.popitem(last=False)
+        return stored
+
+    def get(self, snapshot_id: int) -> Optional[StoredSnapshot]:
+        return self._snapshots.get(snapshot_id)
+
+    def delete(self, snapshot_id: int) -> bool:
+        return self._snapshots.pop(snapshot_id, None) is not None
+
+    def top(self, snapshot_id: int, group_by: str = "lineno", limit: int = 20) -> List[dict]:
+        """Largest allocators in a snapshot."""
+        stored = self._require(snapshot_id)
+        if group_by == "package":
+            return self._by_package(stored.snapshot.statistics("filename"), limit)
+        return [
+            {"location": _location(stat.traceback, group_by), "sizeBytes": stat.size, "count": stat.count}
+            for stat in stored.snapshot.statistics(group_by)[:limit]
+        ]
+
+    def diff(self, snapshot_id: int, base_id: int, group_by: str = "lineno", limit: int = 20) -> List[dict]:
+        """Allocators whose size changed most from snapshot ``base_id`` to ``snapshot_id``."""
+        stored, base = self._require(snapshot_id), self._require(base_id)
+        key_type = "filename" if group_by == "package" else group_by
+        stats = stored.snapshot.compare_to(base.snapshot, key_type)
+        if group_by == "package":
+            grouped: Dict[str, List[int]] = {}
+            for stat in stats:
+                totals = grouped.setdefault(package_of(stat.traceback[0].filename), [0, 0, 0, 0])
+                totals[0] += stat.size
+                totals[1] += stat.size_diff
+                totals[2] += stat.count
+                totals[3] += stat.count_diff
+            rows = [
+                {"location": name, "sizeBytes": size, "sizeDiffBytes": size_diff, "count": count, "countDiff": count_diff}
+                for name, (size, size_diff, count, count_diff) in grouped.items()
+            ]
+            return sorted(rows, key=lambda row: abs(row["sizeDiffBytes"]), reverse=True)[:limit]
+        return [
+            {
+                "location": _location(stat.traceback, group_by),
+                "sizeBytes": stat.size,
+                "sizeDiffBytes": stat.size_diff,
+                "count": stat.count,
+                "countDiff": stat.count_diff,
+            }
+            for stat in stats[:limit]
+        ]
+
+    def _require(self, snapshot_id: int) -> StoredSnapshot:
+        stored = self._snapshots.get(snapshot_id)
+        if stored is None:
+            raise KeyError(snapshot_id)
+        return stored
+
+    def _by_package(self, stats: List[tracemalloc.Statistic], limit: int) -> List[dict]:
+        grouped: Dict[str, List[int]] = {}
+        for stat in stats:
+            totals = grouped.setdefault(package_of(stat.traceback[0].filename), [0, 0])
+            totals[0] += stat.size
+            totals[1] += stat.count
+        rows = [{"location": name, "sizeBytes": size, "count": count} for name, (size, count) in grouped.items()]
+        return sorted(rows, key=lambda row: row["sizeBytes"], reverse=True)[:limit]
+
+
+def _location(traceback: tracemalloc.Traceback, group_by: str) -> Any:
+    if group_by == "traceback":
+        return [f"{frame.filename}:{frame.lineno}" for frame in traceback]
+    frame = traceback[0]
+    return frame.filename if group_by == "filename" else f"{frame.filename}:{frame.lineno}"
+
+
+memory_profiler = MemoryProfiler(get_settings().memory_snapshot_limit)
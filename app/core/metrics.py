@@ -0,0 +1,388 @@
+"""
+Prometheus-style metrics collection and exposition.
+"""
+import asyncio
+import bisect
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+LabelValues = Tuple[str, ...]
+
+# Latency buckets in seconds (covers fast API calls through slow edge inference)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RATE_BUCKETS = (1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0, 500.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Base class for labelled metrics."""
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter."""
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+    type_name = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def remove(self, **labels: str) -> None:
+        """Stop exporting a label set."""
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+def bucket_quantile(buckets: Sequence[float], counts: Sequence[int], q: float) -> Optional[float]:
+    """Estimate a quantile from per-bucket counts (last count is +Inf) by linear interpolation."""
+    total = sum(counts)
+    if not total:
+        return None
+    target = q * total
+    cumulative = 0
+    for i, bucket_count in enumerate(counts):
+        if cumulative + bucket_count >= target and bucket_count:
+            lower = buckets[i - 1] if i > 0 else 0.0
+            upper = buckets[i] if i < len(buckets) else buckets[-1]
+            return lower + (upper - lower) * ((target - cumulative) / bucket_count)
+        cumulative += bucket_count
+    return buckets[-1]
+
+
+class Histogram(_Metric):
+    """Cumulative bucketed histogram."""
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def count(self, **labels: str) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def quantile(self, q: float, **labels: str) -> Optional[float]:
+        """Estimate a quantile by linear interpolation within buckets."""
+        counts = self._counts.get(self._key(labels))
+        if not counts:
+            return None
+        return bucket_quantile(self.buckets, counts, q)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key in sorted(self._counts):
+            counts = self._counts[key]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(self._sums[key])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Registry of metrics plus collectors evaluated at scrape time."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], None]) -> None:
+        """Register a callback that refreshes gauges before each scrape."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        for collector in self._collectors:
+            collector()
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# HTTP
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests currently being served"
+)
+
+# Database pool
+db_pool_size = registry.gauge("db_pool_size", "Configured database pool size")
+db_pool_checked_out = registry.gauge("db_pool_checked_out", "Database connections in use")
+db_pool_overflow = registry.gauge("db_pool_overflow", "Database connections opened beyond the pool size")
+
+# Event loop
+event_loop_lag = registry.gauge("event_loop_lag_seconds", "Most recent event loop scheduling lag")
+event_loop_lag_histogram = registry.histogram(
+    "event_loop_lag_seconds_histogram", "Event loop scheduling lag",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+# Devices / inference
+device_queue_depth = registry.gauge(
+    "device_queue_depth", "Inference requests waiting or running per device", ("device",)
+)
+device_time_to_first_token = registry.histogram(
+    "device_time_to_first_token_seconds", "Time from dispatch to first generated token", ("device",)
+)
+device_tokens_per_second = registry.histogram(
+    "device_tokens_per_second", "Decode throughput per inference", ("device",), buckets=RATE_BUCKETS
+)
+device_inference_duration = registry.histogram(
+    "device_inference_duration_seconds", "End-to-end inference time including queueing", ("device",)
+)
+device_inference_total = registry.counter(
+    "device_inference_total", "Inference requests by outcome (ok, error, cancelled)", ("device", "outcome")
+)
+inference_hedges = registry.counter(
+    "inference_hedges_total", "Hedged inference requests (won, lost, budget_exhausted)", ("outcome",)
+)
+device_circuit_state = registry.gauge(
+    "device_circuit_state", "Device circuit breaker state (0 closed, 1 half-open, 2 open)", ("device",)
+)
+device_circuit_transitions = registry.counter(
+    "device_circuit_transitions_total", "Device circuit breaker state changes by new state", ("device", "state")
+)
+device_circuit_rejected = registry.counter(
+    "device_circuit_rejected_total", "Requests failed fast because the device circuit was open", ("device",)
+)
+device_circuit_probes = registry.counter(
+    "device_circuit_probes_total", "Health probes sent to devices with an open circuit", ("device", "outcome")
+)
+fleet_operation_devices = registry.counter(
+    "fleet_operation_devices_total", "Devices processed by fleet connect/disconnect operations", ("action", "outcome")
+)
+device_model_resident = registry.gauge(
+    "device_model_resident", "1 if the model is loaded on the device", ("device", "model")
+)
+model_loads = registry.counter(
+    "model_loads_total", "Model residency checks by outcome (warm, cold, preload)", ("device", "outcome")
+)
+model_load_duration = registry.histogram(
+    "model_load_duration_seconds", "Time to load a model onto a device", ("device",),
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+)
+usage_events_flushed = registry.counter(
+    "usage_events_flushed_total", "Usage events written to the ledger"
+)
+usage_events_dropped = registry.counter(
+    "usage_events_dropped_total", "Usage events dropped because the buffer was full or the database rejected them",
+    ["reason"]
+)
+encoded_responses = registry.counter(
+    "encoded_responses_total", "Negotiated list responses by format, content encoding and cache use",
+    ("format", "encoding", "cached")
+)
+encoded_response_bytes = registry.histogram(
+    "encoded_response_bytes", "Body size of negotiated list responses", ("format", "encoding"),
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+)
+retrieval_duration = registry.histogram(
+    "retrieval_duration_seconds", "Chat history retrieval search time by search mode", ("mode",),
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05)
+)
+retrieval_searches = registry.counter(
+    "retrieval_searches_total", "Chat history retrievals by outcome (hit, empty, cold, timeout)", ("outcome",)
+)
+chat_turns_abandoned = registry.counter(
+    "chat_turns_abandoned_total", "Chat turns cancelled because the client disconnected", ("device",)
+)
+
+
+def collect_db_pool(pool) -> Callable[[], None]:
+    """Build a collector that samples a SQLAlchemy pool."""
+    def collect() -> None:
+        for gauge, attribute in (
+            (db_pool_size, "size"),
+            (db_pool_checked_out, "checkedout"),
+            (db_pool_overflow, "overflow"),
+        ):
+            method = getattr(pool, attribute, None)
+            if method is not None:
+                gauge.set(method())
+    return collect
+
+
+def route_template(scope: Scope) -> str:
+    """Return the matched route's path template (bounded label cardinality)."""
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    # Routers included with a prefix may only report the inner path; recover
+    # the prefix by rendering the template with the matched path params.
+    path = scope.get("path", "")
+    try:
+        rendered = template.format(**scope.get("path_params", {}))
+    except (KeyError, IndexError, ValueError):
+        return template
+    if rendered and path.endswith(rendered):
+        return path[:len(path) - len(rendered)] + template
+    return template
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route HTTP latency."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=route_template(scope),
+                status=str(status_code)
+            )
+
+
+async def monitor_event_loop(interval: float = 0.5) -> None:
+    """Measure how late the event loop wakes up from a fixed sleep."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        event_loop_lag.set(lag)
+        event_loop_lag_histogram.observe(lag)
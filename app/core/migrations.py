@@ -0,0 +1,70 @@
+"""
+Schema migration helpers.
+
+Migrations are applied once by the launcher (``python -m app.cli migrate`` or
+``start_fastapi.py``). Application startup only compares the database's
+recorded revision against the migration head, which is a single query.
+"""
+import asyncio
+import os
+from functools import lru_cache
+from typing import Optional
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+
+from app.core.database import engine, async_database_url
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "migrations")
+
+
+class SchemaVersionError(RuntimeError):
+    """Raised when the database schema is not at the expected revision."""
+
+
+def alembic_config(database_url: Optional[str] = None) -> Config:
+    """Build an Alembic config without needing an alembic.ini file."""
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    config.set_main_option("sqlalchemy.url", (database_url or async_database_url()).replace("%", "%%"))
+    return config
+
+
+@lru_cache()
+def head_revision() -> str:
+    """Revision the code expects the database to be at."""
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+def upgrade(revision: str = "head", database_url: Optional[str] = None) -> None:
+    """Apply migrations up to ``revision`` (blocking; must not run inside an event loop)."""
+    command.upgrade(alembic_config(database_url), revision)
+
+
+async def current_revision() -> Optional[str]:
+    """Revision recorded in the database, or None if never migrated."""
+    async with engine.connect() as conn:
+        return await conn.run_sync(lambda sync_conn: MigrationContext.configure(sync_conn).get_current_revision())
+
+
+async def check_schema_version() -> str:
+    """Fail fast if the database is not at the migration head."""
+    current = await current_revision()
+    expected = head_revision()
+    if current != expected:
+        raise SchemaVersionError(
+            f"Database schema is at revision {current or 'none'}, expected {expected}. "
+            "Run `python -m app.cli migrate` before starting the API."
+        )
+    return current
+
+
+async def ensure_schema(auto_migrate: bool = False) -> str:
+    """Check the schema version, optionally applying pending migrations first."""
+    if auto_migrate:
+        current = await current_revision()
+        if current != head_revision():
+            await asyncio.to_thread(upgrade)
+    return await check_schema_version()
@@ -0,0 +1,316 @@
+"""
+On-demand sampling CPU profiler for single requests.
+
+``ProfilingMiddleware`` (installed only when ``profiling_enabled`` is set)
+selects a request for profiling when one of these applies:
+
+* it carries ``X-Profile: <profiling_header_token>``;
+* an admin armed the next N requests under a path prefix;
+* a random draw falls under ``profiling_sample_rate``.
+
+Selected requests are watched by a sampler thread that wakes every
+``profiling_interval`` seconds, reads the event loop thread's stack and
+counts it when that request's task (or, on Python 3.12+, a task it spawned)
+is the one running. Samples taken while the loop runs other requests or sits
+idle are counted separately, so a report shows both where the request spent
+CPU and how much of its wall time it was actually on the loop. The sampler
+thread only runs while a profiled request is in flight; unselected requests
+pay one header lookup and nothing at all when profiling is disabled.
+
+Reports are JSON files in ``profiling_dir``, pruned to
+``profiling_max_reports`` files and ``profiling_max_bytes`` in total. Stacks
+are also available in the collapsed format used by flame graph tools.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+_REPORT_ID = re.compile(r"^[0-9]{14}-[0-9a-f]{8}$")
+
+_current_profile: ContextVar[Optional["Profile"]] = ContextVar("current_profile", default=None)
+
+Stack = Tuple[str, ...]
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    for root in sorted(sys.path, key=len, reverse=True):
+        if root and filename.startswith(root + os.sep):
+            filename = filename[len(root) + 1:]
+            break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _stack(frame) -> Stack:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return tuple(reversed(labels))
+
+
+@dataclass
+class Profile:
+    """Samples collected for one request."""
+    id: str
+    method: str
+    path: str
+    task: Optional[asyncio.Task]
+    started: float = field(default_factory=time.perf_counter)
+    started_at: float = field(default_factory=time.time)
+    stacks: Counter = field(default_factory=Counter)
+    wall_samples: int = 0
+    status: Optional[int] = None
+    duration_ms: float = 0.0
+
+    def owns(self, task: Optional[asyncio.Task]) -> bool:
+        if task is None:
+            return False
+        if task is self.task:
+            return True
+        get_context = getattr(task, "get_context", None)  # Python 3.12+
+        return get_context is not None and get_context().get(_current_profile) is self
+
+    def report(self, interval: float) -> dict:
+        running = sum(self.stacks.values())
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "startedAt": self.started_at,
+            "durationMs": round(self.duration_ms, 3),
+            "intervalMs": interval * 1000,
+            "samples": self.wall_samples,
+            "runningSamples": running,
+            "runningMs": round(running * interval * 1000, 3),
+            "top": [
+                {"function": label, "self": count, "total": total[label]}
+                for label, count in own.most_common(30)
+            ],
+            "stacks": {";".join(stack): count for stack, count in self.stacks.most_common()},
+        }
+
+
+class Sampler:
+    """Samples the event loop thread while at least one profile is active."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._profiles: List[Profile] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+
+    def begin(self, profile: Profile) -> None:
+        with self._lock:
+            self._profiles.append(profile)
+            if self._thread is None:
+                self._loop = asyncio.get_running_loop()
+                self._loop_thread_id = threading.get_ident()
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def end(self, profile: Profile) -> None:
+        with self._lock:
+            self._profiles.remove(profile)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    return
+                frame = sys._current_frames().get(self._loop_thread_id)
+                task = asyncio.current_task(self._loop)
+                stack = None
+                for profile in self._profiles:
+                    profile.wall_samples += 1
+                    if frame is not None and profile.owns(task):
+                        if stack is None:
+                            stack = _stack(frame)
+                        profile.stacks[stack] += 1
+                del frame
+
+
+class ProfileStore:
+    """Profile reports on disk with count and size retention."""
+
+    def __init__(self, root: str, max_reports: int, max_bytes: int):
+        self.root = root
+        self.max_reports = max_reports
+        self.max_bytes = max_bytes
+
+    def path(self, report_id: str) -> Optional[str]:
+        if not _REPORT_ID.match(report_id):
+            return None
+        path = os.path.join(self.root, f"{report_id}.json")
+        return path if os.path.exists(path) else None
+
+    def save(self, report: dict) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        target = os.path.join(self.root, f"{report['id']}.json")
+        partial = f"{target}.tmp"
+        with open(partial, "w") as f:
+            json.dump(report, f)
+        os.replace(partial, target)
+        self.prune()
+
+    def list(self) -> List[dict]:
+        """Report summaries, newest first."""
+        if not os.path.isdir(self.root):
+            return []
+        summaries = []
+        for name in sorted(os.listdir(self.root), reverse=True):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.root, name)) as f:
+                    report = json.load(f)
+            except (OSError, ValueError):
+                continue
+            report.pop("stacks", None)
+            report["top"] = report.get("top", [])[:5]
+            summaries.append(report)
+        return summaries
+
+    def delete(self, report_id: str) -> bool:
+        path = self.path(report_id)
+        if path is None:
+            return False
+        os.unlink(path)
+        return True
+
+    def prune(self) -> None:
+        """Delete the oldest reports beyond the count or size limit (the newest is always kept)."""
+        files = sorted(
+            (entry for entry in os.scandir(self.root) if entry.name.endswith(".json")),
+            key=lambda entry: entry.name,
+            reverse=True
+        )
+        kept_bytes = 0
+        for index, entry in enumerate(files):
+            kept_bytes += entry.stat().st_size
+            if index > 0 and (index >= self.max_reports or kept_bytes > self.max_bytes):
+                os.unlink(entry.path)
+
+
+class Profiler:
+    """Decides which requests to profile and records their reports."""
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.sampler = Sampler(self.settings.profiling_interval)
+        self.store = ProfileStore(
+            self.settings.profiling_dir, self.settings.profiling_max_reports, self.settings.profiling_max_bytes
+        )
+        self._armed: Dict[str, int] = {}
+
+    def arm(self, path_prefix: str, count: int) -> Dict[str, int]:
+        """Profile the next ``count`` requests whose path starts with ``path_prefix``."""
+        self._armed[path_prefix] = self._armed.get(path_prefix, 0) + count
+        return dict(self._armed)
+
+    def disarm(self) -> None:
+        self._armed.clear()
+
+    @property
+    def armed(self) -> Dict[str, int]:
+        return dict(self._armed)
+
+    def selects(self, scope: Scope) -> bool:
+        token = self.settings.profiling_header_token
+        if token:
+            for name, value in scope.get("headers") or ():
+                if name == PROFILE_HEADER:
+                    if secrets.compare_digest(value, token.encode()):
+                        return True
+                    break
+        if self._armed:
+            path = scope["path"]
+            for prefix, remaining in self._armed.items():
+                if path.startswith(prefix):
+                    if remaining <= 1:
+                        del self._armed[prefix]
+                    else:
+                        self._armed[prefix] = remaining - 1
+                    return True
+        rate = self.settings.profiling_sample_rate
+        return rate > 0 and random.random() < rate
+
+    def begin(self, scope: Scope) -> Profile:
+        profile = Profile(
+            id=f"{time.strftime('%Y%m%d%H%M%S')}-{secrets.token_hex(4)}",
+            method=scope["method"],
+            path=scope["path"],
+            task=asyncio.current_task(),
+        )
+        self.sampler.begin(profile)
+        return profile
+
+    async def finish(self, profile: Profile) -> None:
+        self.sampler.end(profile)
+        profile.duration_ms = (time.perf_counter() - profile.started) * 1000
+        report = profile.report(self.sampler.interval)
+        try:
+            await asyncio.to_thread(self.store.save, report)
+        except OSError:
+            logger.warning("Could not save profile %s", profile.id, exc_info=True)
+
+
+profiler = Profiler()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles selected requests."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not profiler.selects(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = profiler.begin(scope)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(PROFILE_ID_HEADER, profile.id.encode())]
+            await send(message)
+
+        token = _current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_profile.reset(token)
+            await profiler.finish(profile)
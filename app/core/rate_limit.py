@@ -0,0 +1,198 @@
+"""
+Token bucket rate limiting.
+
+Two backends share one interface:
+
+* ``InMemoryRateLimiter`` keeps buckets in an LRU-bounded ``OrderedDict``;
+  each check is O(1) per bucket and memory is capped at ``max_keys``.
+* ``RedisRateLimiter`` runs the same algorithm in a Lua script so every
+  worker process (and host) shares the buckets.
+
+A request may be checked against several buckets at once (user, device,
+route). Tokens are only consumed if every bucket allows the request, so a
+rejection never drains the other buckets.
+"""
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+from app.core.config import get_settings
+from app.core.memory import register_store
+
+
+PERIODS = {"second": 1.0, "minute": 60.0, "hour": 3600.0, "day": 86400.0}
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """Bucket capacity and refill rate (tokens per second)."""
+    capacity: float
+    rate: float
+
+    @classmethod
+    def parse(cls, value: str) -> "RateLimitRule":
+        """Parse ``"<count>/<second|minute|hour|day>"``, e.g. ``"30/minute"``."""
+        count, _, period = value.partition("/")
+        seconds = PERIODS.get(period.strip().rstrip("s") or "second")
+        if seconds is None:
+            raise ValueError(f"Invalid rate limit period in {value!r}")
+        capacity = float(count)
+        return cls(capacity=capacity, rate=capacity / seconds)
+
+
+@dataclass
+class RateLimitResult:
+    """Outcome of a rate limit check, for response headers."""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float  # Seconds until the tightest bucket is full again
+    retry_after: float  # Seconds until the request would be allowed (0 if allowed)
+
+    def headers(self) -> dict:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+Check = Tuple[str, RateLimitRule]
+
+
+def _summarize(states: Sequence[Tuple[RateLimitRule, float]], allowed: bool, cost: float) -> RateLimitResult:
+    """Build a result from (rule, tokens after the check) for each bucket."""
+    tightest_rule, tightest_tokens = min(states, key=lambda state: state[1])
+    retry_after = 0.0
+    if not allowed:
+        retry_after = max((cost - tokens) / rule.rate for rule, tokens in states if tokens < cost)
+    return RateLimitResult(
+        allowed=allowed,
+        limit=int(tightest_rule.capacity),
+        remaining=max(0, int(tightest_tokens)),
+        reset_after=max((rule.capacity - tokens) / rule.rate for rule, tokens in states),
+        retry_after=retry_after
+    )
+
+
+class InMemoryRateLimiter:
+    """Per-process token buckets with LRU eviction."""
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    async def acquire(self, checks: Sequence[Check], cost: float = 1.0) -> RateLimitResult:
+        """Consume ``cost`` tokens from every bucket if all of them allow it."""
+        now = time.monotonic()
+        refilled: List[Tuple[str, RateLimitRule, float]] = []
+        for key, rule in checks:
+            tokens, updated = self._buckets.get(key, (rule.capacity, now))
+            refilled.append((key, rule, min(rule.capacity, tokens + (now - updated) * rule.rate)))
+
+        allowed = all(tokens >= cost for _, _, tokens in refilled)
+        states = []
+        for key, rule, tokens in refilled:
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            states.append((rule, tokens))
+
+        # An evicted bucket simply starts full again, which errs on the side of allowing
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+        return _summarize(states, allowed, cost)
+
+
+# KEYS: bucket keys. ARGV: cost, then capacity/rate pairs per key.
+# Returns a flat list of tokens remaining per key followed by the allowed flag.
+_TOKEN_BUCKET_SCRIPT = """
+local cost = tonumber(ARGV[1])
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local tokens = {}
+local allowed = 1
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local current = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    current = math.min(capacity, current + math.max(0, now - updated) * rate)
+    tokens[i] = current
+    if current < cost then
+        allowed = 0
+    end
+end
+local result = {}
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    if allowed == 1 then
+        tokens[i] = tokens[i] - cost
+    end
+    redis.call('HSET', key, 'tokens', tokens[i], 'ts', now)
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+    result[i] = tostring(tokens[i])
+end
+result[#KEYS + 1] = allowed
+return result
+"""
+
+
+class RedisRateLimiter:
+    """Token buckets shared across workers through Redis."""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("rate_limit_backend='redis' requires the 'redis' package") from e
+        self.prefix = prefix
+        self.client = redis.from_url(url)
+        self.script = self.client.register_script(_TOKEN_BUCKET_SCRIPT)
+
+    async def acquire(self, checks: Sequence[Check], cost: float = 1.0) -> RateLimitResult:
+        """Consume ``cost`` tokens from every bucket if all of them allow it."""
+        args: List[float] = [cost]
+        for _, rule in checks:
+            args.extend((rule.capacity, rule.rate))
+        reply = await self.script(keys=[self.prefix + key for key, _ in checks], args=args)
+        allowed = int(reply[-1]) == 1
+        states = [(rule, float(tokens)) for (_, rule), tokens in zip(checks, reply[:-1])]
+        return _summarize(states, allowed, cost)
+
+
+@lru_cache()
+def get_rate_limiter():
+    """Get the configured rate limiter backend."""
+    settings = get_settings()
+    if settings.rate_limit_backend == "redis":
+        return RedisRateLimiter(settings.redis_url)
+    return InMemoryRateLimiter(settings.rate_limit_max_keys)
+
+
+@lru_cache()
+def get_rule(value: str) -> RateLimitRule:
+    """Parse and cache a rule string."""
+    return RateLimitRule.parse(value)
+
+
+def route_rule(route: str) -> Optional[RateLimitRule]:
+    """Global rule for a route, if one is configured."""
+    value = get_settings().rate_limit_routes.get(route)
+    return get_rule(value) if value else None
+
+
+register_store("rate_limit_buckets", get_rate_limiter)
@@ -0,0 +1,142 @@
+"""
+Pre-fork multi-worker production server.
+
+The parent process imports the application once, binds the listening socket
+and forks one uvicorn worker per core. Importing before the fork lets the
+workers share the parent's memory pages copy-on-write; ``gc.freeze()`` keeps
+the garbage collector from touching (and so copying) those shared objects.
+
+On SIGTERM/SIGINT the parent forwards SIGTERM to every worker. Each worker
+stops accepting connections and drains in-flight requests for up to
+``graceful_shutdown_timeout`` seconds before the parent force-kills it.
+"""
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional
+
+import uvicorn
+
+
+def best_loop() -> str:
+    """Use uvloop when installed, else the stdlib asyncio loop."""
+    try:
+        import uvloop  # noqa: F401
+        return "uvloop"
+    except ImportError:
+        return "asyncio"
+
+
+def best_http() -> str:
+    """Use the httptools parser when installed, else h11."""
+    try:
+        import httptools  # noqa: F401
+        return "httptools"
+    except ImportError:
+        return "h11"
+
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _signal_workers(pids, signum: int) -> None:
+    """Send a signal to each worker, skipping any that already exited."""
+    for pid in list(pids):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+def _run_worker(app, sock: socket.socket, log_level: str) -> None:
+    """Body of a forked worker process."""
+    from app.core.config import get_settings
+    from app.core.database import engine
+
+    # Connections must never be shared across a fork
+    engine.sync_engine.dispose(close=False)
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    config = uvicorn.Config(
+        app,
+        loop=best_loop(),
+        http=best_http(),
+        lifespan="on",
+        log_level=log_level,
+        timeout_graceful_shutdown=int(get_settings().graceful_shutdown_timeout),
+        proxy_headers=True,
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def run_production(host: str, port: int, workers: Optional[int] = None, log_level: str = "info") -> None:
+    """Run ``workers`` forked uvicorn processes sharing one listening socket."""
+    workers = workers or os.cpu_count() or 1
+
+    # Workers size their DB pools from the global connection budget
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    from app.core.config import get_settings
+    get_settings.cache_clear()
+
+    from app.main import app  # pre-fork import, shared copy-on-write
+    settings = get_settings()
+    sock = _bind_socket(host, port)
+    gc.collect()
+    gc.freeze()
+
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(app, sock, log_level)
+            finally:
+                os._exit(0)
+        children[pid] = slot
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        _signal_workers(children, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"Starting {workers} workers on http://{host}:{port} (loop={best_loop()}, http={best_http()})")
+    for slot in range(workers):
+        spawn(slot)
+
+    deadline = None
+    while children:
+        if stopping and deadline is None:
+            deadline = time.monotonic() + settings.graceful_shutdown_timeout + 5
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            if deadline is not None and time.monotonic() > deadline:
+                _signal_workers(children, signal.SIGKILL)
+            time.sleep(0.2)
+            continue
+        slot = children.pop(pid, None)
+        if not stopping and slot is not None:
+            print(f"Worker {pid} exited with status {status}; restarting", file=sys.stderr)
+            time.sleep(1.0)
+            spawn(slot)
+
+    sock.close()
@@ -0,0 +1,302 @@
+"""
+Lightweight request tracing with contextvar-propagated spans.
+
+A trace is started per HTTP request by ``TracingMiddleware``. Spans opened
+with ``span()`` or ``@traced`` attach to the current trace; because asyncio
+tasks copy the current context when created, spans opened in child tasks are
+parented correctly without any extra plumbing.
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import secrets
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Span:
+    """A timed operation within a trace."""
+    name: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float
+    end: Optional[float] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+
+@dataclass
+class Trace:
+    """All spans recorded for one request."""
+    trace_id: str
+    name: str
+    start: float
+    wall_start: float
+    spans: List[Span] = field(default_factory=list)
+
+    def breakdown(self) -> List[Dict[str, Any]]:
+        """Per-span timings relative to the start of the trace."""
+        return [
+            {
+                "name": span.name,
+                "spanId": span.span_id,
+                "parentId": span.parent_id,
+                "offsetMs": round((span.start - self.start) * 1000, 3),
+                "durationMs": round(span.duration_ms, 3),
+                **({"attributes": span.attributes} if span.attributes else {}),
+                **({"error": span.error} if span.error else {}),
+            }
+            for span in self.spans
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        root = self.spans[0] if self.spans else None
+        return {
+            "traceId": self.trace_id,
+            "name": self.name,
+            "timestamp": self.wall_start,
+            "durationMs": round(root.duration_ms, 3) if root else 0.0,
+            "spans": self.breakdown(),
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class InMemoryExporter:
+    """Keeps the most recent traces in a bounded ring buffer."""
+
+    def __init__(self, maxlen: int = 1000):
+        self.traces: Deque[Dict[str, Any]] = deque(maxlen=maxlen)
+
+    def start(self) -> None:
+        """Start any background work (nothing to do in memory)."""
+
+    async def stop(self) -> None:
+        """Stop background work (nothing to do in memory)."""
+
+    def export(self, trace: Trace) -> None:
+        self.traces.append(trace.to_dict())
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recent traces, newest first."""
+        return list(reversed(self.traces))[:limit]
+
+
+class FileExporter(InMemoryExporter):
+    """Appends traces as JSON lines, keeping recent ones in memory too.
+    
+    ``export`` runs at the end of every request, so it only queues the line;
+    a background task appends queued lines to the file from a worker thread
+    every ``flush_interval`` seconds. At most ``maxlen`` lines wait for a
+    write; further traces are kept in memory only.
+    """
+
+    def __init__(self, path: str, maxlen: int = 1000, flush_interval: float = 1.0):
+        super().__init__(maxlen)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._lines: List[str] = []
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def start(self) -> None:
+        """Start the background writer on the running event loop."""
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run(), name="trace-writer")
+
+    async def stop(self) -> None:
+        """Stop the writer and write whatever is still queued."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def export(self, trace: Trace) -> None:
+        super().export(trace)
+        if len(self._lines) >= self.traces.maxlen:
+            self.dropped += 1
+            return
+        self._lines.append(json.dumps(self.traces[-1], default=str) + "\n")
+
+    def pending(self) -> int:
+        """Lines waiting to be written."""
+        return len(self._lines)
+
+    async def flush(self) -> int:
+        """Append queued lines to the file; returns how many were written."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            lines, self._lines = self._lines, []
+            if not lines:
+                return 0
+            try:
+                await asyncio.to_thread(self._write, lines)
+            except Exception:
+                # Keep them for the next attempt, still bounded by maxlen
+                self._lines[:0] = lines[:max(0, self.traces.maxlen - len(self._lines))]
+                raise
+            return len(lines)
+
+    def _write(self, lines: List[str]) -> None:
+        with open(self.path, "a") as f:
+            f.writelines(lines)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to write traces to %s", self.path)
+
+
+def _build_exporter() -> Optional[InMemoryExporter]:
+    settings = get_settings()
+    if not settings.tracing_enabled or settings.tracing_exporter == "none":
+        return None
+    if settings.tracing_exporter == "file":
+        return FileExporter(
+            settings.tracing_file_path, settings.tracing_buffer_size, settings.tracing_flush_interval
+        )
+    return InMemoryExporter(settings.tracing_buffer_size)
+
+
+exporter = _build_exporter()
+
+
+def current_trace() -> Optional[Trace]:
+    """The trace for the current request, if tracing is active."""
+    return _current_trace.get()
+
+
+def breakdown() -> Optional[List[Dict[str, Any]]]:
+    """Timing breakdown of the current request so far."""
+    trace = _current_trace.get()
+    return trace.breakdown() if trace else None
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Record a span under the current trace (no-op when not tracing)."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = Span(
+        name=name,
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent else None,
+        start=time.perf_counter(),
+        attributes=attributes
+    )
+    trace.spans.append(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as exc:
+        current.error = type(exc).__name__
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorate an async function so each call is recorded as a span."""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                return await func(*args, **kwargs)
+            with span(span_name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _parse_traceparent(value: Optional[str]) -> Optional[str]:
+    """Extract the trace ID from a W3C ``traceparent`` header."""
+    if not value:
+        return None
+    parts = value.split("-")
+    if len(parts) == 4 and len(parts[1]) == 32:
+        return parts[1]
+    return None
+
+
+class TracingMiddleware:
+    """ASGI middleware that starts a trace per HTTP request."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or exporter is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        trace_id = _parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1")) or secrets.token_hex(16)
+        trace = Trace(
+            trace_id=trace_id,
+            name=f"{scope['method']} {scope['path']}",
+            start=time.perf_counter(),
+            wall_start=time.time()
+        )
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-trace-id", trace_id.encode())]
+            await send(message)
+
+        trace_token = _current_trace.set(trace)
+        try:
+            with span("http.request", method=scope["method"], path=scope["path"]):
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(trace_token)
+            exporter.export(trace)
+
+
+class TracedRoute(APIRoute):
+    """API route that records the handler (including dependencies) as a span."""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        span_name = f"route {','.join(sorted(self.methods or []))} {self.path}"
+
+        async def traced_handler(request: Request) -> Response:
+            with span(span_name):
+                return await handler(request)
+        return traced_handler
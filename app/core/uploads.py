@@ -0,0 +1,322 @@
+"""
+Streaming multipart uploads into a content-addressed media store.
+
+``read_streamed_form()`` parses the request body as it arrives instead of
+letting the framework buffer it first. Each file part is checked chunk by
+chunk: the type is taken from the magic bytes of the first chunk (the
+client's ``Content-Type`` is ignored), the size limit is enforced as data
+arrives, and the data is hashed and spooled to disk in the same pass. A bad
+upload is rejected as soon as the offending chunk is seen, and peak memory
+per request is one chunk regardless of file size.
+
+Stored files are named by their SHA-256, so identical images are stored
+once and their URLs never change.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from app.core.config import get_settings
+from app.core.memory import register_store
+
+
+# Magic byte prefixes (offset, signature) for the image types we accept
+IMAGE_SIGNATURES: List[Tuple[str, Tuple[Tuple[int, bytes], ...]]] = [
+    ("image/jpeg", ((0, b"\xff\xd8\xff"),)),
+    ("image/png", ((0, b"\x89PNG\r\n\x1a\n"),)),
+    ("image/gif", ((0, b"GIF87a"),)),
+    ("image/gif", ((0, b"GIF89a"),)),
+    ("image/webp", ((0, b"RIFF"), (8, b"WEBP"))),
+]
+SNIFF_BYTES = 12
+
+MEDIA_URL_PREFIX = "/api/v1/chat/images/"
+
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+def media_url(sha256: str) -> str:
+    """URL of a stored image."""
+    return f"{MEDIA_URL_PREFIX}{sha256}"
+
+
+def media_sha256(url: str) -> Optional[str]:
+    """Content hash of a media store URL (None for other URLs, e.g. legacy data URLs)."""
+    if not url.startswith(MEDIA_URL_PREFIX):
+        return None
+    sha256 = url[len(MEDIA_URL_PREFIX):]
+    return sha256 if _SHA256.match(sha256) else None
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Content type of an image from its first bytes, or None if unrecognised."""
+    for content_type, signatures in IMAGE_SIGNATURES:
+        if all(head[offset:offset + len(signature)] == signature for offset, signature in signatures):
+            return content_type
+    return None
+
+
+@dataclass
+class StoredFile:
+    """An uploaded file saved in the media store."""
+    sha256: str
+    size: int
+    content_type: str
+    filename: Optional[str]
+
+
+@dataclass
+class StreamedForm:
+    """Form fields and stored files from a streamed multipart body."""
+    fields: Dict[str, str] = field(default_factory=dict)
+    files: Dict[str, List[StoredFile]] = field(default_factory=dict)
+    # Hashes this request added to the store (not ones it deduplicated against)
+    created: List[str] = field(default_factory=list)
+
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        return self.fields.get(name, default)
+
+
+class MediaStore:
+    """Content-addressed files on local disk (``<root>/<sha[:2]>/<sha>``)."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+
+    def path(self, sha256: str) -> str:
+        if not _SHA256.match(sha256):
+            raise ValueError("Invalid content hash")
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def exists(self, sha256: str) -> bool:
+        try:
+            return os.path.exists(self.path(sha256))
+        except ValueError:
+            return False
+
+    def read(self, sha256: str) -> bytes:
+        """Contents of a stored file (blocking)."""
+        with open(self.path(sha256), "rb") as f:
+            return f.read()
+
+    def content_type(self, sha256: str) -> str:
+        """Content type of a stored file, sniffed from its magic bytes (blocking)."""
+        with open(self.path(sha256), "rb") as f:
+            return sniff_image_type(f.read(SNIFF_BYTES)) or "application/octet-stream"
+
+    def spool(self) -> BinaryIO:
+        """Open a temporary file on the same filesystem as the store."""
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=self.tmp_dir, delete=False)
+
+    def commit(self, spooled_path: str, sha256: str) -> bool:
+        """Move a spooled file into place under its hash (deduplicating).
+
+        Returns True if the file was new to the store.
+        """
+        destination = self.path(sha256)
+        if os.path.exists(destination):
+            os.unlink(spooled_path)
+            return False
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(spooled_path, destination)
+        return True
+
+    def remove(self, sha256: str) -> None:
+        try:
+            os.unlink(self.path(sha256))
+        except FileNotFoundError:
+            pass
+
+
+media_store = MediaStore(get_settings().media_root)
+register_store(
+    "upload_spool",
+    lambda: [entry.path for entry in os.scandir(media_store.tmp_dir)] if os.path.isdir(media_store.tmp_dir) else [],
+    kind="disk"
+)
+
+
+class _Part:
+    def __init__(self):
+        self.headers: Dict[bytes, bytes] = {}
+        self.name = ""
+        self.filename: Optional[str] = None
+        self.data = bytearray()
+        self.file: Optional[BinaryIO] = None
+        self.hasher = None
+        self.size = 0
+        self.head = bytearray()
+        self.content_type: Optional[str] = None
+
+
+class _StreamingFormReader:
+    """Drives a push multipart parser and validates parts as bytes arrive."""
+
+    def __init__(self, boundary: bytes, store: MediaStore):
+        self.settings = get_settings()
+        self.store = store
+        self.form = StreamedForm()
+        self.events: List[Tuple[str, bytes]] = []
+        self.part: Optional[_Part] = None
+        self.header_field = b""
+        self.header_value = b""
+        self.file_count = 0
+        self.parser = MultipartParser(boundary, {
+            "on_part_begin": lambda: self.events.append(("part_begin", b"")),
+            "on_part_data": lambda data, start, end: self.events.append(("part_data", data[start:end])),
+            "on_part_end": lambda: self.events.append(("part_end", b"")),
+            "on_header_field": lambda data, start, end: self.events.append(("header_field", data[start:end])),
+            "on_header_value": lambda data, start, end: self.events.append(("header_value", data[start:end])),
+            "on_header_end": lambda: self.events.append(("header_end", b"")),
+            "on_headers_finished": lambda: self.events.append(("headers_finished", b"")),
+        })
+
+    def feed(self, chunk: bytes) -> None:
+        self.parser.write(chunk)
+        events, self.events = self.events, []
+        for event, data in events:
+            getattr(self, f"_{event}")(data)
+
+    def close(self) -> None:
+        """Discard any partially written file."""
+        if self.part is not None and self.part.file is not None:
+            self.part.file.close()
+            os.unlink(self.part.file.name)
+
+    def _part_begin(self, data: bytes) -> None:
+        self.part = _Part()
+
+    def _header_field(self, data: bytes) -> None:
+        self.header_field += data
+
+    def _header_value(self, data: bytes) -> None:
+        self.header_value += data
+
+    def _header_end(self, data: bytes) -> None:
+        self.part.headers[self.header_field.lower()] = self.header_value
+        self.header_field = self.header_value = b""
+
+    def _headers_finished(self, data: bytes) -> None:
+        part = self.part
+        _, options = parse_options_header(part.headers.get(b"content-disposition", b""))
+        part.name = options.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" in options:
+            part.filename = options[b"filename"].decode("utf-8", "replace")
+            self.file_count += 1
+            if self.file_count > self.settings.max_images_per_message:
+                raise HTTPException(status_code=413, detail="Too many files")
+            part.file = self.store.spool()
+            part.hasher = hashlib.sha256()
+
+    def _part_data(self, data: bytes) -> None:
+        part = self.part
+        if part.file is None:
+            part.data += data
+            if len(part.data) > self.settings.max_form_field_size:
+                raise HTTPException(status_code=413, detail=f"Field too large: {part.name}")
+            return
+
+        part.size += len(data)
+        if part.size > self.settings.max_upload_size:
+            raise HTTPException(status_code=413, detail=f"Image too large: {part.filename}")
+        if part.content_type is None:
+            part.head += data[:SNIFF_BYTES]
+            if len(part.head) >= SNIFF_BYTES:
+                self._check_type(part)
+        part.hasher.update(data)
+        part.file.write(data)
+
+    def _check_type(self, part: _Part) -> None:
+        content_type = sniff_image_type(bytes(part.head))
+        if content_type is None or content_type not in self.settings.allowed_image_types:
+            raise HTTPException(status_code=400, detail=f"Invalid image type: {part.filename}")
+        part.content_type = content_type
+
+    def _part_end(self, data: bytes) -> None:
+        part, self.part = self.part, None
+        if part.file is None:
+            self.form.fields[part.name] = part.data.decode("utf-8", "replace")
+            return
+
+        part.file.close()
+        if part.size == 0:
+            # An empty file input (no file selected)
+            os.unlink(part.file.name)
+            return
+        if part.content_type is None:
+            self.part = part  # Let close() clean up if the type check fails
+            self._check_type(part)
+            self.part = None
+        sha256 = part.hasher.hexdigest()
+        if self.store.commit(part.file.name, sha256):
+            self.form.created.append(sha256)
+        self.form.files.setdefault(part.name, []).append(
+            StoredFile(sha256=sha256, size=part.size, content_type=part.content_type, filename=part.filename)
+        )
+
+
+async def read_streamed_form(request: Request, store: Optional[MediaStore] = None) -> StreamedForm:
+    """Parse a multipart body incrementally, storing files in the media store.
+
+    URL-encoded bodies (fields only) are also accepted.
+
+    The result is cached on the request, so dependencies and the route can
+    share one parse of the body.
+    """
+    cached = getattr(request.state, "streamed_form", None)
+    if cached is not None:
+        return cached
+
+    settings = get_settings()
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    content_length = request.headers.get("content-length")
+    declared_size = int(content_length) if content_length and content_length.isdigit() else None
+
+    if content_type == b"application/x-www-form-urlencoded":
+        # No files possible; small enough for the framework parser
+        if declared_size is None or declared_size > settings.max_form_field_size:
+            raise HTTPException(status_code=413, detail="Request body too large")
+        fields = await request.form()
+        form = StreamedForm(fields={name: value for name, value in fields.items() if isinstance(value, str)})
+        request.state.streamed_form = form
+        return form
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=415, detail="Expected multipart/form-data")
+
+    # Reject before reading anything when the declared size is already too large
+    max_request_size = settings.max_upload_size * settings.max_images_per_message + settings.max_form_field_size * 8
+    if declared_size is not None and declared_size > max_request_size:
+        raise HTTPException(status_code=413, detail="Request body too large")
+
+    store = store or media_store
+    reader = _StreamingFormReader(options[b"boundary"], store)
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                reader.feed(chunk)
+        reader.parser.finalize()
+    except BaseException:
+        # Earlier parts may already be in the store; nothing would ever reference them
+        discard_form(reader.form, store)
+        raise
+    finally:
+        reader.close()
+
+    request.state.streamed_form = reader.form
+    return reader.form
+
+
+def discard_form(form: StreamedForm, store: Optional[MediaStore] = None) -> None:
+    """Remove the files a rejected request added to the media store."""
+    store = store or media_store
+    for sha256 in form.created:
+        store.remove(sha256)
+    form.created.clear()
@@ -1,18 +1,23 @@
 """
 Dependency injection helpers.
 """
-from fastapi import HTTPException, Header, Depends
+from fastapi import HTTPException, Header, Depends, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, Dict, Any
 import uuid
 
+from app.core.config import get_settings
 from app.core.database import get_db
+from app.core.memory import register_store
+from app.core.rate_limit import get_rate_limiter, get_rule, route_rule
+from app.core.tracing import span
 from app.repositories.user_repository import UserRepository
 from app.schemas.auth import UserInDB
 
 
 # In-memory session store (replace with Redis in production)
 session_store: Dict[str, uuid.UUID] = {}
+register_store("session_store", lambda: session_store)
 
 
 async def get_current_user(
@@ -23,16 +28,17 @@ async def get_current_user(
     if not x_session_id or x_session_id not in session_store:
         return None
     
-    user_id = session_store[x_session_id]
-    user_repo = UserRepository(db)
-    user = await user_repo.get_by_id(user_id)
-    
-    if not user:
-        # Clean up invalid session
-        session_store.pop(x_session_id, None)
-        return None
-    
-    return UserInDB.model_validate(user)
+    with span("auth.get_current_user"):
+        user_id = session_store[x_session_id]
+        user_repo = UserRepository(db)
+        user = await user_repo.get_by_id(user_id)
+        
+        if not user:
+            # Clean up invalid session
+            session_store.pop(x_session_id, None)
+            return None
+        
+        return UserInDB.model_validate(user)
 
 
 async def require_auth(
@@ -44,6 +50,16 @@ async def require_auth(
     return current_user
 
 
+async def require_admin(
+    current_user: UserInDB = Depends(require_auth)
+) -> UserInDB:
+    """Require a user listed in ``admin_emails``."""
+    admins = {email.lower() for email in get_settings().admin_emails}
+    if current_user.email.lower() not in admins:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+
 def create_session(user_id: uuid.UUID) -> str:
     """Create a new session for user."""
     import secrets
@@ -54,4 +70,53 @@ def create_session(user_id: uuid.UUID) -> str:
 
 def destroy_session(session_id: str) -> None:
     """Destroy a session."""
-    session_store.pop(session_id, None)
\ No newline at end of file
+    session_store.pop(session_id, None)
+
+
+async def _acquire(checks, cost: float, response: Response) -> None:
+    result = await get_rate_limiter().acquire(checks, cost)
+    if not result.allowed:
+        raise HTTPException(status_code=429, detail="Rate limit exceeded", headers=result.headers())
+    response.headers.update(result.headers())
+
+
+def rate_limit(route: str, cost: float = 1.0):
+    """Build a dependency enforcing per-user, per-device and per-route token buckets.
+    
+    The device is taken from a ``device_id`` path parameter or a ``deviceId``
+    query parameter. The body is never read here, so a throttled client cannot
+    make the server parse (or store) its upload; routes naming the device in
+    a form field call ``rate_limit_device()`` once the form is parsed.
+    """
+    async def dependency(
+        request: Request,
+        response: Response,
+        current_user: UserInDB = Depends(require_auth)
+    ) -> None:
+        settings = get_settings()
+        if not settings.rate_limit_enabled:
+            return
+        
+        checks = [(f"user:{current_user.id}:{route}", get_rule(settings.rate_limit_user))]
+        
+        device_id = request.path_params.get("device_id") or request.query_params.get("deviceId")
+        if device_id:
+            checks.append((f"device:{device_id}", get_rule(settings.rate_limit_device)))
+        
+        rule = route_rule(route)
+        if rule:
+            checks.append((f"route:{route}", rule))
+        
+        await _acquire(checks, cost, response)
+    
+    return dependency
+
+
+async def rate_limit_device(request: Request, response: Response, device_id: str, cost: float = 1.0) -> None:
+    """Enforce the per-device bucket for a device named in the request body."""
+    settings = get_settings()
+    if not settings.rate_limit_enabled or not device_id:
+        return
+    if device_id in (request.path_params.get("device_id"), request.query_params.get("deviceId")):
+        return  # Already charged by rate_limit()
+    await _acquire([(f"device:{device_id}", get_rule(settings.rate_limit_device))], cost, response)
@@ -2,10 +2,9 @@
 SQLAlchemy domain models.
 """
 import uuid
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
-from sqlalchemy import String, DateTime, Text, JSON, func, ForeignKey
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import String, DateTime, Date, Text, JSON, Integer, BigInteger, Float, Uuid, func, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
@@ -15,7 +14,7 @@ class User(Base):
     """User model."""
     __tablename__ = "users"
     
-    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True, default=uuid.uuid4)
     email: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
     provider: Mapped[str] = mapped_column(String(50), nullable=False, default="email")
@@ -30,6 +29,15 @@ class User(Base):
 class Device(Base):
     """Device model."""
     __tablename__ = "devices"
+    __table_args__ = (
+        # Admin listing: each sort order, and the common filters, seek an index ending in (column, id)
+        Index("ix_devices_last_seen_id", "last_seen", "id"),
+        Index("ix_devices_name_id", "name", "id"),
+        Index("ix_devices_created_at_id", "created_at", "id"),
+        Index("ix_devices_status_last_seen_id", "status", "last_seen", "id"),
+        Index("ix_devices_type_last_seen_id", "type", "last_seen", "id"),
+        Index("ix_devices_user_id", "user_id"),
+    )
     
     id: Mapped[str] = mapped_column(String(255), primary_key=True)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
@@ -38,7 +46,7 @@ class Device(Base):
     status: Mapped[str] = mapped_column(String(20), nullable=False, default="disconnected")
     specs: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
     user_id: Mapped[Optional[uuid.UUID]] = mapped_column(
-        UUID(as_uuid=True), 
+        Uuid, 
         ForeignKey("users.id"), 
         nullable=True
     )
@@ -53,14 +61,25 @@ class Device(Base):
 class ChatMessage(Base):
     """Chat message model."""
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # History in order, one keyset page at a time
+        Index("ix_chat_messages_user_created_at_id", "user_id", "created_at", "id"),
+    )
     
-    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True, default=uuid.uuid4)
+    user_id: Mapped[uuid.UUID] = mapped_column(Uuid, ForeignKey("users.id"), nullable=False)
     device_id: Mapped[Optional[str]] = mapped_column(String(255), ForeignKey("devices.id"), nullable=True)
     role: Mapped[str] = mapped_column(String(20), nullable=False)  # 'user' or 'assistant'
     content: Mapped[str] = mapped_column(Text, nullable=False)
     images: Mapped[Optional[list]] = mapped_column(JSON, nullable=True)
     debug: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    status: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)  # 'abandoned' if the reply was cancelled
+    conversation_id: Mapped[Optional[uuid.UUID]] = mapped_column(
+        Uuid,
+        ForeignKey("conversations.id"),
+        nullable=True,
+        index=True
+    )
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
@@ -68,14 +87,114 @@ class ChatMessage(Base):
     device: Mapped[Optional["Device"]] = relationship("Device", back_populates="chat_messages")
 
 
+class Conversation(Base):
+    """A user's chat thread with one device, with its latest message denormalized for the inbox."""
+    __tablename__ = "conversations"
+    __table_args__ = (
+        UniqueConstraint("user_id", "device_key", name="uq_conversations_user_device"),
+        Index("ix_conversations_user_last_message", "user_id", "last_message_at", "id"),
+    )
+    
+    id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True, default=uuid.uuid4)
+    user_id: Mapped[uuid.UUID] = mapped_column(Uuid, ForeignKey("users.id"), nullable=False)
+    device_id: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    device_key: Mapped[str] = mapped_column(String(255), nullable=False)  # device_id, or '' (unique with NULLs)
+    last_message_preview: Mapped[str] = mapped_column(String(200), nullable=False, default="")
+    last_message_role: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)
+    last_message_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    message_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
 class AdminService(Base):
     """Admin service registry model."""
     __tablename__ = "admin_services"
     
-    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True, default=uuid.uuid4)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
     type: Mapped[str] = mapped_column(String(50), nullable=False)
     endpoint: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
     status: Mapped[str] = mapped_column(String(20), nullable=False, default="active")
     config: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class ChatJob(Base):
+    """Asynchronous chat turn processed by the job worker pool."""
+    __tablename__ = "chat_jobs"
+    __table_args__ = (
+        UniqueConstraint("user_id", "idempotency_key", name="uq_chat_jobs_user_idempotency_key"),
+        Index("ix_chat_jobs_status_created_at", "status", "created_at"),
+    )
+    
+    id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True, default=uuid.uuid4)
+    user_id: Mapped[uuid.UUID] = mapped_column(Uuid, ForeignKey("users.id"), nullable=False)
+    device_id: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    idempotency_key: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="queued")  # queued, running, succeeded, failed
+    request: Mapped[dict] = mapped_column(JSON, nullable=False)
+    result: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    lease_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class UsageLedgerEntry(Base):
+    """Append-only record of the tokens used by one chat turn."""
+    __tablename__ = "usage_ledger"
+    __table_args__ = (
+        Index("ix_usage_ledger_user_id_created_at", "user_id", "created_at"),
+    )
+    
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    user_id: Mapped[uuid.UUID] = mapped_column(Uuid, ForeignKey("users.id"), nullable=False)
+    device_id: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    model: Mapped[str] = mapped_column(String(100), nullable=False)
+    prompt_tokens: Mapped[int] = mapped_column(Integer, nullable=False)
+    completion_tokens: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
+class UsageCounter(Base):
+    """Daily token totals per user, device and model, maintained as the ledger is appended."""
+    __tablename__ = "usage_counters"
+    
+    user_id: Mapped[uuid.UUID] = mapped_column(Uuid, ForeignKey("users.id"), primary_key=True)
+    device_id: Mapped[str] = mapped_column(String(255), primary_key=True)  # '' when no device was selected
+    model: Mapped[str] = mapped_column(String(100), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    requests: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    prompt_tokens: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    completion_tokens: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+class AnalyticsRollup(Base):
+    """Hourly inference totals per device and user, incremented as events are flushed."""
+    __tablename__ = "analytics_rollups"
+    __table_args__ = (
+        Index("ix_analytics_rollups_hour", "hour"),
+    )
+    
+    hour: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    device_id: Mapped[str] = mapped_column(String(255), primary_key=True)  # '' when no device was selected
+    user_id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True)
+    requests: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    errors: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    cancelled: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    tokens: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    decode_seconds: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    latency_seconds: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+
+
+class AnalyticsLatencyBucket(Base):
+    """Latency histogram bucket counts for an hourly rollup (mergeable for percentiles)."""
+    __tablename__ = "analytics_latency_buckets"
+    
+    hour: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    device_id: Mapped[str] = mapped_column(String(255), primary_key=True)
+    user_id: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True)
+    bucket: Mapped[int] = mapped_column(Integer, primary_key=True)  # Index into ANALYTICS_LATENCY_BUCKETS
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
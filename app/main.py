@@ -3,21 +3,69 @@ FastAPI application factory and main entry point.
 """
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
+import asyncio
 import uvicorn
 
 from app.core.config import get_settings
-from app.core.database import create_db_and_tables
+from app.core.database import engine
+from app.core.migrations import ensure_schema
+from app.core import metrics, profiling, tracing
 from app.api.v1.router import api_router
+from app.services.chat_job_service import chat_job_pool
+from app.services.circuit_breaker import device_breakers
+from app.services.service_registry import service_registry
+from app.services.inference_service import device_slots, inference_backend
+from app.services.model_residency import warmup_scheduler
+from app.services.retrieval import history_index
+from app.services.usage_service import usage_recorder
+from app.services.analytics_service import fleet_analytics
+from app.services.thumbnail_service import thumbnailer
+from app.services.tokenizer import preload_tokenizers
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler."""
-    # Startup
-    await create_db_and_tables()
+    settings = get_settings()
+    
+    # Startup: schema is migrated by the launcher; only verify the version here
+    if settings.schema_check_on_startup:
+        await ensure_schema(auto_migrate=settings.auto_migrate)
+    
+    loop_monitor = None
+    if settings.metrics_enabled:
+        metrics.registry.register_collector(metrics.collect_db_pool(engine.pool))
+        loop_monitor = asyncio.create_task(metrics.monitor_event_loop(settings.event_loop_monitor_interval))
+    
+    if tracing.exporter is not None:
+        tracing.exporter.start()
+    await preload_tokenizers()
+    await service_registry.start()
+    usage_recorder.start()
+    fleet_analytics.start()
+    chat_job_pool.start()
+    if settings.warmup_enabled:
+        warmup_scheduler.start(inference_backend(), device_slots)
+    device_breakers.start(inference_backend())
+    history_index.start()
+    
     yield
-    # Shutdown (cleanup if needed)
+    
+    # Shutdown
+    await device_breakers.stop()
+    await history_index.stop()
+    warmup_scheduler.stop()
+    await service_registry.stop()
+    await chat_job_pool.stop(settings.graceful_shutdown_timeout)
+    await usage_recorder.stop()
+    await fleet_analytics.stop()
+    if tracing.exporter is not None:
+        await tracing.exporter.stop()
+    thumbnailer.shutdown()
+    if loop_monitor:
+        loop_monitor.cancel()
 
 
 def create_application() -> FastAPI:
@@ -63,8 +111,16 @@ def create_application() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "X-Total-Estimate", "X-Profile-Id"],
     )
     
+    if settings.tracing_enabled:
+        app.add_middleware(tracing.TracingMiddleware)
+    if settings.metrics_enabled:
+        app.add_middleware(metrics.MetricsMiddleware)
+    if settings.profiling_enabled:
+        app.add_middleware(profiling.ProfilingMiddleware)
+    
     # Include API router with versioning
     app.include_router(api_router, prefix="/api/v1", tags=["API v1"])
     
@@ -85,6 +141,15 @@ def create_application() -> FastAPI:
             "description": "Edge AI Platform API"
         }
     
+    if settings.metrics_enabled:
+        @app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+        async def metrics_endpoint():
+            """Prometheus metrics for request latency, DB pool, event loop and devices."""
+            return PlainTextResponse(
+                metrics.registry.render(),
+                media_type="text/plain; version=0.0.4; charset=utf-8"
+            )
+    
     return app
 
 
@@ -0,0 +1 @@
+# Alembic schema migrations
\ No newline at end of file
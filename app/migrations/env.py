@@ -0,0 +1,55 @@
+"""
+Alembic environment for applying schema migrations.
+
+Migrations run on a dedicated NullPool engine so no pooled connections leak
+into the application's event loop. On PostgreSQL a transaction-scoped
+advisory lock serializes replicas that try to migrate at the same time.
+"""
+import asyncio
+
+from alembic import context
+from sqlalchemy import pool, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.database import Base, async_database_url
+import app.domain.models  # noqa: F401  (register models on Base.metadata)
+
+MIGRATION_LOCK_KEY = 72150911
+
+target_metadata = Base.metadata
+
+
+def do_run_migrations(connection: Connection) -> None:
+    """Run migrations on a synchronous connection."""
+    context.configure(connection=connection, target_metadata=target_metadata)
+    with context.begin_transaction():
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    """Run migrations using an async engine."""
+    url = context.config.get_main_option("sqlalchemy.url") or async_database_url()
+    connectable = create_async_engine(url, poolclass=pool.NullPool)
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await connectable.dispose()
+
+
+def run_migrations_offline() -> None:
+    """Emit SQL to stdout instead of executing it."""
+    context.configure(
+        url=context.config.get_main_option("sqlalchemy.url") or async_database_url(),
+        target_metadata=target_metadata,
+        literal_binds=True
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_async_migrations())
@@ -0,0 +1,78 @@
+"""Initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+
+Tables that already exist (databases created by the old create_all startup
+path) are adopted rather than recreated.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    existing = set(sa.inspect(bind).get_table_names())
+    
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Uuid(), primary_key=True),
+            sa.Column("email", sa.String(255), nullable=False, unique=True),
+            sa.Column("name", sa.String(255), nullable=False),
+            sa.Column("provider", sa.String(50), nullable=False),
+            sa.Column("provider_id", sa.String(255), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        )
+    
+    if "devices" not in existing:
+        op.create_table(
+            "devices",
+            sa.Column("id", sa.String(255), primary_key=True),
+            sa.Column("name", sa.String(255), nullable=False),
+            sa.Column("type", sa.String(50), nullable=False),
+            sa.Column("ip", sa.String(15), nullable=False),
+            sa.Column("status", sa.String(20), nullable=False),
+            sa.Column("specs", sa.JSON(), nullable=True),
+            sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id"), nullable=True),
+            sa.Column("last_seen", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        )
+    
+    if "chat_messages" not in existing:
+        op.create_table(
+            "chat_messages",
+            sa.Column("id", sa.Uuid(), primary_key=True),
+            sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("device_id", sa.String(255), sa.ForeignKey("devices.id"), nullable=True),
+            sa.Column("role", sa.String(20), nullable=False),
+            sa.Column("content", sa.Text(), nullable=False),
+            sa.Column("images", sa.JSON(), nullable=True),
+            sa.Column("debug", sa.JSON(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        )
+    
+    if "admin_services" not in existing:
+        op.create_table(
+            "admin_services",
+            sa.Column("id", sa.Uuid(), primary_key=True),
+            sa.Column("name", sa.String(255), nullable=False),
+            sa.Column("type", sa.String(50), nullable=False),
+            sa.Column("endpoint", sa.String(500), nullable=True),
+            sa.Column("status", sa.String(20), nullable=False),
+            sa.Column("config", sa.JSON(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("admin_services")
+    op.drop_table("chat_messages")
+    op.drop_table("devices")
+    op.drop_table("users")
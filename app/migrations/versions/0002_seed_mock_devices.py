@@ -0,0 +1,66 @@
+"""Seed mock devices
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+
+Replaces the per-boot DeviceService.initialize_mock_devices call in the
+launch scripts; rows that already exist are left untouched.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+MOCK_DEVICES = [
+    {
+        "id": "rpi-001",
+        "name": "Raspberry Pi 4B",
+        "type": "raspberry-pi",
+        "ip": "192.168.1.100",
+        "specs": {"cpu": "ARM Cortex-A72", "memory": "4GB RAM", "temperature": 45, "usage": 23},
+    },
+    {
+        "id": "jetson-001",
+        "name": "NVIDIA Jetson Nano",
+        "type": "jetson",
+        "ip": "192.168.1.101",
+        "specs": {"cpu": "ARM Cortex-A57", "memory": "4GB RAM", "temperature": 52, "usage": 67},
+    },
+    {
+        "id": "coral-001",
+        "name": "Google Coral Dev Board",
+        "type": "coral",
+        "ip": "192.168.1.102",
+        "specs": {"cpu": "ARM Cortex-A53", "memory": "1GB RAM", "temperature": 38, "usage": 12},
+    },
+]
+
+devices = sa.table(
+    "devices",
+    sa.column("id", sa.String),
+    sa.column("name", sa.String),
+    sa.column("type", sa.String),
+    sa.column("ip", sa.String),
+    sa.column("status", sa.String),
+    sa.column("specs", sa.JSON),
+)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    existing = {row[0] for row in bind.execute(sa.select(devices.c.id))}
+    rows = [
+        {**device, "status": "disconnected"}
+        for device in MOCK_DEVICES
+        if device["id"] not in existing
+    ]
+    if rows:
+        op.bulk_insert(devices, rows)
+
+
+def downgrade() -> None:
+    op.execute(devices.delete().where(devices.c.id.in_([device["id"] for device in MOCK_DEVICES])))
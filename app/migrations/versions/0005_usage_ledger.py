@@ -0,0 +1,43 @@
+"""Usage ledger and counters
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "usage_ledger",
+        sa.Column("id", sa.BigInteger().with_variant(sa.Integer(), "sqlite"), primary_key=True, autoincrement=True),
+        sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("device_id", sa.String(255), nullable=True),
+        sa.Column("model", sa.String(100), nullable=False),
+        sa.Column("prompt_tokens", sa.Integer(), nullable=False),
+        sa.Column("completion_tokens", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_usage_ledger_user_id_created_at", "usage_ledger", ["user_id", "created_at"])
+    op.create_table(
+        "usage_counters",
+        sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("device_id", sa.String(255), primary_key=True),
+        sa.Column("model", sa.String(100), primary_key=True),
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("requests", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("prompt_tokens", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("completion_tokens", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("usage_counters")
+    op.drop_index("ix_usage_ledger_user_id_created_at", table_name="usage_ledger")
+    op.drop_table("usage_ledger")
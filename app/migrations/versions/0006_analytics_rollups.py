@@ -0,0 +1,43 @@
+"""Analytics rollups
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "analytics_rollups",
+        sa.Column("hour", sa.DateTime(timezone=True), primary_key=True),
+        sa.Column("device_id", sa.String(255), primary_key=True),
+        sa.Column("user_id", sa.Uuid(), primary_key=True),
+        sa.Column("requests", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("errors", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("cancelled", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("tokens", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("decode_seconds", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("latency_seconds", sa.Float(), nullable=False, server_default="0"),
+    )
+    op.create_index("ix_analytics_rollups_hour", "analytics_rollups", ["hour"])
+    op.create_table(
+        "analytics_latency_buckets",
+        sa.Column("hour", sa.DateTime(timezone=True), primary_key=True),
+        sa.Column("device_id", sa.String(255), primary_key=True),
+        sa.Column("user_id", sa.Uuid(), primary_key=True),
+        sa.Column("bucket", sa.Integer(), primary_key=True),
+        sa.Column("count", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("analytics_latency_buckets")
+    op.drop_index("ix_analytics_rollups_hour", table_name="analytics_rollups")
+    op.drop_table("analytics_rollups")
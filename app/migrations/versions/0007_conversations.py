@@ -0,0 +1,116 @@
+"""Conversations
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+PREVIEW_LENGTH = 200
+
+
+def upgrade() -> None:
+    op.create_table(
+        "conversations",
+        sa.Column("id", sa.Uuid(), primary_key=True),
+        sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("device_id", sa.String(255), nullable=True),
+        sa.Column("device_key", sa.String(255), nullable=False),
+        sa.Column("last_message_preview", sa.String(PREVIEW_LENGTH), nullable=False, server_default=""),
+        sa.Column("last_message_role", sa.String(20), nullable=True),
+        sa.Column("last_message_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("message_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.UniqueConstraint("user_id", "device_key", name="uq_conversations_user_device"),
+    )
+    op.create_index(
+        "ix_conversations_user_last_message", "conversations", ["user_id", "last_message_at", "id"]
+    )
+    with op.batch_alter_table("chat_messages") as batch:
+        batch.add_column(sa.Column("conversation_id", sa.Uuid(), nullable=True))
+        batch.create_foreign_key(
+            "fk_chat_messages_conversation_id", "conversations", ["conversation_id"], ["id"]
+        )
+        batch.create_index("ix_chat_messages_conversation_id", ["conversation_id"])
+
+    _backfill()
+
+
+def _backfill() -> None:
+    """Create one conversation per (user, device) from existing messages."""
+    bind = op.get_bind()
+    messages = sa.table(
+        "chat_messages",
+        sa.column("id", sa.Uuid()),
+        sa.column("user_id", sa.Uuid()),
+        sa.column("device_id", sa.String()),
+        sa.column("role", sa.String()),
+        sa.column("content", sa.Text()),
+        sa.column("created_at", sa.DateTime(timezone=True)),
+        sa.column("conversation_id", sa.Uuid()),
+    )
+    conversations = sa.table(
+        "conversations",
+        sa.column("id", sa.Uuid()),
+        sa.column("user_id", sa.Uuid()),
+        sa.column("device_id", sa.String()),
+        sa.column("device_key", sa.String()),
+        sa.column("last_message_preview", sa.String()),
+        sa.column("last_message_role", sa.String()),
+        sa.column("last_message_at", sa.DateTime(timezone=True)),
+        sa.column("message_count", sa.Integer()),
+        sa.column("created_at", sa.DateTime(timezone=True)),
+    )
+
+    groups = bind.execute(
+        sa.select(
+            messages.c.user_id,
+            messages.c.device_id,
+            sa.func.count(),
+            sa.func.min(messages.c.created_at),
+            sa.func.max(messages.c.created_at),
+        ).group_by(messages.c.user_id, messages.c.device_id)
+    ).all()
+
+    for user_id, device_id, count, first_at, last_at in groups:
+        device_filter = messages.c.device_id.is_(None) if device_id is None else messages.c.device_id == device_id
+        last = bind.execute(
+            sa.select(messages.c.role, messages.c.content)
+            .where(messages.c.user_id == user_id, device_filter)
+            .order_by(messages.c.created_at.desc())
+            .limit(1)
+        ).first()
+        conversation_id = uuid.uuid4()
+        bind.execute(conversations.insert().values(
+            id=conversation_id,
+            user_id=user_id,
+            device_id=device_id,
+            device_key=device_id or "",
+            last_message_preview=" ".join((last.content if last else "").split())[:PREVIEW_LENGTH],
+            last_message_role=last.role if last else None,
+            last_message_at=last_at,
+            message_count=count,
+            created_at=first_at,
+        ))
+        bind.execute(
+            messages.update()
+            .where(messages.c.user_id == user_id, device_filter)
+            .values(conversation_id=conversation_id)
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("chat_messages") as batch:
+        batch.drop_index("ix_chat_messages_conversation_id")
+        batch.drop_constraint("fk_chat_messages_conversation_id", type_="foreignkey")
+        batch.drop_column("conversation_id")
+    op.drop_index("ix_conversations_user_last_message", table_name="conversations")
+    op.drop_table("conversations")
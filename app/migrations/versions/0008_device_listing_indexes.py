@@ -0,0 +1,31 @@
+"""Device listing indexes
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    "ix_devices_last_seen_id": ["last_seen", "id"],
+    "ix_devices_name_id": ["name", "id"],
+    "ix_devices_created_at_id": ["created_at", "id"],
+    "ix_devices_status_last_seen_id": ["status", "last_seen", "id"],
+    "ix_devices_type_last_seen_id": ["type", "last_seen", "id"],
+    "ix_devices_user_id": ["user_id"],
+}
+
+
+def upgrade() -> None:
+    for name, columns in INDEXES.items():
+        op.create_index(name, "devices", columns)
+
+
+def downgrade() -> None:
+    for name in INDEXES:
+        op.drop_index(name, table_name="devices")
@@ -0,0 +1,20 @@
+"""Chat history index
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_chat_messages_user_created_at_id", "chat_messages", ["user_id", "created_at", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_chat_messages_user_created_at_id", table_name="chat_messages")
@@ -0,0 +1 @@
+# Migration scripts
\ No newline at end of file
@@ -6,6 +6,7 @@ from sqlalchemy import select, update
 from typing import Optional, List
 import uuid
 
+from app.core.tracing import traced
 from app.domain.models import AdminService
 from app.schemas.admin import AdminServiceCreate, AdminServiceUpdate
 
@@ -16,16 +17,19 @@ class AdminServiceRepository:
     def __init__(self, db: AsyncSession):
         self.db = db
     
+    @traced()
     async def get_by_id(self, service_id: uuid.UUID) -> Optional[AdminService]:
         """Get admin service by ID."""
         result = await self.db.execute(select(AdminService).where(AdminService.id == service_id))
         return result.scalar_one_or_none()
     
+    @traced()
     async def get_all(self) -> List[AdminService]:
         """Get all admin services."""
         result = await self.db.execute(select(AdminService))
         return list(result.scalars().all())
     
+    @traced()
     async def create(self, service_data: AdminServiceCreate) -> AdminService:
         """Create a new admin service."""
         service = AdminService(
@@ -40,6 +44,7 @@ class AdminServiceRepository:
         await self.db.refresh(service)
         return service
     
+    @traced()
     async def update(self, service_id: uuid.UUID, service_data: AdminServiceUpdate) -> Optional[AdminService]:
         """Update admin service."""
         update_data = service_data.model_dump(exclude_unset=True)
@@ -55,6 +60,7 @@ class AdminServiceRepository:
         else:
             return await self.get_by_id(service_id)
     
+    @traced()
     async def delete(self, service_id: uuid.UUID) -> bool:
         """Delete admin service."""
         service = await self.get_by_id(service_id)
@@ -0,0 +1,88 @@
+"""
+Analytics rollup repository for database operations.
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from datetime import datetime
+from typing import Dict, List, Optional
+import uuid
+
+from app.core.database import upsert
+from app.core.tracing import traced
+from app.domain.models import AnalyticsRollup, AnalyticsLatencyBucket
+
+
+GROUP_COLUMNS = {
+    "device": (AnalyticsRollup.device_id, AnalyticsLatencyBucket.device_id),
+    "user": (AnalyticsRollup.user_id, AnalyticsLatencyBucket.user_id),
+    "hour": (AnalyticsRollup.hour, AnalyticsLatencyBucket.hour),
+}
+
+ROLLUP_SUMS = ("requests", "errors", "cancelled", "tokens", "decode_seconds", "latency_seconds")
+
+
+class AnalyticsRepository:
+    """Analytics rollup repository."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @traced()
+    async def increment(self, rollups: List[dict], buckets: List[dict]) -> None:
+        """Add hourly deltas to the rollup and latency bucket rows in one transaction."""
+        if rollups:
+            statement = upsert(self.db, AnalyticsRollup)
+            statement = statement.on_conflict_do_update(
+                index_elements=["hour", "device_id", "user_id"],
+                set_={
+                    name: getattr(AnalyticsRollup, name) + getattr(statement.excluded, name)
+                    for name in ROLLUP_SUMS
+                }
+            )
+            await self.db.execute(statement, rollups)
+        if buckets:
+            statement = upsert(self.db, AnalyticsLatencyBucket)
+            statement = statement.on_conflict_do_update(
+                index_elements=["hour", "device_id", "user_id", "bucket"],
+                set_={"count": AnalyticsLatencyBucket.count + statement.excluded.count}
+            )
+            await self.db.execute(statement, buckets)
+        await self.db.commit()
+
+    @traced()
+    async def summarize(
+        self,
+        group_by: str,
+        since: datetime,
+        device_id: Optional[str] = None,
+        user_id: Optional[uuid.UUID] = None
+    ) -> Dict[object, dict]:
+        """Sum rollups per group, with merged latency bucket counts under ``"buckets"``."""
+        rollup_key, bucket_key = GROUP_COLUMNS[group_by]
+
+        query = (
+            select(rollup_key, *(func.sum(getattr(AnalyticsRollup, name)) for name in ROLLUP_SUMS))
+            .where(AnalyticsRollup.hour >= since)
+            .group_by(rollup_key)
+            .order_by(rollup_key)
+        )
+        bucket_query = (
+            select(bucket_key, AnalyticsLatencyBucket.bucket, func.sum(AnalyticsLatencyBucket.count))
+            .where(AnalyticsLatencyBucket.hour >= since)
+            .group_by(bucket_key, AnalyticsLatencyBucket.bucket)
+        )
+        if device_id is not None:
+            query = query.where(AnalyticsRollup.device_id == device_id)
+            bucket_query = bucket_query.where(AnalyticsLatencyBucket.device_id == device_id)
+        if user_id is not None:
+            query = query.where(AnalyticsRollup.user_id == user_id)
+            bucket_query = bucket_query.where(AnalyticsLatencyBucket.user_id == user_id)
+
+        groups: Dict[object, dict] = {}
+        for key, *sums in (await self.db.execute(query)).all():
+            groups[key] = {name: value or 0 for name, value in zip(ROLLUP_SUMS, sums)}
+            groups[key]["buckets"] = {}
+        for key, bucket, count in (await self.db.execute(bucket_query)).all():
+            if key in groups:
+                groups[key]["buckets"][bucket] = int(count or 0)
+        return groups
@@ -0,0 +1,176 @@
+"""
+Chat job repository for database operations.
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional, List
+import uuid
+
+from app.core.tracing import traced
+from app.domain.models import ChatJob
+
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class ChatJobRepository:
+    """Chat job repository.
+    
+    ``clock`` supplies creation times and lease deadlines, so queue order and
+    lease expiry do not depend on the database clock's resolution.
+    """
+    
+    def __init__(self, db: AsyncSession, clock: Callable[[], datetime] = utcnow):
+        self.db = db
+        self.clock = clock
+    
+    @traced()
+    async def get_by_id(self, job_id: uuid.UUID) -> Optional[ChatJob]:
+        """Get job by ID."""
+        result = await self.db.execute(
+            select(ChatJob).where(ChatJob.id == job_id).execution_options(populate_existing=True)
+        )
+        return result.scalar_one_or_none()
+    
+    @traced()
+    async def get_for_user(self, job_id: uuid.UUID, user_id: uuid.UUID) -> Optional[ChatJob]:
+        """Get a job owned by a user."""
+        result = await self.db.execute(
+            select(ChatJob)
+            .where(ChatJob.id == job_id, ChatJob.user_id == user_id)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalar_one_or_none()
+    
+    @traced()
+    async def get_by_idempotency_key(self, user_id: uuid.UUID, key: str) -> Optional[ChatJob]:
+        """Get a user's job by idempotency key."""
+        result = await self.db.execute(
+            select(ChatJob).where(ChatJob.user_id == user_id, ChatJob.idempotency_key == key)
+        )
+        return result.scalar_one_or_none()
+    
+    @traced()
+    async def create(
+        self,
+        user_id: uuid.UUID,
+        device_id: Optional[str],
+        request: dict,
+        idempotency_key: Optional[str] = None
+    ) -> ChatJob:
+        """Create a queued job, returning the existing one for a repeated idempotency key."""
+        if idempotency_key:
+            existing = await self.get_by_idempotency_key(user_id, idempotency_key)
+            if existing:
+                return existing
+        
+        job = ChatJob(
+            user_id=user_id,
+            device_id=device_id,
+            idempotency_key=idempotency_key,
+            status="queued",
+            request=request,
+            attempts=0,
+            created_at=self.clock()
+        )
+        self.db.add(job)
+        try:
+            await self.db.commit()
+        except IntegrityError:
+            # Lost a race with a concurrent submit using the same key
+            await self.db.rollback()
+            return await self.get_by_idempotency_key(user_id, idempotency_key)
+        await self.db.refresh(job)
+        return job
+    
+    @traced()
+    async def claim_next(self, lease_seconds: float) -> Optional[ChatJob]:
+        """Atomically move the oldest queued job to running."""
+        next_job = (
+            select(ChatJob.id)
+            .where(ChatJob.status == "queued")
+            .order_by(ChatJob.created_at.asc())
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        result = await self.db.execute(
+            update(ChatJob)
+            .where(ChatJob.id == next_job, ChatJob.status == "queued")
+            .values(
+                status="running",
+                attempts=ChatJob.attempts + 1,
+                lease_expires_at=self.clock() + timedelta(seconds=lease_seconds)
+            )
+            .returning(ChatJob)
+        )
+        job = result.scalar_one_or_none()
+        await self.db.commit()
+        return job
+    
+    @traced()
+    async def renew(self, job_id: uuid.UUID, lease_seconds: float) -> bool:
+        """Extend a running job's lease; False if it is no longer running."""
+        result = await self.db.execute(
+            update(ChatJob)
+            .where(ChatJob.id == job_id, ChatJob.status == "running")
+            .values(lease_expires_at=self.clock() + timedelta(seconds=lease_seconds))
+        )
+        await self.db.commit()
+        return result.rowcount > 0
+    
+    @traced()
+    async def finish(
+        self,
+        job_id: uuid.UUID,
+        status: str,
+        result: Optional[dict] = None,
+        error: Optional[str] = None
+    ) -> bool:
+        """Record a terminal job state.
+        
+        Only a running job is updated, so a job already failed by the reaper
+        keeps its failed state; returns False in that case.
+        """
+        updated = await self.db.execute(
+            update(ChatJob)
+            .where(ChatJob.id == job_id, ChatJob.status == "running")
+            .values(
+                status=status,
+                result=result,
+                error=error,
+                lease_expires_at=None,
+                finished_at=self.clock()
+            )
+        )
+        await self.db.commit()
+        return updated.rowcount > 0
+    
+    @traced()
+    async def fail_expired(self) -> List[uuid.UUID]:
+        """Fail running jobs whose worker died (lease expired).
+        
+        They are not re-queued: inference may already have run, and a retry
+        must never trigger a second one.
+        """
+        now = self.clock()
+        result = await self.db.execute(
+            update(ChatJob)
+            .where(ChatJob.status == "running", ChatJob.lease_expires_at < now)
+            .values(
+                status="failed",
+                error="Job interrupted before completion; submit a new job to retry",
+                lease_expires_at=None,
+                finished_at=now
+            )
+            .returning(ChatJob.id)
+        )
+        job_ids = list(result.scalars().all())
+        await self.db.commit()
+        return job_ids
@@ -2,48 +2,166 @@
 Chat repository for database operations.
 """
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
-from typing import Optional, List
+from sqlalchemy import select, update, and_
+from datetime import datetime, timezone
+from typing import Optional, List, Tuple
 import uuid
 
-from app.domain.models import ChatMessage
+from app.core.database import upsert
+from app.core.pagination import keyset
+from app.core.tracing import traced
+from app.domain.models import ChatMessage, Conversation
 from app.schemas.chat import ChatMessageCreate
 
 
+CONVERSATION_PREVIEW_LENGTH = 200
+
+
 class ChatRepository:
     """Chat repository."""
     
     def __init__(self, db: AsyncSession):
         self.db = db
     
+    @traced()
     async def get_by_id(self, message_id: uuid.UUID) -> Optional[ChatMessage]:
         """Get chat message by ID."""
         result = await self.db.execute(select(ChatMessage).where(ChatMessage.id == message_id))
         return result.scalar_one_or_none()
     
-    async def get_messages(self, user_id: uuid.UUID, device_id: Optional[str] = None) -> List[ChatMessage]:
-        """Get chat messages for user and optionally device."""
+    @traced()
+    async def get_messages(
+        self,
+        user_id: uuid.UUID,
+        device_id: Optional[str] = None,
+        conversation_id: Optional[uuid.UUID] = None,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[datetime, uuid.UUID]] = None
+    ) -> List[ChatMessage]:
+        """Get chat messages for user and optionally device or conversation, oldest first.
+        
+        With ``limit``, returns one page starting after the ``after`` (created_at, id) key.
+        """
         query = select(ChatMessage).where(ChatMessage.user_id == user_id)
         
         if device_id:
             query = query.where(ChatMessage.device_id == device_id)
+        if conversation_id:
+            query = query.where(ChatMessage.conversation_id == conversation_id)
         
-        query = query.order_by(ChatMessage.created_at.asc())
+        query = keyset(query, ChatMessage.created_at, ChatMessage.id, False, after)
+        if limit is not None:
+            query = query.limit(limit)
         
         result = await self.db.execute(query)
         return list(result.scalars().all())
     
+    @traced()
+    async def contents(
+        self,
+        user_id: uuid.UUID,
+        limit: int,
+        after: Optional[Tuple[datetime, uuid.UUID]] = None
+    ) -> List[Tuple[uuid.UUID, uuid.UUID, str, str, datetime]]:
+        """(id, conversation_id, role, content, created_at) of a user's messages, oldest first."""
+        query = select(
+            ChatMessage.id, ChatMessage.conversation_id, ChatMessage.role, ChatMessage.content, ChatMessage.created_at
+        ).where(ChatMessage.user_id == user_id)
+        query = keyset(query, ChatMessage.created_at, ChatMessage.id, False, after).limit(limit)
+        result = await self.db.execute(query)
+        return [tuple(row) for row in result.all()]
+    
+    @traced()
     async def create(self, message_data: ChatMessageCreate) -> ChatMessage:
-        """Create a new chat message."""
+        """Create a new chat message and update its conversation in the same transaction."""
+        # Set here rather than by the database so ordering is at microsecond precision on SQLite too
+        created_at = datetime.now(timezone.utc)
+        conversation_id = await self._touch_conversation(message_data, created_at)
         message = ChatMessage(
             user_id=message_data.user_id,
             device_id=message_data.device_id,
             role=message_data.role,
             content=message_data.content,
             images=message_data.images,
-            debug=message_data.debug
+            debug=message_data.debug,
+            conversation_id=conversation_id,
+            created_at=created_at
         )
         self.db.add(message)
         await self.db.commit()
         await self.db.refresh(message)
-        return message
\ No newline at end of file
+        return message
+    
+    async def _touch_conversation(self, message_data: ChatMessageCreate, created_at: datetime) -> uuid.UUID:
+        """Create or update the message's conversation with one statement (not committed)."""
+        if message_data.conversation_id:
+            # Joins an existing conversation, e.g. a reply from a hedged device
+            result = await self.db.execute(
+                update(Conversation)
+                .where(Conversation.id == message_data.conversation_id)
+                .values(
+                    last_message_preview=preview(message_data.content),
+                    last_message_role=message_data.role,
+                    last_message_at=created_at,
+                    message_count=Conversation.message_count + 1
+                )
+                .returning(Conversation.id)
+            )
+            return result.scalar_one()
+        
+        values = {
+            "user_id": message_data.user_id,
+            "device_id": message_data.device_id,
+            "device_key": message_data.device_id or "",
+            "last_message_preview": preview(message_data.content),
+            "last_message_role": message_data.role,
+            "last_message_at": created_at,
+            "message_count": 1,
+        }
+        statement = upsert(self.db, Conversation).values(id=uuid.uuid4(), **values)
+        statement = statement.on_conflict_do_update(
+            index_elements=["user_id", "device_key"],
+            set_={
+                "last_message_preview": statement.excluded.last_message_preview,
+                "last_message_role": statement.excluded.last_message_role,
+                "last_message_at": statement.excluded.last_message_at,
+                "message_count": Conversation.message_count + 1,
+            }
+        ).returning(Conversation.id)
+        result = await self.db.execute(statement)
+        return result.scalar_one()
+    
+    @traced()
+    async def list_conversations(
+        self,
+        user_id: uuid.UUID,
+        limit: int,
+        after: Optional[Tuple[datetime, uuid.UUID]] = None
+    ) -> List[Conversation]:
+        """A page of the user's conversations, most recent first.
+        
+        ``after`` is the (last_message_at, id) of the last row on the previous
+        page; the query seeks the (user_id, last_message_at, id) index from
+        there, so each page costs the same however deep it is.
+        """
+        query = select(Conversation).where(Conversation.user_id == user_id)
+        query = keyset(query, Conversation.last_message_at, Conversation.id, True, after).limit(limit)
+        
+        result = await self.db.execute(query)
+        return list(result.scalars().all())
+    
+    @traced()
+    async def mark_abandoned(self, message_id: uuid.UUID) -> None:
+        """Mark a user message whose reply was cancelled before completion."""
+        await self.db.execute(
+            update(ChatMessage).where(ChatMessage.id == message_id).values(status="abandoned")
+        )
+        await self.db.commit()
+
+
+def preview(content: str) -> str:
+    """Single-line start of a message for the inbox."""
+    text = " ".join(content.split())
+    if len(text) <= CONVERSATION_PREVIEW_LENGTH:
+        return text
+    return text[:CONVERSATION_PREVIEW_LENGTH - 1] + "…"
@@ -2,25 +2,39 @@
 Device repository for database operations.
 """
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
-from typing import Optional, List
+from sqlalchemy import Select, select, update
+from datetime import datetime
+from typing import Any, Optional, List, Sequence
 import uuid
 
+from app.core.database import upsert
+from app.core.pagination import estimate_count, keyset
+from app.core.tracing import traced
 from app.domain.models import Device
 from app.schemas.devices import DeviceCreate, DeviceUpdate
 
 
+# Admin listing sort fields, each backed by an index ending in (column, id)
+DEVICE_SORT_COLUMNS = {
+    "name": Device.name,
+    "last_seen": Device.last_seen,
+    "created_at": Device.created_at,
+}
+
+
 class DeviceRepository:
     """Device repository."""
     
     def __init__(self, db: AsyncSession):
         self.db = db
     
+    @traced()
     async def get_by_id(self, device_id: str) -> Optional[Device]:
         """Get device by ID."""
         result = await self.db.execute(select(Device).where(Device.id == device_id))
         return result.scalar_one_or_none()
     
+    @traced()
     async def get_user_devices(self, user_id: uuid.UUID) -> List[Device]:
         """Get all devices for a user."""
         result = await self.db.execute(
@@ -28,11 +42,57 @@ class DeviceRepository:
         )
         return list(result.scalars().all())
     
+    @traced()
     async def get_all(self) -> List[Device]:
         """Get all devices."""
         result = await self.db.execute(select(Device))
         return list(result.scalars().all())
     
+    def filtered(
+        self,
+        status: Optional[Sequence[str]] = None,
+        type: Optional[Sequence[str]] = None,
+        owner_id: Optional[uuid.UUID] = None,
+        unowned: bool = False,
+        last_seen_from: Optional[datetime] = None,
+        last_seen_to: Optional[datetime] = None
+    ) -> Select:
+        """Query for devices matching the admin listing filters."""
+        query = select(Device)
+        if status:
+            query = query.where(Device.status.in_(status))
+        if type:
+            query = query.where(Device.type.in_(type))
+        if owner_id is not None:
+            query = query.where(Device.user_id == owner_id)
+        elif unowned:
+            query = query.where(Device.user_id.is_(None))
+        if last_seen_from is not None:
+            query = query.where(Device.last_seen >= last_seen_from)
+        if last_seen_to is not None:
+            query = query.where(Device.last_seen < last_seen_to)
+        return query
+    
+    @traced()
+    async def list_page(
+        self,
+        query: Select,
+        sort: str,
+        descending: bool,
+        limit: int,
+        after: Optional[Sequence[Any]] = None
+    ) -> List[Device]:
+        """One page of ``query`` in (sort, id) order, starting after the ``after`` key."""
+        page = keyset(query, DEVICE_SORT_COLUMNS[sort], Device.id, descending, after).limit(limit)
+        result = await self.db.execute(page)
+        return list(result.scalars().all())
+    
+    @traced()
+    async def estimate(self, query: Select) -> Optional[int]:
+        """Approximate number of devices matching ``query``."""
+        return await estimate_count(self.db, query)
+    
+    @traced()
     async def create(self, device_data: DeviceCreate) -> Device:
         """Create a new device."""
         device = Device(
@@ -47,6 +107,7 @@ class DeviceRepository:
         await self.db.refresh(device)
         return device
     
+    @traced()
     async def update(self, device_id: str, device_data: DeviceUpdate) -> Optional[Device]:
         """Update device."""
         update_data = device_data.model_dump(exclude_unset=True)
@@ -62,6 +123,7 @@ class DeviceRepository:
         else:
             return await self.get_by_id(device_id)
     
+    @traced()
     async def update_status(self, device_id: str, status: str) -> Optional[Device]:
         """Update device status."""
         result = await self.db.execute(
@@ -73,6 +135,7 @@ class DeviceRepository:
         await self.db.commit()
         return result.scalar_one_or_none()
     
+    @traced()
     async def assign_to_user(self, device_id: str, user_id: uuid.UUID) -> Optional[Device]:
         """Assign device to user."""
         result = await self.db.execute(
@@ -84,6 +147,76 @@ class DeviceRepository:
         await self.db.commit()
         return result.scalar_one_or_none()
     
+    @traced()
+    async def get_many(self, device_ids: Sequence[str]) -> List[Device]:
+        """Get the devices with the given IDs (missing IDs are skipped)."""
+        if not device_ids:
+            return []
+        result = await self.db.execute(select(Device).where(Device.id.in_(device_ids)))
+        return list(result.scalars().all())
+    
+    @traced()
+    async def set_connection(
+        self,
+        device_ids: Sequence[str],
+        status: str,
+        user_id: Optional[uuid.UUID] = None
+    ) -> List[Device]:
+        """Set the status (and owner, if given) of many devices in one UPDATE."""
+        if not device_ids:
+            return []
+        values = {"status": status}
+        if user_id is not None:
+            values["user_id"] = user_id
+        result = await self.db.execute(
+            update(Device)
+            .where(Device.id.in_(device_ids))
+            .values(**values)
+            .returning(Device)
+        )
+        devices = list(result.scalars().all())
+        await self.db.commit()
+        return devices
+    
+    @traced()
+    async def transition_status(self, device_id: str, expected: str, status: str) -> bool:
+        """Set a device's status only if it is currently ``expected``."""
+        result = await self.db.execute(
+            update(Device)
+            .where(Device.id == device_id, Device.status == expected)
+            .values(status=status)
+        )
+        await self.db.commit()
+        return result.rowcount > 0
+    
+    @traced()
+    async def ids_with_status(self, status: str) -> List[str]:
+        """IDs of all devices with the given status."""
+        result = await self.db.execute(select(Device.id).where(Device.status == status))
+        return list(result.scalars().all())
+    
+    @traced()
+    async def upsert_many(self, rows: Sequence[dict]) -> int:
+        """Insert devices, or refresh the address, type and specs of existing ones."""
+        if not rows:
+            return 0
+        statement = upsert(self.db, Device).values(list(rows))
+        statement = statement.on_conflict_do_update(
+            index_elements=[Device.id],
+            set_={
+                "name": statement.excluded.name,
+                "type": statement.excluded.type,
+                "ip": statement.excluded.ip,
+                "specs": statement.excluded.specs,
+                "status": statement.excluded.status,
+                "user_id": statement.excluded.user_id,
+            }
+        )
+        await self.db.execute(statement)
+        await self.db.commit()
+        return len(rows)
+    
+    @traced()
     async def delete(self, device_id: str) -> bool:
         """Delete device."""
         device = await self.get_by_id(device_id)
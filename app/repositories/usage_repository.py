@@ -0,0 +1,90 @@
+"""
+Usage ledger repository for database operations.
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, insert
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+import uuid
+
+from app.core.database import upsert
+from app.core.tracing import traced
+from app.domain.models import UsageLedgerEntry, UsageCounter
+
+
+CounterKey = Tuple[uuid.UUID, str, str, date]
+
+
+class UsageRepository:
+    """Usage ledger and counters repository."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @traced()
+    async def append(self, entries: List[dict]) -> None:
+        """Append ledger rows and fold them into the daily counters in one transaction."""
+        if not entries:
+            return
+
+        counters: Dict[CounterKey, List[int]] = {}
+        for entry in entries:
+            key = (entry["user_id"], entry["device_id"] or "", entry["model"], entry["created_at"].date())
+            totals = counters.setdefault(key, [0, 0, 0])
+            totals[0] += 1
+            totals[1] += entry["prompt_tokens"]
+            totals[2] += entry["completion_tokens"]
+
+        await self.db.execute(insert(UsageLedgerEntry), entries)
+
+        statement = upsert(self.db, UsageCounter)
+        statement = statement.on_conflict_do_update(
+            index_elements=["user_id", "device_id", "model", "day"],
+            set_={
+                "requests": UsageCounter.requests + statement.excluded.requests,
+                "prompt_tokens": UsageCounter.prompt_tokens + statement.excluded.prompt_tokens,
+                "completion_tokens": UsageCounter.completion_tokens + statement.excluded.completion_tokens,
+            }
+        )
+        await self.db.execute(statement, [
+            {
+                "user_id": user_id,
+                "device_id": device_id,
+                "model": model,
+                "day": day,
+                "requests": requests,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+            }
+            for (user_id, device_id, model, day), (requests, prompt_tokens, completion_tokens) in counters.items()
+        ])
+        await self.db.commit()
+
+    @traced()
+    async def totals(self, user_id: uuid.UUID, since: Optional[date] = None) -> List[dict]:
+        """Token totals per device and model for a user, from the daily counters."""
+        query = (
+            select(
+                UsageCounter.device_id,
+                UsageCounter.model,
+                func.sum(UsageCounter.requests),
+                func.sum(UsageCounter.prompt_tokens),
+                func.sum(UsageCounter.completion_tokens),
+            )
+            .where(UsageCounter.user_id == user_id)
+            .group_by(UsageCounter.device_id, UsageCounter.model)
+        )
+        if since is not None:
+            query = query.where(UsageCounter.day >= since)
+
+        result = await self.db.execute(query)
+        return [
+            {
+                "device_id": device_id or None,
+                "model": model,
+                "requests": int(requests or 0),
+                "prompt_tokens": int(prompt_tokens or 0),
+                "completion_tokens": int(completion_tokens or 0),
+            }
+            for device_id, model, requests, prompt_tokens, completion_tokens in result.all()
+        ]
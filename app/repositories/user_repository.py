@@ -6,6 +6,7 @@ from sqlalchemy import select
 from typing import Optional
 import uuid
 
+from app.core.tracing import traced
 from app.domain.models import User
 from app.schemas.auth import UserCreate
 
@@ -16,16 +17,19 @@ class UserRepository:
     def __init__(self, db: AsyncSession):
         self.db = db
     
+    @traced()
     async def get_by_id(self, user_id: uuid.UUID) -> Optional[User]:
         """Get user by ID."""
         result = await self.db.execute(select(User).where(User.id == user_id))
         return result.scalar_one_or_none()
     
+    @traced()
     async def get_by_email(self, email: str) -> Optional[User]:
         """Get user by email."""
         result = await self.db.execute(select(User).where(User.email == email))
         return result.scalar_one_or_none()
     
+    @traced()
     async def create(self, user_data: UserCreate) -> User:
         """Create a new user."""
         user = User(
@@ -39,6 +43,7 @@ class UserRepository:
         await self.db.refresh(user)
         return user
     
+    @traced()
     async def update(self, user: User, **kwargs) -> User:
         """Update user."""
         for key, value in kwargs.items():
@@ -2,7 +2,7 @@
 Admin-related Pydantic schemas.
 """
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 import uuid
 
@@ -33,4 +33,24 @@ class AdminServiceUpdate(BaseModel):
     type: Optional[str] = None
     endpoint: Optional[str] = None
     status: Optional[str] = None
-    config: Optional[Dict[str, Any]] = None
\ No newline at end of file
+    config: Optional[Dict[str, Any]] = None
+
+
+class AnalyticsRow(BaseModel):
+    key: Optional[str] = None  # Device ID, user ID or hour, depending on groupBy
+    requests: int
+    errors: int
+    cancelled: int
+    errorRate: float
+    tokens: int
+    tokensPerSecond: float
+    latencyAvgMs: Optional[float] = None
+    latencyP50Ms: Optional[float] = None
+    latencyP95Ms: Optional[float] = None
+    latencyP99Ms: Optional[float] = None
+
+
+class AnalyticsResponse(BaseModel):
+    groupBy: str
+    hours: int
+    rows: List[AnalyticsRow]
@@ -3,7 +3,7 @@ Chat-related Pydantic schemas.
 """
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
-from datetime import datetime
+from datetime import date, datetime
 import uuid
 
 
@@ -12,7 +12,10 @@ class ChatMessageResponse(BaseModel):
     role: str
     content: str
     images: Optional[List[str]] = None
+    fullImages: Optional[List[str]] = None  # Set when ``images`` holds thumbnails
     debug: Optional[Dict[str, Any]] = None
+    status: Optional[str] = None
+    conversationId: Optional[uuid.UUID] = None
     createdAt: datetime
     
     class Config:
@@ -26,15 +29,59 @@ class ChatMessageCreate(BaseModel):
     content: str
     images: Optional[List[str]] = None
     debug: Optional[Dict[str, Any]] = None
+    conversation_id: Optional[uuid.UUID] = None  # Defaults to the user's conversation with ``device_id``
 
 
 class ChatMessageRequest(BaseModel):
     message: str
     deviceId: Optional[str] = None
     debug: Optional[str] = None  # Will be converted to boolean
+    hedge: Optional[str] = None
+    model: Optional[str] = None
+    images: List[str] = []  # Image URLs in the media store
 
 
 class ChatResponse(BaseModel):
     userMessage: ChatMessageResponse
     aiMessage: ChatMessageResponse
-    success: bool = True
\ No newline at end of file
+    success: bool = True
+
+
+class ChatJobResponse(BaseModel):
+    id: uuid.UUID
+    status: str
+    deviceId: Optional[str] = None
+    result: Optional[ChatResponse] = None
+    error: Optional[str] = None
+    createdAt: datetime
+    finishedAt: Optional[datetime] = None
+
+
+class UsageTotals(BaseModel):
+    deviceId: Optional[str] = None
+    model: str
+    requests: int
+    promptTokens: int
+    completionTokens: int
+
+
+class UsageResponse(BaseModel):
+    since: Optional[date] = None
+    requests: int
+    promptTokens: int
+    completionTokens: int
+    breakdown: List[UsageTotals]
+
+
+class ConversationResponse(BaseModel):
+    id: uuid.UUID
+    deviceId: Optional[str] = None
+    lastMessagePreview: str
+    lastMessageRole: Optional[str] = None
+    lastMessageAt: datetime
+    messageCount: int
+
+
+class ConversationPage(BaseModel):
+    conversations: List[ConversationResponse]
+    nextCursor: Optional[str] = None  # Pass as ``cursor`` for the next page; None on the last page
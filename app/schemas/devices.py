@@ -1,8 +1,8 @@
 """
 Device-related Pydantic schemas.
 """
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 import uuid
 
@@ -52,4 +52,9 @@ class DeviceActionResponse(BaseModel):
 class DeviceScanResponse(BaseModel):
     success: bool = True
     devices: int
-    message: str
\ No newline at end of file
+    message: str
+
+
+class FleetOperationRequest(BaseModel):
+    deviceIds: List[str] = Field(min_length=1)
+    concurrency: Optional[int] = Field(None, ge=1, le=256)
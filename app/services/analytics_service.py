@@ -0,0 +1,195 @@
+"""
+Fleet analytics from incrementally maintained hourly rollups.
+
+Every chat inference is folded into an in-memory rollup for its
+(hour, device, user) as it happens: request, error and token counts,
+decode time, and a fixed-bucket latency histogram. A background task flushes
+the accumulated deltas with upserts that add to the stored rows, so each
+row is a mergeable summary. Dashboard queries sum a few rollup rows and
+merge bucket counts to estimate percentiles; they never read chat history.
+"""
+import asyncio
+import bisect
+import logging
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.memory import register_store
+from app.core.database import async_session_maker
+from app.repositories.analytics_repository import AnalyticsRepository
+
+logger = logging.getLogger(__name__)
+
+# Latency histogram bounds (seconds); changing them invalidates stored bucket indexes
+ANALYTICS_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 30.0, 60.0, 120.0)
+
+RollupKey = Tuple[datetime, str, uuid.UUID]
+
+
+@dataclass
+class Rollup:
+    """Deltas accumulated for one (hour, device, user) since the last flush."""
+    requests: int = 0
+    errors: int = 0
+    cancelled: int = 0
+    tokens: int = 0
+    decode_seconds: float = 0.0
+    latency_seconds: float = 0.0
+    buckets: Dict[int, int] = field(default_factory=dict)
+
+
+def _hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class FleetAnalytics:
+    """Accumulates inference events and flushes them to the rollup tables."""
+
+    def __init__(self):
+        self.settings = get_settings()
+        self._pending: Dict[RollupKey, Rollup] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    def buffered(self) -> Dict[RollupKey, Rollup]:
+        """A copy of the rollups recorded since the last flush."""
+        return dict(self._pending)
+
+    def start(self) -> None:
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run(), name="analytics-flusher")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def record(
+        self,
+        user_id: uuid.UUID,
+        device_id: Optional[str],
+        outcome: str,
+        latency_seconds: float,
+        tokens: int = 0,
+        decode_seconds: float = 0.0
+    ) -> None:
+        """Fold one inference (outcome ``ok``, ``error`` or ``cancelled``) into its hourly rollup."""
+        key = (_hour(datetime.now(timezone.utc)), device_id or "", user_id)
+        rollup = self._pending.get(key)
+        if rollup is None:
+            rollup = self._pending[key] = Rollup()
+        rollup.requests += 1
+        if outcome == "error":
+            rollup.errors += 1
+        elif outcome == "cancelled":
+            rollup.cancelled += 1
+        rollup.tokens += tokens
+        rollup.decode_seconds += decode_seconds
+        rollup.latency_seconds += latency_seconds
+        bucket = bisect.bisect_left(ANALYTICS_LATENCY_BUCKETS, latency_seconds)
+        rollup.buckets[bucket] = rollup.buckets.get(bucket, 0) + 1
+
+    async def flush(self) -> int:
+        """Write pending deltas; returns how many rollup rows were updated.
+
+        Flushes are serialized, so the periodic and the shutdown flush cannot
+        both write (or both merge back) the same deltas.
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            rollups, buckets = [], []
+            for (hour, device_id, user_id), rollup in pending.items():
+                key = {"hour": hour, "device_id": device_id, "user_id": user_id}
+                rollups.append({
+                    **key,
+                    "requests": rollup.requests,
+                    "errors": rollup.errors,
+                    "cancelled": rollup.cancelled,
+                    "tokens": rollup.tokens,
+                    "decode_seconds": rollup.decode_seconds,
+                    "latency_seconds": rollup.latency_seconds,
+                })
+                buckets.extend({**key, "bucket": bucket, "count": count} for bucket, count in rollup.buckets.items())
+            try:
+                async with async_session_maker() as db:
+                    await AnalyticsRepository(db).increment(rollups, buckets)
+            except Exception:
+                # Merge back so the deltas are retried on the next flush
+                for key, rollup in pending.items():
+                    self._merge(key, rollup)
+                raise
+            return len(rollups)
+
+    def _merge(self, key: RollupKey, delta: Rollup) -> None:
+        rollup = self._pending.setdefault(key, Rollup())
+        rollup.requests += delta.requests
+        rollup.errors += delta.errors
+        rollup.cancelled += delta.cancelled
+        rollup.tokens += delta.tokens
+        rollup.decode_seconds += delta.decode_seconds
+        rollup.latency_seconds += delta.latency_seconds
+        for bucket, count in delta.buckets.items():
+            rollup.buckets[bucket] = rollup.buckets.get(bucket, 0) + count
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.settings.analytics_flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush analytics rollups")
+
+    async def summarize(
+        self,
+        group_by: str,
+        hours: int,
+        device_id: Optional[str] = None,
+        user_id: Optional[uuid.UUID] = None
+    ) -> List[dict]:
+        """Per-group requests, error rate, tokens/sec and latency percentiles over the last ``hours``."""
+        since = _hour(datetime.now(timezone.utc)) - timedelta(hours=hours - 1)
+        async with async_session_maker() as db:
+            groups = await AnalyticsRepository(db).summarize(group_by, since, device_id, user_id)
+
+        rows = []
+        for key, totals in groups.items():
+            counts = [totals["buckets"].get(i, 0) for i in range(len(ANALYTICS_LATENCY_BUCKETS) + 1)]
+            requests = int(totals["requests"])
+            rows.append({
+                "key": _format_key(key),
+                "requests": requests,
+                "errors": int(totals["errors"]),
+                "cancelled": int(totals["cancelled"]),
+                "errorRate": round(totals["errors"] / requests, 4) if requests else 0.0,
+                "tokens": int(totals["tokens"]),
+                "tokensPerSecond": round(totals["tokens"] / totals["decode_seconds"], 3) if totals["decode_seconds"] else 0.0,
+                "latencyAvgMs": round(totals["latency_seconds"] / requests * 1000, 3) if requests else None,
+                **{
+                    f"latencyP{int(q * 100)}Ms": _ms(metrics.bucket_quantile(ANALYTICS_LATENCY_BUCKETS, counts, q))
+                    for q in (0.5, 0.95, 0.99)
+                },
+            })
+        return rows
+
+
+def _format_key(key: object) -> Optional[str]:
+    if isinstance(key, datetime):
+        return key.isoformat()
+    return str(key) if key != "" else None
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+fleet_analytics = FleetAnalytics()
+register_store("fleet_analytics", fleet_analytics.buffered)
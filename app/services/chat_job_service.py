@@ -0,0 +1,168 @@
+"""
+Worker pool processing asynchronous chat jobs.
+
+Job state lives in the ``chat_jobs`` table, so any worker process can claim
+a queued job and any process can answer status polls. Claiming is a single
+atomic UPDATE, so a job is only ever processed once; jobs whose worker died
+mid-run (their lease, renewed while the job runs, lapsed) are failed rather
+than retried, so a reconnect or retry can never cause a second inference.
+"""
+import asyncio
+import logging
+import uuid
+import weakref
+from typing import List, Optional
+
+from app.core.config import get_settings
+from app.core.database import async_session_maker
+from app.domain.models import ChatJob
+from app.repositories.chat_job_repository import ChatJobRepository
+from app.repositories.chat_repository import ChatRepository
+from app.repositories.device_repository import DeviceRepository
+from app.services.chat_service import ChatService
+from app.services.device_service import DeviceService
+
+logger = logging.getLogger(__name__)
+
+
+class ChatJobWorkerPool:
+    """Asyncio workers that claim and run queued chat jobs."""
+    
+    def __init__(self):
+        self.settings = get_settings()
+        self._tasks: List[asyncio.Task] = []
+        self._running: set = set()
+        self._stopping = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self._finished: "weakref.WeakValueDictionary[uuid.UUID, asyncio.Event]" = weakref.WeakValueDictionary()
+    
+    def start(self) -> None:
+        """Start worker tasks on the running event loop."""
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"chat-job-worker-{i}")
+            for i in range(self.settings.chat_job_workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._reaper(), name="chat-job-reaper"))
+    
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Stop claiming jobs and let in-flight jobs finish for up to ``timeout`` seconds."""
+        self._stopping = True
+        for task in self._tasks:
+            if task not in self._running:
+                task.cancel()
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=timeout)
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+    
+    def notify_submitted(self) -> None:
+        """Wake idle workers in this process after a submit."""
+        if self._wakeup:
+            self._wakeup.set()
+    
+    async def wait_for_update(self, job_id: uuid.UUID, timeout: float) -> None:
+        """Wait until a job finishes in this process, or ``timeout`` elapses."""
+        event = self._finished.get(job_id)
+        if event is None:
+            event = asyncio.Event()
+            self._finished[job_id] = event
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    
+    async def _worker(self) -> None:
+        task = asyncio.current_task()
+        while not self._stopping:
+            try:
+                async with async_session_maker() as db:
+                    job = await ChatJobRepository(db).claim_next(self.settings.chat_job_lease_seconds)
+            except Exception:
+                logger.exception("Failed to claim chat job")
+                job = None
+            
+            if job is None:
+                # Idle: wait for a local submit, or poll for jobs queued by other processes
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.settings.chat_job_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            self._running.add(task)
+            try:
+                await self._process(job)
+            finally:
+                self._running.discard(task)
+    
+    async def _process(self, job: ChatJob) -> None:
+        status, result, error = "failed", None, None
+        heartbeat = asyncio.create_task(self._heartbeat(job.id), name=f"chat-job-heartbeat-{job.id}")
+        try:
+            async with async_session_maker() as db:
+                # Chosen now rather than at submit: devices may have come and gone since
+                model = job.request.get("model")
+                device_service = DeviceService(DeviceRepository(db))
+                device_id = await device_service.resolve_device(job.user_id, job.device_id, model)
+                hedge_devices = None
+                if job.request.get("hedge") and self.settings.hedging_enabled:
+                    hedge_devices = await device_service.hedge_candidates(job.user_id, device_id, model)
+                chat_service = ChatService(ChatRepository(db))
+                response = await chat_service.send_message(
+                    user_id=job.user_id,
+                    message=job.request["message"],
+                    device_id=device_id,
+                    images=job.request.get("images") or None,
+                    debug=job.request.get("debug", False),
+                    hedge_devices=hedge_devices,
+                    model=model
+                )
+            status, result = "succeeded", response.model_dump(mode="json")
+        except Exception as e:
+            logger.exception("Chat job %s failed", job.id)
+            error = str(e) or type(e).__name__
+        finally:
+            heartbeat.cancel()
+        
+        try:
+            async with async_session_maker() as db:
+                finished = await ChatJobRepository(db).finish(job.id, status, result=result, error=error)
+            if not finished:
+                logger.warning("Chat job %s was no longer running; %s result discarded", job.id, status)
+        except Exception:
+            logger.exception("Failed to record result of chat job %s", job.id)
+        
+        event = self._finished.get(job.id)
+        if event is not None:
+            event.set()
+    
+    async def _heartbeat(self, job_id: uuid.UUID) -> None:
+        """Keep renewing a job's lease while this worker is still running it."""
+        lease = self.settings.chat_job_lease_seconds
+        while True:
+            await asyncio.sleep(max(1.0, lease / 3))
+            try:
+                async with async_session_maker() as db:
+                    if not await ChatJobRepository(db).renew(job_id, lease):
+                        return
+            except Exception:
+                logger.exception("Failed to renew lease of chat job %s", job_id)
+    
+    async def _reaper(self) -> None:
+        """Periodically fail jobs whose lease expired (their worker died)."""
+        while True:
+            await asyncio.sleep(max(1.0, self.settings.chat_job_lease_seconds / 4))
+            try:
+                async with async_session_maker() as db:
+                    expired = await ChatJobRepository(db).fail_expired()
+                for job_id in expired:
+                    logger.warning("Chat job %s lease expired; marked failed", job_id)
+            except Exception:
+                logger.exception("Failed to reap expired chat jobs")
+
+
+chat_job_pool = ChatJobWorkerPool()
@@ -1,30 +1,54 @@
 """
 Chat service with AI response generation.
 """
-import asyncio
-import random
 from typing import List, Optional
+import asyncio
+import time
 import uuid
 
+from app.core import metrics
 from app.repositories.chat_repository import ChatRepository
 from app.schemas.chat import ChatMessageCreate, ChatMessageResponse, ChatResponse
+from app.services.inference_service import InferenceService, InferenceResult
+from app.services.retrieval import Snippet, history_index
+from app.services.tokenizer import count_tokens
+from app.services.usage_service import usage_recorder
+from app.services.analytics_service import fleet_analytics
+from app.services.thumbnail_service import thumbnailer
+
+
+SYSTEM_PROMPT = (
+    "You are a helpful AI assistant running on an edge device. Provide concise and accurate "
+    "responses while highlighting the benefits of edge computing."
+)
 
 
 class ChatService:
-    """Chat service with mock AI responses."""
+    """Chat service dispatching prompts to the inference service."""
     
-    def __init__(self, chat_repo: ChatRepository):
+    def __init__(self, chat_repo: ChatRepository, inference: Optional[InferenceService] = None):
         self.chat_repo = chat_repo
+        self.inference = inference or InferenceService()
     
     async def send_message(
         self, 
         user_id: uuid.UUID, 
         message: str, 
-        device_id: Optional[str] = None,
+        device_id: str,
         images: Optional[List[str]] = None,
-        debug: bool = False
+        debug: bool = False,
+        hedge_devices: Optional[List[str]] = None,
+        model: Optional[str] = None
     ) -> ChatResponse:
-        """Send a message and generate AI response."""
+        """Send a message and generate AI response.
+        
+        With ``hedge_devices`` the turn may be re-sent to one of them if the
+        primary device is slow to produce its first token. Earlier messages
+        similar to this one (retrieved before it is stored) are added to the
+        prompt as context.
+        """
+        snippets = await history_index.search(user_id, message)
+        prompt = self._build_prompt(message, snippets)
         
         # Create user message
         user_message_data = ChatMessageCreate(
@@ -37,24 +61,56 @@ class ChatService:
         )
         
         user_message = await self.chat_repo.create(user_message_data)
+        history_index.add(
+            user_id, user_message.id, user_message.conversation_id, "user", message, user_message.created_at
+        )
+        if images:
+            thumbnailer.submit(images)
         
-        # Simulate AI processing delay
-        await asyncio.sleep(0.5 + random.random() * 1.5)
+        # Run inference on the device
+        started = time.perf_counter()
+        try:
+            if hedge_devices:
+                result = await self.inference.generate_hedged(device_id, hedge_devices, prompt, images, model)
+            else:
+                result = await self.inference.generate(device_id, prompt, images, model=model)
+        except asyncio.CancelledError:
+            # Client went away: no assistant reply is stored, only a compact marker
+            metrics.chat_turns_abandoned.inc(device=device_id)
+            fleet_analytics.record(user_id, device_id, "cancelled", time.perf_counter() - started)
+            await asyncio.shield(self.chat_repo.mark_abandoned(user_message.id))
+            raise
+        except Exception:
+            fleet_analytics.record(user_id, device_id, "error", time.perf_counter() - started)
+            raise
         
-        # Generate mock AI response
-        ai_response = self._generate_mock_response(message, images, debug)
+        prompt_tokens = count_tokens(SYSTEM_PROMPT, result.model) + count_tokens(prompt, result.model)
+        usage_recorder.record(user_id, result.device_id, result.model, prompt_tokens, result.tokens_generated)
+        fleet_analytics.record(
+            user_id,
+            result.device_id,
+            "ok",
+            time.perf_counter() - started,
+            tokens=result.tokens_generated,
+            decode_seconds=(result.tokens_generated - 1) / result.tokens_per_second if result.tokens_per_second else 0.0
+        )
         
-        # Create AI message
+        # Create AI message, attributed to the device that answered (a hedge may have won)
+        # but kept in the conversation the turn started in
         ai_message_data = ChatMessageCreate(
             user_id=user_id,
-            device_id=device_id,
+            device_id=result.device_id,
+            conversation_id=user_message.conversation_id,
             role="assistant",
-            content=ai_response["content"],
+            content=result.content,
             images=[],
-            debug=ai_response["debug"] if debug else None
+            debug=self._build_debug_info(prompt_tokens, images, result, snippets) if debug else None
         )
         
         ai_message = await self.chat_repo.create(ai_message_data)
+        history_index.add(
+            user_id, ai_message.id, ai_message.conversation_id, "assistant", result.content, ai_message.created_at
+        )
         
         return ChatResponse(
             userMessage=ChatMessageResponse(
@@ -63,6 +119,8 @@ class ChatService:
                 content=user_message.content,
                 images=user_message.images,
                 debug=user_message.debug,
+                status=user_message.status,
+                conversationId=user_message.conversation_id,
                 createdAt=user_message.created_at
             ),
             aiMessage=ChatMessageResponse(
@@ -71,45 +129,55 @@ class ChatService:
                 content=ai_message.content,
                 images=ai_message.images,
                 debug=ai_message.debug,
+                status=ai_message.status,
+                conversationId=ai_message.conversation_id,
                 createdAt=ai_message.created_at
             )
         )
     
-    def _generate_mock_response(self, message: str, images: Optional[List[str]] = None, debug: bool = False):
-        """Generate a mock AI response."""
-        responses = [
-            "I'm processing your request on the edge device. The model is analyzing your input...",
-            "Based on the data processed locally, here's what I found...",
-            "Running inference on the edge hardware. This keeps your data private and secure.",
-            "The edge AI model has completed processing. Here are the results...",
-            "Processing complete. The advantage of edge computing is the low latency you're experiencing."
-        ]
-        
-        content = random.choice(responses)
-        
-        if images:
-            content += f" I can see you've shared {len(images)} image(s) with me."
-        
-        debug_info = None
-        if debug:
-            debug_info = {
-                "systemPrompt": "You are a helpful AI assistant running on an edge device. Provide concise and accurate responses while highlighting the benefits of edge computing.",
-                "modelInputs": {
-                    "temperature": 0.7,
-                    "max_tokens": 150,
-                    "prompt_tokens": len(message),
-                    "image_count": len(images) if images else 0
-                },
-                "modelOutputs": {
-                    "tokens_generated": random.randint(20, 100),
-                    "confidence": 0.85 + random.random() * 0.15
-                },
-                "processingTime": random.randint(200, 800),
-                "device": {
-                    "gpu_usage": random.randint(0, 80),
-                    "memory_usage": random.randint(30, 70),
-                    "temperature": random.randint(35, 55)
-                }
+    def _build_prompt(self, message: str, snippets: List[Snippet]) -> str:
+        """The message, preceded by any retrieved earlier messages."""
+        if not snippets:
+            return message
+        context = "\n".join(f"- {snippet.role}: {snippet.text}" for snippet in snippets)
+        return f"Relevant earlier messages:\n{context}\n\n{message}"
+    
+    def _build_debug_info(
+        self,
+        prompt_tokens: int,
+        images: Optional[List[str]],
+        result: InferenceResult,
+        snippets: List[Snippet]
+    ) -> dict:
+        """Build the debug payload from measured inference timings."""
+        return {
+            "systemPrompt": SYSTEM_PROMPT,
+            "modelInputs": {
+                "temperature": 0.7,
+                "max_tokens": 150,
+                "prompt_tokens": prompt_tokens,
+                "image_count": len(images) if images else 0
+            },
+            "model": {
+                "name": result.model,
+                "variant": result.model_variant,
+                "cold_start": result.model_load_ms > 0,
+                "load_ms": result.model_load_ms
+            },
+            "modelOutputs": {
+                "tokens_generated": result.tokens_generated,
+                "tokens_per_second": result.tokens_per_second
+            },
+            "retrieval": [
+                {"messageId": str(snippet.message_id), "role": snippet.role, "score": snippet.score}
+                for snippet in snippets
+            ],
+            "processingTime": result.processing_time_ms,
+            "device": {
+                "id": result.device_id,
+                "queue_depth": result.queue_depth,
+                "queue_wait_ms": result.queue_wait_ms,
+                "time_to_first_token_ms": result.time_to_first_token_ms,
+                "hedged": result.hedged
             }
-        
-        return {"content": content, "debug": debug_info}
\ No newline at end of file
+        }
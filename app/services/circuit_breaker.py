@@ -0,0 +1,309 @@
+"""
+Per-device circuit breakers.
+
+Every inference outcome on a device is recorded in its breaker. A closed
+breaker trips open when the device fails ``breaker_consecutive_failures``
+times in a row, or when at least ``breaker_failure_rate`` of the last
+``breaker_window_seconds`` of requests failed (given ``breaker_min_requests``).
+Only device faults count: errors reported by the device, timeouts and lost
+connections, not cancelled or rejected requests.
+
+While open, the device is left out of routing and requests that name it fail
+immediately instead of waiting out a timeout. The device's row is marked
+``unhealthy`` so other workers stop routing to it too. After a cool-down
+(``breaker_open_seconds``, doubling on each consecutive trip up to
+``breaker_max_open_seconds``) the prober moves the breaker to half-open and
+sends the device cheap status requests. ``breaker_close_after`` successful
+probes (or trial requests) close it and mark the device ``connected`` again;
+a failure re-opens it.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.database import async_session_maker
+from app.core.device_protocol import DeviceError
+from app.core.memory import register_store
+from app.repositories.device_repository import DeviceRepository
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Device.status while a breaker is open
+UNHEALTHY = "unhealthy"
+
+# Failures that say something about the device (not the request or the caller)
+DEVICE_FAULTS = (DeviceError, asyncio.TimeoutError, OSError)
+
+
+class DeviceUnavailable(DeviceError):
+    """The device's circuit breaker is open."""
+
+    def __init__(self, device_id: str, retry_after: float):
+        super().__init__(f"Device {device_id} is unavailable", "circuit_open")
+        self.device_id = device_id
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Failure tracking and state for one device."""
+
+    def __init__(self, device_id: str):
+        self.device_id = device_id
+        self.settings = get_settings()
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.open_seconds = self.settings.breaker_open_seconds
+        self.consecutive_failures = 0
+        self.half_open_successes = 0
+        self.trials = 0  # Trial requests in flight while half-open
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a request may be sent to the device now."""
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN:
+            return self.trials < self.settings.breaker_half_open_requests
+        return False
+
+    def failure_rate(self) -> Tuple[int, float]:
+        """Requests and failure rate over the window."""
+        cutoff = time.monotonic() - self.settings.breaker_window_seconds
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
+        if not self._outcomes:
+            return 0, 0.0
+        failures = sum(1 for _, failed in self._outcomes if failed)
+        return len(self._outcomes), failures / len(self._outcomes)
+
+    def record(self, failed: bool) -> Optional[str]:
+        """Record an outcome; returns the new state if it changed."""
+        if self.state == OPEN:
+            return None
+        if self.state == HALF_OPEN:
+            if failed:
+                return self._open(backoff=True)
+            self.half_open_successes += 1
+            if self.half_open_successes >= self.settings.breaker_close_after:
+                return self._close()
+            return None
+
+        self._outcomes.append((time.monotonic(), failed))
+        self.consecutive_failures = self.consecutive_failures + 1 if failed else 0
+        if not failed:
+            return None
+        requests, rate = self.failure_rate()
+        if (
+            self.consecutive_failures >= self.settings.breaker_consecutive_failures
+            or (requests >= self.settings.breaker_min_requests and rate >= self.settings.breaker_failure_rate)
+        ):
+            return self._open(backoff=False)
+        return None
+
+    def half_open(self) -> str:
+        self.state = HALF_OPEN
+        self.half_open_successes = 0
+        self.trials = 0
+        return self.state
+
+    def _open(self, backoff: bool) -> str:
+        if backoff:
+            self.open_seconds = min(self.open_seconds * 2, self.settings.breaker_max_open_seconds)
+        else:
+            self.open_seconds = self.settings.breaker_open_seconds
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.trials = 0
+        return self.state
+
+    def _close(self) -> str:
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.open_seconds = self.settings.breaker_open_seconds
+        self._outcomes.clear()
+        return self.state
+
+
+class DeviceBreakers:
+    """Circuit breakers for all devices, their prober and Device.status updates."""
+
+    def __init__(self):
+        self.settings = get_settings()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._writes: Set[asyncio.Task] = set()
+
+    def get(self, device_id: str) -> CircuitBreaker:
+        """The device's breaker, created on first use (only for devices in the ``devices`` table)."""
+        breaker = self._breakers.get(device_id)
+        if breaker is None:
+            breaker = self._breakers[device_id] = CircuitBreaker(device_id)
+        return breaker
+
+    def forget(self, device_id: str) -> None:
+        """Drop the breaker of a deleted device."""
+        self._breakers.pop(device_id, None)
+        metrics.device_circuit_state.remove(device=device_id)
+
+    def breakers(self) -> Dict[str, CircuitBreaker]:
+        """A copy of every device's breaker, by device ID."""
+        return dict(self._breakers)
+
+    def state(self, device_id: str) -> str:
+        breaker = self._breakers.get(device_id)
+        return breaker.state if breaker else CLOSED
+
+    def available(self, device_id: str) -> bool:
+        """Whether routing may pick the device (its breaker is not open)."""
+        if not self.settings.breaker_enabled:
+            return True
+        breaker = self._breakers.get(device_id)
+        return breaker is None or breaker.state != OPEN
+
+    def check(self, device_id: str) -> None:
+        """Raise ``DeviceUnavailable`` if the device's circuit is open."""
+        if not self.available(device_id):
+            metrics.device_circuit_rejected.inc(device=device_id)
+            raise DeviceUnavailable(device_id, self._breakers[device_id].retry_after())
+
+    def acquire(self, device_id: str) -> bool:
+        """Admit a request to the device, or raise ``DeviceUnavailable``.
+
+        Returns whether the request is a half-open trial (pass it to ``release``).
+        """
+        if not self.settings.breaker_enabled:
+            return False
+        breaker = self._breakers.get(device_id)
+        if breaker is None or breaker.state == CLOSED:
+            return False
+        if not breaker.allow():
+            metrics.device_circuit_rejected.inc(device=device_id)
+            raise DeviceUnavailable(device_id, breaker.retry_after())
+        breaker.trials += 1
+        return True
+
+    def release(self, device_id: str, trial: bool, error: Optional[BaseException]) -> None:
+        """Record how a request admitted by ``acquire`` ended.
+
+        Cancellations and errors that are not device faults are not counted.
+        """
+        if not self.settings.breaker_enabled:
+            return
+        breaker = self.get(device_id)
+        if trial:
+            breaker.trials = max(0, breaker.trials - 1)
+        if isinstance(error, (asyncio.CancelledError, DeviceUnavailable)):
+            return
+        if error is not None and not isinstance(error, DEVICE_FAULTS):
+            return
+        self._transition(breaker, breaker.record(error is not None))
+
+    def snapshot(self) -> List[dict]:
+        """State of every breaker that is not closed, or has recent outcomes."""
+        rows = []
+        for device_id, breaker in self._breakers.items():
+            requests, rate = breaker.failure_rate()
+            if breaker.state == CLOSED and not requests:
+                continue
+            rows.append({
+                "deviceId": device_id,
+                "state": breaker.state,
+                "requests": requests,
+                "failureRate": round(rate, 4),
+                "retryAfter": round(breaker.retry_after(), 3) if breaker.state == OPEN else None,
+            })
+        return rows
+
+    def _transition(self, breaker: CircuitBreaker, state: Optional[str]) -> None:
+        if state is None:
+            return
+        device_id = breaker.device_id
+        logger.info("Circuit for device %s is now %s", device_id, state)
+        metrics.device_circuit_state.set(STATE_VALUES[state], device=device_id)
+        metrics.device_circuit_transitions.inc(device=device_id, state=state)
+        if state == OPEN:
+            self._write_status(device_id, "connected", UNHEALTHY)
+        elif state == CLOSED:
+            self._write_status(device_id, UNHEALTHY, "connected")
+
+    def _write_status(self, device_id: str, expected: str, status: str) -> None:
+        """Update Device.status off the request path (only from ``expected``, so user changes win)."""
+        async def write() -> None:
+            try:
+                async with async_session_maker() as db:
+                    await DeviceRepository(db).transition_status(device_id, expected, status)
+            except Exception:
+                logger.warning("Could not mark device %s %s", device_id, status, exc_info=True)
+
+        task = asyncio.create_task(write())
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    def start(self, backend) -> None:
+        if self.settings.breaker_enabled:
+            self._task = asyncio.create_task(self._run(backend), name="device-prober")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    async def _run(self, backend) -> None:
+        while True:
+            try:
+                await self.adopt_unhealthy()
+                await self.probe(backend)
+            except Exception:
+                logger.exception("Device probing failed")
+            await asyncio.sleep(self.settings.breaker_probe_interval)
+
+    async def adopt_unhealthy(self) -> None:
+        """Open breakers for devices marked unhealthy by another worker (or before a restart)."""
+        async with async_session_maker() as db:
+            device_ids = await DeviceRepository(db).ids_with_status(UNHEALTHY)
+        for device_id in device_ids:
+            breaker = self.get(device_id)
+            if breaker.state == CLOSED:
+                breaker._open(backoff=False)
+                metrics.device_circuit_state.set(STATE_VALUES[OPEN], device=device_id)
+
+    async def probe(self, backend) -> None:
+        """Half-open every breaker whose cool-down is over and probe its device."""
+        due = [
+            breaker for breaker in self._breakers.values()
+            if breaker.state == HALF_OPEN or (breaker.state == OPEN and breaker.retry_after() == 0)
+        ]
+        for breaker in due:
+            if breaker.state == OPEN:
+                self._transition(breaker, breaker.half_open())
+        if due:
+            await asyncio.gather(*(self._probe_one(backend, breaker) for breaker in due))
+
+    async def _probe_one(self, backend, breaker: CircuitBreaker) -> None:
+        error: Optional[BaseException] = None
+        try:
+            await asyncio.wait_for(backend.status(breaker.device_id), self.settings.breaker_probe_timeout)
+        except DEVICE_FAULTS as exc:
+            error = exc
+        metrics.device_circuit_probes.inc(device=breaker.device_id, outcome="error" if error else "ok")
+        if breaker.state == HALF_OPEN:
+            self._transition(breaker, breaker.record(error is not None))
+
+
+device_breakers = DeviceBreakers()
+register_store("device_breakers", device_breakers.breakers)
@@ -2,13 +2,27 @@
 Device service with stubbed device communication.
 """
 import asyncio
+import logging
 import random
-from typing import List
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
 import uuid
 
 from app.repositories.device_repository import DeviceRepository
 from app.schemas.devices import DeviceCreate, DeviceActionResponse, DeviceScanResponse
+from app.core import metrics
 from app.core.config import get_settings
+from app.domain.models import Device
+from app.services.circuit_breaker import UNHEALTHY, device_breakers
+from app.services.inference_service import device_slots
+from app.services.model_residency import model_residency
+
+logger = logging.getLogger(__name__)
+
+FLEET_ACTIONS = {"connect": "connected", "disconnect": "disconnected"}
+
+
+class NoDeviceAvailable(Exception):
+    """A chat turn has no connected device to run on."""
 
 
 class DeviceService:
@@ -20,16 +34,13 @@ class DeviceService:
     
     async def connect_device(self, device_id: str, user_id: uuid.UUID) -> DeviceActionResponse:
         """Connect to a device (stubbed)."""
-        # Simulate connection delay
-        await asyncio.sleep(self.settings.device_connect_timeout)
+        await self._handshake(device_id, "connect")
         
-        # Update device status
-        device = await self.device_repo.update_status(device_id, "connected")
-        if not device:
+        # Update status and owner together
+        devices = await self.device_repo.set_connection([device_id], "connected", user_id)
+        if not devices:
             return DeviceActionResponse(success=False, message="Device not found")
-        
-        # Assign device to user
-        await self.device_repo.assign_to_user(device_id, user_id)
+        model_residency.observe_device(devices[0])
         
         return DeviceActionResponse(message="Device connected successfully")
     
@@ -42,6 +53,81 @@ class DeviceService:
         
         return DeviceActionResponse(message="Device disconnected")
     
+    async def _handshake(self, device_id: str, action: str) -> None:
+        """Talk to the device itself (stubbed: connecting takes ``device_connect_timeout``)."""
+        if action == "connect":
+            await asyncio.sleep(self.settings.device_connect_timeout)
+    
+    async def fleet_operation(
+        self,
+        action: str,
+        device_ids: Sequence[str],
+        user_id: uuid.UUID,
+        concurrency: Optional[int] = None
+    ) -> AsyncIterator[dict]:
+        """Connect or disconnect many devices, yielding a progress event per device.
+        
+        Handshakes run concurrently, at most ``concurrency`` at a time. Devices
+        whose handshake finished while the previous batch was being written are
+        written together in one UPDATE (status and, for connect, owner), so a
+        rack of boards costs a handful of statements rather than two per device.
+        The final event summarises the operation.
+        """
+        status = FLEET_ACTIONS[action]
+        device_ids = list(dict.fromkeys(device_ids))
+        known = {device.id for device in await self.device_repo.get_many(device_ids)}
+        counts = {"ok": 0, "failed": 0}
+        
+        def event(device_id: str, outcome: str, error: Optional[str] = None) -> dict:
+            counts[outcome] += 1
+            metrics.fleet_operation_devices.inc(action=action, outcome=outcome)
+            return {"deviceId": device_id, "status": status if outcome == "ok" else "failed", "error": error}
+        
+        for device_id in device_ids:
+            if device_id not in known:
+                yield event(device_id, "failed", "Device not found")
+        
+        semaphore = asyncio.Semaphore(concurrency or self.settings.fleet_concurrency)
+        done: asyncio.Queue[Tuple[str, Optional[str]]] = asyncio.Queue()
+        
+        async def handshake(device_id: str) -> None:
+            async with semaphore:
+                try:
+                    await self._handshake(device_id, action)
+                    done.put_nowait((device_id, None))
+                except Exception as exc:
+                    logger.warning("Fleet %s failed for %s", action, device_id, exc_info=True)
+                    done.put_nowait((device_id, str(exc) or type(exc).__name__))
+        
+        tasks = [asyncio.create_task(handshake(device_id)) for device_id in device_ids if device_id in known]
+        remaining = len(tasks)
+        ready: List[str] = []
+        try:
+            while remaining:
+                device_id, error = await done.get()
+                remaining -= 1
+                if error is not None:
+                    yield event(device_id, "failed", error)
+                else:
+                    ready.append(device_id)
+                # Group-commit whatever finished while the last batch was written
+                if ready and (done.empty() or len(ready) >= self.settings.fleet_batch_size):
+                    batch, ready = ready, []
+                    updated = await self.device_repo.set_connection(
+                        batch, status, user_id if action == "connect" else None
+                    )
+                    for device in updated:
+                        if action == "connect":
+                            model_residency.observe_device(device)
+                        yield event(device.id, "ok")
+                    for device_id in set(batch) - {device.id for device in updated}:
+                        yield event(device_id, "failed", "Device not found")
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        yield {"done": True, "action": action, "succeeded": counts["ok"], "failed": counts["failed"]}
+    
     async def scan_for_devices(self, user_id: uuid.UUID) -> DeviceScanResponse:
         """Scan for available devices (stubbed)."""
         # Simulate scanning delay
@@ -55,6 +141,50 @@ class DeviceService:
             message="Scan completed"
         )
     
+    async def _connected_devices(self, user_id: uuid.UUID, model: str) -> List[Device]:
+        """User's connected devices, those with ``model`` resident first, then by queue depth."""
+        devices = [
+            device for device in await self.device_repo.get_user_devices(user_id)
+            if device.status == "connected" and device_breakers.available(device.id)
+        ]
+        for device in devices:
+            model_residency.observe_device(device)
+        # Devices too small for every variant of the model are not eligible
+        devices = [device for device in devices if model_residency.fits(device.id, model)]
+        return sorted(
+            devices,
+            key=lambda device: (not model_residency.is_resident(device.id, model), device_slots.depth(device.id))
+        )
+    
+    async def choose_device(self, user_id: uuid.UUID, model: Optional[str] = None) -> Optional[str]:
+        """Pick the user's best device for ``model`` when the client did not choose one."""
+        devices = await self._connected_devices(user_id, model or self.settings.default_model)
+        return devices[0].id if devices else None
+    
+    async def resolve_device(self, user_id: uuid.UUID, device_id: Optional[str], model: Optional[str] = None) -> str:
+        """The device a chat turn runs on: the one requested, or the user's best connected device.
+        
+        Raises ``NoDeviceAvailable`` if the requested device does not exist or
+        is not connected, or if the user has no eligible connected device.
+        A device whose circuit is open is returned; the breaker rejects it.
+        """
+        if device_id:
+            device = await self.device_repo.get_by_id(device_id)
+            if device is None:
+                raise NoDeviceAvailable(f"Device {device_id} not found")
+            if device.status not in ("connected", UNHEALTHY):
+                raise NoDeviceAvailable(f"Device {device_id} is not connected")
+            return device.id
+        chosen = await self.choose_device(user_id, model)
+        if chosen is None:
+            raise NoDeviceAvailable("No connected device available; connect a device first")
+        return chosen
+    
+    async def hedge_candidates(self, user_id: uuid.UUID, primary_id: str, model: Optional[str] = None) -> List[str]:
+        """Other connected devices of the user that a chat turn may be hedged to."""
+        devices = await self._connected_devices(user_id, model or self.settings.default_model)
+        return [device.id for device in devices if device.id != primary_id]
+    
     async def initialize_mock_devices(self) -> None:
         """Initialize mock devices in the database."""
         mock_devices = [
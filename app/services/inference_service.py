@@ -0,0 +1,448 @@
+"""
+Inference service dispatching prompts to edge devices.
+"""
+import asyncio
+import random
+import time
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+
+from app.core.config import get_settings
+from app.core.database import async_session_maker
+from app.core.device_protocol import (
+    MAX_MESSAGE_BYTES, DeviceError, InvalidRequest, MessageTooLarge, encode, image_message, read_message
+)
+from app.core.memory import register_store
+from app.core import metrics
+from app.core.tracing import span
+from app.core.uploads import media_sha256, media_store, sniff_image_type
+from app.repositories.device_repository import DeviceRepository
+from app.services.circuit_breaker import device_breakers
+from app.services.model_residency import model_residency
+from app.services.tokenizer import count_tokens
+
+
+@dataclass
+class InferenceResult:
+    """Generated content plus timings measured on the request path."""
+    content: str
+    device_id: str
+    tokens_generated: int
+    queue_depth: int
+    queue_wait_ms: float
+    time_to_first_token_ms: float
+    processing_time_ms: float
+    tokens_per_second: float
+    hedged: bool = False
+    model: Optional[str] = None
+    model_variant: Optional[str] = None
+    model_load_ms: float = 0.0  # Non-zero on a cold start
+
+
+class DeviceSlots:
+    """Per-device concurrency slots so one board is not oversubscribed.
+    
+    Callers only use IDs of devices in the ``devices`` table, so entries (and
+    their metric labels) are bounded by the fleet, not by client input.
+    """
+
+    def __init__(self):
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._depth: Dict[str, int] = {}
+
+    def semaphore(self, device_id: str) -> asyncio.Semaphore:
+        """Get (or lazily create) the semaphore for a device."""
+        semaphore = self._semaphores.get(device_id)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(get_settings().device_max_concurrency)
+            self._semaphores[device_id] = semaphore
+        return semaphore
+
+    def depth(self, device_id: str) -> int:
+        """Requests currently waiting for or holding a slot on a device."""
+        return self._depth.get(device_id, 0)
+
+    def enter(self, device_id: str) -> int:
+        """Record a request joining the device queue."""
+        depth = self._depth.get(device_id, 0) + 1
+        self._depth[device_id] = depth
+        metrics.device_queue_depth.set(depth, device=device_id)
+        return depth
+
+    def leave(self, device_id: str) -> None:
+        """Record a request leaving the device queue."""
+        depth = max(0, self._depth.get(device_id, 0) - 1)
+        self._depth[device_id] = depth
+        metrics.device_queue_depth.set(depth, device=device_id)
+
+    def forget(self, device_id: str) -> None:
+        """Drop the slots of a deleted device."""
+        self._semaphores.pop(device_id, None)
+        self._depth.pop(device_id, None)
+        metrics.device_queue_depth.remove(device=device_id)
+
+
+device_slots = DeviceSlots()
+register_store("device_slots", lambda: device_slots)
+
+
+class MockInferenceBackend:
+    """Stand-in for on-device inference that streams canned responses."""
+
+    responses = [
+        "I'm processing your request on the edge device. The model is analyzing your input...",
+        "Based on the data processed locally, here's what I found...",
+        "Running inference on the edge hardware. This keeps your data private and secure.",
+        "The edge AI model has completed processing. Here are the results...",
+        "Processing complete. The advantage of edge computing is the low latency you're experiencing."
+    ]
+
+    def __init__(self):
+        self.settings = get_settings()
+
+    async def load_model(self, device_id: str, variant: str) -> None:
+        """Simulate loading model weights onto the device."""
+        await asyncio.sleep(self.settings.mock_model_load_seconds)
+
+    async def stream(
+        self,
+        device_id: str,
+        prompt: str,
+        images: Optional[List[str]] = None
+    ) -> AsyncIterator[str]:
+        """Yield response tokens after a simulated prefill delay."""
+        await asyncio.sleep(random.uniform(
+            self.settings.mock_inference_delay_min,
+            self.settings.mock_inference_delay_max
+        ))
+
+        content = random.choice(self.responses)
+        if images:
+            content += f" I can see you've shared {len(images)} image(s) with me."
+
+        interval = 1.0 / self.settings.mock_tokens_per_second if self.settings.mock_tokens_per_second > 0 else 0.0
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            yield word if i == 0 else " " + word
+            await asyncio.sleep(interval)
+
+    async def status(self, device_id: str) -> dict:
+        """Simulated devices are always healthy."""
+        return {"id": device_id}
+
+
+def device_image(url: str) -> dict:
+    """An image reference from chat history as a device receives it (blocking: reads the media store)."""
+    sha256 = media_sha256(url)
+    if sha256 is not None:
+        try:
+            data = media_store.read(sha256)
+        except FileNotFoundError:
+            raise InvalidRequest(f"Image {sha256} is missing from the media store") from None
+        return image_message(sniff_image_type(data) or "application/octet-stream", data)
+    # Messages stored before the media store inlined images as data URLs
+    header, _, payload = url.partition(",")
+    if header.startswith("data:") and header.endswith(";base64"):
+        return {"contentType": header[len("data:"):-len(";base64")], "data": payload}
+    raise InvalidRequest("Unsupported image reference")
+
+
+def generate_request(prompt: str, images: List[str]) -> bytes:
+    """The encoded ``generate`` request with its images inlined (blocking)."""
+    return encode({"op": "generate", "prompt": prompt, "images": [device_image(url) for url in images]})
+
+
+class NetworkInferenceBackend:
+    """Runs inference on devices over the device protocol (``app.core.device_protocol``)."""
+
+    def __init__(self):
+        self.settings = get_settings()
+        self._addresses: Dict[str, Tuple[str, int, float]] = {}
+
+    async def address(self, device_id: str) -> Tuple[str, int]:
+        """Host and port of a device, from its row (cached for ``device_address_ttl``)."""
+        cached = self._addresses.get(device_id)
+        if cached is not None and time.monotonic() - cached[2] < self.settings.device_address_ttl:
+            return cached[0], cached[1]
+        async with async_session_maker() as db:
+            device = await DeviceRepository(db).get_by_id(device_id)
+        if device is None:
+            raise DeviceError(f"Unknown device {device_id}", "unknown_device")
+        port = int((device.specs or {}).get("port") or self.settings.device_port)
+        self._addresses[device_id] = (device.ip, port, time.monotonic())
+        return device.ip, port
+
+    async def _request(self, device_id: str, request: bytes) -> AsyncIterator[dict]:
+        """Send one encoded request and yield the device's messages until the final one."""
+        if len(request) > MAX_MESSAGE_BYTES:
+            raise MessageTooLarge(f"Request of {len(request)} bytes exceeds the device protocol limit")
+        host, port = await self.address(device_id)
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, limit=MAX_MESSAGE_BYTES),
+                self.settings.device_io_timeout
+            )
+        except (OSError, asyncio.TimeoutError) as exc:
+            self._addresses.pop(device_id, None)
+            raise DeviceError(f"Cannot reach device {device_id} at {host}:{port}: {exc!r}", "unreachable") from None
+        try:
+            writer.write(request)
+            await writer.drain()
+            while True:
+                message = await read_message(reader, self.settings.device_io_timeout)
+                if message is None:
+                    raise DeviceError(f"Device {device_id} closed the connection", "disconnected")
+                if "error" in message:
+                    raise DeviceError(str(message["error"]), str(message.get("code", "device_error")))
+                yield message
+                if "token" not in message:
+                    return
+        except ConnectionError as exc:
+            raise DeviceError(f"Connection to device {device_id} failed: {exc}", "disconnected") from None
+        finally:
+            writer.close()
+
+    async def load_model(self, device_id: str, variant: str) -> None:
+        """Load model weights onto the device."""
+        async with aclosing(self._request(device_id, encode({"op": "load", "variant": variant}))) as messages:
+            async for _ in messages:
+                pass
+
+    async def stream(
+        self,
+        device_id: str,
+        prompt: str,
+        images: Optional[List[str]] = None
+    ) -> AsyncIterator[str]:
+        """Yield response tokens as the device streams them."""
+        request = await asyncio.to_thread(generate_request, prompt, images or [])
+        async with aclosing(self._request(device_id, request)) as messages:
+            async for message in messages:
+                if "token" in message:
+                    yield message["token"]
+
+    async def status(self, device_id: str) -> dict:
+        """Current telemetry reported by the device."""
+        async with aclosing(self._request(device_id, encode({"op": "status"}))) as messages:
+            async for message in messages:
+                return message
+        return {}
+
+
+InferenceBackend = Union[MockInferenceBackend, NetworkInferenceBackend]
+
+_backend: Optional[InferenceBackend] = None
+
+
+def inference_backend() -> InferenceBackend:
+    """The process-wide backend selected by the ``inference_backend`` setting."""
+    global _backend
+    if _backend is None:
+        _backend = NetworkInferenceBackend() if get_settings().inference_backend == "network" else MockInferenceBackend()
+    return _backend
+
+
+class HedgeBudget:
+    """Caps hedged requests at a fraction of all hedge-eligible requests.
+    
+    Every eligible request deposits ``ratio`` tokens (up to ``burst``) and
+    every hedge spends one, so over time hedges never exceed ``ratio`` of
+    requests, plus a small burst allowance.
+    """
+
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = 0.0
+
+    def deposit(self) -> None:
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class InferenceService:
+    """Runs inference on a device and records queueing and generation metrics."""
+
+    def __init__(self, backend: Optional[InferenceBackend] = None):
+        self.backend = backend or inference_backend()
+        self.settings = get_settings()
+
+    async def generate(
+        self,
+        device_id: str,
+        prompt: str,
+        images: Optional[List[str]] = None,
+        first_token: Optional[asyncio.Event] = None,
+        model: Optional[str] = None
+    ) -> InferenceResult:
+        """Generate a full response, waiting for a free device slot first.
+        
+        The model is loaded first if it is not resident on the device.
+        ``first_token`` (if given) is set as soon as the device streams its first token.
+        """
+        device = device_id
+        model = model or self.settings.default_model
+        model_residency.record_demand(model)
+        # Fails fast (before queueing) when the device's circuit is open
+        trial = device_breakers.acquire(device)
+        error: Optional[BaseException] = None
+        queued_at = time.perf_counter()
+        queue_depth = device_slots.enter(device)
+        try:
+            with span("inference.generate", device=device, queue_depth=queue_depth):
+                semaphore = device_slots.semaphore(device)
+                with span("inference.queue_wait"):
+                    await semaphore.acquire()
+                try:
+                    load_seconds = await model_residency.ensure_loaded(device, model, self.backend)
+                    started = time.perf_counter()
+                    first_token_at = None
+                    tokens: List[str] = []
+                    with span("inference.stream"):
+                        async for token in self.backend.stream(device, prompt, images):
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                                if first_token is not None:
+                                    first_token.set()
+                            tokens.append(token)
+                    finished = time.perf_counter()
+                finally:
+                    semaphore.release()
+        except asyncio.CancelledError as exc:
+            error = exc
+            metrics.device_inference_total.inc(device=device, outcome="cancelled")
+            raise
+        except Exception as exc:
+            error = exc
+            metrics.device_inference_total.inc(device=device, outcome="error")
+            raise
+        finally:
+            device_slots.leave(device)
+            device_breakers.release(device, trial, error)
+
+        content = "".join(tokens)
+        completion_tokens = count_tokens(content, model)
+        first_token_at = first_token_at or finished
+        ttft = first_token_at - started
+        decode_time = finished - first_token_at
+        tokens_per_second = (completion_tokens - 1) / decode_time if completion_tokens > 1 and decode_time > 0 else 0.0
+
+        metrics.device_inference_total.inc(device=device, outcome="ok")
+        metrics.device_time_to_first_token.observe(ttft, device=device)
+        metrics.device_inference_duration.observe(finished - queued_at, device=device)
+        if tokens_per_second:
+            metrics.device_tokens_per_second.observe(tokens_per_second, device=device)
+
+        load_ms = round((load_seconds or 0.0) * 1000, 3)
+        residency = model_residency.resident(device)
+        return InferenceResult(
+            content=content,
+            device_id=device,
+            tokens_generated=completion_tokens,
+            queue_depth=queue_depth,
+            queue_wait_ms=round((started - queued_at) * 1000 - load_ms, 3),
+            time_to_first_token_ms=round(ttft * 1000, 3),
+            processing_time_ms=round((finished - queued_at) * 1000, 3),
+            tokens_per_second=round(tokens_per_second, 3),
+            model=model,
+            model_variant=residency.variant if residency else None,
+            model_load_ms=load_ms
+        )
+    
+    def hedge_delay(self, device_id: str) -> float:
+        """Seconds to wait for a first token before hedging, from the device's TTFT p95."""
+        settings = self.settings
+        if metrics.device_time_to_first_token.count(device=device_id) < settings.hedge_min_samples:
+            return settings.hedge_default_delay
+        p95 = metrics.device_time_to_first_token.quantile(settings.hedge_quantile, device=device_id)
+        return max(settings.hedge_min_delay, p95 or settings.hedge_default_delay)
+    
+    async def generate_hedged(
+        self,
+        device_id: str,
+        alternates: List[str],
+        prompt: str,
+        images: Optional[List[str]] = None,
+        model: Optional[str] = None
+    ) -> InferenceResult:
+        """Generate on ``device_id``, hedging to an alternate device if the first token is late.
+        
+        Whichever device produces a first token first wins; the other request is
+        cancelled (freeing its slot). Hedges are limited by the shared budget.
+        """
+        device = device_id
+        alternates = [
+            alternate for alternate in alternates
+            if alternate != device and device_breakers.available(alternate)
+        ]
+        if not alternates:
+            return await self.generate(device_id, prompt, images, model=model)
+        
+        model = model or self.settings.default_model
+        hedge_budget.deposit()
+        primary_first = asyncio.Event()
+        primary = asyncio.ensure_future(self.generate(device, prompt, images, primary_first, model))
+        runs = {primary: primary_first}
+        try:
+            waiter = asyncio.ensure_future(primary_first.wait())
+            try:
+                await asyncio.wait({primary, waiter}, timeout=self.hedge_delay(device), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiter.cancel()
+            if primary_first.is_set() or primary.done():
+                return await primary
+            
+            if not hedge_budget.try_spend():
+                metrics.inference_hedges.inc(outcome="budget_exhausted")
+                return await primary
+            
+            # Prefer an alternate with the model already loaded, then the shortest queue
+            secondary_device = min(
+                alternates,
+                key=lambda alternate: (not model_residency.is_resident(alternate, model), device_slots.depth(alternate))
+            )
+            secondary_first = asyncio.Event()
+            with span("inference.hedge", primary=device, secondary=secondary_device):
+                secondary = asyncio.ensure_future(self.generate(secondary_device, prompt, images, secondary_first, model))
+                runs[secondary] = secondary_first
+                winner = await self._first_to_respond(runs)
+                for task in runs:
+                    if task is not winner:
+                        task.cancel()
+            
+            metrics.inference_hedges.inc(outcome="won" if winner is secondary else "lost")
+            result = await winner
+            result.hedged = True
+            return result
+        finally:
+            for task in runs:
+                task.cancel()
+    
+    async def _first_to_respond(self, runs: Dict[asyncio.Future, asyncio.Event]) -> asyncio.Future:
+        """Return the run that produces a first token (or completes successfully) first.
+        
+        A run that fails is dropped so the other can still win; if all fail the
+        last error is raised.
+        """
+        pending = dict(runs)
+        while True:
+            waiters = {asyncio.ensure_future(event.wait()): task for task, event in pending.items()}
+            done, _ = await asyncio.wait(set(waiters) | set(pending), return_when=asyncio.FIRST_COMPLETED)
+            for waiter in waiters:
+                waiter.cancel()
+            for task, event in list(pending.items()):
+                if event.is_set() or (task in done and not task.cancelled() and task.exception() is None):
+                    return task
+                if task in done:
+                    pending.pop(task)
+                    if not pending:
+                        return task
+
+
+hedge_budget = HedgeBudget(get_settings().hedge_max_extra_load, get_settings().hedge_budget_burst)
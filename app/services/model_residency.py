@@ -0,0 +1,272 @@
+"""
+Model residency tracking and warm-up scheduling for edge devices.
+
+Loading a model onto a Pi or Jetson takes a long time, so each device keeps
+one model resident and we record which one. Inference loads the requested
+model only when it is not already resident (a cold start). Recent demand per
+model is tracked with exponentially decaying counters, and the warm-up
+scheduler uses idle time to preload the most demanded models onto devices
+that do not have them, so later requests find them warm.
+
+Each model has variants (e.g. quantizations) ordered largest first; the
+largest one that fits the device memory listed in ``Device.specs`` is used.
+"""
+import asyncio
+import logging
+import math
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.memory import register_store
+from app.core.database import async_session_maker
+from app.core.tracing import span
+from app.domain.models import Device
+from app.repositories.device_repository import DeviceRepository
+from app.services.service_registry import service_registry
+
+logger = logging.getLogger(__name__)
+
+_MEMORY_PATTERN = re.compile(r"([\d.]+)\s*([KMGT]?)i?B", re.IGNORECASE)
+_MEMORY_UNITS_MB = {"K": 1 / 1024, "M": 1, "G": 1024, "T": 1024 * 1024, "": 1 / (1024 * 1024)}
+
+
+@dataclass(frozen=True)
+class ModelVariant:
+    """A loadable build of a model and the memory it needs."""
+    name: str
+    memory_mb: int
+
+
+def parse_memory_mb(specs: Optional[dict]) -> Optional[int]:
+    """Parse device memory from specs such as ``{"memory": "4GB RAM"}``."""
+    value = (specs or {}).get("memory")
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = _MEMORY_PATTERN.search(str(value or ""))
+    if not match:
+        return None
+    return int(float(match.group(1)) * _MEMORY_UNITS_MB[match.group(2).upper()])
+
+
+class ModelUnavailable(Exception):
+    """No variant of the requested model fits on the device."""
+
+
+def known_model(model: str) -> bool:
+    """Whether ``model`` is configured (``model_variants`` or a ``model`` service)."""
+    return model in get_settings().model_variants or any(
+        service.name == model for service in service_registry.find("model")
+    )
+
+
+def model_variants(model: str) -> List[ModelVariant]:
+    """Variants of a model, largest first (empty for unknown models).
+
+    ``model`` services in the admin registry (``config.variants``) take
+    precedence over the ``model_variants`` setting.
+    """
+    variants = None
+    for service in service_registry.find("model"):
+        if service.name == model and service.config:
+            variants = service.config.get("variants")
+            break
+    if variants is None:
+        variants = get_settings().model_variants.get(model)
+    if not variants:
+        return []
+    parsed = [ModelVariant(name=variant["name"], memory_mb=int(variant.get("memory_mb", 0))) for variant in variants]
+    return sorted(parsed, key=lambda variant: variant.memory_mb, reverse=True)
+
+
+def pick_variant(model: str, memory_mb: Optional[int]) -> Optional[ModelVariant]:
+    """Largest variant that fits in ``memory_mb`` (smallest if memory is unknown)."""
+    variants = model_variants(model)
+    if not variants:
+        return None
+    if memory_mb is None:
+        return variants[-1]
+    budget = memory_mb * get_settings().model_memory_headroom
+    for variant in variants:
+        if variant.memory_mb <= budget:
+            return variant
+    return None
+
+
+@dataclass
+class Residency:
+    """The model loaded (or loading) on a device."""
+    model: str
+    variant: str
+    loaded_at: float
+    last_used: float
+    loading: bool = False
+
+
+class ModelResidency:
+    """Per-device resident model, demand counters and load bookkeeping."""
+
+    def __init__(self):
+        self.settings = get_settings()
+        self._resident: Dict[str, Residency] = {}
+        self._memory_mb: Dict[str, Optional[int]] = {}
+        self._last_active: Dict[str, float] = {}
+        self._demand: Dict[str, float] = {}
+        self._demand_updated: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def observe_device(self, device: Device) -> None:
+        """Remember a device's memory from its specs."""
+        self._memory_mb[device.id] = parse_memory_mb(device.specs)
+
+    def resident(self, device_id: str) -> Optional[Residency]:
+        return self._resident.get(device_id)
+
+    def is_resident(self, device_id: str, model: str) -> bool:
+        residency = self._resident.get(device_id)
+        return residency is not None and residency.model == model and not residency.loading
+
+    def fits(self, device_id: str, model: str) -> bool:
+        """Whether ``model`` is resident on the device or a variant of it fits its memory."""
+        return self.is_resident(device_id, model) or pick_variant(model, self._memory_mb.get(device_id)) is not None
+
+    def idle_for(self, device_id: str) -> float:
+        """Seconds since the device last served or loaded anything."""
+        return time.monotonic() - self._last_active.get(device_id, 0.0)
+
+    def record_demand(self, model: str) -> None:
+        """Count a request for ``model`` in its decaying demand counter."""
+        self._demand[model] = self.demand(model) + 1.0
+        self._demand_updated[model] = time.monotonic()
+
+    def demand(self, model: str) -> float:
+        """Recent requests for ``model``, halving every ``model_demand_half_life`` seconds."""
+        value = self._demand.get(model, 0.0)
+        if not value:
+            return 0.0
+        elapsed = time.monotonic() - self._demand_updated[model]
+        return value * math.pow(0.5, elapsed / self.settings.model_demand_half_life)
+
+    def ranked_models(self) -> List[str]:
+        """Models with meaningful recent demand, most demanded first."""
+        scored = [(self.demand(model), model) for model in self._demand]
+        return [model for score, model in sorted(scored, reverse=True) if score >= self.settings.warmup_min_demand]
+
+    def _lock(self, device_id: str) -> asyncio.Lock:
+        lock = self._locks.get(device_id)
+        if lock is None:
+            lock = self._locks[device_id] = asyncio.Lock()
+        return lock
+
+    async def ensure_loaded(self, device_id: str, model: str, backend, preload: bool = False) -> Optional[float]:
+        """Make ``model`` resident on the device; returns load seconds if it was cold.
+
+        Callers must hold the device's inference slot so loads never overlap
+        a running generation.
+        """
+        self._last_active[device_id] = time.monotonic()
+        async with self._lock(device_id):
+            if self.is_resident(device_id, model):
+                self._resident[device_id].last_used = time.monotonic()
+                if not preload:
+                    metrics.model_loads.inc(device=device_id, outcome="warm")
+                return None
+
+            variant = pick_variant(model, self._memory_mb.get(device_id))
+            if variant is None:
+                raise ModelUnavailable(f"No variant of {model} fits in the memory of device {device_id}")
+
+            previous = self._resident.pop(device_id, None)
+            if previous is not None:
+                metrics.device_model_resident.set(0, device=device_id, model=previous.model)
+            started = time.perf_counter()
+            self._resident[device_id] = Residency(model, variant.name, time.monotonic(), time.monotonic(), loading=True)
+            try:
+                with span("inference.model_load", device=device_id, model=model, variant=variant.name):
+                    await backend.load_model(device_id, variant.name)
+            except BaseException:
+                self._resident.pop(device_id, None)
+                raise
+            self._resident[device_id].loading = False
+            self._last_active[device_id] = time.monotonic()
+
+            elapsed = time.perf_counter() - started
+            metrics.model_loads.inc(device=device_id, outcome="preload" if preload else "cold")
+            metrics.device_model_resident.set(1, device=device_id, model=model)
+            metrics.model_load_duration.observe(elapsed, device=device_id)
+            return elapsed
+
+
+model_residency = ModelResidency()
+register_store("model_residency", lambda: model_residency)
+
+
+class WarmupScheduler:
+    """Preloads the most demanded models onto idle devices that lack them."""
+
+    def __init__(self, residency: ModelResidency):
+        self.residency = residency
+        self.settings = get_settings()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, backend, slots) -> None:
+        self._task = asyncio.create_task(self._run(backend, slots), name="model-warmup")
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self, backend, slots) -> None:
+        while True:
+            await asyncio.sleep(self.settings.warmup_interval)
+            try:
+                await self.tick(backend, slots)
+            except Exception:
+                logger.exception("Model warm-up failed")
+
+    async def tick(self, backend, slots) -> List[str]:
+        """Run one scheduling pass; returns the devices that were warmed."""
+        async with async_session_maker() as db:
+            devices = [device for device in await DeviceRepository(db).get_all() if device.status == "connected"]
+        for device in devices:
+            self.residency.observe_device(device)
+        models = self.residency.ranked_models()
+
+        warmed = []
+        for model in models:
+            if any(self.residency.is_resident(device.id, model) for device in devices):
+                continue
+            candidate = self._pick_device(model, devices, slots)
+            if candidate is None:
+                continue
+            semaphore = slots.semaphore(candidate.id)
+            if semaphore.locked():
+                continue
+            async with semaphore:
+                await self.residency.ensure_loaded(candidate.id, model, backend, preload=True)
+            warmed.append(candidate.id)
+            devices.remove(candidate)
+        return warmed
+
+    def _pick_device(self, model: str, devices: List[Device], slots) -> Optional[Device]:
+        """Idle device that fits the model, preferring ones holding less demanded models, then more memory."""
+        candidates = []
+        for device in devices:
+            if slots.depth(device.id) or self.residency.idle_for(device.id) < self.settings.warmup_idle_seconds:
+                continue
+            memory_mb = parse_memory_mb(device.specs)
+            if pick_variant(model, memory_mb) is None:
+                continue
+            resident = self.residency.resident(device.id)
+            displaced = self.residency.demand(resident.model) if resident else 0.0
+            if displaced >= self.residency.demand(model):
+                continue
+            candidates.append((displaced, -(memory_mb or 0), device.id, device))
+        return min(candidates, key=lambda candidate: candidate[:3])[3] if candidates else None
+
+
+warmup_scheduler = WarmupScheduler(model_residency)
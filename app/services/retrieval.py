@@ -0,0 +1,788 @@
+"""
+Retrieval over chat history.
+
+Small models answer much better with relevant earlier context, but whole
+histories do not fit their prompts. Every message a user sends or receives
+is embedded into that user's index, and each chat turn adds the
+``retrieval_top_k`` most similar earlier messages (by cosine similarity) to
+the prompt.
+
+Embeddings use signed feature hashing of words and word pairs, so no model
+has to be loaded and a message is embedded in microseconds on the request
+path.
+
+Each index lives in ``<retrieval_dir>/<user id>/``:
+
+* ``vectors.f32``: unit-length float32 rows, memory-mapped for search;
+* ``entries.bin``: one fixed-size record per row (message id, conversation,
+  role and the start of the text), also memory-mapped;
+* ``ivf.npz``: once an index has ``retrieval_ann_min_vectors`` rows, an
+  inverted-file index (spherical k-means centroids and the rows nearest each
+  one), so a query only scores the rows of its ``retrieval_ann_probes``
+  nearest lists.
+
+New messages are searchable at once from an in-memory tail, appended to the
+files in batches off the request path (under a file lock, so worker
+processes share a user's index) and assigned to their nearest IVF list. The
+IVF index is retrained in the background whenever the index has doubled.
+``meta.json`` records the format and the newest message written (its
+``(created_at, id)``), so an index opened from disk first catches up on
+messages stored while it was not loaded anywhere, such as while retrieval
+was disabled.
+
+Searches never wait for the database: an index that is not open is loaded
+in the background (or built from the user's messages the first time) and
+that turn goes without retrieved context. A search runs in a thread over a
+snapshot of the index, since the mapped pages may have to be read from
+disk, and a turn whose search does not finish within
+``retrieval_budget_ms`` goes without context too. The files are derived data;
+deleting a user's directory rebuilds it. Needs the optional numpy package;
+without it retrieval is disabled.
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.database import async_session_maker
+from app.core.memory import register_store
+from app.core.pagination import decode_cursor, encode_cursor
+from app.repositories.chat_repository import ChatRepository
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+FORMAT_VERSION = 1
+EMBEDDER = "hashing-v1"
+ROLES = ("user", "assistant")
+MAX_EMBED_CHARS = 8000
+BACKFILL_BATCH = 1000
+KMEANS_ITERATIONS = 8
+KMEANS_SAMPLE_PER_LIST = 64
+TRAIN_CHUNK = 8192
+
+# (created_at, id) of a message, the order messages are indexed in
+Key = Tuple[datetime, uuid.UUID]
+
+_WORDS = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from has have how i if in is it its me my no not of on or so "
+    "that the their there this to was we were what when where which who why will with you your".split()
+)
+
+
+@dataclass
+class Snippet:
+    """An earlier message similar to the query."""
+    message_id: uuid.UUID
+    conversation_id: Optional[uuid.UUID]
+    role: str
+    text: str
+    score: float
+
+
+class HashingEmbedder:
+    """Signed feature hashing of words and word pairs into ``dim`` buckets."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def embed(self, text: str) -> "np.ndarray":
+        """Unit-length embedding of ``text`` (all zeros if it has no words)."""
+        words = [word for word in _WORDS.findall(text[:MAX_EMBED_CHARS].lower()) if word not in STOPWORDS]
+        features = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if not features:
+            return vector
+        hashes = np.fromiter((zlib.crc32(feature.encode()) for feature in features), np.uint32, len(features))
+        # Low bits pick the bucket, the top bit the sign, so collisions cancel out on average
+        np.add.at(vector, hashes % self.dim, np.where(hashes >> 31, -1.0, 1.0).astype(np.float32))
+        # Dampen repeated terms
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def embed_many(self, texts: List[str]) -> "np.ndarray":
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.stack([self.embed(text) for text in texts])
+
+
+def entry_dtype(snippet_bytes: int) -> "np.dtype":
+    return np.dtype([("id", "V16"), ("conversation", "V16"), ("role", "u1"), ("text", f"S{snippet_bytes}")])
+
+
+def _snippet_text(content: str, snippet_bytes: int) -> bytes:
+    """Whitespace-collapsed start of ``content`` that fits a record (cut on a character boundary)."""
+    return " ".join(content.split()).encode()[:snippet_bytes].decode("utf-8", "ignore").encode()
+
+
+def message_key(created_at: datetime, message_id: uuid.UUID) -> Key:
+    """Sort key of a message; naive timestamps (SQLite) are UTC."""
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at, message_id
+
+
+def _top(scores: "np.ndarray", k: int) -> "np.ndarray":
+    """Indices of the ``k`` highest scores (unordered)."""
+    if len(scores) <= k:
+        return np.arange(len(scores))
+    return np.argpartition(-scores, k - 1)[:k]
+
+
+class IVF:
+    """Inverted-file index: rows grouped by their nearest k-means centroid.
+
+    Training rewrites the index files in list order, so each list is a
+    contiguous range of the first ``ordered`` rows. Rows appended since are
+    kept as per-list row numbers until the next training.
+    """
+
+    def __init__(self, centroids: "np.ndarray", bounds: "np.ndarray"):
+        self.centroids = centroids
+        self.bounds = bounds
+        self.ordered = self.rows = int(bounds[-1])
+        self.extra = [np.empty(0, dtype=np.int64) for _ in range(len(centroids))]
+
+    @classmethod
+    def train(cls, vectors: "np.ndarray", seed: int = 0) -> Tuple["IVF", "np.ndarray"]:
+        """Spherical k-means with sqrt(n) lists; also the row order that makes lists contiguous."""
+        rng = np.random.default_rng(seed)
+        count = len(vectors)
+        lists = max(1, int(math.sqrt(count)))
+        sample = np.sort(rng.choice(count, size=min(count, lists * KMEANS_SAMPLE_PER_LIST), replace=False))
+        sample = np.asarray(vectors[sample])
+        centroids = sample[rng.choice(len(sample), size=lists, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            nearest = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, nearest, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Lists that lost all their rows keep their old centroid
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids).astype(np.float32)
+        assignments = cls.assign(centroids, vectors)
+        order = np.argsort(assignments, kind="stable")
+        return cls(centroids, np.searchsorted(assignments[order], np.arange(lists + 1))), order
+
+    @staticmethod
+    def assign(centroids: "np.ndarray", vectors: "np.ndarray", chunk: int = 8192) -> "np.ndarray":
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), chunk):
+            assignments[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+        return assignments
+
+    def extend(self, vectors: "np.ndarray") -> None:
+        """Add the rows that follow the indexed ones to their nearest lists."""
+        if not len(vectors):
+            return
+        assignments = self.assign(self.centroids, vectors)
+        rows = np.arange(self.rows, self.rows + len(vectors))
+        for centroid in np.unique(assignments):
+            self.extra[centroid] = np.concatenate([self.extra[centroid], rows[assignments == centroid]])
+        self.rows += len(vectors)
+
+    def search(self, vectors: "np.ndarray", query: "np.ndarray", k: int, probes: int) -> List[Tuple[float, int]]:
+        """Top ``k`` (score, row) pairs among the lists nearest ``query``.
+
+        Rows appended after ``vectors`` was mapped are skipped, so a search in
+        a thread can run while ``extend`` adds rows.
+        """
+        nearest = _top(self.centroids @ query, min(probes, len(self.centroids)))
+        scores, rows = [], []
+        for centroid in nearest:
+            start, end = self.bounds[centroid], self.bounds[centroid + 1]
+            if end > start:
+                scores.append(vectors[start:end] @ query)
+                rows.append(np.arange(start, end))
+        extra = np.sort(np.concatenate([self.extra[centroid] for centroid in nearest]))
+        extra = extra[extra < len(vectors)]
+        if len(extra):
+            scores.append(vectors[extra] @ query)
+            rows.append(extra)
+        if not scores:
+            return []
+        scores, rows = np.concatenate(scores), np.concatenate(rows)
+        return [(float(scores[i]), int(rows[i])) for i in _top(scores, k)]
+
+
+@dataclass
+class View:
+    """An index as of one moment, safe to search in a thread while the index changes.
+
+    The mapped arrays and the tail matrix are replaced rather than modified,
+    so holding references to them is enough.
+    """
+    vectors: "np.ndarray"
+    entries: "np.ndarray"
+    ivf: Optional[IVF]
+    indexed: int  # Rows covered by the IVF index
+    tail_vectors: Optional["np.ndarray"]
+    tail_entries: List[tuple]
+
+    def search(self, query: "np.ndarray", k: int, min_score: float, probes: int) -> Tuple[List[Snippet], str]:
+        """Top ``k`` rows by cosine similarity; also the search mode used."""
+        hits: List[Tuple[float, int]] = []  # (score, row); tail rows are negative
+        mapped, mode, start = len(self.vectors), "exact", 0
+        if self.ivf is not None:
+            mode, start = "ann", self.indexed
+            hits += self.ivf.search(self.vectors, query, k, probes)
+        if mapped > start:
+            scores = self.vectors[start:mapped] @ query
+            hits += [(float(scores[i]), start + int(i)) for i in _top(scores, k)]
+        if self.tail_vectors is not None:
+            scores = self.tail_vectors @ query
+            hits += [(float(scores[i]), -1 - int(i)) for i in _top(scores, k)]
+
+        snippets, seen = [], set()
+        for score, row in sorted(hits, reverse=True):
+            if score < min_score or len(snippets) == k:
+                break
+            snippet = self._snippet(row, score)
+            if snippet.text and snippet.text not in seen:
+                seen.add(snippet.text)
+                snippets.append(snippet)
+        return snippets, mode
+
+    def _snippet(self, row: int, score: float) -> Snippet:
+        if row < 0:
+            message_id, conversation, role, text = self.tail_entries[-1 - row]
+        else:
+            entry = self.entries[row]
+            message_id, conversation, role, text = bytes(entry["id"]), bytes(entry["conversation"]), entry["role"], entry["text"]
+        return Snippet(
+            message_id=uuid.UUID(bytes=message_id),
+            conversation_id=uuid.UUID(bytes=conversation) if any(conversation) else None,
+            role=ROLES[role],
+            text=text.decode("utf-8", "ignore"),
+            score=round(score, 4)
+        )
+
+
+@dataclass
+class Mapping:
+    """The index files as mapped at one point in time."""
+    vectors: "np.ndarray"
+    entries: "np.ndarray"
+    inode: Optional[int]
+    ivf: Optional[IVF] = None  # Loaded when the files were replaced (trained) since the last mapping
+    cursor: Optional[Key] = None  # Newest message written to the files
+
+
+class UserIndex:
+    """One user's index: memory-mapped rows on disk plus an in-memory tail."""
+
+    def __init__(self, root: str, dim: int, snippet_bytes: int):
+        self.root = root
+        self.dim = dim
+        self.dtype = entry_dtype(snippet_bytes)
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.entries = np.empty(0, dtype=self.dtype)
+        self.inode: Optional[int] = None
+        self.ivf: Optional[IVF] = None
+        self.ready = False
+        self.training = False
+        self.flush_lock = asyncio.Lock()
+        # Rows not yet in the mapped files
+        self._tail_vectors: List["np.ndarray"] = []
+        self._tail_entries: List[tuple] = []
+        self._tail_keys: List[Key] = []
+        self._tail_matrix: Optional["np.ndarray"] = None
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    @property
+    def meta(self) -> dict:
+        return {"version": FORMAT_VERSION, "embedder": EMBEDDER, "dim": self.dim, "snippetBytes": self.dtype["text"].itemsize}
+
+    @property
+    def tail_size(self) -> int:
+        return len(self._tail_entries)
+
+    def tail(self) -> List[tuple]:
+        """A copy of the entries not yet flushed to the mapped files."""
+        return list(self._tail_entries)
+
+    def pending_ids(self) -> Set[bytes]:
+        """Message IDs (as bytes) of the rows not yet flushed."""
+        return {entry[0] for entry in self._tail_entries}
+
+    def files(self) -> List[str]:
+        return [self.path(name) for name in ("vectors.f32", "entries.bin", "ivf.npz") if os.path.exists(self.path(name))]
+
+    # Request path
+
+    def append(self, vector: "np.ndarray", entry: tuple, key: Key) -> None:
+        self._tail_vectors.append(vector)
+        self._tail_entries.append(entry)
+        self._tail_keys.append(key)
+        self._tail_matrix = None
+
+    def view(self) -> View:
+        """Snapshot of the index for a search (taken on the event loop)."""
+        if self._tail_entries and self._tail_matrix is None:
+            self._tail_matrix = np.stack(self._tail_vectors)
+        return View(
+            vectors=self.vectors,
+            entries=self.entries,
+            ivf=self.ivf,
+            indexed=self.ivf.rows if self.ivf is not None else 0,
+            tail_vectors=self._tail_matrix if self._tail_entries else None,
+            tail_entries=list(self._tail_entries)
+        )
+
+    def search(self, query: "np.ndarray", k: int, min_score: float, probes: int) -> Tuple[List[Snippet], str]:
+        """Top ``k`` rows by cosine similarity; also the search mode used."""
+        return self.view().search(query, k, min_score, probes)
+
+    def take_tail(self) -> Tuple[int, "np.ndarray", "np.ndarray", Optional[Key]]:
+        """The rows to flush and the newest of their keys (they stay searchable until ``remapped``)."""
+        count = len(self._tail_entries)
+        if not count:
+            return 0, np.empty((0, self.dim), dtype=np.float32), np.empty(0, dtype=self.dtype), None
+        return (
+            count,
+            np.stack(self._tail_vectors[:count]),
+            np.array(self._tail_entries[:count], dtype=self.dtype),
+            max(self._tail_keys[:count])
+        )
+
+    def stale(self) -> bool:
+        """Whether another process appended rows or retrained since the last mapping."""
+        try:
+            stat = os.stat(self.path("vectors.f32"))
+        except OSError:
+            return False
+        return stat.st_ino != self.inode or stat.st_size // (4 * self.dim) > len(self.vectors)
+
+    def remapped(self, mapping: Mapping, flushed: int = 0) -> None:
+        """Swap in a new mapping; the first ``flushed`` tail rows are now part of it."""
+        if mapping.inode != self.inode:
+            self.ivf = mapping.ivf
+        self.vectors, self.entries, self.inode = mapping.vectors, mapping.entries, mapping.inode
+        if flushed:
+            del self._tail_vectors[:flushed]
+            del self._tail_entries[:flushed]
+            del self._tail_keys[:flushed]
+            self._tail_matrix = None
+        if self.ivf is not None and self.ivf.rows < len(self.vectors):
+            self.ivf.extend(self.vectors[self.ivf.rows:])
+
+    # File access (worker threads, holding the file lock)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with open(self.path("lock"), "a+b") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _rows_on_disk(self) -> int:
+        """Rows present in both files (a torn append leaves one longer)."""
+        sizes = [
+            os.path.getsize(path) if os.path.exists(path) else 0
+            for path in (self.path("vectors.f32"), self.path("entries.bin"))
+        ]
+        return min(sizes[0] // (4 * self.dim), sizes[1] // self.dtype.itemsize)
+
+    def _map(self, known_inode: Optional[int]) -> Mapping:
+        rows = self._rows_on_disk()
+        inode = os.stat(self.path("vectors.f32")).st_ino
+        ivf = self._load_ivf(rows) if inode != known_inode else None
+        cursor = self._cursor(self._read_meta())
+        if not rows:
+            return Mapping(np.empty((0, self.dim), dtype=np.float32), np.empty(0, dtype=self.dtype), inode, ivf, cursor)
+        return Mapping(
+            np.memmap(self.path("vectors.f32"), dtype=np.float32, mode="r", shape=(rows, self.dim)),
+            np.memmap(self.path("entries.bin"), dtype=self.dtype, mode="r", shape=(rows,)),
+            inode,
+            ivf,
+            cursor
+        )
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            with open(self.path("meta.json")) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return saved if isinstance(saved, dict) else None
+
+    def _write_meta(self, cursor: Optional[Key]) -> None:
+        with open(self.path("meta.json.tmp"), "w") as f:
+            json.dump({**self.meta, "cursor": encode_cursor(cursor) if cursor else None}, f)
+        os.replace(self.path("meta.json.tmp"), self.path("meta.json"))
+
+    @staticmethod
+    def _cursor(saved: Optional[dict]) -> Optional[Key]:
+        """The newest message recorded in ``meta.json``; None for indexes written before it was."""
+        try:
+            created_at, message_id = decode_cursor(saved["cursor"])
+            return message_key(created_at, message_id)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return None
+
+    def _load_ivf(self, rows: int) -> Optional[IVF]:
+        try:
+            with np.load(self.path("ivf.npz")) as saved:
+                centroids, bounds = saved["centroids"], saved["bounds"]
+        except (OSError, KeyError, ValueError):
+            return None
+        if centroids.shape[1:] != (self.dim,) or bounds[-1] > rows:
+            return None
+        return IVF(centroids, bounds)
+
+    def open(self) -> Optional[Mapping]:
+        """Map the index if it was built with the current format; None if it must be built."""
+        os.makedirs(self.root, exist_ok=True)
+        with self._locked():
+            saved = self._read_meta()
+            if saved is None or {key: saved.get(key) for key in self.meta} != self.meta:
+                for name in ("vectors.f32", "entries.bin", "ivf.npz", "meta.json"):
+                    if os.path.exists(self.path(name)):
+                        os.remove(self.path(name))
+                return None
+            return self._map(None)
+
+    def refresh(self, known_inode: Optional[int]) -> Mapping:
+        with self._locked():
+            return self._map(known_inode)
+
+    def stage(self, vectors: "np.ndarray", entries: "np.ndarray") -> None:
+        """Append rows of an index being built to this process's staging files."""
+        for name, rows in (("vectors.f32", vectors), ("entries.bin", entries)):
+            with open(self.path(f"{name}.{os.getpid()}.tmp"), "ab") as f:
+                f.write(rows.tobytes())
+
+    def commit_staged(self, cursor: Optional[Key] = None) -> Mapping:
+        """Publish the staged index (``cursor`` is its newest message), unless another process built one meanwhile."""
+        staged = {name: self.path(f"{name}.{os.getpid()}.tmp") for name in ("vectors.f32", "entries.bin")}
+        with self._locked():
+            if os.path.exists(self.path("meta.json")):
+                for path in staged.values():
+                    if os.path.exists(path):
+                        os.remove(path)
+            else:
+                for name, path in staged.items():
+                    if os.path.exists(path):
+                        os.replace(path, self.path(name))
+                    else:
+                        open(self.path(name), "wb").close()
+                self._write_meta(cursor)
+            return self._map(None)
+
+    def discard_staged(self) -> None:
+        for name in ("vectors.f32", "entries.bin"):
+            path = self.path(f"{name}.{os.getpid()}.tmp")
+            if os.path.exists(path):
+                os.remove(path)
+
+    def write(
+        self,
+        vectors: "np.ndarray",
+        entries: "np.ndarray",
+        cursor: Optional[Key],
+        known_inode: Optional[int]
+    ) -> Mapping:
+        """Append rows (other processes' appends may land in between), advance the cursor and remap."""
+        with self._locked():
+            rows = self._rows_on_disk()
+            for name, size in (("vectors.f32", 4 * self.dim), ("entries.bin", self.dtype.itemsize)):
+                path = self.path(name)
+                if os.path.getsize(path) > rows * size:
+                    os.truncate(path, rows * size)
+                with open(path, "ab") as f:
+                    f.write((vectors if name == "vectors.f32" else entries).tobytes())
+            saved = self._cursor(self._read_meta())
+            if cursor is not None and (saved is None or cursor > saved):
+                self._write_meta(cursor)
+            return self._map(known_inode)
+
+    def train(self, snapshot: Mapping) -> Optional[Mapping]:
+        """Train an IVF index on ``snapshot`` and rewrite the files in list order.
+
+        Rows appended meanwhile are kept after the ordered ones. Returns None
+        if another process retrained first.
+        """
+        ivf, order = IVF.train(snapshot.vectors)
+        with self._locked():
+            current = self._map(snapshot.inode)
+            if current.inode != snapshot.inode:
+                return None
+            trained, rows = len(order), len(current.vectors)
+            for name, source in (("vectors.f32", current.vectors), ("entries.bin", current.entries)):
+                with open(self.path(f"{name}.{os.getpid()}.tmp"), "wb") as f:
+                    for start in range(0, trained, TRAIN_CHUNK):
+                        f.write(np.ascontiguousarray(source[order[start:start + TRAIN_CHUNK]]).tobytes())
+                    for start in range(trained, rows, TRAIN_CHUNK):
+                        f.write(np.ascontiguousarray(source[start:start + TRAIN_CHUNK]).tobytes())
+            partial = self.path(f"ivf.{os.getpid()}.tmp.npz")
+            np.savez(partial, centroids=ivf.centroids, bounds=ivf.bounds)
+            os.replace(partial, self.path("ivf.npz"))
+            for name in ("vectors.f32", "entries.bin"):
+                os.replace(self.path(f"{name}.{os.getpid()}.tmp"), self.path(name))
+            return self._map(snapshot.inode)
+
+
+class HistoryIndex:
+    """Per-user retrieval indexes, loaded on demand and flushed in the background."""
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.embedder = HashingEmbedder(self.settings.retrieval_dim) if np is not None else None
+        self._indexes: "OrderedDict[uuid.UUID, UserIndex]" = OrderedDict()
+        self._background: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return np is not None and self.settings.retrieval_enabled
+
+    def loaded(self) -> Dict[uuid.UUID, UserIndex]:
+        """The indexes currently held in memory, by user ID."""
+        return dict(self._indexes)
+
+    def start(self) -> None:
+        if self.enabled:
+            self._task = asyncio.create_task(self._run(), name="retrieval-flusher")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        for index in list(self._indexes.values()):
+            await self._flush(index)
+
+    async def search(self, user_id: uuid.UUID, text: str, k: Optional[int] = None) -> List[Snippet]:
+        """Earlier messages most similar to ``text``.
+        
+        Empty while the user's index is loading, or if the search takes longer
+        than ``retrieval_budget_ms`` (it finishes in its thread, unused).
+        """
+        if not self.enabled or not text.strip():
+            return []
+        started = time.perf_counter()
+        index = self._index(user_id)
+        if not index.ready:
+            metrics.retrieval_searches.inc(outcome="cold")
+            return []
+        view = index.view()
+        try:
+            snippets, mode = await asyncio.wait_for(
+                asyncio.to_thread(
+                    view.search,
+                    self.embedder.embed(text),
+                    k or self.settings.retrieval_top_k,
+                    self.settings.retrieval_min_score,
+                    self.settings.retrieval_ann_probes
+                ),
+                self.settings.retrieval_budget_ms / 1000
+            )
+        except asyncio.TimeoutError:
+            metrics.retrieval_searches.inc(outcome="timeout")
+            return []
+        metrics.retrieval_duration.observe(time.perf_counter() - started, mode=mode)
+        metrics.retrieval_searches.inc(outcome="hit" if snippets else "empty")
+        return snippets
+
+    def add(
+        self,
+        user_id: uuid.UUID,
+        message_id: uuid.UUID,
+        conversation_id: Optional[uuid.UUID],
+        role: str,
+        content: str,
+        created_at: datetime
+    ) -> None:
+        """Index a stored message (searchable immediately, written to disk in the background)."""
+        if not self.enabled or not content.strip() or role not in ROLES:
+            return
+        index = self._index(user_id)
+        index.append(
+            self.embedder.embed(content),
+            self._entry(message_id, conversation_id, role, content),
+            message_key(created_at, message_id)
+        )
+
+    def _entry(self, message_id: uuid.UUID, conversation_id: Optional[uuid.UUID], role: str, content: str) -> tuple:
+        return (
+            message_id.bytes,
+            conversation_id.bytes if conversation_id else bytes(16),
+            ROLES.index(role),
+            _snippet_text(content, self.settings.retrieval_snippet_bytes)
+        )
+
+    def _index(self, user_id: uuid.UUID) -> UserIndex:
+        index = self._indexes.get(user_id)
+        if index is not None:
+            self._indexes.move_to_end(user_id)
+            return index
+        index = self._indexes[user_id] = UserIndex(
+            os.path.join(self.settings.retrieval_dir, str(user_id)),
+            self.settings.retrieval_dim,
+            self.settings.retrieval_snippet_bytes
+        )
+        self._spawn(self._load(user_id, index))
+        while len(self._indexes) > self.settings.retrieval_max_users:
+            _, evicted = self._indexes.popitem(last=False)
+            if evicted.ready:
+                self._spawn(self._flush(evicted))
+        return index
+
+    def _spawn(self, coroutine) -> None:
+        task = asyncio.create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _load(self, user_id: uuid.UUID, index: UserIndex) -> None:
+        try:
+            mapping = await asyncio.to_thread(index.open)
+            if mapping is None:
+                mapping = await self._backfill(user_id, index)
+            index.remapped(mapping)
+            index.ready = True
+            if mapping.cursor is not None:
+                await self._catch_up(user_id, index, mapping.cursor)
+            await self._flush(index)
+        except Exception:
+            logger.exception("Could not load the retrieval index of user %s", user_id)
+            # Retried on the user's next turn
+            if self._indexes.get(user_id) is index:
+                del self._indexes[user_id]
+
+    async def _stored(
+        self,
+        user_id: uuid.UUID,
+        index: UserIndex,
+        after: Optional[Key]
+    ) -> AsyncIterator[Tuple[List[tuple], "np.ndarray"]]:
+        """Batches of (rows, vectors) of a user's stored messages after ``after``, oldest first.
+
+        Messages indexed since loading started are already in the tail and
+        are left out.
+        """
+        while True:
+            async with async_session_maker() as db:
+                rows = await ChatRepository(db).contents(user_id, BACKFILL_BATCH, after)
+            if not rows:
+                return
+            fetched, after = len(rows), (rows[-1][4], rows[-1][0])
+            pending = index.pending_ids()
+            rows = [
+                row for row in rows
+                if row[3] and row[3].strip() and row[2] in ROLES and row[0].bytes not in pending
+            ]
+            if rows:
+                yield rows, await asyncio.to_thread(self.embedder.embed_many, [row[3] for row in rows])
+            if fetched < BACKFILL_BATCH:
+                return
+
+    async def _backfill(self, user_id: uuid.UUID, index: UserIndex) -> Mapping:
+        """Build a user's index from the messages already in the database."""
+        cursor = None
+        try:
+            async for rows, vectors in self._stored(user_id, index, None):
+                entries = np.array([self._entry(row[0], row[1], row[2], row[3]) for row in rows], dtype=index.dtype)
+                await asyncio.to_thread(index.stage, vectors, entries)
+                cursor = message_key(rows[-1][4], rows[-1][0])
+            return await asyncio.to_thread(index.commit_staged, cursor)
+        except BaseException:
+            await asyncio.to_thread(index.discard_staged)
+            raise
+
+    async def _catch_up(self, user_id: uuid.UUID, index: UserIndex, cursor: Key) -> None:
+        """Index the messages stored after the newest one written to the index.
+
+        Those were stored while no process had the index loaded (such as
+        while retrieval was disabled) or by another process during a backfill.
+        """
+        caught_up = 0
+        async for rows, vectors in self._stored(user_id, index, cursor):
+            for row, vector in zip(rows, vectors):
+                index.append(vector, self._entry(row[0], row[1], row[2], row[3]), message_key(row[4], row[0]))
+            caught_up += len(rows)
+            await self._flush(index)
+        if caught_up:
+            logger.info("Indexed %d messages of user %s stored while the index was not loaded", caught_up, user_id)
+
+    async def _flush(self, index: UserIndex) -> None:
+        """Write the tail to disk and pick up rows other processes appended."""
+        if not index.ready:
+            return
+        async with index.flush_lock:
+            count, vectors, entries, cursor = index.take_tail()
+            if count:
+                mapping = await asyncio.to_thread(index.write, vectors, entries, cursor, index.inode)
+                index.remapped(mapping, flushed=count)
+            elif index.stale():
+                index.remapped(await asyncio.to_thread(index.refresh, index.inode))
+        self._maybe_train(index)
+
+    def _maybe_train(self, index: UserIndex) -> None:
+        rows = len(index.vectors)
+        if index.training or rows < self.settings.retrieval_ann_min_vectors:
+            return
+        if index.ivf is not None and rows < 2 * index.ivf.ordered:
+            return
+        index.training = True
+
+        async def train() -> None:
+            try:
+                async with index.flush_lock:
+                    snapshot = Mapping(index.vectors, index.entries, index.inode)
+                    mapping = await asyncio.to_thread(index.train, snapshot)
+                    if mapping is not None:
+                        index.remapped(mapping)
+                        logger.info("Trained a %d-list IVF index over %d messages", len(index.ivf.centroids), rows)
+            except Exception:
+                logger.exception("Could not train a retrieval IVF index")
+            finally:
+                index.training = False
+
+        self._spawn(train())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.settings.retrieval_flush_interval)
+            for index in list(self._indexes.values()):
+                try:
+                    await self._flush(index)
+                except Exception:
+                    logger.exception("Failed to flush a retrieval index")
+
+
+history_index = HistoryIndex()
+register_store("retrieval_tails", lambda: {user_id: index.tail() for user_id, index in history_index.loaded().items()})
+register_store(
+    "retrieval_indexes",
+    lambda: [path for index in history_index.loaded().values() for path in index.files()],
+    kind="disk"
+)
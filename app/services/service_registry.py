@@ -0,0 +1,243 @@
+"""
+In-memory registry of admin services.
+
+Every worker loads ``admin_services`` once at startup and answers lookups
+from memory, so request routing never queries the database. The admin CRUD
+routes apply their changes locally and publish a small notification; other
+workers receive it and refresh just that service:
+
+* ``postgres`` uses ``LISTEN``/``NOTIFY`` on the application database.
+* ``redis`` uses a pub/sub channel on ``redis_url``.
+* ``none`` only updates the local process (single worker).
+
+A periodic full reload covers notifications missed while a listener was
+reconnecting.
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+
+from app.core.config import get_settings
+from app.core.memory import register_store
+from app.core.database import async_session_maker, engine
+from app.domain.models import AdminService
+from app.repositories.admin_service_repository import AdminServiceRepository
+from app.schemas.admin import AdminServiceResponse
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class PostgresNotifier:
+    """Publishes with ``pg_notify`` and listens on a dedicated connection."""
+
+    def __init__(self, channel: str):
+        self.channel = channel
+
+    async def publish(self, payload: str) -> None:
+        async with engine.begin() as conn:
+            await conn.execute(select(func.pg_notify(self.channel, payload)))
+
+    async def listen(self, handler: Handler) -> None:
+        import psycopg
+
+        url = get_settings().database_url.replace("postgresql+psycopg://", "postgresql://")
+        async with await psycopg.AsyncConnection.connect(url, autocommit=True) as conn:
+            await conn.execute(f'LISTEN "{self.channel}"')
+            async for notify in conn.notifies():
+                await handler(json.loads(notify.payload))
+
+
+class RedisNotifier:
+    """Publishes and listens on a Redis pub/sub channel."""
+
+    def __init__(self, url: str, channel: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("service_registry_notifier='redis' requires the 'redis' package") from e
+        self.channel = channel
+        self.client = redis.from_url(url)
+
+    async def publish(self, payload: str) -> None:
+        await self.client.publish(self.channel, payload)
+
+    async def listen(self, handler: Handler) -> None:
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.channel)
+        try:
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    await handler(json.loads(message["data"]))
+        finally:
+            await pubsub.unsubscribe(self.channel)
+
+
+def _build_notifier():
+    settings = get_settings()
+    backend = settings.service_registry_notifier
+    if backend == "auto":
+        backend = "postgres" if settings.database_url.startswith("postgresql") else "none"
+    if backend == "postgres":
+        return PostgresNotifier(settings.service_registry_channel)
+    if backend == "redis":
+        return RedisNotifier(settings.redis_url, settings.service_registry_channel)
+    return None
+
+
+# Admin listing sort fields
+SERVICE_SORT_FIELDS = ("name", "created_at", "type", "status")
+
+
+class ServiceRegistry:
+    """Process-local snapshot of ``admin_services`` kept in sync across workers."""
+
+    def __init__(self):
+        self.settings = get_settings()
+        self._services: Dict[uuid.UUID, AdminServiceResponse] = {}
+        self._loaded = False
+        self._load_lock: Optional[asyncio.Lock] = None
+        self._tasks: List[asyncio.Task] = []
+        self._notifier = None
+        # Lets a worker ignore its own notifications
+        self._origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    async def load(self) -> None:
+        """Replace the snapshot with the current contents of the table."""
+        async with async_session_maker() as db:
+            services = await AdminServiceRepository(db).get_all()
+        self._services = {service.id: AdminServiceResponse.model_validate(service) for service in services}
+        self._loaded = True
+
+    async def ensure_loaded(self) -> None:
+        """Load the snapshot on first use (e.g. when lifespan did not run)."""
+        if self._loaded:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if not self._loaded:
+                await self.load()
+
+    async def start(self) -> None:
+        """Load the registry and start listening for changes from other workers."""
+        await self.load()
+        self._notifier = _build_notifier()
+        if self._notifier is not None:
+            self._tasks.append(asyncio.create_task(self._listen(), name="service-registry-listener"))
+        if self.settings.service_registry_refresh_interval > 0:
+            self._tasks.append(asyncio.create_task(self._refresh(), name="service-registry-refresh"))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def all(self) -> List[AdminServiceResponse]:
+        """All services, oldest first (matching the table's insertion order)."""
+        return sorted(self._services.values(), key=lambda service: service.created_at)
+
+    def get(self, service_id: uuid.UUID) -> Optional[AdminServiceResponse]:
+        return self._services.get(service_id)
+
+    def find(self, type: str, status: str = "active") -> List[AdminServiceResponse]:
+        """Services of a type in a given status (e.g. active inference endpoints)."""
+        return [
+            service for service in self.all()
+            if service.type == type and service.status == status
+        ]
+
+    def page(
+        self,
+        status: Optional[Sequence[str]] = None,
+        type: Optional[Sequence[str]] = None,
+        sort: str = "created_at",
+        descending: bool = False,
+        limit: int = 100,
+        after: Optional[Sequence[Any]] = None
+    ) -> Tuple[List[AdminServiceResponse], int]:
+        """A page of matching services in (sort, id) order after the ``after`` key, and the match count."""
+        matches = [
+            service for service in self._services.values()
+            if (not status or service.status in status) and (not type or service.type in type)
+        ]
+        def key(service: AdminServiceResponse) -> tuple:
+            return (getattr(service, sort), service.id)
+        matches.sort(key=key, reverse=descending)
+        rows = matches
+        if after is not None:
+            bound = tuple(after)
+            rows = [service for service in matches if (key(service) < bound if descending else key(service) > bound)]
+        return rows[:limit], len(matches)
+
+    async def upserted(self, service: AdminService) -> None:
+        """Record a created or updated service and notify other workers."""
+        snapshot = AdminServiceResponse.model_validate(service)
+        self._services[snapshot.id] = snapshot
+        await self._publish("upsert", snapshot.id)
+
+    async def deleted(self, service_id: uuid.UUID) -> None:
+        """Record a deleted service and notify other workers."""
+        self._services.pop(service_id, None)
+        await self._publish("delete", service_id)
+
+    async def _publish(self, action: str, service_id: uuid.UUID) -> None:
+        if self._notifier is None:
+            return
+        payload = json.dumps({"action": action, "id": str(service_id), "origin": self._origin})
+        try:
+            await self._notifier.publish(payload)
+        except Exception:
+            # Other workers catch up on their next periodic reload
+            logger.exception("Failed to publish service registry change")
+
+    async def _handle(self, message: dict) -> None:
+        if message.get("origin") == self._origin:
+            return
+        service_id = uuid.UUID(message["id"])
+        if message.get("action") == "delete":
+            self._services.pop(service_id, None)
+            return
+        async with async_session_maker() as db:
+            service = await AdminServiceRepository(db).get_by_id(service_id)
+        if service is None:
+            self._services.pop(service_id, None)
+        else:
+            self._services[service_id] = AdminServiceResponse.model_validate(service)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                await self._notifier.listen(self._handle)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Service registry listener failed; reconnecting")
+            await asyncio.sleep(1.0)
+            # Changes may have been missed while disconnected
+            try:
+                await self.load()
+            except Exception:
+                logger.exception("Service registry reload failed")
+
+    async def _refresh(self) -> None:
+        while True:
+            await asyncio.sleep(self.settings.service_registry_refresh_interval)
+            try:
+                await self.load()
+            except Exception:
+                logger.exception("Service registry reload failed")
+
+
+service_registry = ServiceRegistry()
+register_store("service_registry", service_registry.all)
@@ -0,0 +1,146 @@
+"""
+Image thumbnails for chat history.
+
+When a message with images is stored, thumbnails at each size in
+``thumbnail_sizes`` are rendered once and cached on disk next to the media
+store (``<media_root>/thumbs/<size>/<sha[:2]>/<sha>.webp``). Rendering runs in
+a bounded thread pool so decoding large photos never blocks the event loop,
+and concurrent requests for the same image share one render.
+
+Thumbnails need the optional Pillow package; without it history falls back
+to the full images.
+"""
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set
+
+from app.core.config import get_settings
+from app.core.memory import register_store
+from app.core.uploads import MediaStore, media_sha256, media_store, media_url
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+
+def _render(source: str, targets: Dict[int, str]) -> None:
+    """Decode ``source`` once and write a thumbnail for each size (runs in a worker thread)."""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        for size, target in sorted(targets.items(), reverse=True):
+            thumbnail = image.copy()
+            thumbnail.thumbnail((size, size), Image.Resampling.LANCZOS)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            partial = f"{target}.{os.getpid()}.tmp"
+            thumbnail.save(partial, "WEBP", quality=80, method=4)
+            os.replace(partial, target)
+
+
+class Thumbnailer:
+    """Generates and caches thumbnails in a bounded worker pool."""
+
+    def __init__(self, store: MediaStore):
+        self.store = store
+        self.settings = get_settings()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._background: Set[asyncio.Task] = set()
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    @property
+    def sizes(self) -> List[int]:
+        return self.settings.thumbnail_sizes
+
+    def path(self, sha256: str, size: int) -> str:
+        return os.path.join(self.store.root, "thumbs", str(size), sha256[:2], f"{sha256}.webp")
+
+    def url(self, sha256: str, size: int) -> str:
+        return f"{media_url(sha256)}/thumbnails/{size}"
+
+    async def ensure(self, sha256: str) -> bool:
+        """Render any missing thumbnails for an image; False if that is not possible."""
+        if not self.available or not self.store.exists(sha256):
+            return False
+        future = self._inflight.get(sha256)
+        if future is None:
+            targets = self._missing(sha256)
+            if not targets:
+                return True
+            future = self._start(sha256, targets)
+        try:
+            await asyncio.shield(future)
+        except Exception:
+            logger.warning("Could not render thumbnails for %s", sha256, exc_info=True)
+            return False
+        return True
+
+    def submit(self, urls: Iterable[str]) -> None:
+        """Render thumbnails for stored images in the background.
+
+        Each render takes its slot in ``_inflight`` before this returns, so a
+        burst of messages cannot queue more than ``thumbnail_queue_limit``.
+        """
+        if not self.available:
+            return
+        for url in urls:
+            sha256 = media_sha256(url)
+            if sha256 is None or sha256 in self._inflight or not self.store.exists(sha256):
+                continue
+            if len(self._inflight) >= self.settings.thumbnail_queue_limit:
+                # Rendered on first request instead
+                return
+            targets = self._missing(sha256)
+            if not targets:
+                continue
+            self._start(sha256, targets)
+            task = asyncio.create_task(self.ensure(sha256))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    def inflight(self) -> List[str]:
+        """Hashes of the images with a render queued or running."""
+        return list(self._inflight)
+
+    def _missing(self, sha256: str) -> Dict[int, str]:
+        """Thumbnail paths (by size) not yet rendered for an image."""
+        targets = {size: self.path(sha256, size) for size in self.sizes}
+        return {size: target for size, target in targets.items() if not os.path.exists(target)}
+
+    def _start(self, sha256: str, targets: Dict[int, str]) -> asyncio.Future:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.settings.thumbnail_workers, thread_name_prefix="thumbnail"
+            )
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, _render, self.store.path(sha256), targets)
+        self._inflight[sha256] = future
+        future.add_done_callback(lambda _: self._inflight.pop(sha256, None))
+        return future
+
+    def history_images(self, urls: Optional[List[str]], size: int) -> Optional[List[str]]:
+        """Thumbnail URLs for stored images (other URLs are returned unchanged)."""
+        if urls is None or not self.available:
+            return urls
+        return [
+            self.url(sha256, size) if (sha256 := media_sha256(url)) else url
+            for url in urls
+        ]
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+thumbnailer = Thumbnailer(media_store)
+register_store("thumbnailer", thumbnailer.inflight)
@@ -0,0 +1,87 @@
+"""
+Per-model token counting.
+
+When the optional ``tokenizers`` package is installed and a model has a
+tokenizer configured in ``model_tokenizers`` (a Hugging Face hub name or a
+local ``tokenizer.json`` path), counts are exact. Otherwise an approximate
+tokenizer splits text into words and punctuation and charges long words one
+token per four characters, which tracks BPE tokenizers closely for English.
+
+Configured tokenizers are loaded by ``preload_tokenizers()`` in a worker
+thread at startup (loading may download from the hub). Counting never loads
+one, so a chat request cannot block the event loop on it; a model whose
+tokenizer is not loaded gets approximate counts.
+"""
+import asyncio
+import logging
+import math
+import os
+import re
+from typing import Dict, Optional
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_PIECES = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+class ApproximateTokenizer:
+    """Dependency-free token estimate (words, punctuation, long-word pieces)."""
+    exact = False
+
+    def __init__(self, chars_per_token: float = 4.0):
+        self.chars_per_token = chars_per_token
+
+    def count(self, text: str) -> int:
+        return sum(max(1, math.ceil(len(piece) / self.chars_per_token)) for piece in _PIECES.findall(text))
+
+
+class HuggingFaceTokenizer:
+    """Exact counts from a ``tokenizers`` tokenizer."""
+    exact = True
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+
+    def count(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def _load_huggingface(source: str) -> Optional[HuggingFaceTokenizer]:
+    try:
+        from tokenizers import Tokenizer
+    except ImportError:
+        return None
+    try:
+        if os.path.exists(source):
+            return HuggingFaceTokenizer(Tokenizer.from_file(source))
+        return HuggingFaceTokenizer(Tokenizer.from_pretrained(source))
+    except Exception:
+        logger.warning("Could not load tokenizer %s; using approximate counts", source, exc_info=True)
+        return None
+
+
+_approximate = ApproximateTokenizer()
+_loaded: Dict[str, HuggingFaceTokenizer] = {}
+
+
+async def preload_tokenizers() -> None:
+    """Load the tokenizers in ``model_tokenizers`` off the event loop."""
+    for model, source in get_settings().model_tokenizers.items():
+        if model not in _loaded:
+            tokenizer = await asyncio.to_thread(_load_huggingface, source)
+            if tokenizer is not None:
+                _loaded[model] = tokenizer
+
+
+def get_tokenizer(model: str):
+    """Get the loaded tokenizer for a model (approximate if none is loaded)."""
+    return _loaded.get(model, _approximate)
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Count tokens in ``text`` with the model's tokenizer."""
+    if not text:
+        return 0
+    return get_tokenizer(model or get_settings().default_model).count(text)
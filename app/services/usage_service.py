@@ -0,0 +1,141 @@
+"""
+Token usage recording.
+
+Chat turns call ``usage_recorder.record()``, which only appends to an
+in-memory buffer. A background task flushes the buffer in batches, appending
+the rows to ``usage_ledger`` and folding them into ``usage_counters`` in the
+same transaction, so the request path never waits on the ledger and usage
+summaries read a handful of counter rows instead of scanning messages.
+
+A batch that fails transiently is kept for the next flush. One the database
+rejects outright (a constraint or data error) is split until the offending
+events are isolated and dropped, so a single bad event cannot stall the
+ledger.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.memory import register_store
+from app.core.database import async_session_maker
+from app.domain.models import UsageLedgerEntry
+from app.repositories.usage_repository import UsageRepository
+
+logger = logging.getLogger(__name__)
+
+MODEL_LENGTH = UsageLedgerEntry.__table__.c.model.type.length
+DEVICE_ID_LENGTH = UsageLedgerEntry.__table__.c.device_id.type.length
+
+
+class UsageRecorder:
+    """Buffers usage events and writes them to the ledger in batches."""
+
+    def __init__(self):
+        self.settings = get_settings()
+        self._buffer: List[dict] = []
+        self._task: Optional[asyncio.Task] = None
+        self._full: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    def start(self) -> None:
+        """Start the background flusher on the running event loop."""
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run(), name="usage-flusher")
+
+    async def stop(self) -> None:
+        """Stop the flusher and write whatever is still buffered."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def record(
+        self,
+        user_id: uuid.UUID,
+        device_id: Optional[str],
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int
+    ) -> None:
+        """Queue a usage event (never blocks the caller)."""
+        if len(self._buffer) >= self.settings.usage_buffer_limit:
+            metrics.usage_events_dropped.inc(reason="buffer_full")
+            return
+        self._buffer.append({
+            "user_id": user_id,
+            "device_id": device_id[:DEVICE_ID_LENGTH] if device_id else device_id,
+            "model": model[:MODEL_LENGTH],
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "created_at": datetime.now(timezone.utc),
+        })
+        if self._full is not None and len(self._buffer) >= self.settings.usage_batch_size:
+            self._full.set()
+
+    def pending(self) -> int:
+        """Events waiting to be written."""
+        return len(self._buffer)
+
+    def buffered(self) -> List[dict]:
+        """A copy of the events waiting to be written."""
+        return list(self._buffer)
+
+    async def flush(self) -> int:
+        """Write buffered events; returns how many were written."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            pending, written = [batch], 0
+            try:
+                while pending:
+                    chunk = pending.pop()
+                    try:
+                        async with async_session_maker() as db:
+                            await UsageRepository(db).append(chunk)
+                    except (DataError, IntegrityError):
+                        # Retrying would fail forever: bisect down to the rejected events
+                        if len(chunk) == 1:
+                            logger.error("Dropping usage event rejected by the database: %r", chunk[0], exc_info=True)
+                            metrics.usage_events_dropped.inc(reason="rejected")
+                        else:
+                            middle = len(chunk) // 2
+                            pending += [chunk[middle:], chunk[:middle]]
+                        continue
+                    except Exception:
+                        pending.append(chunk)
+                        raise
+                    written += len(chunk)
+            except Exception:
+                # Keep the unwritten events for the next attempt (bounded by usage_buffer_limit)
+                unwritten = [event for chunk in reversed(pending) for event in chunk]
+                self._buffer[:0] = unwritten[:max(0, self.settings.usage_buffer_limit - len(self._buffer))]
+                raise
+            finally:
+                metrics.usage_events_flushed.inc(written)
+            return written
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.settings.usage_flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush usage ledger")
+
+
+usage_recorder = UsageRecorder()
+register_store("usage_recorder", usage_recorder.buffered)
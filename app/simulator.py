@@ -0,0 +1,457 @@
+"""
+Edge device fleet simulator for load and capacity testing.
+
+Runs any number of fake devices in one process, each listening on its own
+TCP port and speaking the device protocol (``app.core.device_protocol``), so
+the API drives them through ``NetworkInferenceBackend`` exactly as it would
+drive real boards. Every device has a profile:
+
+* speed: decode tokens/sec, and a prefill cost per prompt token;
+* memory: model variants larger than the device are refused, and each
+  in-flight request holds KV cache memory for its context;
+* thermals: decoding heats the device, it cools towards ambient, and above
+  ``throttle_c`` it runs at ``throttle_factor`` of its speed (refusing work
+  above ``critical_c``);
+* failures: per-request probabilities of an immediate error, a hang (the
+  connection stays open but nothing is sent) or a dropped connection
+  mid-stream. Devices can also be taken offline and brought back.
+
+Usage:
+    python -m app.simulator --devices 200 --owner alice@example.com
+    python -m app.simulator --devices 50 --mix jetson=1 --error-rate 0.02 --time-scale 10
+
+``--owner`` registers the simulated devices (``sim-0000``...) for that user as
+connected; run the API with ``INFERENCE_BACKEND=network`` to route chat to them.
+"""
+import argparse
+import asyncio
+import contextlib
+import dataclasses
+import logging
+import math
+import random
+import signal
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.device_protocol import (
+    MAX_MESSAGE_BYTES, PROTOCOL_VERSION, DeviceError, decode_image, encode, read_message
+)
+from app.services.tokenizer import count_tokens, preload_tokenizers
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_WORDS = (
+    "the edge device processed your request locally and the model analyzed the input data "
+    "keeping everything private while running inference on small hardware with low latency"
+).split()
+
+
+@dataclass
+class DeviceProfile:
+    """Performance, memory, thermal and failure characteristics of a simulated device."""
+    type: str = "raspberry-pi"
+    cpu: str = "ARM Cortex-A72"
+    tokens_per_second: float = 8.0
+    prefill_ms_per_token: float = 10.0
+    prefill_base_ms: float = 50.0
+    memory_mb: int = 4096
+    kv_cache_kb_per_token: float = 64.0
+    load_seconds_per_gb: float = 1.5
+    max_concurrency: int = 1
+    response_tokens: Tuple[int, int] = (16, 48)
+    ambient_c: float = 40.0
+    heat_per_token_c: float = 0.15
+    cooling_seconds: float = 30.0  # Time constant of cooling towards ambient
+    throttle_c: float = 70.0
+    throttle_factor: float = 0.5
+    critical_c: float = 90.0
+    error_rate: float = 0.0
+    hang_rate: float = 0.0
+    disconnect_rate: float = 0.0
+    hang_seconds: float = 60.0
+
+
+PROFILES: Dict[str, DeviceProfile] = {
+    "raspberry-pi": DeviceProfile(),
+    "jetson": DeviceProfile(
+        type="jetson", cpu="ARM Cortex-A57", tokens_per_second=20.0, prefill_ms_per_token=3.0,
+        prefill_base_ms=30.0, memory_mb=4096, load_seconds_per_gb=1.0, heat_per_token_c=0.1, throttle_c=75.0
+    ),
+    "coral": DeviceProfile(
+        type="coral", cpu="ARM Cortex-A53", tokens_per_second=4.0, prefill_ms_per_token=25.0,
+        prefill_base_ms=80.0, memory_mb=1024, load_seconds_per_gb=2.5, heat_per_token_c=0.25
+    ),
+}
+
+
+def variant_memory_mb() -> Dict[str, int]:
+    """Memory needed by each configured model variant, by variant name."""
+    return {
+        variant["name"]: int(variant.get("memory_mb", 0))
+        for variants in get_settings().model_variants.values()
+        for variant in variants
+    }
+
+
+class SimulatedDevice:
+    """One fake device: a TCP listener and the state behind it."""
+
+    def __init__(
+        self,
+        device_id: str,
+        profile: DeviceProfile,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        time_scale: float = 1.0,
+        seed: Optional[int] = None
+    ):
+        self.id = device_id
+        self.profile = profile
+        self.host = host
+        self.port = port
+        self.time_scale = time_scale
+        self.random = random.Random(seed)
+        self.variant: Optional[str] = None
+        self.variant_mb = 0
+        self.kv_cache_mb = 0.0
+        self.active = 0
+        self.served = 0
+        self.failed = 0
+        self._temperature = profile.ambient_c
+        self._temperature_at = time.monotonic()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: set = set()
+
+    @property
+    def online(self) -> bool:
+        return self._server is not None
+
+    async def start(self) -> None:
+        """Start listening; with ``port=0`` the first start picks a free port and keeps it."""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_MESSAGE_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        """Go offline: stop listening and drop open connections (resident model is lost)."""
+        if self._server is None:
+            return
+        self._server.close()
+        for handler in list(self._handlers):
+            handler.cancel()
+        await self._server.wait_closed()
+        self._server = None
+        self.variant, self.variant_mb, self.kv_cache_mb, self.active = None, 0, 0.0, 0
+
+    def temperature(self) -> float:
+        """Current temperature, cooling exponentially towards ambient since the last update."""
+        now = time.monotonic()
+        elapsed = (now - self._temperature_at) * self.time_scale
+        ambient = self.profile.ambient_c
+        self._temperature = ambient + (self._temperature - ambient) * math.exp(-elapsed / self.profile.cooling_seconds)
+        self._temperature_at = now
+        return self._temperature
+
+    def heat(self, tokens: int) -> None:
+        self._temperature = self.temperature() + tokens * self.profile.heat_per_token_c
+
+    def speed_factor(self) -> float:
+        return self.profile.throttle_factor if self.temperature() >= self.profile.throttle_c else 1.0
+
+    def status(self) -> dict:
+        temperature = self.temperature()
+        return {
+            "id": self.id,
+            "protocol": PROTOCOL_VERSION,
+            "type": self.profile.type,
+            "temperatureC": round(temperature, 1),
+            "throttled": temperature >= self.profile.throttle_c,
+            "variant": self.variant,
+            "memoryMb": self.profile.memory_mb,
+            "memoryUsedMb": round(self.variant_mb + self.kv_cache_mb, 1),
+            "active": self.active,
+            "served": self.served,
+            "failed": self.failed,
+        }
+
+    def specs(self) -> dict:
+        """``Device.specs`` for this device, including where it listens."""
+        return {
+            "cpu": self.profile.cpu,
+            "memory": f"{self.profile.memory_mb / 1024:g}GB RAM",
+            "temperature": round(self.temperature()),
+            "usage": 0,
+            "port": self.port,
+            "simulated": True,
+        }
+
+    async def _sleep(self, seconds: float) -> None:
+        await asyncio.sleep(seconds / self.time_scale)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        try:
+            request = await read_message(reader)
+            if request is None:
+                return
+            operation = request.get("op")
+            if operation == "status":
+                writer.write(encode(self.status()))
+            elif operation == "load":
+                await self._load(str(request.get("variant") or ""))
+                writer.write(encode({"ok": True, "variant": self.variant}))
+            elif operation == "generate":
+                await self._generate(request, writer)
+            else:
+                raise DeviceError(f"Unknown operation {operation!r}", "bad_request")
+            await writer.drain()
+        except DeviceError as exc:
+            self.failed += 1
+            with contextlib.suppress(ConnectionError):
+                writer.write(encode({"error": str(exc), "code": exc.code}))
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # Cancelled when the device goes offline; ending quietly closes the connection
+            pass
+        finally:
+            self._handlers.discard(handler)
+            writer.close()
+
+    async def _load(self, variant: str) -> None:
+        needed_mb = variant_memory_mb().get(variant, 0)
+        if needed_mb + self.kv_cache_mb > self.profile.memory_mb:
+            raise DeviceError(
+                f"{variant} needs {needed_mb}MB; {self.profile.memory_mb}MB available", "out_of_memory"
+            )
+        if variant == self.variant:
+            return
+        self.variant, self.variant_mb = None, 0
+        await self._sleep(needed_mb / 1024 * self.profile.load_seconds_per_gb)
+        self.variant, self.variant_mb = variant, needed_mb
+
+    async def _generate(self, request: dict, writer: asyncio.StreamWriter) -> None:
+        profile = self.profile
+        if self.temperature() >= profile.critical_c:
+            raise DeviceError("Device is too hot to run inference", "overheated")
+        if self.active >= profile.max_concurrency:
+            raise DeviceError("Device is busy", "busy")
+        if self.random.random() < profile.error_rate:
+            raise DeviceError("Injected inference failure", "injected")
+
+        images = [decode_image(image) for image in request.get("images") or []]
+        prompt_tokens = count_tokens(str(request.get("prompt") or ""))
+        response_tokens = self.random.randint(*profile.response_tokens)
+        kv_cache_mb = (prompt_tokens + response_tokens) * profile.kv_cache_kb_per_token / 1024
+        if self.variant_mb + self.kv_cache_mb + kv_cache_mb > profile.memory_mb:
+            raise DeviceError("Not enough memory for the context", "out_of_memory")
+
+        # Where in the response an injected hang or disconnect happens (-1: none)
+        fail_at = self.random.randrange(response_tokens) if response_tokens else 0
+        hang_at = fail_at if self.random.random() < profile.hang_rate else -1
+        drop_at = fail_at if hang_at < 0 and self.random.random() < profile.disconnect_rate else -1
+
+        self.active += 1
+        self.kv_cache_mb += kv_cache_mb
+        try:
+            await self._sleep((profile.prefill_base_ms + prompt_tokens * profile.prefill_ms_per_token) / 1000 / self.speed_factor())
+            for index in range(response_tokens):
+                if index == hang_at:
+                    await self._sleep(profile.hang_seconds)
+                if index == drop_at:
+                    self.failed += 1
+                    writer.transport.abort()
+                    return
+                word = RESPONSE_WORDS[index % len(RESPONSE_WORDS)]
+                if index == 0 and images:
+                    word = f"({len(images)} image(s), {sum(len(data) for _, data in images)} bytes) {word}"
+                writer.write(encode({"token": word if index == 0 else " " + word}))
+                await writer.drain()
+                self.heat(1)
+                if profile.tokens_per_second > 0:
+                    await self._sleep(1.0 / (profile.tokens_per_second * self.speed_factor()))
+            writer.write(encode({"done": True, "tokens": response_tokens, "promptTokens": prompt_tokens}))
+            self.served += 1
+        finally:
+            self.active -= 1
+            self.kv_cache_mb -= kv_cache_mb
+
+
+@dataclass
+class FleetConfig:
+    """How many devices to simulate and how their profiles vary."""
+    devices: int = 100
+    mix: Dict[str, float] = field(default_factory=lambda: {"raspberry-pi": 0.6, "jetson": 0.3, "coral": 0.1})
+    overrides: Dict[str, object] = field(default_factory=dict)  # DeviceProfile fields applied to every device
+    host: str = "127.0.0.1"
+    base_port: int = 0  # 0 picks free ports; otherwise device N listens on base_port + N
+    id_prefix: str = "sim"
+    time_scale: float = 1.0  # >1 runs every delay faster than real time
+    speed_jitter: float = 0.1  # Per-device +/- fraction applied to tokens/sec and prefill cost
+    seed: Optional[int] = None
+
+
+class SimulatedFleet:
+    """A set of simulated devices started and stopped together."""
+
+    def __init__(self, config: FleetConfig):
+        self.config = config
+        rng = random.Random(config.seed)
+        names = list(config.mix)
+        weights = [config.mix[name] for name in names]
+        self.devices: List[SimulatedDevice] = []
+        for index in range(config.devices):
+            profile = dataclasses.replace(PROFILES[rng.choices(names, weights)[0]], **config.overrides)
+            jitter = 1 + rng.uniform(-config.speed_jitter, config.speed_jitter)
+            profile.tokens_per_second *= jitter
+            profile.prefill_ms_per_token /= jitter
+            self.devices.append(SimulatedDevice(
+                f"{config.id_prefix}-{index:04d}",
+                profile,
+                host=config.host,
+                port=config.base_port + index if config.base_port else 0,
+                time_scale=config.time_scale,
+                seed=rng.randrange(2 ** 32),
+            ))
+
+    def __getitem__(self, device_id: str) -> SimulatedDevice:
+        for device in self.devices:
+            if device.id == device_id:
+                return device
+        raise KeyError(device_id)
+
+    @property
+    def ids(self) -> List[str]:
+        return [device.id for device in self.devices]
+
+    async def start(self) -> None:
+        await asyncio.gather(*(device.start() for device in self.devices))
+
+    async def stop(self) -> None:
+        await asyncio.gather(*(device.stop() for device in self.devices))
+
+    def device_rows(self, owner_id=None, status: str = "connected") -> List[dict]:
+        """``devices`` rows that point the API at the simulated devices."""
+        return [
+            {
+                "id": device.id,
+                "name": f"Simulated {device.profile.type} {device.id}",
+                "type": device.profile.type,
+                "ip": device.host,
+                "status": status,
+                "specs": device.specs(),
+                "user_id": owner_id,
+            }
+            for device in self.devices
+        ]
+
+    async def register(self, owner_email: Optional[str] = None) -> int:
+        """Upsert the fleet into the devices table (owned by ``owner_email`` and connected, if given)."""
+        from app.core.database import async_session_maker
+        from app.repositories.device_repository import DeviceRepository
+        from app.repositories.user_repository import UserRepository
+
+        async with async_session_maker() as db:
+            owner_id = None
+            if owner_email:
+                owner = await UserRepository(db).get_by_email(owner_email)
+                if owner is None:
+                    raise ValueError(f"No user with email {owner_email}")
+                owner_id = owner.id
+            rows = self.device_rows(owner_id, "connected" if owner_id else "disconnected")
+            return await DeviceRepository(db).upsert_many(rows)
+
+    def summary(self) -> dict:
+        statuses = [device.status() for device in self.devices]
+        return {
+            "devices": len(statuses),
+            "online": sum(device.online for device in self.devices),
+            "active": sum(status["active"] for status in statuses),
+            "served": sum(status["served"] for status in statuses),
+            "failed": sum(status["failed"] for status in statuses),
+            "throttled": sum(status["throttled"] for status in statuses),
+            "maxTemperatureC": max((status["temperatureC"] for status in statuses), default=None),
+        }
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in PROFILES:
+            raise argparse.ArgumentTypeError(f"Unknown profile {name!r} (choose from {', '.join(PROFILES)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m app.simulator", description="Simulated edge device fleet")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--mix", type=parse_mix, default=None, help="Profile weights, e.g. raspberry-pi=3,jetson=1")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=0, help="Device N listens on base-port + N (default: free ports)")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Run delays this many times faster")
+    parser.add_argument("--tokens-per-second", type=float, default=None, help="Override every profile's decode speed")
+    parser.add_argument("--memory-mb", type=int, default=None, help="Override every profile's memory")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--disconnect-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--owner", default=None, help="Register the devices as connected for this user")
+    parser.add_argument("--report-interval", type=float, default=10.0)
+    return parser.parse_args(argv)
+
+
+def fleet_config(args: argparse.Namespace) -> FleetConfig:
+    overrides = {
+        "error_rate": args.error_rate,
+        "hang_rate": args.hang_rate,
+        "disconnect_rate": args.disconnect_rate,
+    }
+    if args.tokens_per_second is not None:
+        overrides["tokens_per_second"] = args.tokens_per_second
+    if args.memory_mb is not None:
+        overrides["memory_mb"] = args.memory_mb
+    config = FleetConfig(
+        devices=args.devices,
+        overrides=overrides,
+        host=args.host,
+        base_port=args.base_port,
+        time_scale=args.time_scale,
+        seed=args.seed,
+    )
+    if args.mix:
+        config.mix = args.mix
+    return config
+
+
+async def serve(args: argparse.Namespace) -> None:
+    await preload_tokenizers()
+    fleet = SimulatedFleet(fleet_config(args))
+    await fleet.start()
+    if args.owner:
+        await fleet.register(args.owner)
+    first, last = fleet.devices[0], fleet.devices[-1]
+    print(f"{len(fleet.devices)} devices listening ({first.id} on {first.port} ... {last.id} on {last.port})")
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+    while not stopping.is_set():
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(stopping.wait(), args.report_interval)
+        print(fleet.summary(), flush=True)
+    await fleet.stop()
+
+
+def main(argv=None) -> int:
+    asyncio.run(serve(parse_args(argv)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
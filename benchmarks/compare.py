@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Compare two benchmark result files and flag regressions.
+
+Usage:
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Tuple
+
+# Metrics where a larger value is worse
+LATENCY_METRICS = ("p50_ms", "p95_ms", "p99_ms")
+# Metrics where a smaller value is worse
+THROUGHPUT_METRICS = ("throughput_rps",)
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def pct_change(old: float, new: float) -> float:
+    if not old:
+        return 0.0
+    return (new - old) / old * 100.0
+
+
+def compare(baseline: Dict[str, Any], candidate: Dict[str, Any], threshold: float) -> Tuple[List[str], List[str]]:
+    """Return (report lines, regression lines)."""
+    lines, regressions = [], []
+    for name, new in sorted(candidate["scenarios"].items()):
+        old = baseline["scenarios"].get(name)
+        if old is None:
+            lines.append(f"{name:<24} (new scenario)")
+            continue
+        parts = []
+        for metric in LATENCY_METRICS + THROUGHPUT_METRICS:
+            change = pct_change(old[metric], new[metric])
+            parts.append(f"{metric}={new[metric]:.2f} ({change:+.1f}%)")
+            worse = change > threshold if metric in LATENCY_METRICS else change < -threshold
+            if worse:
+                regressions.append(f"{name}: {metric} {old[metric]:.2f} -> {new[metric]:.2f} ({change:+.1f}%)")
+        if new.get("errors", 0) > old.get("errors", 0):
+            regressions.append(f"{name}: errors {old.get('errors', 0)} -> {new['errors']}")
+        lines.append(f"{name:<24} " + "  ".join(parts))
+    return lines, regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare benchmark results")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed regression in percent")
+    args = parser.parse_args()
+    
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    print(f"baseline: {baseline['meta'].get('commit')}  candidate: {candidate['meta'].get('commit')}")
+    lines, regressions = compare(baseline, candidate, args.threshold)
+    print("\n".join(lines))
+    
+    if regressions:
+        print(f"\nRegressions beyond {args.threshold:.0f}%:")
+        print("\n".join(f"  {line}" for line in regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
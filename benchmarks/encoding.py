@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Bytes on the wire and encode time of the negotiated list formats.
+
+Builds chat history pages like ``GET /chat/messages`` returns (text plus
+some legacy messages carrying base64 data URL images) and, for every body
+format and content encoding, measures the response size, the server-side
+encode time (serialize + compress) and the client-side decode time.
+``cached`` rows are immutable pages: compressed once at the best level, so
+later requests cost a cache lookup. The generated images are random bytes,
+which (like JPEG data) barely compress; ``--image-every 0`` shows text only.
+
+Usage:
+    python -m benchmarks.encoding --sizes 10,100,1000 --trials 20
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from benchmarks.harness import ScenarioResult, build_report, git_revision, write_report
+from app.core.encoding import BEST, DEFAULT, FAST, JSON, MSGPACK, compress, effort_for, msgpack, serialize, zstandard
+
+WORDS = "edge device model inference latency token memory thermal battery sensor camera network local".split()
+
+
+def history(size: int, image_every: int, image_bytes: int, seed: int = 0) -> List[dict]:
+    """A page of ``size`` messages shaped like ``ChatMessageResponse``."""
+    rng = random.Random(seed)
+    started = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    conversation_id = str(uuid.UUID(int=rng.getrandbits(128)))
+    messages = []
+    for index in range(size):
+        images = []
+        if image_every and index % image_every == 0:
+            data = rng.randbytes(image_bytes)
+            images = [f"data:image/jpeg;base64,{base64.b64encode(data).decode()}"]
+        messages.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "role": "user" if index % 2 == 0 else "assistant",
+            "content": " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 80))),
+            "images": images,
+            "fullImages": None,
+            "debug": None,
+            "status": None,
+            "conversationId": conversation_id,
+            "createdAt": (started + timedelta(seconds=index * 7)).isoformat(),
+        })
+    return messages
+
+
+def decode(body: bytes, media_type: str, encoding: Optional[str]) -> object:
+    if encoding == "zstd":
+        body = zstandard.ZstdDecompressor().decompress(body)
+    elif encoding == "gzip":
+        body = gzip.decompress(body)
+    return msgpack.unpackb(body) if media_type == MSGPACK else json.loads(body)
+
+
+def measure(payload: List[dict], media_type: str, encoding: Optional[str], cached: bool, trials: int) -> dict:
+    encode_ms, decode_ms = ScenarioResult(name="encode"), ScenarioResult(name="decode")
+    body = b""
+    for _ in range(trials):
+        started = time.perf_counter()
+        body = serialize(payload, media_type)
+        if encoding:
+            effort = effort_for(len(body))
+            body = compress(body, encoding, (BEST if effort != FAST else DEFAULT) if cached else effort)
+        encode_ms.latencies_ms.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        decode(body, media_type, encoding)
+        decode_ms.latencies_ms.append((time.perf_counter() - started) * 1000)
+    encode, decoded = encode_ms.summary(), decode_ms.summary()
+    return {
+        "bytes": len(body),
+        "encode_p50_ms": encode["p50_ms"],
+        "encode_p95_ms": encode["p95_ms"],
+        "decode_p50_ms": decoded["p50_ms"],
+        "_encode": encode_ms,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="List response format and compression benchmark")
+    parser.add_argument("--sizes", default="10,100,1000", help="Messages per history page")
+    parser.add_argument("--image-every", type=int, default=10, help="Every Nth message carries a data URL image (0: none)")
+    parser.add_argument("--image-bytes", type=int, default=24 * 1024)
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    formats = [JSON] + ([MSGPACK] if msgpack is not None else [])
+    encodings: List[Optional[str]] = [None, "gzip"] + (["zstd"] if zstandard is not None else [])
+    results, rows = [], {}
+    print(f"{'page':<24} {'format':<8} {'encoding':<9} {'bytes':>10} {'vs json':>8} "
+          f"{'encode p50':>11} {'decode p50':>11}")
+    for size in [int(size) for size in args.sizes.split(",") if size]:
+        payload = history(size, args.image_every, args.image_bytes)
+        baseline = None
+        for media_type in formats:
+            for encoding in encodings:
+                for cached in ((False, True) if encoding else (False,)):
+                    label = media_type.split("/")[-1]
+                    name = f"history[{size}].{label}.{encoding or 'identity'}{'.cached' if cached else ''}"
+                    row = measure(payload, media_type, encoding, cached, args.trials)
+                    baseline = baseline or row["bytes"]
+                    result = row.pop("_encode")
+                    result.name = name
+                    results.append(result)
+                    rows[name] = row
+                    print(f"{f'history[{size}]':<24} {label:<8} {(encoding or 'identity') + ('*' if cached else ''):<9} "
+                          f"{row['bytes']:>10} {row['bytes'] / baseline:>7.1%} "
+                          f"{row['encode_p50_ms']:>9.2f}ms {row['decode_p50_ms']:>9.2f}ms")
+    print("* cached immutable page: compressed once at the best level; later requests skip encoding entirely")
+
+    report = build_report(results, {
+        "sizes": args.sizes,
+        "image_every": args.image_every,
+        "image_bytes": args.image_bytes,
+        "trials": args.trials,
+    })
+    for name, row in rows.items():
+        report["scenarios"][name].update(row)
+    output = args.output or os.path.join(
+        "benchmarks", "results",
+        f"encoding-{git_revision() or 'unknown'}-{datetime.now().strftime('%Y%m%d%H%M%S')}.json"
+    )
+    write_report(report, output)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Benchmark harness for driving the ASGI app in-process.
+"""
+import asyncio
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+
+DEFAULT_DATABASE_URL = "sqlite+aiosqlite:///./benchmarks/bench.db"
+
+
+def configure_environment(
+    database_url: str,
+    inference_delay_min: float,
+    inference_delay_max: float,
+    inference_backend: str = "mock",
+) -> None:
+    """Configure settings through the environment before the app is imported."""
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["INFERENCE_BACKEND"] = inference_backend
+    os.environ["DATABASE_ECHO"] = "false"
+    os.environ["MOCK_INFERENCE_DELAY_MIN"] = str(inference_delay_min)
+    os.environ["MOCK_INFERENCE_DELAY_MAX"] = str(inference_delay_max)
+    os.environ["DEVICE_CONNECT_TIMEOUT"] = "0"
+    os.environ["DEVICE_SCAN_TIMEOUT"] = "0"
+    os.environ["MOCK_MODEL_LOAD_SECONDS"] = "0"
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+@dataclass
+class ScenarioResult:
+    """Latency samples and error count for a single scenario."""
+    name: str
+    latencies_ms: List[float] = field(default_factory=list)
+    errors: int = 0
+    wall_time_s: float = 0.0
+    
+    def summary(self) -> Dict[str, Any]:
+        """Summarize samples as percentiles and throughput."""
+        values = sorted(self.latencies_ms)
+        count = len(values)
+        return {
+            "count": count,
+            "errors": self.errors,
+            "mean_ms": round(sum(values) / count, 3) if count else 0.0,
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+            "max_ms": round(values[-1], 3) if count else 0.0,
+            "throughput_rps": round(count / self.wall_time_s, 3) if self.wall_time_s else 0.0,
+        }
+
+
+@dataclass
+class Scenario:
+    """A named benchmark operation with optional one-off setup."""
+    name: str
+    operation: Callable[[httpx.AsyncClient, int], Awaitable[None]]
+    setup: Optional[Callable[[httpx.AsyncClient], Awaitable[None]]] = None
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    requests: int,
+    concurrency: int,
+    warmup: int = 0,
+) -> ScenarioResult:
+    """Run a scenario with a fixed number of operations across concurrent workers."""
+    if scenario.setup:
+        await scenario.setup(client)
+    
+    for i in range(warmup):
+        await scenario.operation(client, -1 - i)
+    
+    result = ScenarioResult(name=scenario.name)
+    counter = iter(range(requests))
+    
+    async def worker() -> None:
+        for index in counter:
+            started = time.perf_counter()
+            try:
+                await scenario.operation(client, index)
+            except Exception:
+                result.errors += 1
+                continue
+            result.latencies_ms.append((time.perf_counter() - started) * 1000)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.wall_time_s = time.perf_counter() - started
+    return result
+
+
+def check(response: httpx.Response) -> httpx.Response:
+    """Raise for non-2xx responses so they are counted as errors."""
+    response.raise_for_status()
+    return response
+
+
+def git_revision() -> Optional[str]:
+    """Return the current git commit, if available."""
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip() or None
+
+
+def max_rss_mb() -> float:
+    """Peak resident memory of this process."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+
+def build_report(results: List[ScenarioResult], config: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a machine-readable benchmark report."""
+    return {
+        "meta": {
+            "commit": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": config,
+            "max_rss_mb": round(max_rss_mb(), 1),
+        },
+        "scenarios": {result.name: result.summary() for result in results},
+    }
+
+
+def write_report(report: Dict[str, Any], path: str) -> None:
+    """Write a benchmark report as JSON."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Search latency and recall of the chat history retrieval index.
+
+Builds one user's index from a synthetic history (words drawn from a
+Zipf-like vocabulary, so some words are common and most are rare) and, for
+each size, times ``retrieval_top_k`` searches for half-remembered earlier
+messages with exact cosine scoring and with the IVF index, reporting recall
+of the IVF results against the exact ones. The chat path spends about this
+much per turn (plus embedding the message) when the user's index is open.
+
+Usage:
+    python -m benchmarks.retrieval --sizes 1000,20000,100000 --queries 200
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from typing import List
+
+from benchmarks.harness import ScenarioResult, build_report, git_revision, write_report
+from app.core.config import get_settings
+from app.services.retrieval import HashingEmbedder, Mapping, UserIndex, np
+
+
+def corpus(size: int, vocabulary: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    words = [f"w{index}" for index in range(vocabulary)]
+    weights = [1 / (rank + 1) for rank in range(vocabulary)]
+    return [" ".join(rng.choices(words, weights, k=rng.randint(6, 60))) for _ in range(size)]
+
+
+def paraphrases(texts: List[str], count: int, seed: int = 1) -> List[str]:
+    """Queries about earlier messages: half the words of randomly chosen ones."""
+    rng = random.Random(seed)
+    queries = []
+    for text in rng.sample(texts, min(count, len(texts))):
+        words = text.split()
+        queries.append(" ".join(rng.sample(words, max(1, len(words) // 2))))
+    return queries
+
+
+def build(root: str, texts: List[str], embedder: HashingEmbedder, snippet_bytes: int) -> UserIndex:
+    index = UserIndex(root, embedder.dim, snippet_bytes)
+    index.open()
+    for start in range(0, len(texts), 10000):
+        batch = texts[start:start + 10000]
+        entries = np.array(
+            [(uuid.uuid4().bytes, bytes(16), 0, text.encode()[:snippet_bytes]) for text in batch], dtype=index.dtype
+        )
+        index.stage(embedder.embed_many(batch), entries)
+    index.remapped(index.commit_staged())
+    index.ready = True
+    return index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Chat history retrieval benchmark")
+    parser.add_argument("--sizes", default="1000,20000,100000", help="Messages in the index")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    if np is None:
+        raise SystemExit("numpy is required for retrieval")
+    settings = get_settings()
+    embedder = HashingEmbedder(settings.retrieval_dim)
+    k, probes = settings.retrieval_top_k, settings.retrieval_ann_probes
+    results, rows = [], {}
+    root = tempfile.mkdtemp(prefix="retrieval-bench-")
+    print(f"{'index':<18} {'mode':<6} {'p50':>9} {'p95':>9} {'recall':>7}")
+    try:
+        for size in [int(size) for size in args.sizes.split(",") if size]:
+            texts = corpus(size, args.vocabulary)
+            index = build(os.path.join(root, str(size)), texts, embedder, settings.retrieval_snippet_bytes)
+            started = time.perf_counter()
+            index.remapped(index.train(Mapping(index.vectors, index.entries, index.inode)))
+            train_seconds = time.perf_counter() - started
+            ivf = index.ivf
+            queries = [embedder.embed(text) for text in paraphrases(texts, args.queries)]
+
+            found = {}
+            for mode in ("exact", "ann"):
+                index.ivf = ivf if mode == "ann" else None
+                result = ScenarioResult(name=f"search[{size}].{mode}")
+                found[mode] = []
+                for query in queries:
+                    started = time.perf_counter()
+                    snippets, _ = index.search(query, k, -1.0, probes)
+                    result.latencies_ms.append((time.perf_counter() - started) * 1000)
+                    found[mode].append({snippet.message_id for snippet in snippets})
+                results.append(result)
+                summary = result.summary()
+                recall = sum(
+                    len(exact & approximate) for exact, approximate in zip(found["exact"], found[mode])
+                ) / max(1, sum(len(exact) for exact in found["exact"]))
+                rows[result.name] = {"recall": round(recall, 4)}
+                if mode == "ann":
+                    rows[result.name].update({"lists": len(ivf.centroids), "train_seconds": round(train_seconds, 3)})
+                print(f"{f'search[{size}]':<18} {mode:<6} {summary['p50_ms']:>7.3f}ms {summary['p95_ms']:>7.3f}ms "
+                      f"{recall:>7.1%}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    report = build_report(results, {
+        "sizes": args.sizes,
+        "queries": args.queries,
+        "vocabulary": args.vocabulary,
+        "dim": settings.retrieval_dim,
+        "top_k": k,
+        "probes": probes,
+    })
+    for name, row in rows.items():
+        report["scenarios"][name].update(row)
+    output = args.output or os.path.join(
+        "benchmarks", "results",
+        f"retrieval-{git_revision() or 'unknown'}-{datetime.now().strftime('%Y%m%d%H%M%S')}.json"
+    )
+    write_report(report, output)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Benchmark scenarios covering the main API paths.
+
+Import this module only after ``harness.configure_environment`` has run so the
+application settings pick up the benchmark database and inference latency.
+"""
+import uuid
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.core.database import Base, engine, async_session_maker
+from app.domain.models import ChatMessage, Device, User
+from app.repositories.device_repository import DeviceRepository
+from app.simulator import SimulatedDevice
+from benchmarks.harness import Scenario, check
+
+API = "/api/v1"
+
+
+async def reset_database() -> None:
+    """Recreate all tables in the benchmark database."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def login(client: httpx.AsyncClient, email: str) -> Dict[str, str]:
+    """Log in and return session headers."""
+    response = check(await client.post(f"{API}/auth/login", json={"email": email, "password": "bench"}))
+    return {"X-Session-Id": response.json()["sessionId"]}
+
+
+async def user_id_for(email: str) -> uuid.UUID:
+    """Look up a user ID by email."""
+    from sqlalchemy import select
+    async with async_session_maker() as session:
+        result = await session.execute(select(User.id).where(User.email == email))
+        return result.scalar_one()
+
+
+async def seed_devices(user_id: uuid.UUID, prefix: str, count: int) -> List[str]:
+    """Insert devices owned by a user."""
+    device_ids = [f"{prefix}-{i:05d}" for i in range(count)]
+    async with async_session_maker() as session:
+        session.add_all([
+            Device(
+                id=device_id,
+                name=f"Bench device {device_id}",
+                type="raspberry-pi",
+                ip="10.0.0.1",
+                status="connected",
+                specs={"cpu": "ARM Cortex-A72", "memory": "4GB RAM", "temperature": 40, "usage": 10},
+                user_id=user_id
+            )
+            for device_id in device_ids
+        ])
+        await session.commit()
+    return device_ids
+
+
+async def register_simulated(user_id: uuid.UUID, devices: List[SimulatedDevice]) -> List[str]:
+    """Register simulated devices as connected boards owned by a user."""
+    async with async_session_maker() as session:
+        await DeviceRepository(session).upsert_many([
+            {
+                "id": device.id,
+                "name": f"Bench {device.profile.type} {device.id}",
+                "type": device.profile.type,
+                "ip": device.host,
+                "status": "connected",
+                "specs": device.specs(),
+                "user_id": user_id,
+            }
+            for device in devices
+        ])
+    return [device.id for device in devices]
+
+
+async def seed_history(user_id: uuid.UUID, device_id: str, count: int) -> None:
+    """Insert alternating user/assistant messages for a user."""
+    async with async_session_maker() as session:
+        session.add_all([
+            ChatMessage(
+                user_id=user_id,
+                device_id=device_id,
+                role="user" if i % 2 == 0 else "assistant",
+                content=f"Benchmark message {i} " + "lorem ipsum " * 10,
+                images=[]
+            )
+            for i in range(count)
+        ])
+        await session.commit()
+
+
+def login_scenario(user_pool: int) -> Scenario:
+    """Login against a rotating pool of users (first pass creates them)."""
+    async def operation(client: httpx.AsyncClient, index: int) -> None:
+        await login(client, f"bench-login-{index % user_pool}@example.com")
+    
+    return Scenario(name="auth_login", operation=operation)
+
+
+def device_list_scenario(device_count: int) -> Scenario:
+    """List devices for a user owning ``device_count`` boards."""
+    state: Dict[str, Dict[str, str]] = {}
+    
+    async def setup(client: httpx.AsyncClient) -> None:
+        email = "bench-devices@example.com"
+        state["headers"] = await login(client, email)
+        await seed_devices(await user_id_for(email), "bench-list", device_count)
+    
+    async def operation(client: httpx.AsyncClient, index: int) -> None:
+        check(await client.get(f"{API}/devices", headers=state["headers"]))
+    
+    return Scenario(name="devices_list", operation=operation, setup=setup)
+
+
+def chat_send_scenario(device: Optional[SimulatedDevice] = None) -> Scenario:
+    """Send a text chat message; latency includes the fake (or simulated device) inference delay."""
+    state: Dict[str, object] = {}
+    
+    async def setup(client: httpx.AsyncClient) -> None:
+        email = "bench-chat@example.com"
+        state["headers"] = await login(client, email)
+        user_id = await user_id_for(email)
+        if device is None:
+            state["device_id"] = (await seed_devices(user_id, "bench-chat", 1))[0]
+        else:
+            state["device_id"] = (await register_simulated(user_id, [device]))[0]
+    
+    async def operation(client: httpx.AsyncClient, index: int) -> None:
+        check(await client.post(
+            f"{API}/chat/message",
+            data={"message": f"Benchmark prompt {index}", "deviceId": state["device_id"]},
+            headers=state["headers"]
+        ))
+    
+    return Scenario(name="chat_send", operation=operation, setup=setup)
+
+
+def fleet_chat_scenario(devices: List[SimulatedDevice]) -> Scenario:
+    """Send chat messages without choosing a device, so the API routes them across a simulated fleet."""
+    state: Dict[str, Dict[str, str]] = {}
+    
+    async def setup(client: httpx.AsyncClient) -> None:
+        email = "bench-fleet@example.com"
+        state["headers"] = await login(client, email)
+        await register_simulated(await user_id_for(email), devices)
+    
+    async def operation(client: httpx.AsyncClient, index: int) -> None:
+        check(await client.post(
+            f"{API}/chat/message",
+            data={"message": f"Fleet prompt {index} " + "context " * (index % 50)},
+            headers=state["headers"]
+        ))
+    
+    return Scenario(name=f"fleet_chat[{len(devices)}]", operation=operation, setup=setup)
+
+
+def chat_history_scenario(size: int) -> Scenario:
+    """Fetch a chat history containing ``size`` messages."""
+    state: Dict[str, Dict[str, str]] = {}
+    
+    async def setup(client: httpx.AsyncClient) -> None:
+        email = f"bench-history-{size}@example.com"
+        state["headers"] = await login(client, email)
+        user_id = await user_id_for(email)
+        device_ids = await seed_devices(user_id, f"bench-history-{size}", 1)
+        await seed_history(user_id, device_ids[0], size)
+    
+    async def operation(client: httpx.AsyncClient, index: int) -> None:
+        check(await client.get(f"{API}/chat/messages", headers=state["headers"]))
+    
+    return Scenario(name=f"chat_history[{size}]", operation=operation, setup=setup)
+
+
+def admin_devices_crud_scenario() -> Scenario:
+    """Create, update and delete a device through the admin API (one cycle per op)."""
+    state: Dict[str, Dict[str, str]] = {}
+    
+    async def setup(client: httpx.AsyncClient) -> None:
+        state["headers"] = await login(client, "bench-admin@example.com")
+    
+    async def operation(client: httpx.AsyncClient, index: int) -> None:
+        headers = state["headers"]
+        device_id = f"bench-admin-{uuid.uuid4().hex[:12]}"
+        check(await client.post(
+            f"{API}/admin/devices",
+            json={"id": device_id, "name": "Bench", "type": "jetson", "ip": "10.0.0.2"},
+            headers=headers
+        ))
+        check(await client.patch(f"{API}/admin/devices/{device_id}", json={"name": "Bench 2"}, headers=headers))
+        check(await client.delete(f"{API}/admin/devices/{device_id}", headers=headers))
+    
+    return Scenario(name="admin_devices_crud", operation=operation, setup=setup)
+
+
+def admin_services_crud_scenario() -> Scenario:
+    """Create, update and delete an admin service (one cycle per op)."""
+    state: Dict[str, Dict[str, str]] = {}
+    
+    async def setup(client: httpx.AsyncClient) -> None:
+        state["headers"] = await login(client, "bench-admin@example.com")
+    
+    async def operation(client: httpx.AsyncClient, index: int) -> None:
+        headers = state["headers"]
+        response = check(await client.post(
+            f"{API}/admin/services",
+            json={"name": "bench-service", "type": "inference", "config": {"model": "bench"}},
+            headers=headers
+        ))
+        service_id = response.json()["id"]
+        check(await client.patch(f"{API}/admin/services/{service_id}", json={"status": "inactive"}, headers=headers))
+        check(await client.delete(f"{API}/admin/services/{service_id}", headers=headers))
+    
+    return Scenario(name="admin_services_crud", operation=operation, setup=setup)
+
+
+def build_scenarios(
+    device_count: int,
+    history_sizes: List[int],
+    user_pool: int,
+    simulated: Optional[List[SimulatedDevice]] = None
+) -> List[Scenario]:
+    """Build the default scenario list.
+    
+    With ``simulated`` devices, chat goes to them over the device protocol:
+    ``chat_send`` uses the first one and ``fleet_chat`` routes across the rest.
+    """
+    fleet = [fleet_chat_scenario(simulated[1:])] if simulated and len(simulated) > 1 else []
+    return [
+        login_scenario(user_pool),
+        device_list_scenario(device_count),
+        chat_send_scenario(simulated[0] if simulated else None),
+        *fleet,
+        *(chat_history_scenario(size) for size in history_sizes),
+        admin_devices_crud_scenario(),
+        admin_services_crud_scenario(),
+    ]
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for API startup.
+
+Each trial runs in a fresh interpreter and measures importing ``app.main``
+plus the startup work for one of two modes:
+
+    check       schema version check only (the current lifespan path)
+    create_all  legacy CREATE EXTENSION + metadata.create_all on every boot
+
+Usage:
+    python -m benchmarks.startup --trials 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from benchmarks.harness import (
+    DEFAULT_DATABASE_URL, ScenarioResult, build_report, configure_environment, git_revision, write_report
+)
+
+MODES = ("check", "create_all")
+
+
+async def _startup(mode: str) -> None:
+    if mode == "check":
+        from app.main import app, lifespan
+        async with lifespan(app):
+            pass
+    else:
+        from sqlalchemy import text
+        from app.core.database import Base, engine
+        import app.domain.models  # noqa: F401
+        async with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                await conn.execute(text('CREATE EXTENSION IF NOT EXISTS "uuid-ossp"'))
+            await conn.run_sync(Base.metadata.create_all)
+
+
+def child(mode: str) -> None:
+    """Run one cold start and print its timings as JSON."""
+    started = time.perf_counter()
+    import app.main  # noqa: F401
+    imported = time.perf_counter()
+    asyncio.run(_startup(mode))
+    finished = time.perf_counter()
+    print(json.dumps({
+        "import_ms": (imported - started) * 1000,
+        "startup_ms": (finished - imported) * 1000,
+        "total_ms": (finished - started) * 1000,
+    }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="API cold-start benchmark")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL", DEFAULT_DATABASE_URL))
+    parser.add_argument("--trials", type=int, default=10)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    configure_environment(args.database_url, 0.0, 0.0)
+    if args.child:
+        child(args.child)
+        return
+    
+    from app.core.migrations import upgrade
+    upgrade()
+    
+    results = []
+    for mode in MODES:
+        totals = ScenarioResult(name=f"startup[{mode}]")
+        phases = {"import": ScenarioResult(name=f"startup[{mode}].import"),
+                  "startup": ScenarioResult(name=f"startup[{mode}].startup")}
+        for _ in range(args.trials):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.startup", "--database-url", args.database_url, "--child", mode],
+                capture_output=True, text=True, env=os.environ.copy()
+            )
+            if output.returncode != 0:
+                totals.errors += 1
+                print(output.stderr.strip().splitlines()[-1:] or output.returncode, file=sys.stderr)
+                continue
+            timings = json.loads(output.stdout.strip().splitlines()[-1])
+            totals.latencies_ms.append(timings["total_ms"])
+            phases["import"].latencies_ms.append(timings["import_ms"])
+            phases["startup"].latencies_ms.append(timings["startup_ms"])
+        for result in (totals, *phases.values()):
+            summary = result.summary()
+            print(f"{result.name:<30} n={summary['count']:<3} p50={summary['p50_ms']:>8.2f}ms "
+                  f"p95={summary['p95_ms']:>8.2f}ms max={summary['max_ms']:>8.2f}ms")
+            results.append(result)
+    
+    report = build_report(results, {"database": args.database_url.split("://", 1)[0], "trials": args.trials})
+    output = args.output or os.path.join(
+        "benchmarks", "results",
+        f"startup-{git_revision() or 'unknown'}-{datetime.now().strftime('%Y%m%d%H%M%S')}.json"
+    )
+    write_report(report, output)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
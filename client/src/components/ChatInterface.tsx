@@ -138,7 +138,14 @@ export function ChatInterface({
                       {msg.images && msg.images.length > 0 && (
                         <div className="flex gap-2 mt-2">
                           {msg.images.map((img, idx) => (
-                            <img key={idx} src={img} alt="Attached" className="h-20 w-20 object-cover rounded" />
+                            <a
+                              key={idx}
+                              href={msg.fullImages?.[idx] ?? img}
+                              target="_blank"
+                              rel="noopener noreferrer"
+                            >
+                              <img src={img} alt="Attached" loading="lazy" className="h-20 w-20 object-cover rounded" />
+                            </a>
                           ))}
                         </div>
                       )}
@@ -7,6 +7,7 @@ interface ChatMessage {
   role: 'user' | 'assistant';
   content: string;
   images?: string[];
+  fullImages?: string[] | null;  // Full-size images when `images` holds thumbnails
   debug?: {
     systemPrompt?: string;
     modelInputs?: Record<string, any>;
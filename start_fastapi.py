@@ -1,43 +1,58 @@
 #!/usr/bin/env python3
 """
 Start FastAPI server for Independent Research.
+
+Usage:
+    python start_fastapi.py                  # single process
+    python start_fastapi.py --prod           # one worker per core
+    python start_fastapi.py --prod --workers 4
 """
+import argparse
+import os
+
 import uvicorn
-import asyncio
-from app.main import app
-from app.core.database import get_db
-from app.repositories.device_repository import DeviceRepository
-from app.services.device_service import DeviceService
 
 
-async def initialize_data():
-    """Initialize mock data."""
+def migrate_database():
+    """Apply pending schema migrations (also seeds mock devices once)."""
+    from app.core.migrations import upgrade
     try:
-        async for db in get_db():
-            device_repo = DeviceRepository(db)
-            device_service = DeviceService(device_repo)
-            await device_service.initialize_mock_devices()
-            print("✅ Mock devices initialized successfully")
-            break
+        upgrade()
+        print("✅ Database schema is up to date")
     except Exception as e:
-        print(f"⚠️  Warning: Could not initialize mock data: {e}")
+        print(f"⚠️  Warning: Could not apply migrations: {e}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Start the Independent Research API")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("FASTAPI_PORT", "8000")))
+    parser.add_argument("--prod", action="store_true", help="Pre-fork multi-worker production mode")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
+    args = parse_args()
     print("🚀 Starting Independent Research FastAPI Backend...")
     
-    # Initialize mock data
-    try:
-        asyncio.run(initialize_data())
-    except Exception as e:
-        print(f"⚠️  Warning: Data initialization failed: {e}")
+    if args.prod:
+        # Must be set before app modules are imported so DB pools are sized per worker
+        os.environ["WEB_CONCURRENCY"] = str(args.workers or os.cpu_count() or 1)
+    
+    # Apply migrations once, before any worker starts
+    migrate_database()
     
-    # Run the server (disable reload when supervised)
-    print("🌐 FastAPI server starting on http://0.0.0.0:8000")
-    uvicorn.run(
-        "app.main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=False,
-        log_level="info"
-    )
\ No newline at end of file
+    if args.prod:
+        from app.core.server import run_production
+        run_production(args.host, args.port, int(os.environ["WEB_CONCURRENCY"]))
+    else:
+        # Run the server (disable reload when supervised)
+        print(f"🌐 FastAPI server starting on http://{args.host}:{args.port}")
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            reload=False,
+            log_level="info"
+        )
@@ -0,0 +1,161 @@
+"""
+Shared fixtures.
+
+Tests run without a database server: repositories get sessions on a SQLite
+file per test (configured like the app's own SQLite engine). ``async def``
+tests are run on a fresh event loop by the hook below, so no pytest plugin
+is needed; fixtures that need that loop return an ``AsyncResource``, which
+the hook enters before the test and exits after it.
+"""
+import asyncio
+import contextlib
+import inspect
+import os
+import tempfile
+from typing import Optional
+
+# Settings are read at import time; keep the app's own engine off PostgreSQL
+# and its files out of the working tree
+_state_dir = tempfile.mkdtemp(prefix="edge-ai-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_state_dir, 'app.db')}")
+os.environ.setdefault("DATABASE_ECHO", "false")
+os.environ.setdefault("MEDIA_ROOT", os.path.join(_state_dir, "media"))
+os.environ.setdefault("RETRIEVAL_DIR", os.path.join(_state_dir, "retrieval"))
+os.environ.setdefault("PROFILING_DIR", os.path.join(_state_dir, "profiles"))
+os.environ.setdefault("TRACING_FILE_PATH", os.path.join(_state_dir, "traces", "traces.jsonl"))
+os.environ.setdefault("ADMIN_EMAILS", '["admin@example.com"]')
+os.environ.setdefault("MOCK_INFERENCE_DELAY_MIN", "0")
+os.environ.setdefault("MOCK_INFERENCE_DELAY_MAX", "0.01")
+os.environ.setdefault("MOCK_MODEL_LOAD_SECONDS", "0")
+os.environ.setdefault("DEVICE_CONNECT_TIMEOUT", "0")
+os.environ.setdefault("DEVICE_SCAN_TIMEOUT", "0")
+
+import httpx
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import app.domain.models  # noqa: F401 - registers the tables on Base.metadata
+from app.core.database import Base, configure_sqlite
+
+
+class AsyncResource:
+    """Fixture value set up and torn down on the test's event loop.
+
+    The test receives whatever ``__aenter__`` returns.
+    """
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass
+
+
+async def _run_test(test, arguments: dict) -> None:
+    async with contextlib.AsyncExitStack() as stack:
+        for name, value in arguments.items():
+            if isinstance(value, AsyncResource):
+                arguments[name] = await stack.enter_async_context(value)
+        await test(**arguments)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    """Run ``async def`` tests with ``asyncio.run``."""
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    arguments = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(_run_test(pyfuncitem.obj, arguments))
+    return True
+
+
+class Database(AsyncResource):
+    """Schema on a fresh SQLite file; calling it opens a session.
+
+    Once entered it behaves like an ``async_sessionmaker``, including inside
+    fixtures that captured it before the test started.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.session_maker: Optional[async_sessionmaker] = None
+
+    async def __aenter__(self) -> "Database":
+        self.engine = create_async_engine(self.url)
+        configure_sqlite(self.engine.sync_engine)
+        async with self.engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        self.session_maker = async_sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.engine.dispose()
+
+    def __call__(self) -> AsyncSession:
+        return self.session_maker()
+
+
+@pytest.fixture
+def session_maker(tmp_path):
+    """Session maker over a per-test SQLite database with the full schema."""
+    return Database(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+
+
+class Api(AsyncResource):
+    """The application over an in-process transport, on a freshly created schema.
+
+    The lifespan is not run, so background workers stay stopped; tests
+    start the ones they need.
+    """
+
+    async def __aenter__(self) -> "Api":
+        from app.core.database import engine
+        from app.main import create_application
+
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.drop_all)
+            await connection.run_sync(Base.metadata.create_all)
+        self.app = create_application()
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url="http://test")
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        from app.core.database import engine
+
+        await self.client.aclose()
+        # Pooled connections belong to this test's event loop
+        await engine.dispose()
+
+    async def login(self, email: str = "user@example.com") -> dict:
+        """Log in (creating the user) and return the session headers."""
+        response = await self.client.post("/api/v1/auth/login", json={"email": email, "password": "password"})
+        response.raise_for_status()
+        return {"X-Session-Id": response.json()["sessionId"]}
+
+    async def connect_device(self, headers: dict, device_id: str = "rpi-001") -> None:
+        """Create the mock devices and connect one for the logged-in user."""
+        from app.core.database import async_session_maker
+        from app.repositories.device_repository import DeviceRepository
+        from app.services.device_service import DeviceService
+
+        async with async_session_maker() as db:
+            await DeviceService(DeviceRepository(db)).initialize_mock_devices()
+        response = await self.client.post(f"/api/v1/devices/{device_id}/connect", headers=headers)
+        response.raise_for_status()
+
+
+@pytest.fixture
+def api():
+    """The application with an HTTP client; see ``Api``."""
+    return Api()
+
+
+@pytest.fixture
+def app_settings():
+    """The application settings; values the test changes are restored afterwards."""
+    from app.core.config import get_settings
+
+    settings = get_settings()
+    saved = dict(settings.__dict__)
+    yield settings
+    settings.__dict__.update(saved)
@@ -0,0 +1,86 @@
+"""
+Fleet analytics rollups: recording, flushing and summaries.
+"""
+import asyncio
+import uuid
+
+import pytest
+
+from app.repositories.analytics_repository import AnalyticsRepository
+from app.services.analytics_service import FleetAnalytics
+
+
+async def user_id(api, email: str = "user@example.com") -> uuid.UUID:
+    headers = await api.login(email)
+    return uuid.UUID((await api.client.get("/api/v1/auth/session", headers=headers)).json()["id"])
+
+
+async def test_summary_merges_flushed_rollups(api):
+    user = await user_id(api)
+    analytics = FleetAnalytics()
+    for latency in (0.2, 0.4, 0.4, 0.8):
+        analytics.record(user, "rpi-001", "ok", latency, tokens=10, decode_seconds=0.5)
+    assert await analytics.flush() == 1
+
+    analytics.record(user, "rpi-001", "error", 4.0)
+    analytics.record(user, None, "cancelled", 1.0)
+    assert await analytics.flush() == 2
+
+    rows = {row["key"]: row for row in await analytics.summarize("device", hours=1)}
+    device = rows["rpi-001"]
+    assert device["requests"] == 5
+    assert device["errors"] == 1
+    assert device["errorRate"] == 0.2
+    assert device["tokensPerSecond"] == 20.0
+    assert 250 <= device["latencyP50Ms"] <= 500
+    assert rows[None]["cancelled"] == 1
+
+
+async def test_concurrent_flushes_write_each_event_once(api, monkeypatch):
+    user = await user_id(api)
+    analytics = FleetAnalytics()
+    increment = AnalyticsRepository.increment
+
+    async def slow_increment(self, rollups, buckets):
+        await asyncio.sleep(0.02)
+        await increment(self, rollups, buckets)
+
+    monkeypatch.setattr(AnalyticsRepository, "increment", slow_increment)
+
+    async def record_then_flush():
+        analytics.record(user, "rpi-001", "ok", 0.1)
+        await asyncio.sleep(0)
+        return await analytics.flush()
+
+    await asyncio.gather(*(record_then_flush() for _ in range(5)))
+    await analytics.flush()
+    rows = await analytics.summarize("device", hours=1)
+    assert [row["requests"] for row in rows] == [5]
+
+
+async def test_failed_flush_keeps_the_deltas(api, monkeypatch):
+    user = await user_id(api)
+    analytics = FleetAnalytics()
+    analytics.record(user, "rpi-001", "ok", 0.1)
+    increment = AnalyticsRepository.increment
+
+    async def failing_increment(self, rollups, buckets):
+        raise ConnectionResetError("database went away")
+
+    monkeypatch.setattr(AnalyticsRepository, "increment", failing_increment)
+    with pytest.raises(ConnectionResetError):
+        await analytics.flush()
+
+    analytics.record(user, "rpi-001", "ok", 0.1)
+    monkeypatch.setattr(AnalyticsRepository, "increment", increment)
+    assert await analytics.flush() == 1
+    assert [row["requests"] for row in await analytics.summarize("device", hours=1)] == [2]
+
+
+async def test_analytics_are_for_admins_only(api):
+    user = await api.login()
+    admin = await api.login("admin@example.com")
+    assert (await api.client.get("/api/v1/admin/analytics", headers=user)).status_code == 403
+    response = await api.client.get("/api/v1/admin/analytics", params={"groupBy": "user"}, headers=admin)
+    assert response.status_code == 200
+    assert response.json()["groupBy"] == "user"
@@ -0,0 +1,49 @@
+"""
+Benchmark statistics and regression comparison.
+"""
+from benchmarks.compare import compare
+from benchmarks.harness import ScenarioResult, percentile
+
+
+def scenario(p50: float, p95: float, p99: float, throughput: float, errors: int = 0) -> dict:
+    return {"p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "throughput_rps": throughput, "errors": errors}
+
+
+def test_percentile_uses_nearest_rank():
+    values = [float(value) for value in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile(values, 100) == 100.0
+    assert percentile([7.0], 95) == 7.0
+    assert percentile([], 50) == 0.0
+
+
+def test_summary_reports_percentiles_and_throughput():
+    result = ScenarioResult("chat_send", latencies_ms=[4.0, 1.0, 3.0, 2.0], errors=1, wall_time_s=2.0)
+    summary = result.summary()
+    assert summary["count"] == 4
+    assert summary["errors"] == 1
+    assert summary["mean_ms"] == 2.5
+    assert summary["p50_ms"] == 2.0
+    assert summary["max_ms"] == 4.0
+    assert summary["throughput_rps"] == 2.0
+
+
+def test_empty_summary_has_no_division_by_zero():
+    assert ScenarioResult("idle").summary()["throughput_rps"] == 0.0
+
+
+def test_compare_flags_latency_and_throughput_regressions():
+    baseline = {"scenarios": {
+        "login": scenario(10, 20, 30, 100),
+        "chat_send": scenario(10, 20, 30, 100),
+    }}
+    candidate = {"scenarios": {
+        "login": scenario(10.5, 21, 31, 98),  # within 10%
+        "chat_send": scenario(10, 25, 30, 80, errors=2),
+        "fleet_chat[10]": scenario(1, 2, 3, 4),
+    }}
+    lines, regressions = compare(baseline, candidate, threshold=10)
+    assert any("fleet_chat[10]" in line and "new scenario" in line for line in lines)
+    assert [line.split(":")[1].split()[0] for line in regressions] == ["p95_ms", "throughput_rps", "errors"]
+    assert all(line.startswith("chat_send:") for line in regressions)
@@ -0,0 +1,66 @@
+"""
+Cancelling request work when the client disconnects.
+"""
+import asyncio
+
+import pytest
+
+from app.core.cancellation import ClientDisconnected, run_until_disconnected
+
+
+class FakeRequest:
+    """Request whose client goes away at the ``disconnect_after``-th poll (never if 0)."""
+
+    def __init__(self, disconnect_after: int = 0):
+        self.polls = 0
+        self.disconnect_after = disconnect_after
+
+    async def is_disconnected(self) -> bool:
+        self.polls += 1
+        return 0 < self.disconnect_after <= self.polls
+
+
+class Work:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.cancelled = False
+
+    async def run(self) -> str:
+        try:
+            await asyncio.sleep(self.seconds)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return "done"
+
+
+async def test_returns_the_result_while_connected():
+    request = FakeRequest()
+    assert await run_until_disconnected(request, Work(0.03).run(), poll_interval=0.01) == "done"
+    assert request.polls >= 1
+
+
+async def test_disconnect_cancels_the_work():
+    work = Work(10)
+    with pytest.raises(ClientDisconnected):
+        await run_until_disconnected(FakeRequest(disconnect_after=2), work.run(), poll_interval=0.01)
+    assert work.cancelled
+
+
+async def test_cancelling_the_handler_cancels_the_work():
+    work = Work(10)
+    handler = asyncio.create_task(run_until_disconnected(FakeRequest(), work.run(), poll_interval=0.01))
+    await asyncio.sleep(0.03)
+    handler.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await handler
+    await asyncio.sleep(0)
+    assert work.cancelled
+
+
+async def test_work_errors_propagate():
+    async def fail():
+        raise ValueError("bad")
+
+    with pytest.raises(ValueError):
+        await run_until_disconnected(FakeRequest(), fail(), poll_interval=0.01)
@@ -0,0 +1,167 @@
+"""
+Chat job claiming, lease renewal, reaping and completion.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.domain.models import User
+from app.repositories.chat_job_repository import ChatJobRepository
+from app.services.chat_job_service import chat_job_pool
+
+
+REQUEST = {"message": "hi", "images": [], "debug": False}
+
+
+class Clock:
+    """Settable UTC clock for ``ChatJobRepository``."""
+
+    def __init__(self):
+        self.now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    def __call__(self) -> datetime:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += timedelta(seconds=seconds)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def jobs(session_maker, clock):
+    """Run a repository call in its own session, like separate requests would."""
+    async def call(method: str, *args, **kwargs):
+        async with session_maker() as db:
+            return await getattr(ChatJobRepository(db, clock), method)(*args, **kwargs)
+    return call
+
+
+async def create_user(session_maker) -> User:
+    async with session_maker() as db:
+        user = User(email="jobs@example.com", name="Jobs")
+        db.add(user)
+        await db.commit()
+        return user
+
+
+async def test_idempotency_key_returns_the_existing_job(session_maker, jobs):
+    user = await create_user(session_maker)
+    first = await jobs("create", user.id, None, REQUEST, idempotency_key="key")
+    again = await jobs("create", user.id, None, REQUEST, idempotency_key="key")
+    other = await jobs("create", user.id, None, REQUEST, idempotency_key="other")
+    assert again.id == first.id
+    assert other.id != first.id
+
+
+async def test_concurrent_claims_take_each_job_once(session_maker, jobs):
+    user = await create_user(session_maker)
+    for _ in range(3):
+        await jobs("create", user.id, None, REQUEST)
+
+    claimed = [job for job in await asyncio.gather(*(jobs("claim_next", 60) for _ in range(6))) if job]
+    assert len(claimed) == 3
+    assert len({job.id for job in claimed}) == 3
+    assert all(job.status == "running" and job.attempts == 1 for job in claimed)
+
+
+async def test_claims_oldest_queued_job_first(session_maker, jobs, clock):
+    user = await create_user(session_maker)
+    created = []
+    for _ in range(3):
+        created.append((await jobs("create", user.id, None, REQUEST)).id)
+        clock.advance(-1)  # Each later job is created earlier
+
+    claimed = [(await jobs("claim_next", 60)).id for _ in range(3)]
+    assert claimed == created[::-1]
+
+
+async def test_reaper_fails_only_expired_running_jobs(session_maker, jobs, clock):
+    user = await create_user(session_maker)
+    for _ in range(3):
+        await jobs("create", user.id, None, REQUEST)
+    expired = await jobs("claim_next", 10)
+    clock.advance(5)
+    live = await jobs("claim_next", 10)
+    clock.advance(6)
+
+    assert await jobs("fail_expired") == [expired.id]
+    queued = await jobs("claim_next", 10)
+    assert queued.id not in (expired.id, live.id)
+    stored = await jobs("get_by_id", expired.id)
+    assert stored.status == "failed"
+    assert stored.finished_at.replace(tzinfo=timezone.utc) == clock.now
+
+
+async def test_finish_does_not_overwrite_a_reaped_job(session_maker, jobs, clock):
+    user = await create_user(session_maker)
+    job = await jobs("create", user.id, None, REQUEST)
+    await jobs("claim_next", 10)
+    clock.advance(11)
+    await jobs("fail_expired")
+
+    assert await jobs("finish", job.id, "succeeded", result={"ok": True}) is False
+    assert await jobs("renew", job.id, 60) is False
+    stored = await jobs("get_by_id", job.id)
+    assert stored.status == "failed"
+    assert stored.result is None
+
+
+async def test_renewed_lease_survives_the_reaper(session_maker, jobs, clock):
+    user = await create_user(session_maker)
+    job = await jobs("create", user.id, None, REQUEST)
+    await jobs("claim_next", 10)
+    clock.advance(8)
+    assert await jobs("renew", job.id, 10) is True
+    clock.advance(8)
+
+    assert await jobs("fail_expired") == []
+    assert await jobs("finish", job.id, "succeeded", result={"ok": True}) is True
+    assert (await jobs("get_by_id", job.id)).status == "succeeded"
+
+
+async def test_finish_and_reaper_race_settles_on_one_outcome(session_maker, jobs, clock):
+    user = await create_user(session_maker)
+    job = await jobs("create", user.id, None, REQUEST)
+    await jobs("claim_next", 10)
+    clock.advance(11)
+
+    finished, reaped = await asyncio.gather(
+        jobs("finish", job.id, "succeeded", result={"ok": True}),
+        jobs("fail_expired")
+    )
+    # Exactly one of the two updates applies, and the stored status agrees with it
+    assert finished != bool(reaped)
+    assert (await jobs("get_by_id", job.id)).status == ("succeeded" if finished else "failed")
+
+
+async def test_submitted_job_runs_in_the_background(api):
+    headers = await api.login()
+    await api.connect_device(headers)
+    submitted = await api.client.post(
+        "/api/v1/chat/jobs", data={"message": "hello"}, headers={**headers, "Idempotency-Key": "turn-1"}
+    )
+    assert submitted.status_code == 202
+    job_id = submitted.json()["id"]
+    assert submitted.json()["status"] == "queued"
+
+    chat_job_pool.start()
+    try:
+        response = await api.client.get(f"/api/v1/chat/jobs/{job_id}", params={"wait": 10}, headers=headers)
+    finally:
+        await chat_job_pool.stop(timeout=5)
+    job = response.json()
+    assert job["status"] == "succeeded"
+    assert job["result"]["userMessage"]["content"] == "hello"
+    assert job["result"]["aiMessage"]["role"] == "assistant"
+
+    # Resubmitting with the same key returns the finished job without running it again
+    again = await api.client.post(
+        "/api/v1/chat/jobs", data={"message": "hello"}, headers={**headers, "Idempotency-Key": "turn-1"}
+    )
+    assert again.json()["id"] == job_id
+    assert again.json()["status"] == "succeeded"
@@ -0,0 +1,215 @@
+"""
+Circuit breaker state transitions.
+"""
+import asyncio
+
+import pytest
+
+from app.core.config import Settings
+from app.core.device_protocol import DeviceError
+from app.services import circuit_breaker
+from app.services.circuit_breaker import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, DeviceBreakers, DeviceUnavailable
+)
+
+
+def make_settings(**overrides) -> Settings:
+    values = {
+        "breaker_enabled": True,
+        "breaker_window_seconds": 30.0,
+        "breaker_min_requests": 4,
+        "breaker_failure_rate": 0.5,
+        "breaker_consecutive_failures": 3,
+        "breaker_open_seconds": 5.0,
+        "breaker_max_open_seconds": 12.0,
+        "breaker_half_open_requests": 1,
+        "breaker_close_after": 2,
+        "breaker_probe_timeout": 0.5,
+    }
+    values.update(overrides)
+    return Settings(**values)
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    settings = make_settings()
+    monkeypatch.setattr(circuit_breaker, "get_settings", lambda: settings)
+    return settings
+
+
+@pytest.fixture
+def breakers(settings, monkeypatch):
+    """Breakers whose Device.status writes are recorded instead of committed."""
+    breakers = DeviceBreakers()
+    breakers.writes = []
+    monkeypatch.setattr(
+        breakers, "_write_status", lambda device_id, expected, status: breakers.writes.append((device_id, status))
+    )
+    return breakers
+
+
+class FakeBackend:
+    def __init__(self, failing: bool = False):
+        self.failing = failing
+        self.probed = []
+
+    async def status(self, device_id: str) -> dict:
+        self.probed.append(device_id)
+        if self.failing:
+            raise ConnectionResetError("device went away")
+        return {"status": "ok"}
+
+
+def test_trips_after_consecutive_failures(settings):
+    breaker = CircuitBreaker("dev")
+    assert breaker.record(True) is None
+    assert breaker.record(True) is None
+    assert breaker.record(True) == OPEN
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert 0 < breaker.retry_after() <= settings.breaker_open_seconds
+
+
+def test_success_resets_consecutive_failures(settings):
+    settings.breaker_min_requests = 100
+    breaker = CircuitBreaker("dev")
+    for failed in (True, True, False, True, True):
+        breaker.record(failed)
+    assert breaker.state == CLOSED
+
+
+def test_trips_on_failure_rate_once_enough_requests(settings):
+    settings.breaker_consecutive_failures = 100
+    breaker = CircuitBreaker("dev")
+    assert breaker.record(True) is None  # 1 of 1 failed, but below breaker_min_requests
+    assert breaker.record(False) is None
+    assert breaker.record(True) is None
+    assert breaker.record(True) == OPEN  # 3 of 4 failed
+
+
+def test_outcomes_expire_from_the_window(settings, monkeypatch):
+    settings.breaker_consecutive_failures = 100
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker("dev")
+    for _ in range(3):
+        breaker.record(True)
+    now[0] += settings.breaker_window_seconds + 1
+    assert breaker.failure_rate() == (0, 0.0)
+    assert breaker.record(True) is None
+    assert breaker.state == CLOSED
+
+
+def test_half_open_closes_after_successes(settings):
+    breaker = CircuitBreaker("dev")
+    for _ in range(3):
+        breaker.record(True)
+    assert breaker.half_open() == HALF_OPEN
+    assert breaker.allow()
+    assert breaker.record(False) is None
+    assert breaker.record(False) == CLOSED
+    assert breaker.consecutive_failures == 0
+    assert breaker.open_seconds == settings.breaker_open_seconds
+    assert breaker.failure_rate() == (0, 0.0)
+
+
+def test_failed_recovery_doubles_cool_down_up_to_the_maximum(settings):
+    breaker = CircuitBreaker("dev")
+    for _ in range(3):
+        breaker.record(True)
+    cool_downs = []
+    for _ in range(3):
+        breaker.half_open()
+        assert breaker.record(True) == OPEN
+        cool_downs.append(breaker.open_seconds)
+    assert cool_downs == [10.0, 12.0, 12.0]
+
+    # A fresh trip after closing starts from the base cool-down again
+    breaker.half_open()
+    breaker.record(False)
+    breaker.record(False)
+    for _ in range(3):
+        breaker.record(True)
+    assert breaker.state == OPEN
+    assert breaker.open_seconds == settings.breaker_open_seconds
+
+
+def test_open_breaker_ignores_outcomes(settings):
+    breaker = CircuitBreaker("dev")
+    for _ in range(3):
+        breaker.record(True)
+    assert breaker.record(False) is None
+    assert breaker.state == OPEN
+
+
+def test_acquire_rejects_open_device(breakers):
+    for _ in range(3):
+        assert breakers.acquire("dev") is False
+        breakers.release("dev", False, DeviceError("boom", "internal"))
+    assert breakers.state("dev") == OPEN
+    assert not breakers.available("dev")
+    assert breakers.writes == [("dev", circuit_breaker.UNHEALTHY)]
+    with pytest.raises(DeviceUnavailable) as raised:
+        breakers.acquire("dev")
+    assert raised.value.retry_after > 0
+    with pytest.raises(DeviceUnavailable):
+        breakers.check("dev")
+
+
+def test_half_open_admits_limited_trials(breakers):
+    breaker = breakers.get("dev")
+    for _ in range(3):
+        breaker.record(True)
+    breaker.half_open()
+    assert breakers.acquire("dev") is True
+    with pytest.raises(DeviceUnavailable):
+        breakers.acquire("dev")  # breaker_half_open_requests = 1
+    breakers.release("dev", True, None)
+    assert breaker.trials == 0
+    assert breakers.acquire("dev") is True
+    breakers.release("dev", True, None)
+    assert breakers.state("dev") == CLOSED
+    assert breakers.writes[-1] == ("dev", "connected")
+
+
+def test_only_device_faults_count(breakers):
+    for error in (asyncio.CancelledError(), ValueError("bad request"), DeviceUnavailable("dev", 1.0)):
+        for _ in range(5):
+            breakers.release("dev", False, error)
+    assert breakers.state("dev") == CLOSED
+    for error in (asyncio.TimeoutError(), OSError("reset"), DeviceError("boom", "internal")):
+        breakers.release("dev", False, error)
+    assert breakers.state("dev") == OPEN
+
+
+def test_disabled_breakers_admit_everything(breakers, settings):
+    settings.breaker_enabled = False
+    for _ in range(5):
+        breakers.release("dev", False, DeviceError("boom", "internal"))
+    assert breakers.acquire("dev") is False
+    assert breakers.available("dev")
+
+
+async def test_probe_closes_recovered_device(breakers, settings):
+    settings.breaker_open_seconds = 0.0
+    breaker = breakers.get("dev")
+    for _ in range(3):
+        breakers.release("dev", False, DeviceError("boom", "internal"))
+    backend = FakeBackend()
+
+    await breakers.probe(backend)
+    assert breaker.state == HALF_OPEN
+    await breakers.probe(backend)
+    assert breaker.state == CLOSED
+    assert backend.probed == ["dev", "dev"]
+
+
+async def test_failed_probe_reopens_with_backoff(breakers, settings):
+    breaker = breakers.get("dev")
+    for _ in range(3):
+        breakers.release("dev", False, DeviceError("boom", "internal"))
+    breaker.half_open()
+
+    await breakers.probe(FakeBackend(failing=True))
+    assert breaker.state == OPEN
+    assert breaker.open_seconds == 2 * settings.breaker_open_seconds
@@ -0,0 +1,70 @@
+"""
+Conversation threads and the denormalized inbox listing.
+"""
+
+
+async def send(api, headers: dict, message: str, device_id: str) -> dict:
+    response = await api.client.post(
+        "/api/v1/chat/message", data={"message": message, "deviceId": device_id}, headers=headers
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+async def test_inbox_lists_conversations_by_latest_message(api):
+    headers = await api.login()
+    await api.connect_device(headers, "rpi-001")
+    await api.connect_device(headers, "jetson-001")
+    await send(api, headers, "first", "rpi-001")
+    await send(api, headers, "second", "rpi-001")
+    latest = await send(api, headers, "third", "jetson-001")
+
+    inbox = (await api.client.get("/api/v1/chat/conversations", headers=headers)).json()
+    assert [(row["deviceId"], row["messageCount"]) for row in inbox["conversations"]] == [
+        ("jetson-001", 2), ("rpi-001", 4)
+    ]
+    newest = inbox["conversations"][0]
+    assert newest["id"] == latest["aiMessage"]["conversationId"]
+    assert newest["lastMessageRole"] == "assistant"
+    assert newest["lastMessagePreview"] == latest["aiMessage"]["content"][:len(newest["lastMessagePreview"])]
+    assert inbox["nextCursor"] is None
+
+    # Another user's inbox is separate
+    other = await api.login("other@example.com")
+    assert (await api.client.get("/api/v1/chat/conversations", headers=other)).json()["conversations"] == []
+
+
+async def test_inbox_pages_with_a_cursor(api):
+    headers = await api.login()
+    for device_id in ("rpi-001", "jetson-001", "coral-001"):
+        await api.connect_device(headers, device_id)
+        await send(api, headers, "hello", device_id)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = (await api.client.get("/api/v1/chat/conversations", params=params, headers=headers)).json()
+        seen += [row["deviceId"] for row in page["conversations"]]
+        cursor = page["nextCursor"]
+        if cursor is None:
+            break
+    assert seen == ["coral-001", "jetson-001", "rpi-001"]
+
+    response = await api.client.get("/api/v1/chat/conversations", params={"cursor": "bogus"}, headers=headers)
+    assert response.status_code == 400
+
+
+async def test_messages_can_be_read_by_conversation(api):
+    headers = await api.login()
+    await api.connect_device(headers, "rpi-001")
+    await api.connect_device(headers, "jetson-001")
+    reply = await send(api, headers, "on the pi", "rpi-001")
+    await send(api, headers, "on the jetson", "jetson-001")
+
+    conversation_id = reply["aiMessage"]["conversationId"]
+    messages = (await api.client.get(
+        "/api/v1/chat/messages", params={"conversationId": conversation_id}, headers=headers
+    )).json()
+    assert [message["content"] for message in messages][0] == "on the pi"
+    assert {message["conversationId"] for message in messages} == {conversation_id}
+    assert len(messages) == 2
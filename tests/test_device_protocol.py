@@ -0,0 +1,80 @@
+"""
+The device protocol end to end: the network backend against a simulated device.
+"""
+import base64
+import hashlib
+
+import pytest
+
+from app.core.database import async_session_maker
+from app.core.device_protocol import DeviceError, InvalidRequest, MessageTooLarge, decode_image, image_message
+from app.core.uploads import media_store, media_url
+from app.repositories.device_repository import DeviceRepository
+from app.services import inference_service
+from app.services.inference_service import NetworkInferenceBackend
+from app.simulator import FleetConfig, SimulatedFleet
+from conftest import AsyncResource
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x01" * 100
+
+
+def store(data: bytes) -> str:
+    sha256 = hashlib.sha256(data).hexdigest()
+    with media_store.spool() as f:
+        f.write(data)
+    media_store.commit(f.name, sha256)
+    return sha256
+
+
+class SimulatedPi(AsyncResource):
+    """A simulated Raspberry Pi listening locally and registered as ``sim-0000``.
+
+    Registering it needs the schema, so tests take ``api`` before it.
+    """
+
+    async def __aenter__(self):
+        self.fleet = SimulatedFleet(FleetConfig(devices=1, mix={"raspberry-pi": 1}, time_scale=1000, seed=1))
+        await self.fleet.start()
+        async with async_session_maker() as db:
+            await DeviceRepository(db).upsert_many(self.fleet.device_rows())
+        return self.fleet["sim-0000"]
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.fleet.stop()
+
+
+@pytest.fixture
+def device():
+    return SimulatedPi()
+
+
+def test_images_round_trip():
+    assert decode_image(image_message("image/png", PNG)) == ("image/png", PNG)
+    for malformed in ("/api/v1/chat/images/abc", {"contentType": "image/png"}, {"contentType": "image/png", "data": "!!"}):
+        with pytest.raises(DeviceError) as raised:
+            decode_image(malformed)
+        assert raised.value.code == "bad_request"
+
+
+async def test_stored_images_reach_the_device_as_bytes(api, device):
+    sha256 = store(PNG)
+    legacy = "data:image/png;base64," + base64.b64encode(PNG).decode()
+    tokens = [token async for token in NetworkInferenceBackend().stream(device.id, "describe", [media_url(sha256), legacy])]
+    assert tokens[0].startswith(f"(2 image(s), {2 * len(PNG)} bytes)")
+    assert device.served == 1
+
+
+async def test_unresolvable_images_are_refused_before_sending(api, device):
+    backend = NetworkInferenceBackend()
+    with pytest.raises(InvalidRequest, match="missing from the media store"):
+        [token async for token in backend.stream(device.id, "describe", [media_url("f" * 64)])]
+    with pytest.raises(InvalidRequest, match="Unsupported image reference"):
+        [token async for token in backend.stream(device.id, "describe", ["https://example.com/cat.png"])]
+    assert device.served == device.failed == 0
+
+
+async def test_oversized_requests_are_not_sent(api, device, monkeypatch):
+    monkeypatch.setattr(inference_service, "MAX_MESSAGE_BYTES", 64)
+    with pytest.raises(MessageTooLarge):
+        [token async for token in NetworkInferenceBackend().stream(device.id, "describe", [media_url(store(PNG))])]
+    assert device.served == device.failed == 0
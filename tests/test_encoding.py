@@ -0,0 +1,108 @@
+"""
+Content negotiation, size-dependent compression and the immutable page cache.
+"""
+import pytest
+
+from app.core import encoding
+from app.core.encoding import JSON, MSGPACK, CachedPage, PageCache, negotiate_encoding, negotiate_media_type
+
+msgpack = pytest.importorskip("msgpack")
+zstandard = pytest.importorskip("zstandard")
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, JSON),
+    ("application/json", JSON),
+    ("application/msgpack", MSGPACK),
+    ("application/x-msgpack, application/json;q=0.5", MSGPACK),
+    ("application/json, application/msgpack;q=0.9", JSON),
+    ("*/*", JSON),
+    ("application/msgpack;q=0", JSON),
+])
+def test_media_type_negotiation(accept, expected):
+    assert negotiate_media_type(accept) == expected
+
+
+@pytest.mark.parametrize("accept_encoding, size, expected", [
+    (None, 10_000, None),
+    ("gzip, zstd", 100, None),  # Below compression_min_bytes
+    ("gzip", 10_000, "gzip"),
+    ("gzip, zstd", 10_000, "zstd"),
+    ("zstd;q=0.5, gzip", 10_000, "gzip"),
+    ("*", 10_000, "zstd"),
+    ("gzip;q=0, br", 10_000, None),
+])
+def test_encoding_negotiation(accept_encoding, size, expected):
+    assert negotiate_encoding(accept_encoding, size) == expected
+
+
+def test_large_bodies_use_the_fast_level(app_settings):
+    app_settings.compression_fast_above_bytes = 1000
+    assert encoding.effort_for(999) == encoding.DEFAULT
+    assert encoding.effort_for(1001) == encoding.FAST
+
+
+def test_page_cache_evicts_least_recently_used_by_bytes():
+    cache = PageCache(max_bytes=250)
+    for key in ("a", "b", "c"):
+        page = CachedPage(etag=key, headers={})
+        page.bodies[(JSON, None)] = b"x" * 100
+        cache.put(key, page)
+    assert cache.get("a") is None and len(cache) == 2
+
+    cache.get("b")  # Now most recently used
+    page = CachedPage(etag="d", headers={})
+    page.bodies[(JSON, None)] = b"x" * 100
+    cache.put("d", page)
+    assert [page.etag for page in cache.pages()] == ["b", "d"]
+    assert cache.bytes == 200
+
+
+async def history(api, count: int) -> dict:
+    headers = await api.login()
+    await api.connect_device(headers)
+    for index in range(count):
+        response = await api.client.post("/api/v1/chat/message", data={"message": f"message {index} " * 40}, headers=headers)
+        assert response.status_code == 200
+    return headers
+
+
+async def test_history_is_negotiated(api):
+    headers = await history(api, 3)
+    plain = await api.client.get("/api/v1/chat/messages", headers=headers)
+    assert plain.headers["vary"].startswith("Accept, Accept-Encoding")
+
+    packed = await api.client.get(
+        "/api/v1/chat/messages",
+        headers={**headers, "Accept": "application/msgpack", "Accept-Encoding": "zstd"}
+    )
+    assert packed.headers["content-type"] == MSGPACK
+    assert packed.headers["content-encoding"] == "zstd"
+    # httpx undoes the Content-Encoding
+    assert msgpack.unpackb(packed.content) == plain.json()
+
+
+async def test_settled_pages_are_cached_with_an_etag(api, app_settings):
+    app_settings.history_immutable_after = 0
+    app_settings.compression_min_bytes = 0
+    headers = await history(api, 2)
+    params = {"limit": 2}
+    request_headers = {**headers, "Accept-Encoding": "gzip"}
+    first = await api.client.get("/api/v1/chat/messages", params=params, headers=request_headers)
+    assert "immutable" in first.headers["cache-control"]
+    etag = first.headers["etag"]
+
+    again = await api.client.get("/api/v1/chat/messages", params=params, headers=request_headers)
+    assert again.headers["etag"] == etag
+    assert again.headers["content-encoding"] == "gzip"
+    assert again.json() == first.json()
+
+    unchanged = await api.client.get("/api/v1/chat/messages", params=params, headers={**headers, "If-None-Match": etag})
+    assert unchanged.status_code == 304
+
+
+async def test_recent_pages_are_not_cached(api):
+    headers = await history(api, 2)
+    response = await api.client.get("/api/v1/chat/messages", params={"limit": 2}, headers=headers)
+    assert "etag" not in response.headers
+    assert response.headers["x-next-cursor"]
@@ -0,0 +1,94 @@
+"""
+Fleet-wide connect/disconnect: bounded concurrency, group commits and streamed progress.
+"""
+import asyncio
+import json
+import uuid
+
+from sqlalchemy import select
+
+from app.domain.models import Device, User
+from app.repositories.device_repository import DeviceRepository
+from app.services.device_service import DeviceService
+
+
+class RecordingDeviceService(DeviceService):
+    """Handshakes take a moment, fail for ``broken`` devices and record peak concurrency."""
+
+    def __init__(self, device_repo, broken=()):
+        super().__init__(device_repo)
+        self.broken = set(broken)
+        self.running = 0
+        self.peak = 0
+
+    async def _handshake(self, device_id: str, action: str) -> None:
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(0.005)
+            if device_id in self.broken:
+                raise ConnectionRefusedError("handshake refused")
+        finally:
+            self.running -= 1
+
+
+async def add_fleet(session_maker, count: int) -> uuid.UUID:
+    async with session_maker() as db:
+        user = User(email="fleet@example.com", name="Fleet")
+        db.add(user)
+        db.add_all([
+            Device(id=f"board-{index:02d}", name=f"Board {index}", type="rpi", ip=f"10.0.0.{index}")
+            for index in range(count)
+        ])
+        await db.commit()
+        return user.id
+
+
+async def test_connect_is_bounded_batched_and_reports_every_device(session_maker, monkeypatch):
+    user_id = await add_fleet(session_maker, 12)
+    batches = []
+    set_connection = DeviceRepository.set_connection
+
+    async def recording_set_connection(self, device_ids, status, user_id=None):
+        batches.append(len(device_ids))
+        return await set_connection(self, device_ids, status, user_id)
+
+    monkeypatch.setattr(DeviceRepository, "set_connection", recording_set_connection)
+    device_ids = [f"board-{index:02d}" for index in range(12)] + ["board-00", "missing"]
+
+    async with session_maker() as db:
+        service = RecordingDeviceService(DeviceRepository(db), broken={"board-03"})
+        events = [event async for event in service.fleet_operation("connect", device_ids, user_id, concurrency=4)]
+
+    summary = events.pop()
+    assert summary == {"done": True, "action": "connect", "succeeded": 11, "failed": 2}
+    outcomes = {event["deviceId"]: (event["status"], event["error"]) for event in events}
+    assert len(events) == 13  # Duplicates are dropped
+    assert outcomes["missing"] == ("failed", "Device not found")
+    assert outcomes["board-03"] == ("failed", "handshake refused")
+    assert service.peak == 4
+    assert sum(batches) == 11 and len(batches) < 11
+
+    async with session_maker() as db:
+        rows = (await db.execute(select(Device.id, Device.status, Device.user_id))).all()
+    connected = {device_id for device_id, status, owner in rows if status == "connected" and owner == user_id}
+    assert connected == {f"board-{index:02d}" for index in range(12)} - {"board-03"}
+
+
+async def test_fleet_progress_streams_as_ndjson(api):
+    headers = await api.login()
+    await api.connect_device(headers)  # Creates the mock devices
+    body = {"deviceIds": ["jetson-001", "coral-001", "nope"]}
+    response = await api.client.post("/api/v1/devices/fleet/connect", json=body, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[-1] == {"done": True, "action": "connect", "succeeded": 2, "failed": 1}
+    assert {line["deviceId"] for line in lines[:-1]} == {"jetson-001", "coral-001", "nope"}
+
+    devices = (await api.client.get("/api/v1/devices", headers=headers)).json()
+    assert {device["id"] for device in devices if device["status"] == "connected"} == {"rpi-001", "jetson-001", "coral-001"}
+
+    response = await api.client.post("/api/v1/devices/fleet/disconnect", json={"deviceIds": ["coral-001"]}, headers=headers)
+    assert [json.loads(line) for line in response.text.splitlines()][0]["status"] == "disconnected"
+    assert (await api.client.post("/api/v1/devices/fleet/reboot", json=body, headers=headers)).status_code == 422
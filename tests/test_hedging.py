@@ -0,0 +1,103 @@
+"""
+Hedged inference: the first device to stream a token wins the turn.
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app.domain.models import ChatMessage, Conversation, Device, User
+from app.repositories.chat_repository import ChatRepository
+from app.services import inference_service
+from app.services.chat_service import ChatService
+from app.services.inference_service import HedgeBudget, InferenceService, device_slots
+
+
+class DelayedBackend:
+    """Streams a fixed reply after a per-device delay before the first token."""
+
+    def __init__(self, delays: dict):
+        self.delays = delays
+        self.cancelled = []
+
+    async def load_model(self, device_id: str, variant: str) -> None:
+        pass
+
+    async def stream(self, device_id, prompt, images=None):
+        try:
+            await asyncio.sleep(self.delays[device_id])
+        except asyncio.CancelledError:
+            self.cancelled.append(device_id)
+            raise
+        for token in ("reply", " from", f" {device_id}"):
+            yield token
+
+    async def status(self, device_id: str) -> dict:
+        return {"id": device_id}
+
+
+@pytest.fixture
+def hedging(app_settings, monkeypatch):
+    """Hedge after 20 ms, with budget for one hedge."""
+    app_settings.hedge_default_delay = 0.02
+    app_settings.hedge_min_delay = 0.02
+    app_settings.hedge_min_samples = 10 ** 9  # Never trust the TTFT histogram
+    budget = HedgeBudget(ratio=0.0, burst=1.0)
+    budget.tokens = 1.0
+    monkeypatch.setattr(inference_service, "hedge_budget", budget)
+    return budget
+
+
+async def test_slow_primary_loses_to_the_hedge(hedging):
+    backend = DelayedBackend({"hedge-slow": 5.0, "hedge-fast": 0.0})
+    result = await InferenceService(backend).generate_hedged("hedge-slow", ["hedge-fast"], "hi")
+
+    assert result.device_id == "hedge-fast"
+    assert result.hedged
+    assert result.content == "reply from hedge-fast"
+    await asyncio.sleep(0)
+    assert backend.cancelled == ["hedge-slow"]
+    assert device_slots.depth("hedge-slow") == 0
+
+
+async def test_prompt_primary_is_not_hedged(hedging):
+    backend = DelayedBackend({"hedge-slow": 0.0, "hedge-fast": 0.0})
+    result = await InferenceService(backend).generate_hedged("hedge-slow", ["hedge-fast"], "hi")
+    assert result.device_id == "hedge-slow"
+    assert not result.hedged
+    assert hedging.tokens == 1.0
+
+
+async def test_exhausted_budget_waits_for_the_primary(hedging):
+    hedging.tokens = 0.0
+    backend = DelayedBackend({"hedge-slow": 0.05, "hedge-fast": 0.0})
+    result = await InferenceService(backend).generate_hedged("hedge-slow", ["hedge-fast"], "hi")
+    assert result.device_id == "hedge-slow"
+    assert backend.cancelled == []
+
+
+async def test_hedged_reply_is_stored_against_the_winning_device(session_maker, hedging):
+    async with session_maker() as db:
+        user = User(email="hedge@example.com", name="Hedge")
+        db.add_all([
+            user,
+            Device(id="hedge-slow", name="Slow", type="jetson", ip="10.0.0.1"),
+            Device(id="hedge-fast", name="Fast", type="jetson", ip="10.0.0.2"),
+        ])
+        await db.commit()
+
+    inference = InferenceService(DelayedBackend({"hedge-slow": 5.0, "hedge-fast": 0.0}))
+    async with session_maker() as db:
+        response = await ChatService(ChatRepository(db), inference).send_message(
+            user_id=user.id, message="hello", device_id="hedge-slow", hedge_devices=["hedge-fast"]
+        )
+    assert response.userMessage.conversationId == response.aiMessage.conversationId
+
+    async with session_maker() as db:
+        messages = (await db.execute(select(ChatMessage.role, ChatMessage.device_id))).all()
+        conversations = list((await db.execute(select(Conversation))).scalars())
+    assert sorted(messages) == [("assistant", "hedge-fast"), ("user", "hedge-slow")]
+    # Both messages stay in the conversation the turn started in
+    assert [(conversation.device_key, conversation.message_count) for conversation in conversations] == [
+        ("hedge-slow", 2)
+    ]
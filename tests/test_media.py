@@ -0,0 +1,77 @@
+"""
+Streamed image uploads, the content-addressed media store and image serving.
+"""
+import hashlib
+import os
+
+from app.core.uploads import media_sha256, media_store, media_url, sniff_image_type
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+GIF = b"GIF89a" + b"\x00" * 64
+
+
+def test_types_are_sniffed_from_magic_bytes():
+    assert sniff_image_type(PNG) == "image/png"
+    assert sniff_image_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+    assert sniff_image_type(b"<svg xmlns=") is None
+
+
+def test_media_urls_round_trip():
+    sha256 = hashlib.sha256(PNG).hexdigest()
+    assert media_sha256(media_url(sha256)) == sha256
+    assert media_sha256("data:image/png;base64,AAAA") is None
+    assert media_sha256(media_url("../../etc/passwd")) is None
+
+
+async def test_uploaded_images_are_stored_once_and_served(api):
+    headers = await api.login()
+    await api.connect_device(headers)
+    files = [("images", ("a.png", PNG, "image/png")), ("images", ("b.png", PNG, "image/png"))]
+    response = await api.client.post("/api/v1/chat/message", data={"message": "look"}, files=files, headers=headers)
+    assert response.status_code == 200
+
+    sha256 = hashlib.sha256(PNG).hexdigest()
+    assert media_store.exists(sha256)
+    image = await api.client.get(media_url(sha256))
+    assert image.status_code == 200
+    assert image.content == PNG
+    assert image.headers["content-type"] == "image/png"
+    assert image.headers["etag"] == f'"{sha256}"'
+    assert (await api.client.get(media_url("0" * 64))).status_code == 404
+
+
+async def test_declared_content_type_is_ignored(api):
+    headers = await api.login()
+    await api.connect_device(headers)
+    # A GIF labelled as PNG is stored and served as what it is
+    files = [("images", ("fake.png", GIF, "image/png"))]
+    assert (await api.client.post("/api/v1/chat/message", data={"message": "gif"}, files=files, headers=headers)).status_code == 200
+    image = await api.client.get(media_url(hashlib.sha256(GIF).hexdigest()))
+    assert image.headers["content-type"] == "image/gif"
+
+    files = [("images", ("page.png", b"<html><script>alert(1)</script></html>", "image/png"))]
+    response = await api.client.post("/api/v1/chat/message", data={"message": "html"}, files=files, headers=headers)
+    assert response.status_code == 400
+
+
+async def test_oversized_uploads_are_rejected_while_streaming(api, app_settings):
+    app_settings.max_upload_size = 32
+    headers = await api.login()
+    await api.connect_device(headers)
+    big = PNG + b"big"
+    files = [("images", ("big.png", big, "image/png"))]
+    response = await api.client.post("/api/v1/chat/message", data={"message": "big"}, files=files, headers=headers)
+    assert response.status_code == 413
+    assert not media_store.exists(hashlib.sha256(big).hexdigest())
+    assert not os.listdir(media_store.tmp_dir)
+
+
+async def test_traces_are_for_admins_only(api):
+    # Traced paths include image URLs, which are capabilities
+    user = await api.login()
+    admin = await api.login("admin@example.com")
+    assert (await api.client.get("/api/v1/admin/traces", headers=user)).status_code == 403
+    response = await api.client.get("/api/v1/admin/traces", headers=admin)
+    assert response.status_code == 200
+    assert isinstance(response.json(), list)
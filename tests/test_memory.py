@@ -0,0 +1,92 @@
+"""
+Memory diagnostics: store sizes, live session tracking and tracemalloc snapshots.
+"""
+import threading
+
+from sqlalchemy import select
+
+from app.core import memory
+from app.core.database import _identity_map_objects, async_session_maker
+from app.domain.models import Device
+
+
+class Node:
+    pass
+
+
+def test_deep_sizeof_follows_containers_and_app_objects(monkeypatch):
+    monkeypatch.setattr(Node, "__module__", "app.tests")
+    node = Node()
+    node.payload = [b"x" * 10_000]
+    size, truncated = memory.deep_sizeof({"node": node})
+    assert size > 10_000 and not truncated
+
+    size, truncated = memory.deep_sizeof(list(range(1000)), max_objects=10)
+    assert truncated
+
+
+def test_store_sizes_reports_entries_and_errors(monkeypatch):
+    monkeypatch.setattr(memory, "_stores", {})
+    memory.register_store("rows", lambda: [b"x" * 100] * 3)
+    memory.register_store("broken", lambda: 1 / 0)
+    rows, broken = memory.store_sizes()
+    assert (rows["name"], rows["entries"]) == ("rows", 3)
+    assert rows["bytes"] > 100
+    assert broken == {"name": "broken", "kind": "memory", "error": "division by zero"}
+
+
+async def test_open_sessions_are_tracked(api):
+    headers = await api.login()
+    await api.connect_device(headers)
+    async with async_session_maker() as db:
+        devices = list((await db.execute(select(Device))).scalars())
+        held = _identity_map_objects()
+        assert all(any(device is obj for obj in held) for device in devices)
+
+
+async def test_memory_report_is_built_off_the_event_loop(api, monkeypatch):
+    admin = await api.login("admin@example.com")
+    threads = []
+    store_sizes, gc_summary = memory.store_sizes, memory.gc_summary
+
+    def recording(function):
+        def run():
+            threads.append(threading.current_thread())
+            return function()
+        return run
+
+    monkeypatch.setattr(memory, "store_sizes", recording(store_sizes))
+    monkeypatch.setattr(memory, "gc_summary", recording(gc_summary))
+    response = await api.client.get("/api/v1/admin/diagnostics/memory", headers=admin)
+    assert response.status_code == 200
+    assert len(threads) == 2 and threading.main_thread() not in threads
+
+    stores = {store["name"]: store for store in response.json()["stores"]}
+    for name in ("fleet_analytics", "usage_recorder", "thumbnailer", "device_breakers", "service_registry",
+                 "encoded_page_cache", "retrieval_tails", "sqlalchemy_identity_maps"):
+        assert "error" not in stores[name], stores[name]
+
+    user = await api.login()
+    assert (await api.client.get("/api/v1/admin/diagnostics/memory", headers=user)).status_code == 403
+
+
+async def test_snapshots_can_be_taken_and_diffed(api):
+    admin = await api.login("admin@example.com")
+    base = "/api/v1/admin/diagnostics/memory"
+    assert (await api.client.post(f"{base}/snapshots", headers=admin)).status_code == 409
+
+    assert (await api.client.post(f"{base}/tracing", headers=admin)).json()["tracing"]
+    try:
+        first = (await api.client.post(f"{base}/snapshots", params={"label": "before"}, headers=admin)).json()
+        retained = [bytearray(1024) for _ in range(100)]
+        second = (await api.client.post(f"{base}/snapshots", params={"groupBy": "package"}, headers=admin)).json()
+        assert second["top"] and retained
+
+        diff = await api.client.get(
+            f"{base}/snapshots/{second['id']}/diff", params={"base": first["id"]}, headers=admin
+        )
+        assert diff.status_code == 200
+        assert diff.json()["base"]["label"] == "before"
+        assert diff.json()["changes"]
+    finally:
+        await api.client.delete(f"{base}/tracing", headers=admin)
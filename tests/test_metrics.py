@@ -0,0 +1,84 @@
+"""
+Metrics exposition, inference timing histograms and per-device cleanup.
+"""
+import pytest
+
+from app.core import metrics
+from app.core.metrics import MetricsRegistry, bucket_quantile
+from app.services.circuit_breaker import OPEN, DeviceBreakers
+from app.services.inference_service import DeviceSlots
+
+
+def test_counter_and_gauge_render_labelled_samples():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ("route",))
+    depth = registry.gauge("queue_depth", "Queued", ("device",))
+    requests.inc(route="/a")
+    requests.inc(2, route="/a")
+    requests.inc(route='say "hi"\n')
+    depth.set(3, device="dev")
+    depth.dec(device="dev")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{route="/a"} 3' in lines
+    assert 'requests_total{route="say \\"hi\\"\\n"} 1' in lines
+    assert 'queue_depth{device="dev"} 2' in lines
+
+
+def test_registering_a_name_twice_returns_the_same_metric():
+    registry = MetricsRegistry()
+    assert registry.counter("hits", "Hits") is registry.counter("hits", "Hits")
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency", ("device",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        latency.observe(value, device="dev")
+
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{device="dev",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{device="dev",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{device="dev",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{device="dev"} 6.05' in lines
+    assert 'latency_seconds_count{device="dev"} 4' in lines
+    assert latency.count(device="dev") == 4
+
+
+def test_bucket_quantile_interpolates_within_a_bucket():
+    assert bucket_quantile((1.0, 2.0), [0, 4, 0], 0.5) == pytest.approx(1.5)
+    assert bucket_quantile((1.0, 2.0), [0, 0, 0], 0.5) is None
+
+
+def test_collectors_run_before_each_scrape():
+    registry = MetricsRegistry()
+    gauge = registry.gauge("sampled", "Sampled")
+    samples = iter([1, 2])
+    registry.register_collector(lambda: gauge.set(next(samples)))
+    assert "sampled 1" in registry.render()
+    assert "sampled 2" in registry.render()
+
+
+def test_forgotten_device_stops_exporting_queue_depth():
+    slots = DeviceSlots()
+    slots.enter("gone")
+    slots.leave("gone")
+    assert 'device_queue_depth{device="gone"}' in metrics.registry.render()
+
+    slots.forget("gone")
+    assert slots.depth("gone") == 0
+    assert 'device_queue_depth{device="gone"}' not in metrics.registry.render()
+
+
+def test_forgotten_device_gets_a_fresh_breaker(monkeypatch):
+    breakers = DeviceBreakers()
+    monkeypatch.setattr(breakers, "_write_status", lambda device_id, expected, status: None)
+    breaker = breakers.get("gone")
+    for _ in range(breaker.settings.breaker_consecutive_failures):
+        breaker.record(True)
+    assert breakers.state("gone") == OPEN
+
+    breakers.forget("gone")
+    assert breakers.get("gone") is not breaker
+    assert breakers.available("gone")
@@ -0,0 +1,60 @@
+"""
+Migrations build the models' schema, and startup only checks the revision.
+"""
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect
+
+from app.core import migrations
+from app.core.database import Base
+from app.core.migrations import SchemaVersionError, alembic_config, check_schema_version, head_revision, upgrade
+
+
+def schema_diff(path) -> list:
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        with engine.connect() as connection:
+            return compare_metadata(MigrationContext.configure(connection), Base.metadata)
+    finally:
+        engine.dispose()
+
+
+def test_migrations_build_the_model_schema(tmp_path):
+    path = tmp_path / "migrated.db"
+    upgrade(database_url=f"sqlite+aiosqlite:///{path}")
+    assert schema_diff(path) == []
+
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        columns = {column["name"]: column for column in inspect(engine).get_columns("chat_messages")}
+    finally:
+        engine.dispose()
+    assert columns["created_at"]["nullable"] is False
+
+
+def test_migrations_downgrade_and_reapply(tmp_path):
+    path = tmp_path / "migrated.db"
+    url = f"sqlite+aiosqlite:///{path}"
+    upgrade(database_url=url)
+    command.downgrade(alembic_config(url), "base")
+    upgrade(database_url=url)
+    assert schema_diff(path) == []
+
+
+async def test_schema_check_rejects_an_unmigrated_database(monkeypatch):
+    async def current_revision():
+        return None
+
+    monkeypatch.setattr(migrations, "current_revision", current_revision)
+    with pytest.raises(SchemaVersionError, match="app.cli migrate"):
+        await check_schema_version()
+
+
+async def test_schema_check_accepts_the_head_revision(monkeypatch):
+    async def current_revision():
+        return head_revision()
+
+    monkeypatch.setattr(migrations, "current_revision", current_revision)
+    assert await check_schema_version() == head_revision()
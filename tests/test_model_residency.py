@@ -0,0 +1,139 @@
+"""
+Model variants, residency, demand and warm model selection for chat jobs.
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app.core.database import async_session_maker
+from app.domain.models import ChatJob
+from app.services import model_residency as residency_module
+from app.services.chat_job_service import chat_job_pool
+from app.services.model_residency import ModelResidency, ModelUnavailable, parse_memory_mb, pick_variant
+
+
+VARIANTS = {
+    "edge-llm": [{"name": "edge-llm-3b", "memory_mb": 2000}, {"name": "edge-llm-7b", "memory_mb": 4000}],
+    "vision": [{"name": "vision-1b", "memory_mb": 1000}],
+}
+
+
+class CountingBackend:
+    def __init__(self, fail: bool = False):
+        self.loads = []
+        self.fail = fail
+
+    async def load_model(self, device_id: str, variant: str) -> None:
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise ConnectionResetError("device went away")
+        self.loads.append((device_id, variant))
+
+
+class FakeDevice:
+    def __init__(self, id: str, memory: str):
+        self.id = id
+        self.specs = {"memory": memory}
+
+
+@pytest.fixture
+def variants(app_settings):
+    app_settings.model_variants = VARIANTS
+    app_settings.model_memory_headroom = 1.0
+
+
+@pytest.mark.parametrize("specs, expected", [
+    ({"memory": "4GB RAM"}, 4096),
+    ({"memory": "512 MiB"}, 512),
+    ({"memory": 2048}, 2048),
+    ({"memory": "lots"}, None),
+    (None, None),
+])
+def test_parse_memory(specs, expected):
+    assert parse_memory_mb(specs) == expected
+
+
+def test_largest_fitting_variant_is_picked(variants):
+    assert pick_variant("edge-llm", 8192).name == "edge-llm-7b"
+    assert pick_variant("edge-llm", 3000).name == "edge-llm-3b"
+    assert pick_variant("edge-llm", None).name == "edge-llm-3b"
+    assert pick_variant("edge-llm", 1000) is None
+    assert pick_variant("unknown", 8192) is None
+
+
+async def test_model_is_loaded_once_then_warm(variants):
+    residency, backend = ModelResidency(), CountingBackend()
+    residency.observe_device(FakeDevice("dev", "8GB"))
+
+    loads = await asyncio.gather(*(residency.ensure_loaded("dev", "edge-llm", backend) for _ in range(3)))
+    assert backend.loads == [("dev", "edge-llm-7b")]
+    assert sum(1 for seconds in loads if seconds) == 1
+    assert residency.is_resident("dev", "edge-llm")
+
+    # Switching models replaces the resident one
+    await residency.ensure_loaded("dev", "vision", backend)
+    assert residency.resident("dev").variant == "vision-1b"
+    assert not residency.is_resident("dev", "edge-llm")
+
+
+async def test_failed_load_leaves_nothing_resident(variants):
+    residency = ModelResidency()
+    residency.observe_device(FakeDevice("dev", "8GB"))
+    with pytest.raises(ConnectionResetError):
+        await residency.ensure_loaded("dev", "edge-llm", CountingBackend(fail=True))
+    assert residency.resident("dev") is None
+
+
+async def test_model_that_does_not_fit_is_unavailable(variants):
+    residency = ModelResidency()
+    residency.observe_device(FakeDevice("dev", "1GB"))
+    assert not residency.fits("dev", "edge-llm")
+    with pytest.raises(ModelUnavailable):
+        await residency.ensure_loaded("dev", "edge-llm", CountingBackend())
+
+
+def test_demand_decays_by_half_life(variants, app_settings, monkeypatch):
+    app_settings.model_demand_half_life = 60.0
+    app_settings.warmup_min_demand = 1.0
+    now = [1000.0]
+    monkeypatch.setattr(residency_module.time, "monotonic", lambda: now[0])
+    residency = ModelResidency()
+    for _ in range(4):
+        residency.record_demand("edge-llm")
+    residency.record_demand("vision")
+    assert residency.ranked_models() == ["edge-llm", "vision"]
+
+    now[0] += 60
+    assert residency.demand("edge-llm") == pytest.approx(2.0)
+    assert residency.ranked_models() == ["edge-llm"]
+
+
+async def test_jobs_keep_the_requested_model_and_hedge(api, variants):
+    headers = await api.login()
+    await api.connect_device(headers)
+    submitted = await api.client.post(
+        "/api/v1/chat/jobs",
+        data={"message": "hello", "model": "vision", "hedge": "true", "debug": "true"},
+        headers=headers
+    )
+    assert submitted.status_code == 202
+    job_id = submitted.json()["id"]
+    async with async_session_maker() as db:
+        request = (await db.execute(select(ChatJob.request))).scalar_one()
+    assert request["model"] == "vision"
+    assert request["hedge"] is True
+
+    chat_job_pool.start()
+    try:
+        response = await api.client.get(f"/api/v1/chat/jobs/{job_id}", params={"wait": 10}, headers=headers)
+    finally:
+        await chat_job_pool.stop(timeout=5)
+    assert response.json()["status"] == "succeeded"
+    assert response.json()["result"]["aiMessage"]["debug"]["model"]["name"] == "vision"
+
+
+async def test_jobs_reject_unknown_models(api):
+    headers = await api.login()
+    response = await api.client.post("/api/v1/chat/jobs", data={"message": "hello", "model": "nope"}, headers=headers)
+    assert response.status_code == 422
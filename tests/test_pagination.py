@@ -0,0 +1,106 @@
+"""
+Keyset cursors: encoding round-trips, paging through ties and the admin listings.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.core.database import async_session_maker
+from app.core.pagination import (
+    NEXT_CURSOR_HEADER, TOTAL_ESTIMATE_HEADER, decode_cursor, encode_cursor, keyset, parse_sort
+)
+from app.domain.models import Device
+
+
+@pytest.mark.parametrize("values", [
+    [datetime(2026, 1, 2, 3, 4, 5, 678901), uuid.UUID("12345678-1234-5678-1234-567812345678")],
+    [datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc), "device-7"],
+    [datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone(timedelta(hours=-5))), 42],
+    ["Jetson Nano", "jetson-001"],
+    [None, "device-1"],
+    [1.5, True],
+])
+def test_cursor_round_trip(values):
+    cursor = encode_cursor(values)
+    assert cursor.isascii() and "=" not in cursor and "/" not in cursor and "+" not in cursor
+    assert decode_cursor(cursor) == values
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor!", "e30", encode_cursor([{"t": "yesterday"}])[:-2]])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_parse_sort():
+    assert parse_sort("-last_seen", ["last_seen", "name"]) == ("last_seen", True)
+    assert parse_sort("name", ["last_seen", "name"]) == ("name", False)
+    with pytest.raises(ValueError):
+        parse_sort("ip", ["last_seen", "name"])
+
+
+@pytest.mark.parametrize("descending", [False, True])
+async def test_keyset_pages_visit_every_row_once_in_order(session_maker, descending):
+    """Rows share sort values, so only the (sort column, id) key tells pages apart."""
+    seen = datetime(2026, 1, 1, 12, 0, 0)
+    devices = [
+        Device(id=f"device-{index:02d}", name=f"Device {index}", type="jetson", ip="10.0.0.1",
+               last_seen=seen + timedelta(minutes=index // 4))
+        for index in range(23)
+    ]
+    expected = [device.id for device in sorted(devices, key=lambda device: (device.last_seen, device.id), reverse=descending)]
+    async with session_maker() as db:
+        db.add_all(devices)
+        await db.commit()
+
+    pages, cursor = [], None
+    while True:
+        after = decode_cursor(cursor) if cursor else None
+        async with session_maker() as db:
+            query = keyset(select(Device), Device.last_seen, Device.id, descending, after).limit(5)
+            rows = list((await db.execute(query)).scalars())
+        pages.append([device.id for device in rows])
+        if len(rows) < 5:
+            break
+        cursor = encode_cursor([rows[-1].last_seen, rows[-1].id])
+
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+    assert [device_id for page in pages for device_id in page] == expected
+
+
+async def test_admin_device_listing_filters_and_pages(api):
+    headers = await api.login()
+    async with async_session_maker() as db:
+        db.add_all([
+            Device(id=f"fleet-{index:02d}", name=f"Fleet {index % 3}", type="jetson" if index % 2 else "rpi",
+                   ip="10.0.0.1", status="online" if index < 6 else "offline")
+            for index in range(9)
+        ])
+        await db.commit()
+
+    seen, cursor = [], None
+    while True:
+        params = {"sort": "name", "limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = await api.client.get("/api/v1/admin/devices", params=params, headers=headers)
+        assert response.status_code == 200
+        seen += [(device["name"], device["id"]) for device in response.json()]
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+    assert seen == sorted(seen) and len(seen) == 9
+    assert int(response.headers[TOTAL_ESTIMATE_HEADER]) == 9
+
+    filtered = await api.client.get(
+        "/api/v1/admin/devices", params={"status": "online", "type": "jetson"}, headers=headers
+    )
+    assert sorted(device["id"] for device in filtered.json()) == ["fleet-01", "fleet-03", "fleet-05"]
+
+    # A cursor only continues the sort it was issued for
+    first = await api.client.get("/api/v1/admin/devices", params={"sort": "name", "limit": 2}, headers=headers)
+    response = await api.client.get(
+        "/api/v1/admin/devices", params={"sort": "-last_seen", "cursor": first.headers[NEXT_CURSOR_HEADER]}, headers=headers
+    )
+    assert response.status_code == 400
+    assert (await api.client.get("/api/v1/admin/devices", params={"sort": "ip"}, headers=headers)).status_code == 400
@@ -0,0 +1,92 @@
+"""
+The request CPU profiler: sampling, report retention and the admin endpoints.
+"""
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.core import profiling
+from app.core.profiling import Profile, ProfileStore, Sampler
+
+
+def spin(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def profiled_work() -> None:
+    spin(0.05)
+    await asyncio.sleep(0.05)
+
+
+async def other_work() -> None:
+    await asyncio.sleep(0.005)
+    spin(0.04)
+
+
+async def test_samples_count_only_the_profiled_task():
+    sampler = Sampler(0.001)
+    task = asyncio.create_task(profiled_work())
+    profile = Profile(id="p", method="GET", path="/work", task=task)
+    sampler.begin(profile)
+    await asyncio.gather(task, other_work())
+    sampler.end(profile)
+
+    report = profile.report(sampler.interval)
+    functions = " ".join(report["stacks"])
+    assert "profiled_work" in functions and "spin" in functions
+    assert "other_work" not in functions
+    assert 0 < report["runningSamples"] < report["samples"]
+
+
+def test_reports_are_pruned_by_count_and_size(tmp_path):
+    store = ProfileStore(str(tmp_path), max_reports=3, max_bytes=10_000)
+    for index in range(5):
+        store.save({"id": f"2026010100000{index}-0000000{index}", "top": [], "stacks": {}})
+    assert [report["id"] for report in store.list()] == [f"2026010100000{index}-0000000{index}" for index in (4, 3, 2)]
+
+    store.save({"id": "20260101000009-00000009", "top": [], "stacks": {"x" * 20_000: 1}})
+    assert len(os.listdir(tmp_path)) == 1  # The newest is kept even when over the size limit alone
+    assert store.path("../etc/passwd") is None
+
+
+@pytest.fixture
+def profiler(app_settings, tmp_path, monkeypatch):
+    """Profiling switched on (before the app is built), with reports in ``tmp_path``."""
+    app_settings.profiling_enabled = True
+    app_settings.profiling_header_token = "secret"
+    monkeypatch.setattr(profiling.profiler, "store", ProfileStore(str(tmp_path), 10, 10 ** 7))
+    monkeypatch.setattr(profiling.profiler, "sampler", Sampler(0.001))
+    yield profiling.profiler
+    profiling.profiler.disarm()
+
+
+async def test_armed_requests_are_profiled_and_downloadable(profiler, api):
+    admin = await api.login("admin@example.com")
+    base = "/api/v1/admin/diagnostics/profiles"
+    armed = await api.client.post(f"{base}/arm", params={"path": "/api/v1/devices/scan", "count": 1}, headers=admin)
+    assert armed.json() == {"armed": {"/api/v1/devices/scan": 1}}
+
+    first = await api.client.post("/api/v1/devices/scan", headers=admin)
+    second = await api.client.post("/api/v1/devices/scan", headers=admin)
+    assert "x-profile-id" in first.headers and "x-profile-id" not in second.headers
+
+    profile_id = first.headers["x-profile-id"]
+    listed = (await api.client.get(base, headers=admin)).json()
+    assert [profile["id"] for profile in listed["profiles"]] == [profile_id]
+    report = (await api.client.get(f"{base}/{profile_id}", headers=admin)).json()
+    assert (report["path"], report["status"]) == ("/api/v1/devices/scan", 200)
+    collapsed = await api.client.get(f"{base}/{profile_id}", params={"format": "collapsed"}, headers=admin)
+    assert collapsed.status_code == 200
+
+    assert (await api.client.delete(f"{base}/{profile_id}", headers=admin)).status_code == 200
+    assert (await api.client.get(f"{base}/{profile_id}", headers=admin)).status_code == 404
+
+
+async def test_the_header_token_selects_a_request(profiler, api):
+    headers = await api.login()
+    assert "x-profile-id" in (await api.client.get("/api/v1/devices", headers={**headers, "X-Profile": "secret"})).headers
+    assert "x-profile-id" not in (await api.client.get("/api/v1/devices", headers={**headers, "X-Profile": "wrong"})).headers
@@ -0,0 +1,80 @@
+"""
+Token buckets and the per-user, per-device and per-route limits on the API.
+"""
+import pytest
+
+from app.core import rate_limit
+from app.core.rate_limit import InMemoryRateLimiter, RateLimitRule, get_rate_limiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_rule_parsing():
+    assert RateLimitRule.parse("30/minute") == RateLimitRule(capacity=30.0, rate=0.5)
+    assert RateLimitRule.parse("2/seconds") == RateLimitRule(capacity=2.0, rate=2.0)
+    assert RateLimitRule.parse("5") == RateLimitRule(capacity=5.0, rate=5.0)
+    with pytest.raises(ValueError):
+        RateLimitRule.parse("5/fortnight")
+
+
+async def test_bucket_refills_at_the_rule_rate(clock):
+    limiter = InMemoryRateLimiter()
+    checks = [("user:1", RateLimitRule.parse("2/minute"))]
+    assert (await limiter.acquire(checks)).allowed
+    assert (await limiter.acquire(checks)).remaining == 0
+
+    rejected = await limiter.acquire(checks)
+    assert not rejected.allowed
+    assert rejected.retry_after == pytest.approx(30.0)
+    assert rejected.headers()["Retry-After"] == "30"
+
+    clock[0] += 30
+    assert (await limiter.acquire(checks)).allowed
+
+
+async def test_rejection_does_not_drain_the_other_buckets(clock):
+    limiter = InMemoryRateLimiter()
+    user, device = RateLimitRule.parse("10/minute"), RateLimitRule.parse("1/minute")
+    assert (await limiter.acquire([("user:1", user), ("device:a", device)])).allowed
+    assert not (await limiter.acquire([("user:1", user), ("device:a", device)])).allowed
+
+    # Only the successful request was charged to the user
+    allowed = await limiter.acquire([("user:1", user)])
+    assert allowed.remaining == 8
+
+
+async def test_least_recently_used_buckets_are_evicted(clock):
+    limiter = InMemoryRateLimiter(max_keys=2)
+    rule = RateLimitRule.parse("1/minute")
+    for key in ("a", "b", "c"):
+        await limiter.acquire([(key, rule)])
+    assert len(limiter) == 2
+    # "a" was evicted, so it starts full again
+    assert (await limiter.acquire([("a", rule)])).allowed
+    assert not (await limiter.acquire([("c", rule)])).allowed
+
+
+async def test_api_returns_429_with_retry_after(api, app_settings):
+    app_settings.rate_limit_enabled = True
+    app_settings.rate_limit_user = "2/minute"
+    get_rate_limiter.cache_clear()
+    try:
+        headers = await api.login()
+        statuses = [
+            (await api.client.post("/api/v1/devices/scan", headers=headers)).status_code for _ in range(3)
+        ]
+        assert statuses == [200, 200, 429]
+        response = await api.client.post("/api/v1/devices/scan", headers=headers)
+        assert int(response.headers["Retry-After"]) > 0
+        assert response.headers["X-RateLimit-Remaining"] == "0"
+
+        # Another user has their own bucket
+        other = await api.login("other@example.com")
+        assert (await api.client.post("/api/v1/devices/scan", headers=other)).status_code == 200
+    finally:
+        get_rate_limiter.cache_clear()
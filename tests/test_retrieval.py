@@ -0,0 +1,114 @@
+"""
+Retrieval over chat history: exact and IVF search, flushing the tail to disk
+and catching up on messages stored while the index was not loaded.
+"""
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from app.services import chat_service
+from app.services.retrieval import IVF, HashingEmbedder, HistoryIndex, UserIndex, View, entry_dtype, message_key
+
+np = pytest.importorskip("numpy")
+
+
+def clustered(count: int, dim: int, clusters: int, rng) -> "np.ndarray":
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(clusters, size=count)] + 0.4 * rng.normal(size=(count, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_ivf_search_recalls_the_exact_neighbours():
+    rng = np.random.default_rng(7)
+    vectors = clustered(4000, 32, 40, rng)
+    entries = np.array(
+        [(uuid.uuid4().bytes, bytes(16), 0, f"row {row}".encode()) for row in range(4000)], dtype=entry_dtype(16)
+    )
+    # Train on the first rows (rewritten in list order, as on disk), then extend with the rest
+    ivf, order = IVF.train(vectors[:3000])
+    vectors = np.concatenate([vectors[:3000][order], vectors[3000:]])
+    entries = np.concatenate([entries[:3000][order], entries[3000:]])
+    ivf.extend(vectors[3000:])
+    assert ivf.rows == 4000 and sum(len(rows) for rows in ivf.extra) == 1000
+
+    exact = View(vectors, entries, None, 0, None, [])
+    ann = View(vectors, entries, ivf, ivf.rows, None, [])
+    recalled = []
+    for query in vectors[rng.choice(4000, size=50, replace=False)]:
+        expected, mode = exact.search(query, 10, -1.0, 8)
+        assert mode == "exact"
+        found, mode = ann.search(query, 10, -1.0, 8)
+        assert mode == "ann"
+        recalled.append(len({s.message_id for s in expected} & {s.message_id for s in found}) / 10)
+    assert np.mean(recalled) >= 0.9
+
+
+def test_tail_rows_are_found_before_and_after_a_flush(tmp_path):
+    embedder = HashingEmbedder(64)
+    index = UserIndex(str(tmp_path), 64, 64)
+    assert index.open() is None
+    index.remapped(index.commit_staged())
+    message_id, created_at = uuid.uuid4(), datetime(2026, 1, 1, tzinfo=timezone.utc)
+    index.append(embedder.embed("zebras graze on the savanna"), (message_id.bytes, bytes(16), 0, b"zebras graze"),
+                 message_key(created_at, message_id))
+
+    query = embedder.embed("where do zebras graze")
+    [snippet], _ = index.search(query, 3, 0.1, 4)
+    assert snippet.message_id == message_id
+    assert index.pending_ids() == {message_id.bytes}
+
+    count, vectors, entries, cursor = index.take_tail()
+    index.remapped(index.write(vectors, entries, cursor, index.inode), flushed=count)
+    assert index.tail_size == 0 and len(index.vectors) == 1
+    [snippet], _ = index.search(query, 3, 0.1, 4)
+    assert (snippet.message_id, snippet.role, snippet.text) == (message_id, "user", "zebras graze")
+
+    # A naive timestamp is UTC
+    reopened = UserIndex(str(tmp_path), 64, 64).open()
+    assert reopened.cursor == message_key(created_at.replace(tzinfo=None), message_id)
+    assert len(reopened.vectors) == 1
+
+
+@pytest.fixture
+def retrieval(app_settings, tmp_path):
+    app_settings.retrieval_enabled = True
+    app_settings.retrieval_dir = str(tmp_path)
+    app_settings.retrieval_budget_ms = 1000
+    return app_settings
+
+
+async def send(api, headers: dict, message: str) -> None:
+    response = await api.client.post("/api/v1/chat/message", data={"message": message}, headers=headers)
+    assert response.status_code == 200
+
+
+async def test_messages_stored_while_disabled_are_indexed_on_open(api, retrieval, monkeypatch):
+    headers = await api.login()
+    await api.connect_device(headers)
+    first = HistoryIndex()
+    monkeypatch.setattr(chat_service, "history_index", first)
+    await send(api, headers, "zebras graze on the savanna")
+    await first.stop()  # Finishes loading and flushes
+    [user_id] = first.loaded()
+    assert [s.text for s in await first.search(user_id, "zebras graze")][:1] == ["zebras graze on the savanna"]
+
+    retrieval.retrieval_enabled = False
+    await send(api, headers, "penguins huddle through the antarctic winter")
+    retrieval.retrieval_enabled = True
+
+    second = HistoryIndex()
+    monkeypatch.setattr(chat_service, "history_index", second)
+
+    async def rebuild(*args):
+        raise AssertionError("The index on disk should be opened, not rebuilt")
+
+    monkeypatch.setattr(second, "_backfill", rebuild)
+    assert await second.search(user_id, "penguins huddle") == []  # Opens the index in the background
+    await second.stop()
+    snippets = await second.search(user_id, "penguins huddle")
+    assert snippets[0].text == "penguins huddle through the antarctic winter"
+
+    index = second.loaded()[user_id]
+    ids = [bytes(message_id) for message_id in index.entries["id"]]
+    assert len(ids) == len(set(ids)) == 4  # Both turns, nothing indexed twice
@@ -0,0 +1,37 @@
+"""
+Pre-fork launcher helpers.
+"""
+import signal
+import subprocess
+import sys
+
+from app.core.server import _bind_socket, _signal_workers, best_http, best_loop
+
+
+def test_signalling_skips_workers_that_already_exited():
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    running = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        _signal_workers([exited.pid, running.pid], signal.SIGKILL)
+        assert running.wait(timeout=10) == -signal.SIGKILL
+    finally:
+        running.kill()
+        running.wait()
+
+
+def test_listening_socket_is_inherited_by_workers():
+    sock = _bind_socket("127.0.0.1", 0)
+    try:
+        assert sock.get_inheritable()
+        assert sock.getsockname()[1] > 0
+    finally:
+        sock.close()
+
+
+def test_event_loop_and_parser_fall_back_to_the_stdlib(monkeypatch):
+    # A None entry makes the import raise ImportError
+    monkeypatch.setitem(sys.modules, "uvloop", None)
+    monkeypatch.setitem(sys.modules, "httptools", None)
+    assert best_loop() == "asyncio"
+    assert best_http() == "h11"
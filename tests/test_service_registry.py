@@ -0,0 +1,96 @@
+"""
+The in-memory service registry and its cross-worker notifications.
+"""
+import json
+
+from app.core.database import async_session_maker
+from app.repositories.admin_service_repository import AdminServiceRepository
+from app.schemas.admin import AdminServiceCreate, AdminServiceUpdate
+from app.services.service_registry import ServiceRegistry, service_registry
+
+
+class LocalNotifier:
+    """Delivers each published change to every registry, as LISTEN/NOTIFY would."""
+
+    def __init__(self, *registries: ServiceRegistry):
+        self.registries = registries
+        self.published = []
+        for registry in registries:
+            registry._notifier = self
+
+    async def publish(self, payload: str) -> None:
+        self.published.append(json.loads(payload))
+        for registry in self.registries:
+            await registry._handle(json.loads(payload))
+
+
+async def create_service(**fields):
+    async with async_session_maker() as db:
+        return await AdminServiceRepository(db).create(AdminServiceCreate(**fields))
+
+
+async def test_changes_reach_other_workers(api):
+    local, remote = ServiceRegistry(), ServiceRegistry()
+    notifier = LocalNotifier(local, remote)
+    await local.load()
+    await remote.load()
+
+    service = await create_service(name="llm", type="inference", endpoint="http://a")
+    await local.upserted(service)
+    assert remote.get(service.id).endpoint == "http://a"
+
+    async with async_session_maker() as db:
+        updated = await AdminServiceRepository(db).update(service.id, AdminServiceUpdate(status="inactive"))
+    await local.upserted(updated)
+    assert remote.get(service.id).status == "inactive"
+    assert remote.find("inference") == []
+
+    await local.deleted(service.id)
+    assert remote.get(service.id) is None
+    assert local.all() == remote.all() == []
+    assert [message["action"] for message in notifier.published] == ["upsert", "upsert", "delete"]
+
+
+async def test_a_worker_ignores_its_own_notifications(api):
+    registry = ServiceRegistry()
+    LocalNotifier(registry)
+    await registry.load()
+    service = await create_service(name="llm", type="inference")
+    await registry.upserted(service)
+
+    # The handler would re-read the row; a deleted row shows it was skipped
+    async with async_session_maker() as db:
+        await AdminServiceRepository(db).delete(service.id)
+    await registry._handle({"action": "upsert", "id": str(service.id), "origin": registry._origin})
+    assert registry.get(service.id) is not None
+
+
+async def test_page_walks_services_in_key_order(api):
+    registry = ServiceRegistry()
+    for index in range(5):
+        await create_service(name=f"svc-{index % 2}", type="inference" if index < 3 else "storage")
+    await registry.load()
+
+    seen, after = [], None
+    while True:
+        page, total = registry.page(sort="name", limit=2, after=after)
+        seen += page
+        if len(page) < 2:
+            break
+        after = [page[-1].name, page[-1].id]
+    assert total == 5
+    assert [(service.name, service.id) for service in seen] == sorted((service.name, service.id) for service in seen)
+    assert len({service.id for service in seen}) == 5
+    assert registry.page(type=["storage"])[1] == 2
+
+
+async def test_admin_routes_serve_services_from_the_registry(api):
+    headers = await api.login()
+    await service_registry.load()
+    created = await api.client.post(
+        "/api/v1/admin/services", json={"name": "llm", "type": "inference"}, headers=headers
+    )
+    assert created.status_code == 200
+    listed = await api.client.get("/api/v1/admin/services", headers=headers)
+    assert [service["id"] for service in listed.json()] == [created.json()["id"]]
+    assert listed.headers["X-Total-Estimate"] == "1"
@@ -0,0 +1,59 @@
+"""
+The embedded SQLite backend: URLs, pool sizing, pragmas and dialect-specific upserts.
+"""
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.exc import IntegrityError
+
+from app.core import database
+from app.domain.models import ChatMessage, Device
+from app.repositories.device_repository import DeviceRepository
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("sqlite:///./edge.db", "sqlite+aiosqlite:///./edge.db"),
+    ("postgresql://user@db/edge", "postgresql+psycopg://user@db/edge"),
+])
+def test_async_driver_is_selected(app_settings, url, expected):
+    app_settings.database_url = url
+    assert database.async_database_url() == expected
+
+
+def test_sqlite_pool_sizing(app_settings):
+    app_settings.database_url = "sqlite:///:memory:"
+    assert database.pool_options() == {}
+    app_settings.database_url = "sqlite:///./edge.db"
+    app_settings.sqlite_pool_size = 3
+    options = database.pool_options()
+    assert (options["pool_size"], options["max_overflow"]) == (3, 0)
+    assert "pool_pre_ping" not in options
+
+
+async def test_pragmas_apply_to_every_connection(session_maker, app_settings):
+    async def pragma(name: str):
+        async with session_maker() as db:
+            return (await db.execute(text(f"PRAGMA {name}"))).scalar()
+
+    values = await asyncio.gather(*(pragma(name) for name in ("journal_mode", "foreign_keys", "busy_timeout")))
+    assert values == ["wal", 1, app_settings.sqlite_busy_timeout_ms]
+
+
+async def test_foreign_keys_are_enforced(session_maker):
+    async with session_maker() as db:
+        db.add(ChatMessage(user_id=uuid.uuid4(), role="user", content="orphan"))
+        with pytest.raises(IntegrityError, match="FOREIGN KEY"):
+            await db.commit()
+
+
+async def test_upsert_inserts_then_updates(session_maker):
+    row = {"id": "edge-1", "name": "Edge", "type": "rpi", "ip": "10.0.0.1", "specs": {"memory": "4GB"},
+           "status": "disconnected", "user_id": None}
+    async with session_maker() as db:
+        assert await DeviceRepository(db).upsert_many([row]) == 1
+        assert await DeviceRepository(db).upsert_many([{**row, "ip": "10.0.0.2", "specs": {"memory": "8GB"}}]) == 1
+    async with session_maker() as db:
+        devices = list((await db.execute(select(Device))).scalars())
+    assert [(device.id, device.ip, device.specs) for device in devices] == [("edge-1", "10.0.0.2", {"memory": "8GB"})]
@@ -0,0 +1,92 @@
+"""
+Thumbnail rendering, the background queue and thumbnails in chat history.
+"""
+import asyncio
+import hashlib
+import io
+
+import pytest
+
+from app.core.uploads import MediaStore, media_url
+from app.services.thumbnail_service import Thumbnailer
+
+Image = pytest.importorskip("PIL.Image")  # Thumbnails need the optional Pillow package
+
+
+def png(width: int, height: int, color: str = "red") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def store_image(store: MediaStore, data: bytes) -> str:
+    sha256 = hashlib.sha256(data).hexdigest()
+    with store.spool() as f:
+        f.write(data)
+    store.commit(f.name, sha256)
+    return sha256
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MediaStore(str(tmp_path / "media"))
+
+
+async def test_each_size_is_rendered_once(store, app_settings):
+    app_settings.thumbnail_sizes = [32, 128]
+    thumbnailer = Thumbnailer(store)
+    sha256 = store_image(store, png(400, 200))
+    try:
+        assert all(await asyncio.gather(*(thumbnailer.ensure(sha256) for _ in range(3))))
+        with Image.open(thumbnailer.path(sha256, 128)) as thumbnail:
+            assert (thumbnail.format, thumbnail.size) == ("WEBP", (128, 64))
+        with Image.open(thumbnailer.path(sha256, 32)) as thumbnail:
+            assert thumbnail.size == (32, 16)
+        assert thumbnailer.inflight() == []
+    finally:
+        thumbnailer.shutdown()
+
+
+async def test_undecodable_images_have_no_thumbnails(store):
+    thumbnailer = Thumbnailer(store)
+    sha256 = store_image(store, b"\x89PNG\r\n\x1a\n" + b"\x00" * 32)
+    try:
+        assert not await thumbnailer.ensure(sha256)
+        assert not await thumbnailer.ensure("0" * 64)
+    finally:
+        thumbnailer.shutdown()
+
+
+async def test_a_burst_of_submits_respects_the_queue_limit(store, app_settings):
+    app_settings.thumbnail_queue_limit = 2
+    thumbnailer = Thumbnailer(store)
+    urls = [media_url(store_image(store, png(64, 64, color))) for color in ("red", "green", "blue", "white")]
+    try:
+        for url in urls:
+            thumbnailer.submit([url])
+        assert len(thumbnailer.inflight()) == 2
+        await asyncio.gather(*thumbnailer._background)
+        assert thumbnailer.inflight() == []
+    finally:
+        thumbnailer.shutdown()
+
+
+async def test_history_references_thumbnails_and_full_images(api):
+    headers = await api.login()
+    await api.connect_device(headers)
+    data = png(600, 300, "purple")
+    files = [("images", ("photo.png", data, "image/png"))]
+    assert (await api.client.post("/api/v1/chat/message", data={"message": "photo"}, files=files, headers=headers)).status_code == 200
+
+    sha256 = hashlib.sha256(data).hexdigest()
+    history = (await api.client.get("/api/v1/chat/messages", headers=headers)).json()
+    user_message = next(message for message in history if message["role"] == "user")
+    assert user_message["fullImages"] == [media_url(sha256)]
+    assert user_message["images"] == [f"{media_url(sha256)}/thumbnails/256"]
+
+    thumbnail = await api.client.get(user_message["images"][0])
+    assert thumbnail.status_code == 200
+    assert thumbnail.headers["content-type"] == "image/webp"
+
+    full = (await api.client.get("/api/v1/chat/messages", params={"images": "full"}, headers=headers)).json()
+    assert next(message for message in full if message["role"] == "user")["images"] == [media_url(sha256)]
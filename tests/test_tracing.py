@@ -0,0 +1,93 @@
+"""
+Span propagation and trace export.
+"""
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.core import tracing
+from app.core.tracing import FileExporter, InMemoryExporter, Trace, _parse_traceparent, span, traced
+
+
+@pytest.fixture
+def trace():
+    """A trace made current for the test (async tests get a copy of the context)."""
+    trace = Trace(trace_id="t" * 32, name="GET /", start=time.perf_counter(), wall_start=time.time())
+    token = tracing._current_trace.set(trace)
+    yield trace
+    tracing._current_trace.reset(token)
+
+
+async def test_spans_nest_across_child_tasks(trace):
+    @traced("child")
+    async def child():
+        await asyncio.sleep(0)
+
+    with span("root"):
+        await asyncio.gather(child(), child())
+
+    root, first, second = trace.spans
+    assert [root.name, first.name, second.name] == ["root", "child", "child"]
+    assert root.parent_id is None
+    assert first.parent_id == second.parent_id == root.span_id
+    assert all(entry.end is not None for entry in trace.spans)
+
+
+def test_span_records_the_exception_type(trace):
+    with pytest.raises(KeyError):
+        with span("failing"):
+            raise KeyError("missing")
+    assert trace.to_dict()["spans"][0]["error"] == "KeyError"
+
+
+def test_spans_are_no_ops_without_a_trace():
+    with span("orphan") as current:
+        assert current is None
+
+
+def test_parse_traceparent():
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert _parse_traceparent(f"00-{trace_id}-00f067aa0ba902b7-01") == trace_id
+    assert _parse_traceparent("garbage") is None
+    assert _parse_traceparent(None) is None
+
+
+def test_memory_exporter_keeps_the_most_recent_traces():
+    exporter = InMemoryExporter(maxlen=2)
+    for name in ("a", "b", "c"):
+        exporter.export(Trace(trace_id=name, name=name, start=0.0, wall_start=0.0))
+    assert [trace["name"] for trace in exporter.recent()] == ["c", "b"]
+
+
+async def test_file_exporter_writes_in_batches(tmp_path):
+    path = tmp_path / "traces" / "traces.jsonl"
+    exporter = FileExporter(str(path), maxlen=10)
+    for name in ("a", "b"):
+        exporter.export(Trace(trace_id=name, name=name, start=0.0, wall_start=0.0))
+
+    # Exporting only queues; the file is written by flush
+    assert not path.exists()
+    assert exporter.pending() == 2
+    assert await exporter.flush() == 2
+    assert [json.loads(line)["name"] for line in path.read_text().splitlines()] == ["a", "b"]
+    assert await exporter.flush() == 0
+
+
+async def test_file_exporter_bounds_unwritten_lines(tmp_path):
+    exporter = FileExporter(str(tmp_path / "traces.jsonl"), maxlen=2)
+    for name in ("a", "b", "c"):
+        exporter.export(Trace(trace_id=name, name=name, start=0.0, wall_start=0.0))
+    assert exporter.pending() == 2
+    assert exporter.dropped == 1
+    assert len(exporter.recent()) == 2
+
+
+async def test_file_exporter_background_writer_flushes_on_stop(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = FileExporter(str(path), flush_interval=60)
+    exporter.start()
+    exporter.export(Trace(trace_id="a", name="a", start=0.0, wall_start=0.0))
+    await exporter.stop()
+    assert len(path.read_text().splitlines()) == 1
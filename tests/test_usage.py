@@ -0,0 +1,91 @@
+"""
+Token counting and the batched usage ledger.
+"""
+import threading
+import uuid
+
+import pytest
+from pydantic import ValidationError
+
+from app.core.config import Settings
+from app.core.database import async_session_maker
+from app.repositories.usage_repository import UsageRepository
+from app.services import tokenizer
+from app.services.tokenizer import ApproximateTokenizer, count_tokens, preload_tokenizers
+from app.services.usage_service import UsageRecorder, usage_recorder
+
+
+class WordTokenizer:
+    exact = True
+
+    def count(self, text: str) -> int:
+        return len(text.split())
+
+
+def test_approximate_counts_words_punctuation_and_long_words():
+    assert ApproximateTokenizer().count("Hi, you!") == 4
+    assert ApproximateTokenizer().count("internationalization") == 5
+    assert count_tokens("") == 0
+
+
+async def test_configured_tokenizers_load_off_the_event_loop(app_settings, monkeypatch):
+    app_settings.model_tokenizers = {"exact-model": "org/tokenizer"}
+    loaded_on = []
+
+    def load(source):
+        loaded_on.append(threading.current_thread())
+        return WordTokenizer()
+
+    monkeypatch.setattr(tokenizer, "_load_huggingface", load)
+    monkeypatch.setattr(tokenizer, "_loaded", {})
+
+    # Counting never loads: the model gets approximate counts until preloaded
+    assert count_tokens("internationalization", "exact-model") == 5
+    assert loaded_on == []
+
+    await preload_tokenizers()
+    assert loaded_on and loaded_on[0] is not threading.main_thread()
+    assert count_tokens("internationalization", "exact-model") == 1
+
+
+def test_unsupported_databases_are_rejected_at_startup():
+    with pytest.raises(ValidationError, match="postgresql:// or sqlite://"):
+        Settings(database_url="mysql://user@localhost/edge")
+    assert Settings(database_url="sqlite:///./edge.db").database_url == "sqlite:///./edge.db"
+
+
+async def test_flush_writes_ledger_rows_and_daily_counters(api):
+    headers = await api.login()
+    await api.connect_device(headers)
+    await usage_recorder.flush()  # Start from an empty buffer
+    for message in ("one", "two"):
+        assert (await api.client.post("/api/v1/chat/message", data={"message": message}, headers=headers)).status_code == 200
+    assert await usage_recorder.flush() == 2
+
+    usage = (await api.client.get("/api/v1/chat/usage", headers=headers)).json()
+    assert usage["requests"] == 2
+    assert usage["promptTokens"] > 0 and usage["completionTokens"] > 0
+    assert [(row["deviceId"], row["model"]) for row in usage["breakdown"]] == [("rpi-001", "edge-llm")]
+
+
+async def test_rejected_events_are_dropped_without_losing_the_batch(api):
+    headers = await api.login()
+    user = (await api.client.get("/api/v1/auth/session", headers=headers)).json()
+    recorder = UsageRecorder()
+    user_id = uuid.UUID(user["id"])
+    recorder.record(user_id, None, "edge-llm", 3, 4)
+    recorder.record(uuid.uuid4(), None, "edge-llm", 1, 1)  # Unknown user: foreign key violation
+    recorder.record(user_id, None, "edge-llm", 5, 6)
+
+    assert await recorder.flush() == 2
+    async with async_session_maker() as db:
+        totals = await UsageRepository(db).totals(user_id)
+    assert totals == [{"device_id": None, "model": "edge-llm", "requests": 2, "prompt_tokens": 8, "completion_tokens": 10}]
+
+
+def test_full_buffer_drops_new_events(app_settings):
+    app_settings.usage_buffer_limit = 2
+    recorder = UsageRecorder()
+    for _ in range(3):
+        recorder.record(uuid.uuid4(), "d" * 500, "m" * 500, 1, 1)
+    assert recorder.pending() == 2